@@ -51,6 +51,7 @@ except ImportError as e:
 from .ncbi_taxonomy import *
 from .coretype.tree import *
 from .coretype.seqgroup import *
+from .coretype.seqmatrix import *
 from .phylo.phylotree import *
 from .evol.evoltree import *
 from .webplugin.webapp import *
@@ -59,6 +60,7 @@ from .nexml import Nexml, NexmlTree
 from .evol import EvolTree
 from .coretype.arraytable import *
 from .clustering.clustertree import *
+from . import profiling
 
 try:
     from .phylomedb.phylomeDB3 import *
@@ -41,10 +41,10 @@ from __future__ import print_function
 
 from sys import stderr
 from . import clustvalidation
+from . import linkage as _linkage
 from ..coretype.tree import _translate_nodes
 from .. import TreeNode, ArrayTable
 from .. import numpy
-from six.moves import range
 
 __all__ = ["ClusterNode", "ClusterTree"]
 
@@ -92,26 +92,47 @@ class ClusterNode(TreeNode):
 
     def _set_profile(self, value):
         self._profile = value
+        if self.up is not None:
+            self.up._invalidate_profile_cache()
+
+    def _set_up(self, value):
+        old_up = self._up
+        TreeNode._set_up(self, value)
+        # Profiles aggregated above this node are no longer valid
+        if old_up is not None:
+            old_up._invalidate_profile_cache()
+        if value is not None:
+            value._invalidate_profile_cache()
+
+    def _set_children(self, value):
+        TreeNode._set_children(self, value)
+        self._invalidate_profile_cache()
 
     intracluster_dist = property(fget=_get_intra, fset=_set_forbidden)
     intercluster_dist = property(fget=_get_inter, fset=_set_forbidden)
     silhouette = property(fget=_get_silh, fset=_set_forbidden)
     profile = property(fget=_get_prof, fset=_set_profile)
     deviation = property(fget=_get_std, fset=_set_forbidden)
+    up = property(fget=TreeNode._get_up, fset=_set_up)
+    children = property(fget=TreeNode._get_children, fset=_set_children)
 
     def __init__(self, newick = None, text_array = None, \
                  fdist=clustvalidation.default_dist):
         # Default dist is spearman_dist when scipy module is loaded
         # otherwise, it is set to euclidean_dist.
 
-        # Initialize basic tree features and loads the newick (if any)
-        TreeNode.__init__(self, newick)
+        # Cluster values must exist before the newick is loaded, as
+        # topology changes invalidate them
         self._fdist = None
         self._silhouette = None
         self._intercluster_dist = None
         self._intracluster_dist = None
         self._profile = None
         self._std_profile = None
+        self._profile_stats = None
+
+        # Initialize basic tree features and loads the newick (if any)
+        TreeNode.__init__(self, newick)
 
         # Cluster especific features
         self.features.add("intercluster_dist")
@@ -130,6 +151,71 @@ class ClusterNode(TreeNode):
     def __repr__(self):
         return "ClusterTree node (%s)" %hex(self.__hash__())
 
+    @classmethod
+    def from_arraytable(cls, arraytbl, metric="euclidean", linkage="average",
+                        max_memory=_linkage.DEFAULT_MAX_MEMORY, chunk_size=None):
+        """ Builds a new ClusterTree by hierarchical clustering of the
+        rows in the given arraytable, which is then linked to the
+        tree. Branch lengths are set from merge heights, so leaves are
+        at a distance of the merge height from their ancestors.
+
+        :argument arraytbl: an ArrayTable instance or a matrix file.
+
+        :argument "euclidean" metric: "euclidean", "sqeuclidean",
+          "cityblock", "cosine", "correlation" (or "pearson") or
+          "spearman".
+
+        :argument "average" linkage: "single", "complete", "average",
+          "weighted" or "ward".
+
+        :argument max_memory: maximum number of bytes used to keep
+          pairwise distances in memory. Larger matrices can only be
+          clustered using "single" or "ward" linkage, and distances are
+          then computed on the fly.
+
+        :argument None chunk_size: number of rows whose distances are
+          computed at once.
+
+        Scipy is used to cluster the distance matrix when available.
+
+        """
+        if metric not in _METRIC2DIST:
+            raise ValueError("Unknown metric: %s" % metric)
+
+        if isinstance(arraytbl, ArrayTable):
+            array = arraytbl
+        else:
+            array = ArrayTable(arraytbl)
+
+        Z = _linkage.get_linkage(array.matrix, metric=metric, method=linkage,
+                                 max_memory=max_memory, chunk_size=chunk_size)
+
+        nrows = len(array.rowNames)
+        nodes = []
+        heights = []
+        for name in array.rowNames:
+            leaf = cls()
+            leaf.name = name
+            nodes.append(leaf)
+            heights.append(0.0)
+
+        for ch1, ch2, height, size in Z:
+            node = cls()
+            for ch in (int(ch1), int(ch2)):
+                child = nodes[ch]
+                child.dist = height - heights[ch]
+                node.add_child(child)
+                # children are only added once
+                nodes[ch] = None
+            nodes.append(node)
+            heights.append(height)
+        root = nodes[-1]
+        root.dist = 0.0
+
+        root.link_to_arraytable(array)
+        root.set_distance_function(_METRIC2DIST[metric])
+        return root
+
     def set_distance_function(self, fn):
         """ Sets the distance function used to calculate cluster
         distances and silouette index.
@@ -170,19 +256,18 @@ class ClusterNode(TreeNode):
             array = ArrayTable(arraytbl)
 
         missing_leaves = []
-        matrix_values = [i for r in range(len(array.matrix))\
-                           for i in array.matrix[r] if numpy.isfinite(i)]
-
-        array._matrix_min = min(matrix_values)
-        array._matrix_max = max(matrix_values)
+        array._matrix_min, array._matrix_max = array.get_value_range()
 
         for n in self.traverse():
             n.arraytable = array
-            if n.is_leaf() and n.name in array.rowNames:
+            n._reset_profile_cache()
+            if n.is_leaf() and n.name in array.rowValues:
                 n._profile = array.get_row_vector(n.name)
             elif n.is_leaf():
                 n._profile = [numpy.nan]*len(array.colNames)
                 missing_leaves.append(n)
+        if self.up is not None:
+            self.up._invalidate_profile_cache()
 
 
         if len(missing_leaves)>0:
@@ -246,9 +331,52 @@ class ClusterNode(TreeNode):
         """ This internal function updates the mean profile
         associated to an internal node. """
 
-        # Updates internal values
-        self._profile, self._std_profile = clustvalidation.get_avg_profile(self)
+        # Updates internal values. Profiles of all the nodes under this
+        # one are aggregated in the same postorder pass.
+        clustvalidation.update_avg_profiles(self)
+
+    def _reset_validation(self):
+        self._silhouette = None
+        self._intercluster_dist = None
+        self._intracluster_dist = None
 
+    def _reset_profile_cache(self):
+        self._reset_validation()
+        self._std_profile = None
+        if self._profile_stats is not None or not self.is_leaf():
+            # Internal profiles are derived values, while leaf profiles
+            # come from the arraytable
+            self._profile = None
+        self._profile_stats = None
+
+    def _invalidate_profile_cache(self):
+        """ Discards the aggregated profiles of this node and all its
+        ancestors, as well as the validation values depending on
+        them."""
+        node = self
+        while node is not None:
+            cached = node._profile_stats is not None
+            node._reset_profile_cache()
+            for sister in node.get_sisters():
+                sister._reset_validation()
+            # Aggregated values are only cached in nodes whose
+            # descendants are also cached, so there is nothing to clear
+            # above the first non cached ancestor.
+            if node is not self and not cached:
+                break
+            node = node.up
+
+
+# Validation distance functions matching clustering metrics
+_METRIC2DIST = {
+    "euclidean": clustvalidation.euclidean_dist,
+    "sqeuclidean": clustvalidation.square_euclidean_dist,
+    "cityblock": clustvalidation.cityblock_dist,
+    "cosine": clustvalidation.cosine_dist,
+    "correlation": clustvalidation.pearson_dist,
+    "pearson": clustvalidation.pearson_dist,
+    "spearman": clustvalidation.spearman_dist,
+}
 
 # cosmetic alias
 #: .. currentmodule:: ete3
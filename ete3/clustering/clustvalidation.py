@@ -39,15 +39,13 @@ from __future__ import absolute_import
 # #END_LICENSE#############################################################
 
 from .. import numpy
-from math import sqrt
-from six.moves import range
 
 def safe_mean(values):
     """ Returns mean value discarding non finite values """
-    valid_values = []
-    for v in values:
-        if numpy.isfinite(v):
-            valid_values.append(v)
+    values = numpy.asarray(values, dtype=float).ravel()
+    valid_values = values[numpy.isfinite(values)]
+    if len(valid_values) == 0:
+        return numpy.nan, numpy.nan
     return numpy.mean(valid_values), numpy.std(valid_values)
 
 def safe_mean_vector(vectors):
@@ -56,69 +54,145 @@ def safe_mean_vector(vectors):
     # if only one vector, avg = itself
     if len(vectors)==1:
         return vectors[0], numpy.zeros(len(vectors[0]))
-    # Takes the vector length form the first item
-    length = len(vectors[0])
 
-    safe_mean = []
-    safe_std  = []
+    matrix = numpy.asarray(vectors, dtype=float)
+    finite = numpy.isfinite(matrix)
+    counts = finite.sum(axis=0)
+    values = numpy.where(finite, matrix, 0.0)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        safe_mean = values.sum(axis=0) / counts
+        dev = numpy.where(finite, matrix - safe_mean, 0.0)
+        safe_std = numpy.sqrt((dev * dev).sum(axis=0) / counts)
+    return safe_mean, safe_std
 
-    for pos in range(length):
-        pos_mean = []
-        for v in vectors:
-            if numpy.isfinite(v[pos]):
-                pos_mean.append(v[pos])
-        safe_mean.append(numpy.mean(pos_mean))
-        safe_std.append(numpy.std(pos_mean))
-    return numpy.array(safe_mean), numpy.array(safe_std)
+def get_dist_vector(fdist, matrix, vector):
+    """ Returns the distances between each row in matrix and the given
+    vector. Distance functions defined in this module are computed at
+    once for all rows, any other function is called once per row. """
+    batch_fn = _BATCH_DIST.get(fdist, None)
+    if batch_fn is not None:
+        return batch_fn(matrix, vector)
+    return numpy.array([fdist(row, vector) for row in matrix], dtype=float)
 
 def get_silhouette_width(fdist, cluster):
     sisters = cluster.get_sisters()
 
+    # Leaf profiles are stacked into a single matrix, so distances to
+    # each centroid are computed at once for all leaves. Skip nodes
+    # without profile.
+    leaf_vectors = [i.profile for i in cluster.iter_leaves()
+                    if i._profile is not None]
+
     # Calculates silhouette
     silhouette = []
     intra_dist = []
     inter_dist = []
+    a = None
     for st in sisters:
-        if st.profile is None:
+        if st.profile is None or not leaf_vectors:
             continue
-        for i in cluster.iter_leaves():
-            # Skip nodes without profile
-            if i._profile is not None:
-                # item intraclsuterdist -> Centroid Diameter
-                a = fdist(i.profile, cluster.profile)*2
-                # intracluster dist -> Centroid Linkage
-                b = fdist(i.profile, st.profile)
-
-                if (b-a) == 0.0:
-                    s = 0.0
-                else:
-                    s =  (b-a) / max(a,b)
-
-                intra_dist.append(a)
-                inter_dist.append(b)
-                silhouette.append(s)
-
-    silhouette, std = safe_mean(silhouette)
-    intracluster_dist, std = safe_mean(intra_dist)
-    intercluster_dist, std = safe_mean(inter_dist)
+        if a is None:
+            matrix = numpy.asarray(leaf_vectors, dtype=float)
+            # item intraclsuterdist -> Centroid Diameter
+            a = get_dist_vector(fdist, matrix, cluster.profile) * 2
+        # intracluster dist -> Centroid Linkage
+        b = get_dist_vector(fdist, matrix, st.profile)
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            s = (b - a) / numpy.maximum(a, b)
+        s[(b - a) == 0.0] = 0.0
+
+        intra_dist.append(a)
+        inter_dist.append(b)
+        silhouette.append(s)
+
+    silhouette, std = safe_mean(_concat(silhouette))
+    intracluster_dist, std = safe_mean(_concat(intra_dist))
+    intercluster_dist, std = safe_mean(_concat(inter_dist))
     return silhouette, intracluster_dist, intercluster_dist
 
 def get_avg_profile(node):
     """ This internal function updates the mean profile
     associated to an internal node. """
 
-    if not node.is_leaf():
-        leaf_vectors = [n._profile for n in  node.get_leaves() \
-                            if n._profile is not None]
-        if len(leaf_vectors)>0:
-            node._profile, node._std_profile = safe_mean_vector(leaf_vectors)
-        else:
+    update_avg_profiles(node)
+    return node._profile, node._std_profile
+
+# Aggregated values of a subtree without profiles
+_NO_PROFILES = (None, None, None, 0)
+
+def _get_leaf_stats(leaf):
+    if leaf._profile is None:
+        return _NO_PROFILES
+    vector = numpy.asarray(leaf._profile, dtype=float)
+    finite = numpy.isfinite(vector)
+    values = numpy.where(finite, vector, 0.0)
+    return values, numpy.zeros(len(values)), finite.astype(float), 1
+
+def _merge_stats(stats1, stats2):
+    """ Combines the means, sums of squared deviations and number of
+    values of two groups of profiles, column by column (Chan et al.
+    1979)."""
+    means1, m2_1, counts1, nvectors1 = stats1
+    means2, m2_2, counts2, nvectors2 = stats2
+    counts = counts1 + counts2
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        weight = numpy.where(counts > 0, counts2 / counts, 0.0)
+    delta = means2 - means1
+    means = means1 + delta * weight
+    m2 = m2_1 + m2_2 + delta * delta * counts1 * weight
+    return means, m2, counts, nvectors1 + nvectors2
+
+def _is_aggregated(node):
+    return node._profile_stats is not None or node.is_leaf()
+
+def update_avg_profiles(root):
+    """
+    Computes the mean and standard deviation profiles of all the nodes
+    under root in a single postorder pass.
+
+    Each internal node caches the mean, sum of squared deviations and
+    number of finite values of the leaf profiles under it, which are
+    combined from the ones of its children. Subtrees whose values are
+    already cached are not visited again, so only invalidated nodes are
+    recomputed.
+    """
+    for node in root.traverse("postorder", is_leaf_fn=_is_aggregated):
+        if node.is_leaf():
+            if node._profile is not None and node._std_profile is None:
+                node._std_profile = [0.0]*len(node._profile)
+            continue
+        elif node._profile_stats is not None:
+            continue
+
+        stats = None
+        for ch in node.children:
+            if ch.is_leaf():
+                ch_stats = _get_leaf_stats(ch)
+            else:
+                ch_stats = ch._profile_stats
+            if not ch_stats[3]:
+                continue
+            elif stats is None:
+                stats = ch_stats
+            else:
+                stats = _merge_stats(stats, ch_stats)
+
+        if stats is None:
+            node._profile_stats = _NO_PROFILES
             node._profile, node._std_profile = None, None
-        return node._profile, node._std_profile
-    else:
-        node._std_profile = [0.0]*len(node._profile)
-        return node._profile, [0.0]*len(node._profile)
+            continue
 
+        node._profile_stats = stats
+        means, m2, counts, nvectors = stats
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            mean = numpy.where(counts > 0, means, numpy.nan)
+            if nvectors == 1:
+                # if only one vector, avg = itself
+                std = numpy.zeros(len(mean))
+            else:
+                std = numpy.sqrt(m2 / counts)
+        node._profile, node._std_profile = mean, std
 
 def get_dunn_index(fdist, *clusters):
     """
@@ -134,12 +208,12 @@ def get_dunn_index(fdist, *clusters):
 
     intra_dist = []
     for c in clusters:
-        for i in c.get_leaves():
-            if i is not None:
-                # item intraclsuterdist -> Centroid Diameter
-                a = fdist(i.profile, c.profile)*2
-                intra_dist.append(a)
-    max_a = numpy.max(intra_dist)
+        leaf_vectors = [i.profile for i in c.get_leaves() if i is not None]
+        if leaf_vectors:
+            # item intraclsuterdist -> Centroid Diameter
+            matrix = numpy.asarray(leaf_vectors, dtype=float)
+            intra_dist.append(get_dist_vector(fdist, matrix, c.profile) * 2)
+    max_a = numpy.max(_concat(intra_dist))
     inter_dist = []
     for i, ci in enumerate(clusters):
         for cj in clusters[i+1:]:
@@ -154,6 +228,10 @@ def get_dunn_index(fdist, *clusters):
         D = min_b / max_a
     return D
 
+def _concat(arrays):
+    if not arrays:
+        return numpy.array([], dtype=float)
+    return numpy.concatenate(arrays)
 
 
 # ####################
@@ -161,44 +239,117 @@ def get_dunn_index(fdist, *clusters):
 # ####################
 
 def pearson_dist(v1, v2):
-    if (v1 == v2).all():
-        return 0.0
-    else:
-        return 1.0 - stats.pearsonr(list(v1),list(v2))[0]
+    return float(batch_pearson_dist(v1, v2)[0])
 
 def spearman_dist(v1, v2):
-    if (v1 == v2).all():
-        return 0.0
-    else:
-        return 1.0 - stats.spearmanr(list(v1),list(v2))[0]
+    return float(batch_spearman_dist(v1, v2)[0])
 
 def euclidean_dist(v1,v2):
-    if (v1 == v2).all():
-        return 0.0
-    else:
-        return sqrt( square_euclidean_dist(v1,v2) )
+    return float(batch_euclidean_dist(v1, v2)[0])
 
 def square_euclidean_dist(v1,v2):
-    if (v1 == v2).all():
-        return 0.0
-    valids  = 0
-    distance= 0.0
-    for i in range(len(v1)):
-        if numpy.isfinite(v1[i]) and numpy.isfinite(v2[i]):
-            valids += 1
-            d = v1[i]-v2[i]
-            distance += d*d
-    if valids==0:
+    return float(batch_square_euclidean_dist(v1, v2)[0])
+
+def cityblock_dist(v1, v2):
+    return float(batch_cityblock_dist(v1, v2)[0])
+
+def cosine_dist(v1, v2):
+    return float(batch_cosine_dist(v1, v2)[0])
+
+# Batched versions: distances between all rows of a matrix and a single
+# vector. Rows identical to the vector are always at distance 0.
+
+def _prepare(matrix, vector):
+    matrix = numpy.atleast_2d(numpy.asarray(matrix, dtype=float))
+    vector = numpy.asarray(vector, dtype=float)
+    identical = (matrix == vector).all(axis=1)
+    return matrix, vector, identical
+
+def batch_pearson_dist(matrix, vector):
+    matrix, vector, identical = _prepare(matrix, vector)
+    return _pearson(matrix, vector, identical)
+
+def batch_spearman_dist(matrix, vector):
+    matrix, vector, identical = _prepare(matrix, vector)
+    # nan values make the correlation undefined
+    undefined = numpy.isnan(matrix).any(axis=1) | numpy.isnan(vector).any()
+    dist = _pearson(_rankdata(matrix), _rankdata(vector)[0], identical)
+    dist[undefined & ~identical] = numpy.nan
+    return dist
+
+def batch_euclidean_dist(matrix, vector):
+    return numpy.sqrt(batch_square_euclidean_dist(matrix, vector))
+
+def batch_square_euclidean_dist(matrix, vector):
+    matrix, vector, identical = _prepare(matrix, vector)
+    valid = numpy.isfinite(matrix) & numpy.isfinite(vector)
+    valids = valid.sum(axis=1)
+    if ((valids == 0) & ~identical).any():
         raise ValueError("Cannot calculate values")
-    return  distance/valids
-
-try:
-   from scipy import stats
-except ImportError:
-    try:
-        from . import stats
-        default_dist = spearman_dist
-    except ImportError:
-        default_dist = euclidean_dist
-else:
-    default_dist = spearman_dist
+    diff = numpy.where(valid, matrix - vector, 0.0)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        dist = (diff * diff).sum(axis=1) / valids
+    dist[identical] = 0.0
+    return dist
+
+def batch_cityblock_dist(matrix, vector):
+    matrix, vector, identical = _prepare(matrix, vector)
+    valid = numpy.isfinite(matrix) & numpy.isfinite(vector)
+    if ((valid.sum(axis=1) == 0) & ~identical).any():
+        raise ValueError("Cannot calculate values")
+    dist = numpy.where(valid, numpy.abs(matrix - vector), 0.0).sum(axis=1)
+    dist[identical] = 0.0
+    return dist
+
+def batch_cosine_dist(matrix, vector):
+    matrix, vector, identical = _prepare(matrix, vector)
+    valid = numpy.isfinite(matrix) & numpy.isfinite(vector)
+    x = numpy.where(valid, matrix, 0.0)
+    y = numpy.where(valid, vector, 0.0)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        r = (x * y).sum(axis=1) / numpy.sqrt((x * x).sum(axis=1) * (y * y).sum(axis=1))
+    dist = 1.0 - numpy.clip(r, -1.0, 1.0)
+    dist[identical] = 0.0
+    return dist
+
+def _pearson(matrix, vector, identical):
+    x = matrix - matrix.mean(axis=1)[:, None]
+    y = vector - vector.mean()
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        r = numpy.dot(x, y) / numpy.sqrt((x * x).sum(axis=1) * numpy.dot(y, y))
+    r = numpy.clip(r, -1.0, 1.0)
+    dist = 1.0 - r
+    dist[identical] = 0.0
+    return dist
+
+def _rankdata(matrix):
+    """ Ranks the values of each row, assigning average ranks to ties. """
+    matrix = numpy.atleast_2d(numpy.asarray(matrix, dtype=float))
+    nrows, ncols = matrix.shape
+    rows = numpy.arange(nrows)[:, None]
+    positions = numpy.arange(ncols)
+    sorter = numpy.argsort(matrix, axis=1, kind="mergesort")
+    svalues = matrix[rows, sorter]
+    # First and last sorted position of each group of ties
+    starts = numpy.ones(svalues.shape, dtype=bool)
+    starts[:, 1:] = svalues[:, 1:] != svalues[:, :-1]
+    ends = numpy.ones(svalues.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = numpy.maximum.accumulate(numpy.where(starts, positions, 0), axis=1)
+    last = numpy.minimum.accumulate(numpy.where(ends, positions, ncols)[:, ::-1],
+                                    axis=1)[:, ::-1]
+    ranks = numpy.empty(matrix.shape, dtype=float)
+    ranks[rows, sorter] = 0.5 * (first + last) + 1
+    return ranks
+
+_BATCH_DIST = {
+    pearson_dist: batch_pearson_dist,
+    spearman_dist: batch_spearman_dist,
+    euclidean_dist: batch_euclidean_dist,
+    square_euclidean_dist: batch_square_euclidean_dist,
+    cityblock_dist: batch_cityblock_dist,
+    cosine_dist: batch_cosine_dist,
+}
+
+# Only numpy is needed to compute correlations
+default_dist = spearman_dist
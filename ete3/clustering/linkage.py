@@ -0,0 +1,366 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+"""
+Hierarchical clustering of ArrayTable matrices.
+
+Linkage matrices follow the same convention as scipy: row i describes
+the merge of clusters Z[i,0] and Z[i,1] (leaves are numbered 0..n-1 and
+the cluster created at row i is numbered n+i) at height Z[i,2], with
+Z[i,3] original observations.
+"""
+
+from .. import numpy
+from six.moves import range
+
+__all__ = ["get_linkage", "get_distance_matrix", "METRICS", "LINKAGE_METHODS"]
+
+METRICS = ["euclidean", "sqeuclidean", "cityblock", "cosine",
+           "correlation", "pearson", "spearman"]
+LINKAGE_METHODS = ["single", "complete", "average", "weighted", "ward"]
+
+# Default memory (in bytes) that can be used to keep the pairwise distance
+# matrix. Larger datasets are clustered computing distances on the fly.
+DEFAULT_MAX_MEMORY = 2 * 1024**3
+
+try:
+    from scipy.cluster import hierarchy as _hierarchy
+except ImportError:
+    _hierarchy = None
+
+
+def _prepare_matrix(matrix, metric):
+    matrix = numpy.asarray(matrix, dtype=float)
+    if matrix.ndim != 2:
+        raise ValueError("A 2D matrix is expected")
+    if not numpy.isfinite(matrix).all():
+        raise ValueError("Matrix contains missing or non finite values")
+    if metric == "spearman":
+        # Spearman correlation is the pearson correlation of ranks
+        from .clustvalidation import _rankdata
+        matrix = _rankdata(matrix)
+        metric = "correlation"
+    elif metric == "pearson":
+        metric = "correlation"
+
+    if metric == "correlation":
+        matrix = matrix - matrix.mean(axis=1)[:, None]
+        metric = "cosine"
+    if metric == "cosine":
+        norms = numpy.sqrt((matrix * matrix).sum(axis=1))
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms[:, None]
+    return matrix, metric
+
+def _block_distances(block, matrix, metric, sq_norms=None):
+    """ Distances between the rows in block and all rows in matrix, once
+    the matrix has been prepared for the given metric."""
+    if metric in ("euclidean", "sqeuclidean"):
+        if sq_norms is None:
+            sq_norms = (matrix * matrix).sum(axis=1)
+        block_norms = (block * block).sum(axis=1)
+        d = block_norms[:, None] + sq_norms[None, :] - 2.0 * numpy.dot(block, matrix.T)
+        numpy.maximum(d, 0.0, out=d)
+        if metric == "euclidean":
+            numpy.sqrt(d, out=d)
+        return d
+    elif metric == "cosine":
+        d = 1.0 - numpy.dot(block, matrix.T)
+        numpy.maximum(d, 0.0, out=d)
+        return d
+    elif metric == "cityblock":
+        return numpy.abs(block[:, None, :] - matrix[None, :, :]).sum(axis=2)
+    else:
+        raise ValueError("Unknown metric: %s" % metric)
+
+def _get_chunk_rows(nrows, ncols, metric, chunk_size):
+    if chunk_size is not None:
+        return max(1, int(chunk_size))
+    # keep temporary blocks around 64MB
+    if metric == "cityblock":
+        per_row = max(1, nrows * ncols)
+    else:
+        per_row = max(1, nrows)
+    return max(1, (8 * 1024**2) // per_row)
+
+def _iter_distance_blocks(matrix, metric, chunk_size=None):
+    """ Yields (start, end, block) tuples, where block contains the
+    distances between rows start..end and all the rows in matrix."""
+    nrows = matrix.shape[0]
+    sq_norms = (matrix * matrix).sum(axis=1)
+    step = _get_chunk_rows(nrows, matrix.shape[1], metric, chunk_size)
+    for start in range(0, nrows, step):
+        end = min(nrows, start + step)
+        yield start, end, _block_distances(matrix[start:end], matrix, metric, sq_norms)
+
+def get_distance_matrix(matrix, metric="euclidean", chunk_size=None):
+    """
+    Returns the square matrix of pairwise distances between the rows of
+    matrix. Distances are computed in blocks of rows, so temporary memory
+    stays bounded.
+
+    :argument "euclidean" metric: one of "euclidean", "sqeuclidean",
+      "cityblock", "cosine", "correlation" (or "pearson") and
+      "spearman". Correlation based metrics return 1 - r.
+    """
+    matrix, metric = _prepare_matrix(matrix, metric)
+    nrows = matrix.shape[0]
+    dist = numpy.empty((nrows, nrows), dtype=float)
+    for start, end, block in _iter_distance_blocks(matrix, metric, chunk_size):
+        dist[start:end] = block
+    numpy.fill_diagonal(dist, 0.0)
+    # Rounding errors may break symmetry
+    dist = numpy.minimum(dist, dist.T)
+    return dist
+
+def _get_condensed_distances(matrix, metric, chunk_size=None):
+    nrows = matrix.shape[0]
+    condensed = numpy.empty(nrows * (nrows - 1) // 2, dtype=float)
+    for start, end, block in _iter_distance_blocks(matrix, metric, chunk_size):
+        for i in range(start, end):
+            offset = i * nrows - i * (i + 1) // 2
+            condensed[offset:offset + nrows - i - 1] = block[i - start, i + 1:]
+    return condensed
+
+def get_linkage(matrix, metric="euclidean", method="average",
+                max_memory=DEFAULT_MAX_MEMORY, chunk_size=None):
+    """
+    Performs agglomerative hierarchical clustering of the rows in matrix
+    and returns a scipy-like linkage matrix.
+
+    When the pairwise distance matrix fits in ``max_memory`` bytes, it is
+    computed in chunks and clustered with scipy (if available) or with a
+    nearest-neighbor chain algorithm. Larger datasets are clustered
+    without storing pairwise distances, which is supported for "single"
+    linkage (minimum spanning tree) and "ward" linkage with euclidean
+    distances (nearest-neighbor chain over cluster centroids).
+
+    :argument "euclidean" metric: distance metric. See
+      :func:`get_distance_matrix`.
+
+    :argument "average" method: "single", "complete", "average",
+      "weighted" or "ward". Ward linkage requires euclidean distances.
+
+    :argument max_memory: maximum number of bytes used to store the
+      pairwise distance matrix.
+
+    :argument None chunk_size: number of rows whose distances are
+      computed at once. By default it is adjusted to the size of the
+      matrix.
+    """
+    if metric not in METRICS:
+        raise ValueError("Unknown metric: %s" % metric)
+    if method not in LINKAGE_METHODS:
+        raise ValueError("Unknown linkage method: %s" % method)
+    if method == "ward" and metric != "euclidean":
+        raise ValueError("Ward linkage requires euclidean distances")
+
+    data, pmetric = _prepare_matrix(matrix, metric)
+    nrows = data.shape[0]
+    if nrows < 2:
+        raise ValueError("At least 2 rows are required")
+
+    if _hierarchy is not None:
+        needed = 8 * nrows * (nrows - 1) // 2
+    else:
+        needed = 8 * nrows * nrows
+
+    if needed <= max_memory:
+        if _hierarchy is not None:
+            condensed = _get_condensed_distances(data, pmetric, chunk_size)
+            return _hierarchy.linkage(condensed, method=method)
+        dist = numpy.empty((nrows, nrows), dtype=float)
+        for start, end, block in _iter_distance_blocks(data, pmetric, chunk_size):
+            dist[start:end] = block
+        dist = numpy.minimum(dist, dist.T)
+        return _nn_chain_linkage(dist, method)
+    elif method == "single":
+        return _mst_linkage(data, pmetric)
+    elif method == "ward":
+        return _ward_centroid_linkage(data)
+    else:
+        raise ValueError("Pairwise distances do not fit in memory. Increase"
+                         " max_memory or use 'single' or 'ward' linkage")
+
+def _lance_williams(method, d_a, d_b, d_ab, size_a, size_b, sizes):
+    if method == "single":
+        return numpy.minimum(d_a, d_b)
+    elif method == "complete":
+        return numpy.maximum(d_a, d_b)
+    elif method == "average":
+        return (size_a * d_a + size_b * d_b) / (size_a + size_b)
+    elif method == "weighted":
+        return (d_a + d_b) / 2.0
+    elif method == "ward":
+        total = size_a + size_b + sizes
+        return numpy.sqrt(numpy.maximum(((size_a + sizes) * d_a * d_a +
+                                         (size_b + sizes) * d_b * d_b -
+                                         sizes * d_ab * d_ab) / total, 0.0))
+
+def _nn_chain_linkage(dist, method):
+    """ Nearest-neighbor chain clustering of a square distance matrix,
+    which is modified in place. """
+    nrows = dist.shape[0]
+    numpy.fill_diagonal(dist, numpy.inf)
+    sizes = numpy.ones(nrows)
+    active = numpy.ones(nrows, dtype=bool)
+    merges = []
+    chain = []
+    while len(merges) < nrows - 1:
+        if not chain:
+            chain.append(int(numpy.nonzero(active)[0][0]))
+        while True:
+            a = chain[-1]
+            b = int(numpy.argmin(dist[a]))
+            # Ties are resolved in favour of the previous chain element
+            if len(chain) > 1 and dist[a, chain[-2]] <= dist[a, b]:
+                b = chain[-2]
+            if len(chain) > 1 and b == chain[-2]:
+                break
+            chain.append(b)
+        a, b = chain.pop(), chain.pop()
+        if a > b:
+            a, b = b, a
+        d_ab = dist[a, b]
+        merges.append((a, b, d_ab))
+
+        new = _lance_williams(method, dist[a], dist[b], d_ab,
+                              sizes[a], sizes[b], sizes)
+        active[b] = False
+        new[~active] = numpy.inf
+        new[a] = numpy.inf
+        dist[a, :] = new
+        dist[:, a] = new
+        dist[b, :] = numpy.inf
+        dist[:, b] = numpy.inf
+        sizes[a] += sizes[b]
+    return _merges_to_linkage(merges, nrows)
+
+def _mst_linkage(data, metric):
+    """ Single linkage clustering from the minimum spanning tree of the
+    rows, computing distances on the fly (Prim's algorithm). """
+    nrows = data.shape[0]
+    sq_norms = (data * data).sum(axis=1)
+    in_tree = numpy.zeros(nrows, dtype=bool)
+    min_dist = numpy.empty(nrows)
+    min_dist.fill(numpy.inf)
+    parent = numpy.zeros(nrows, dtype=int)
+    merges = []
+    current = 0
+    in_tree[current] = True
+    for _ in range(nrows - 1):
+        d = _block_distances(data[current:current+1], data, metric, sq_norms)[0]
+        closer = (d < min_dist) & ~in_tree
+        min_dist[closer] = d[closer]
+        parent[closer] = current
+        candidates = numpy.where(in_tree, numpy.inf, min_dist)
+        current = int(numpy.argmin(candidates))
+        merges.append((parent[current], current, min_dist[current]))
+        in_tree[current] = True
+    return _merges_to_linkage(merges, nrows)
+
+def _ward_centroid_linkage(data):
+    """ Ward clustering using a nearest-neighbor chain over cluster
+    centroids, so no pairwise distances are stored. """
+    nrows = data.shape[0]
+    centroids = data.copy()
+    sizes = numpy.ones(nrows)
+    active = numpy.ones(nrows, dtype=bool)
+
+    def ward_dist(a):
+        diff = centroids - centroids[a]
+        d = numpy.sqrt(2.0 * sizes * sizes[a] / (sizes + sizes[a]) *
+                       (diff * diff).sum(axis=1))
+        d[~active] = numpy.inf
+        d[a] = numpy.inf
+        return d
+
+    merges = []
+    chain = []
+    while len(merges) < nrows - 1:
+        if not chain:
+            chain.append(int(numpy.nonzero(active)[0][0]))
+        while True:
+            a = chain[-1]
+            d = ward_dist(a)
+            b = int(numpy.argmin(d))
+            if len(chain) > 1 and d[chain[-2]] <= d[b]:
+                b = chain[-2]
+            if len(chain) > 1 and b == chain[-2]:
+                d_ab = d[b]
+                break
+            chain.append(b)
+        a, b = chain.pop(), chain.pop()
+        if a > b:
+            a, b = b, a
+        merges.append((a, b, d_ab))
+        total = sizes[a] + sizes[b]
+        centroids[a] = (sizes[a] * centroids[a] + sizes[b] * centroids[b]) / total
+        sizes[a] = total
+        active[b] = False
+    return _merges_to_linkage(merges, nrows)
+
+def _merges_to_linkage(merges, nrows):
+    """ Sorts merges (pairs of cluster representatives and distance) by
+    distance and assigns scipy-like cluster labels. """
+    order = sorted(range(len(merges)), key=lambda i: merges[i][2])
+    # union-find over original observations
+    parent = numpy.arange(2 * nrows - 1)
+    sizes = numpy.ones(2 * nrows - 1)
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    linkage = numpy.empty((nrows - 1, 4))
+    for i, m in enumerate(order):
+        a, b, d = merges[m]
+        ra, rb = find(a), find(b)
+        if ra > rb:
+            ra, rb = rb, ra
+        new = nrows + i
+        parent[ra] = parent[rb] = new
+        sizes[new] = sizes[ra] + sizes[rb]
+        linkage[i] = (ra, rb, d, sizes[new])
+    return linkage
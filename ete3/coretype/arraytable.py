@@ -46,15 +46,68 @@ from os import path
 
 from .. import numpy
 from ..parser.text_arraytable import write_arraytable, read_arraytable
+from ..parser.npy_arraytable import write_npy_arraytable, read_npy_arraytable
 import six
 from six.moves import range
 
 __all__ = ["ArrayTable"]
 
+class _MatrixVectors(object):
+    """ Read-only, dict-like access to the row (axis=0) or column
+    (axis=1) vectors of an ArrayTable, indexed by name. Vectors are
+    views of the matrix obtained on demand. """
+
+    def __init__(self, table, axis):
+        self._table = table
+        self._axis = axis
+
+    def _get_index(self):
+        if self._axis == 0:
+            return self._table._row_index
+        else:
+            return self._table._col_index
+
+    def __getitem__(self, name):
+        i = self._get_index()[name]
+        if self._axis == 0:
+            return self._table.matrix[i]
+        else:
+            return self._table.matrix[:, i]
+
+    def get(self, name, default=None):
+        if name in self._get_index():
+            return self[name]
+        return default
+
+    def __contains__(self, name):
+        return name in self._get_index()
+
+    def __len__(self):
+        return len(self._get_index())
+
+    def __iter__(self):
+        return iter(self._get_index())
+
+    def keys(self):
+        return list(self._get_index().keys())
+
+    def values(self):
+        return [self[name] for name in self._get_index()]
+
+    def items(self):
+        return [(name, self[name]) for name in self._get_index()]
+
+
 class ArrayTable(object):
     """This object is thought to work with matrix datasets (like
     microarrays). It allows to load the matrix an access easily to row
-    and column vectors. """
+    and column vectors.
+
+    Text tab-delimited matrices and numpy binary files (.npy, as
+    written by :func:`ArrayTable.write`) are supported. Binary matrices
+    are memory-mapped by default, so very large datasets do not need to
+    fit in memory.
+    """
 
     def __repr__(self):
         return "ArrayTable (%s)" %hex(self.__hash__())
@@ -62,50 +115,86 @@ class ArrayTable(object):
     def __str__(self):
         return str(self.matrix)
 
-    def __init__(self, matrix_file=None, mtype="float"):
+    def __init__(self, matrix_file=None, mtype="float", mmap_mode="r"):
         self.colNames  = []
         self.rowNames  = []
-        self.colValues = {}
-        self.rowValues = {}
+        self._row_index = {}
+        self._col_index = {}
         self.matrix   = None
         self.mtype = None
 
         # If matrix file is supplied
         if matrix_file is not None:
-            read_arraytable(matrix_file, \
-                            mtype=mtype, \
-                            arraytable_object = self)
+            if _is_npy_file(matrix_file):
+                read_npy_arraytable(matrix_file, mmap_mode=mmap_mode,
+                                    arraytable_object=self)
+            else:
+                read_arraytable(matrix_file, \
+                                mtype=mtype, \
+                                arraytable_object = self)
+
+    def _get_row_values(self):
+        return _MatrixVectors(self, 0)
+
+    def _get_col_values(self):
+        return _MatrixVectors(self, 1)
+
+    #: Dict-like access to row vectors by row name
+    rowValues = property(fget=_get_row_values)
+    #: Dict-like access to column vectors by column name
+    colValues = property(fget=_get_col_values)
 
     def get_row_vector(self,rowname):
         """ Returns the vector associated to the given row name """
-        return self.rowValues.get(rowname,None)
+        i = self._row_index.get(rowname, None)
+        if i is None:
+            return None
+        return self.matrix[i]
 
 
     def get_column_vector(self,colname):
         """ Returns the vector associated to the given column name """
-        return self.colValues.get(colname,None)
-
+        i = self._col_index.get(colname, None)
+        if i is None:
+            return None
+        return self.matrix[:, i]
+
+    def get_value_range(self, chunk_size=10000):
+        """ Returns the minimum and maximum finite values in the
+        matrix. Large matrices are scanned in chunks of rows, so
+        memory-mapped data is never fully loaded. """
+        vmin, vmax = None, None
+        for start in range(0, self.matrix.shape[0], chunk_size):
+            block = numpy.asarray(self.matrix[start:start+chunk_size], dtype=float)
+            finite = numpy.isfinite(block)
+            if not finite.any():
+                continue
+            block = numpy.where(finite, block, numpy.nan)
+            bmin, bmax = numpy.nanmin(block), numpy.nanmax(block)
+            vmin = bmin if vmin is None else min(vmin, bmin)
+            vmax = bmax if vmax is None else max(vmax, bmax)
+        if vmin is None:
+            raise ValueError("Matrix contains no finite values")
+        return vmin, vmax
 
     def get_several_column_vectors(self,colnames):
         """ Returns a list of vectors associated to several column names """
-        vectors = [self.colValues[cname] for cname in colnames]
-        return numpy.array(vectors)
+        indexes = [self._col_index[cname] for cname in colnames]
+        return numpy.array(self.matrix[:, indexes]).transpose()
 
     def get_several_row_vectors(self,rownames):
         """ Returns a list vectors associated to several row names """
-        vectors = [self.rowValues[rname] for rname in rownames]
-        return numpy.array(vectors)
+        indexes = [self._row_index[rname] for rname in rownames]
+        return numpy.array(self.matrix[indexes])
 
     def remove_column(self,colname):
         """Removes the given column form the current dataset """
-        col_value = self.colValues.pop(colname, None)
-        if col_value != None:
+        index = self._col_index.get(colname, None)
+        if index is not None:
             new_indexes = list(range(len(self.colNames)))
-            index = self.colNames.index(colname)
             self.colNames.pop(index)
             new_indexes.pop(index)
-            newmatrix = self.matrix.swapaxes(0,1)
-            newmatrix = newmatrix[new_indexes].swapaxes(0,1)
+            newmatrix = self.matrix[:, new_indexes]
             self._link_names2matrix(newmatrix)
 
     def merge_columns(self, groups, grouping_criterion):
@@ -141,7 +230,7 @@ class ArrayTable(object):
         for gname,tnames in six.iteritems(groups):
             all_vectors=[]
             for tn in tnames:
-                if tn not in self.colValues:
+                if tn not in self._col_index:
                     raise ValueError(str(tn)+" column not found.")
                 if tn in alltnames:
                     raise ValueError(str(tn)+" duplicated column name for merging")
@@ -183,29 +272,31 @@ class ArrayTable(object):
     def _link_names2matrix(self, m):
         """ Synchronize curent column and row names to the given matrix"""
         if len(self.rowNames) != m.shape[0]:
-            raise ValueError("Expecting matrix with  %d rows" % m.size[0])
+            raise ValueError("Expecting matrix with  %d rows" % m.shape[0])
 
         if len(self.colNames) != m.shape[1]:
-            raise ValueError("Expecting matrix with  %d columns" % m.size[1])
+            raise ValueError("Expecting matrix with  %d columns" % m.shape[1])
 
         self.matrix = m
-        self.colValues.clear()
-        self.rowValues.clear()
-        # link columns names to vectors
-        i = 0
-        for colname in self.colNames:
-            self.colValues[colname] = self.matrix[:,i]
-            i+=1
-        # link row names to vectors
-        i = 0
-        for rowname in self.rowNames:
-            self.rowValues[rowname] = self.matrix[i,:]
-            i+=1
+        # link row and column names to matrix positions
+        self._row_index = dict((name, i) for i, name in enumerate(self.rowNames))
+        self._col_index = dict((name, i) for i, name in enumerate(self.colNames))
 
     def write(self, fname, colnames=None):
-        write_arraytable(self, fname, colnames=colnames)
+        """ Writes the matrix to a file. Files ending in .npy are
+        written in numpy binary format, which can be later
+        memory-mapped. Any other name produces a tab-delimited text
+        file."""
+        if _is_npy_file(fname):
+            if colnames:
+                raise ValueError("Column selection is not supported in binary format")
+            write_npy_arraytable(self, fname)
+        else:
+            write_arraytable(self, fname, colnames=colnames)
 
 
+def _is_npy_file(fname):
+    return "\n" not in fname and fname.lower().endswith(".npy")
 
 def get_centroid_dist(vcenter,vlist,fdist):
     d = 0.0
@@ -46,14 +46,236 @@ supported.
 """
 from __future__ import absolute_import
 
-from ..parser.fasta import read_fasta, write_fasta
+import os
+import re
+import json
+import mmap
+
+from ..parser.fasta import read_fasta, write_fasta, index_fasta
 from ..parser.paml import read_paml, write_paml
-from ..parser.phylip import read_phylip, write_phylip
+from ..parser.phylip import read_phylip, write_phylip, index_phylip
+from .. import numpy
 import six
 from six.moves import zip
 
 __all__ = ["SeqGroup"]
 
+# Version of the sequence index files (sidecars) used in lazy mode
+INDEX_VERSION = 1
+INDEX_EXTENSION = ".seqidx"
+
+_WHITESPACE = re.compile(b"\\s")
+if numpy is not None:
+    _WHITESPACE_TABLE = numpy.zeros(256, dtype=bool)
+    _WHITESPACE_TABLE[bytearray(b" \t\n\r\x0b\x0c")] = True
+
+class _IndexedSeqs(object):
+    """ Dict-like mapping of sequence ids to the sequences of an indexed
+    file. Sequences are read on demand from a memory map of the file,
+    so they are never kept in memory. Sequences assigned afterwards are
+    stored in memory and take precedence over the file. """
+
+    def __init__(self, fname, id2segments):
+        self.fname = fname
+        self._segments = id2segments
+        self._overrides = {}
+        self._deleted = set()
+        self._layouts = {}
+        self._handle = None
+        self._map = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_handle"] = None
+        state["_map"] = None
+        return state
+
+    def _get_map(self):
+        if self._map is None:
+            self._handle = open(self.fname, "rb")
+            self._map = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self):
+        """ Releases the memory map of the sequence file."""
+        if self._map is not None:
+            self._map.close()
+            self._handle.close()
+            self._map = self._handle = None
+
+    def __getitem__(self, seqid):
+        if seqid in self._overrides:
+            return self._overrides[seqid]
+        if seqid in self._deleted:
+            raise KeyError(seqid)
+        segments = self._segments[seqid]
+        data = self._get_map()
+        raw = b"".join([data[start:start+length] for start, length in segments])
+        return _WHITESPACE.sub(b"", raw).decode("latin-1")
+
+    def get_slice(self, seqid, start, end):
+        """ Returns the residues from start to end (non negative
+        positions) of a sequence. Sequences written in lines of the same
+        width are sliced reading only the required part of the file."""
+        try:
+            layout = self._layouts[seqid]
+        except KeyError:
+            layout = self._get_layout(seqid)
+        if layout is None:
+            return self[seqid][start:end]
+        offset, length, width, eol = layout
+        start = min(start, length)
+        end = min(max(end, start), length)
+        if start == end:
+            return ""
+        last = end - 1
+        raw = self._get_map()[offset + start + (start // width) * eol:
+                              offset + last + (last // width) * eol + 1]
+        if start // width != last // width:
+            raw = _WHITESPACE.sub(b"", raw)
+        return raw.decode("latin-1")
+
+    def get_length(self, seqid):
+        """ Returns the number of residues of a sequence, reading it only
+        if its line layout is not regular."""
+        layout = self._get_layout(seqid)
+        if layout is None:
+            return len(self[seqid])
+        return layout[1]
+
+    def _get_layout(self, seqid):
+        """ Returns the line layout of a sequence stored in the file
+        (see _get_line_layout), or None if it cannot be sliced."""
+        if seqid in self._overrides or numpy is None:
+            return None
+        if seqid in self._deleted:
+            raise KeyError(seqid)
+        try:
+            return self._layouts[seqid]
+        except KeyError:
+            segments = self._segments[seqid]
+            layout = None
+            if len(segments) == 1:
+                layout = _get_line_layout(self._get_map(), *segments[0])
+            self._layouts[seqid] = layout
+            return layout
+
+    def __setitem__(self, seqid, seq):
+        self._deleted.discard(seqid)
+        self._layouts.pop(seqid, None)
+        self._overrides[seqid] = seq
+
+    def __delitem__(self, seqid):
+        if seqid not in self:
+            raise KeyError(seqid)
+        self._overrides.pop(seqid, None)
+        self._layouts.pop(seqid, None)
+        self._deleted.add(seqid)
+
+    def __contains__(self, seqid):
+        if seqid in self._overrides:
+            return True
+        return seqid in self._segments and seqid not in self._deleted
+
+    def __len__(self):
+        return len(list(self.iterkeys()))
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def get(self, seqid, default=None):
+        if seqid in self:
+            return self[seqid]
+        return default
+
+    def iterkeys(self):
+        for seqid in self._segments:
+            if seqid not in self._deleted or seqid in self._overrides:
+                yield seqid
+        for seqid in self._overrides:
+            if seqid not in self._segments:
+                yield seqid
+
+    def itervalues(self):
+        for seqid in self.iterkeys():
+            yield self[seqid]
+
+    def iteritems(self):
+        for seqid in self.iterkeys():
+            yield seqid, self[seqid]
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    # Sequences are read one by one while iterating
+    values = itervalues
+    items = iteritems
+
+def _get_line_layout(data, offset, size):
+    """ Returns (offset, residues, line width, line separator size) if
+    the sequence stored in data[offset:offset+size] is written in lines
+    of the same width (except the last one), all of them followed by the
+    same number of whitespace characters. Returns None otherwise."""
+    raw = numpy.frombuffer(data, dtype=numpy.uint8, count=size, offset=offset)
+    blanks = numpy.flatnonzero(_WHITESPACE_TABLE[raw])
+    del raw
+    nresidues = size - len(blanks)
+    if not len(blanks):
+        return offset, size, max(size, 1), 0
+    width = int(blanks[0])
+    if width == 0 or nresidues == 0:
+        return None
+    eol = 1
+    while eol < len(blanks) and blanks[eol] == width + eol:
+        eol += 1
+
+    # Whitespace before the last residue must be found at the end of
+    # every line
+    nlines = (nresidues - 1) // width + 1
+    last = nresidues - 1 + (nlines - 1) * eol
+    inner = blanks[blanks < last]
+    expected = (numpy.arange(nlines - 1)[:, None] * (width + eol) + width +
+                numpy.arange(eol)[None, :]).ravel()
+    if len(inner) != len(expected) or not (inner == expected).all():
+        return None
+    return offset, nresidues, width, eol
+
+def _get_index_path(fname):
+    return fname + INDEX_EXTENSION
+
+def _load_index(fname, format, fix_duplicates):
+    """ Returns the entries stored in the index of a sequence file, or
+    None if the index does not exist or is outdated."""
+    try:
+        with open(_get_index_path(fname)) as handle:
+            index = json.load(handle)
+    except (IOError, OSError, ValueError):
+        return None
+    stat = os.stat(fname)
+    if index.get("version") != INDEX_VERSION or \
+       index.get("format") != format or \
+       index.get("fix_duplicates") != fix_duplicates or \
+       index.get("size") != stat.st_size or \
+       index.get("mtime") != stat.st_mtime:
+        return None
+    return index["entries"]
+
+def _save_index(fname, format, fix_duplicates, entries):
+    stat = os.stat(fname)
+    index = {"version": INDEX_VERSION, "format": format,
+             "fix_duplicates": fix_duplicates, "size": stat.st_size,
+             "mtime": stat.st_mtime, "entries": entries}
+    path = _get_index_path(fname)
+    tmp_path = "%s.%d.tmp" %(path, os.getpid())
+    try:
+        with open(tmp_path, "w") as handle:
+            json.dump(index, handle)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        # Index files are only a cache (i.e. read-only directories)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 class SeqGroup(object):
     """
     SeqGroup class can be used to store a set of sequences (aligned
@@ -71,6 +293,13 @@ class SeqGroup(object):
         of 10 chars. To avoid this effect, you can use the relaxed
         phylip format: ``phylip_relaxed`` and ``iphylip_relaxed``.
 
+    :argument False lazy: If True, ``sequences`` must be the path to an
+        uncompressed fasta or phylip file. The file is scanned once to
+        build an index of sequence positions, which is saved next to
+        it (``<file>.seqidx``) and reused while the file does not
+        change. Sequences are then read from disk when requested, so
+        very large alignments are never fully loaded in memory.
+
     ::
 
      msf = ">seq1\\nAAAAAAAAAAA\\n>seq2\\nTTTTTTTTTTTTT\\n"
@@ -90,7 +319,8 @@ class SeqGroup(object):
     def __iter__(self):
         return self.iter_entries()
 
-    def __init__(self, sequences=None , format="fasta", fix_duplicates=True, **kwargs):
+    def __init__(self, sequences=None , format="fasta", fix_duplicates=True,
+                 lazy=False, **kwargs):
         self.parsers = {
             "fasta": [read_fasta, write_fasta, {}],
             "phylip": [read_phylip, write_phylip, {"interleaved":False, "relaxed":False}],
@@ -105,9 +335,19 @@ class SeqGroup(object):
         self.id2comment= {}
         self.id2seq = {}
 
+        self.indexers = {
+            "fasta": [index_fasta, {}],
+            "phylip": [index_phylip, {"interleaved":False, "relaxed":False}],
+            "iphylip": [index_phylip, {"interleaved":True, "relaxed":False}],
+            "phylip_relaxed": [index_phylip, {"interleaved":False, "relaxed":True}],
+            "iphylip_relaxed": [index_phylip, {"interleaved":True, "relaxed":True}],
+            }
+
         if sequences is not None:
             format = format.lower()
-            if format in self.parsers:
+            if lazy:
+                self._load_indexed(sequences, format, fix_duplicates)
+            elif format in self.parsers:
                 read = self.parsers[format][0]
                 args = self.parsers[format][2]
                 read(sequences, obj=self, fix_duplicates=fix_duplicates, **args)
@@ -117,6 +357,41 @@ class SeqGroup(object):
     def __repr__(self):
         return "SeqGroup (%s)" %hex(self.__hash__())
 
+    def _load_indexed(self, fname, format, fix_duplicates):
+        if format not in self.indexers:
+            raise ValueError("Lazy loading is not supported for format: [%s]" %format)
+        if not os.path.isfile(fname) or fname.endswith(".gz"):
+            raise ValueError("Lazy loading requires an uncompressed sequence file")
+
+        entries = _load_index(fname, format, fix_duplicates)
+        if entries is None:
+            index, args = self.indexers[format]
+            entries = index(fname, fix_duplicates=fix_duplicates, **args)
+            _save_index(fname, format, fix_duplicates, entries)
+
+        id2segments = {}
+        for seqid, (name, comments, segments) in enumerate(entries):
+            self.id2name[seqid] = name
+            self.name2id[name] = seqid
+            self.id2comment[seqid] = comments
+            id2segments[seqid] = segments
+        self.id2seq = _IndexedSeqs(fname, id2segments)
+
+    def is_lazy(self):
+        """ Returns True if sequences are read from disk on demand."""
+        return isinstance(self.id2seq, _IndexedSeqs)
+
+    def to_matrix(self, names=None):
+        """ Returns a :class:`SeqMatrix` representation of the
+        alignment, in which sequences are stored as the rows of a numpy
+        uint8 matrix. Sequences must have the same length.
+
+        :argument None names: If provided, only the given sequence
+          names are included, in the same order.
+        """
+        from .seqmatrix import SeqMatrix
+        return SeqMatrix.from_seqgroup(self, names=names)
+
     def write(self, format="fasta", outfile=None):
         """ Returns the text representation of the sequences in the
         supplied given format (default=FASTA). If "oufile" argument is
@@ -0,0 +1,306 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+from .. import numpy
+import six
+from six.moves import range
+
+__all__ = ["SeqMatrix"]
+
+# Maximum number of matrix cells processed at once by chunked operations
+CHUNK_CELLS = 2**22
+
+class SeqMatrix(object):
+    """ Columnar representation of an alignment, in which sequences are
+    stored as the rows of a numpy ``uint8`` matrix (one byte per
+    residue). Column statistics, pairwise identities and column
+    selections are computed with vectorized operations.
+
+    :argument matrix: a 2D array of residue bytes (rows=sequences,
+       columns=alignment positions).
+
+    :argument names: the list of sequence names, in the same order as
+       matrix rows.
+
+    :argument None comments: an optional list of comment lists for
+       each sequence.
+
+    Instances are usually created from an aligned SeqGroup:
+
+    ::
+
+       alg = SeqGroup("alignment.fa")
+       matrix = alg.to_matrix()
+       gappy = matrix.get_gap_fraction() > 0.9
+       trimmed = matrix.select(columns=~gappy)
+       trimmed.write(format="iphylip", outfile="trimmed.phy")
+
+    """
+
+    def __init__(self, matrix, names, comments=None):
+        matrix = numpy.asarray(matrix, dtype=numpy.uint8)
+        if matrix.ndim != 2:
+            raise ValueError("A 2D matrix is expected")
+        if len(names) != matrix.shape[0]:
+            raise ValueError("Number of names does not match the number of sequences")
+        if comments is None:
+            comments = [[] for _ in range(len(names))]
+        self.matrix = matrix
+        self.names = list(names)
+        self.comments = list(comments)
+        self.name2row = dict((name, i) for i, name in enumerate(self.names))
+
+    def __repr__(self):
+        return "SeqMatrix (%s): %d sequences x %d columns" %(
+            hex(self.__hash__()), self.matrix.shape[0], self.matrix.shape[1])
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def __contains__(self, name):
+        return name in self.name2row
+
+    def __iter__(self):
+        for i, name in enumerate(self.names):
+            yield name, self.get_seq(i), self.comments[i]
+
+    @property
+    def ncols(self):
+        """ Number of alignment columns."""
+        return self.matrix.shape[1]
+
+    @classmethod
+    def from_seqgroup(cls, seqgroup, names=None):
+        """ Builds a new matrix from the sequences in a SeqGroup
+        instance. Sequences must be aligned (same length).
+
+        :argument None names: If provided, only the given sequence
+          names are included, in the same order.
+        """
+        if names is None:
+            names = [seqgroup.id2name[seqid] for seqid in seqgroup.id2seq]
+        nrows = len(names)
+        matrix = None
+        comments = []
+        # Sequences are converted one by one, so no intermediate copy of
+        # the whole alignment is made.
+        for row, name in enumerate(names):
+            seqid = seqgroup.name2id[name]
+            seq = _to_bytes(seqgroup.id2seq[seqid])
+            if matrix is None:
+                matrix = numpy.empty((nrows, len(seq)), dtype=numpy.uint8)
+            elif len(seq) != matrix.shape[1]:
+                raise ValueError("Sequences are not aligned: [%s]" %name)
+            matrix[row] = numpy.frombuffer(seq, dtype=numpy.uint8)
+            comments.append(seqgroup.id2comment.get(seqid, []))
+        if matrix is None:
+            matrix = numpy.empty((0, 0), dtype=numpy.uint8)
+        return cls(matrix, names, comments)
+
+    def to_seqgroup(self):
+        """ Returns a SeqGroup instance containing the sequences in
+        the matrix."""
+        from .seqgroup import SeqGroup
+        seqs = SeqGroup()
+        for seqid, name in enumerate(self.names):
+            seqs.id2name[seqid] = name
+            seqs.name2id[name] = seqid
+            seqs.id2comment[seqid] = self.comments[seqid]
+            seqs.id2seq[seqid] = self.get_seq(seqid)
+        return seqs
+
+    def write(self, format="fasta", outfile=None):
+        """ Returns the text representation of the alignment in the
+        given format (default=FASTA). If "outfile" argument is used,
+        the result is written into the given path. See
+        :func:`SeqGroup.write`."""
+        return self.to_seqgroup().write(format=format, outfile=outfile)
+
+    def get_seq(self, name):
+        """ Returns the sequence string of a given entry name or row
+        index."""
+        if isinstance(name, six.string_types):
+            name = self.name2row[name]
+        return self.matrix[name].tobytes().decode("latin-1")
+
+    def select(self, names=None, columns=None):
+        """ Returns a new SeqMatrix containing only the given sequences
+        and columns.
+
+        :argument None names: list of sequence names to keep (in the
+          given order). All sequences are kept by default.
+
+        :argument None columns: a slice, a list of column indexes or
+          a boolean mask of columns to keep. All columns are kept by
+          default.
+        """
+        if names is None:
+            rows = slice(None)
+            names = self.names
+            comments = self.comments
+        else:
+            rows = [self.name2row[n] for n in names]
+            comments = [self.comments[r] for r in rows]
+        matrix = self.matrix[rows]
+        if columns is not None:
+            matrix = matrix[:, columns]
+        return SeqMatrix(matrix, names, comments)
+
+    def trim(self, max_gap_fraction=0.5, gap_chars="-"):
+        """ Returns a new SeqMatrix without the columns whose fraction
+        of gaps is larger than max_gap_fraction."""
+        return self.select(columns=self.get_gap_fraction(gap_chars) <= max_gap_fraction)
+
+    def concat(self, *matrices, **kargs):
+        """ Returns a new SeqMatrix in which the columns of the given
+        matrices are appended to the ones in this matrix. Rows are
+        matched by sequence name.
+
+        :argument None fill_char: character used to fill the columns of
+          sequences missing in some of the matrices. If not provided,
+          all matrices must contain the same sequence names.
+        """
+        fill_char = kargs.get("fill_char", None)
+        names = list(self.names)
+        comments = list(self.comments)
+        visited = set(names)
+        for m in matrices:
+            for name, comment in zip(m.names, m.comments):
+                if name not in visited:
+                    visited.add(name)
+                    names.append(name)
+                    comments.append(comment)
+
+        ncols = self.ncols + sum([m.ncols for m in matrices])
+        matrix = numpy.empty((len(names), ncols), dtype=numpy.uint8)
+        if fill_char is None:
+            for m in (self,) + matrices:
+                if len(m.names) != len(names):
+                    raise ValueError("Sequence names differ among matrices")
+        else:
+            matrix.fill(ord(fill_char))
+
+        start = 0
+        for m in (self,) + matrices:
+            rows = [m.name2row[n] for n in names if n in m.name2row]
+            target = [i for i, n in enumerate(names) if n in m.name2row]
+            block = m.matrix[rows]
+            matrix[target, start:start+m.ncols] = block
+            start += m.ncols
+        return SeqMatrix(matrix, names, comments)
+
+    def get_gap_mask(self, gap_chars="-"):
+        """ Returns a boolean matrix flagging gap positions."""
+        return numpy.isin(self.matrix, _symbols(gap_chars))
+
+    def get_gap_fraction(self, gap_chars="-"):
+        """ Returns the fraction of gaps in each column."""
+        counts = self.get_column_counts()
+        gaps = counts[:, _symbols(gap_chars)].sum(axis=1)
+        return gaps / float(max(len(self), 1))
+
+    def get_column_counts(self):
+        """ Returns a (ncols x 256) matrix with the number of times each
+        byte value is found in each column."""
+        nrows, ncols = self.matrix.shape
+        counts = numpy.zeros(ncols * 256, dtype=numpy.int64)
+        offsets = numpy.arange(ncols, dtype=numpy.int64) * 256
+        chunk = max(1, CHUNK_CELLS // max(ncols, 1))
+        for start in range(0, nrows, chunk):
+            block = self.matrix[start:start+chunk] + offsets
+            counts += numpy.bincount(block.ravel(), minlength=ncols * 256)
+        return counts.reshape(ncols, 256)
+
+    def _get_residue_counts(self, gap_chars):
+        counts = self.get_column_counts()
+        counts[:, _symbols(gap_chars)] = 0
+        return counts
+
+    def get_conservation(self, gap_chars="-"):
+        """ Returns the frequency of the most common residue in each
+        column, excluding gaps. Columns containing only gaps are set to
+        nan."""
+        counts = self._get_residue_counts(gap_chars)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            return counts.max(axis=1) / counts.sum(axis=1).astype(float)
+
+    def get_entropy(self, gap_chars="-"):
+        """ Returns the Shannon entropy (in bits) of the residue
+        frequencies in each column, excluding gaps. Columns containing
+        only gaps are set to nan."""
+        counts = self._get_residue_counts(gap_chars)
+        totals = counts.sum(axis=1).astype(float)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            freqs = counts / totals[:, None]
+            logs = numpy.where(counts > 0, numpy.log2(freqs), 0.0)
+            entropy = -(freqs * logs).sum(axis=1)
+        entropy[totals == 0] = numpy.nan
+        return entropy
+
+    def get_identity_matrix(self, gap_chars="-"):
+        """ Returns a square matrix with the pairwise identity between
+        sequences, computed as the fraction of identical residues among
+        the columns in which both sequences have no gaps. Pairs with no
+        such columns are set to nan."""
+        nrows, ncols = self.matrix.shape
+        gaps = _symbols(gap_chars)
+        residues = numpy.setdiff1d(numpy.nonzero(self.get_column_counts().sum(axis=0))[0], gaps)
+        matches = numpy.zeros((nrows, nrows), dtype=numpy.float64)
+        aligned = numpy.zeros((nrows, nrows), dtype=numpy.float64)
+        # Identities are the sum over residues of the products of their
+        # presence matrices, which are computed by blocks of columns.
+        chunk = max(1, CHUNK_CELLS // max(nrows, 1))
+        for start in range(0, ncols, chunk):
+            block = self.matrix[:, start:start+chunk]
+            present = (~numpy.isin(block, gaps)).astype(numpy.float32)
+            aligned += numpy.dot(present, present.T)
+            for res in residues:
+                hits = (block == res).astype(numpy.float32)
+                matches += numpy.dot(hits, hits.T)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            return matches / aligned
+
+def _symbols(chars):
+    return numpy.frombuffer(_to_bytes(chars), dtype=numpy.uint8)
+
+def _to_bytes(seq):
+    if isinstance(seq, bytes):
+        return seq
+    return seq.encode("latin-1")
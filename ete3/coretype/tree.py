@@ -42,15 +42,19 @@ from __future__ import print_function
 import random
 import copy
 import itertools
-from collections import deque
+from bisect import bisect_left
+from collections import deque, namedtuple
 from hashlib import md5
 from functools import cmp_to_key
 
 import six
 from six.moves import (cPickle, map, range, zip)
 
-from ..parser.newick import read_newick, write_newick
+from ..parser.newick import read_newick, iter_newick
+from ..parser.binary_tree import read_binary_tree, write_binary_tree, _get_node_factory
+from . import treegen
 from .. import utils
+from .. import numpy
 
 # the following imports are necessary to set fixed styles and faces
 try:
@@ -69,6 +73,15 @@ DEFAULT_DIST = 1.0
 DEFAULT_SUPPORT = 1.0
 DEFAULT_NAME = ""
 
+# Number of attribute indexes in use (see TreeNode.enable_attr_index).
+# Changes in nodes are only reported to indexes when there is any.
+_ATTR_INDEXES = 0
+
+#: Statistics of the subtree under a node (see
+#: :func:`TreeNode.get_subtree_stats`)
+SubtreeStats = namedtuple("SubtreeStats", ["leaves", "max_depth", "min_depth",
+                                           "max_edges", "min_edges", "length"])
+
 class TreeError(Exception):
     """
     A problem occurred during a TreeNode operation
@@ -122,24 +135,50 @@ class TreeNode(object):
     def _get_dist(self):
         return self._dist
     def _set_dist(self, value):
+        old_value = self._dist
         try:
             self._dist = float(value)
         except ValueError:
             raise TreeError('node dist must be a float number')
+        if _ATTR_INDEXES:
+            _attr_changed(self, "dist", old_value)
+        up = self._up
+        if up is not None and up._stats:
+            _invalidate_stats(up)
 
     def _get_support(self):
         return self._support
     def _set_support(self, value):
+        old_value = self._support
         try:
             self._support = float(value)
         except ValueError:
             raise TreeError('node support must be a float number')
+        if _ATTR_INDEXES:
+            _attr_changed(self, "support", old_value)
+
+    def _get_name(self):
+        return self._name
+    def _set_name(self, value):
+        if _ATTR_INDEXES:
+            old_value = self.__dict__.get("_name", _MISSING)
+            self._name = value
+            _attr_changed(self, "name", old_value)
+        else:
+            self._name = value
 
     def _get_up(self):
         return self._up
     def _set_up(self, value):
         if type(value) == type(self) or value is None:
+            old_up = self._up
+            if old_up is not None and old_up._stats:
+                _invalidate_stats(old_up)
+            if value is not None and value._stats:
+                _invalidate_stats(value)
             self._up = value
+            if _ATTR_INDEXES and old_up is not value:
+                _move_indexed_nodes(self, old_up, value)
         else:
             raise TreeError("bad node_up type")
 
@@ -148,7 +187,13 @@ class TreeNode(object):
     def _set_children(self, value):
         if type(value) == list and \
            len(set([type(n)==type(self) for n in value]))<2:
+            old_children = self._children
             self._children = value
+            if self._stats:
+                _invalidate_stats(self)
+            if _ATTR_INDEXES:
+                for index in _get_attr_indexes(self):
+                    index.replace_nodes(old_children, value)
         else:
             raise TreeError("Incorrect children type")
 
@@ -170,6 +215,8 @@ class TreeNode(object):
     support = property(fget=_get_support, fset=_set_support)
     #: Pointer to parent node
     up = property(fget=_get_up, fset=_set_up)
+    #: Node name
+    name = property(fget=_get_name, fset=_set_name)
     #: A list of children nodes
     children = property(fget=_get_children, fset=_set_children)
 
@@ -187,6 +234,12 @@ class TreeNode(object):
     faces = property(fget=_get_face_areas, \
                          fset=_set_face_areas)
 
+    # Attribute index (see enable_attr_index)
+    _attr_index = None
+    # Cached subtree statistics (see enable_subtree_stats). None if not
+    # enabled and False if they must be recomputed.
+    _stats = None
+
     def __init__(self, newick=None, format=0, dist=None, support=None,
                  name=None):
         self._children = []
@@ -210,6 +263,12 @@ class TreeNode(object):
             read_newick(newick, root_node = self, format=format)
 
 
+    def __setstate__(self, state):
+        # Nodes pickled when names were stored as plain attributes
+        if "name" in state:
+            state["_name"] = state.pop("name")
+        self.__dict__.update(state)
+
     def __nonzero__(self):
         return True
 
@@ -260,6 +319,9 @@ class TreeNode(object):
 
     def __len__(self):
         """Node len returns number of children."""
+        stats = self._get_stats()
+        if stats is not None:
+            return stats.leaves
         return len(self.get_leaves())
 
     def __iter__(self):
@@ -270,23 +332,150 @@ class TreeNode(object):
         """
         Add or update a node's feature.
         """
+        old_value = getattr(self, pr_name, _MISSING)
         setattr(self, pr_name, pr_value)
         self.features.add(pr_name)
+        if _ATTR_INDEXES:
+            _attr_changed(self, pr_name, old_value)
 
     def add_features(self, **features):
         """
         Add or update several features. """
         for fname, fvalue in six.iteritems(features):
-            setattr(self, fname, fvalue)
-            self.features.add(fname)
+            self.add_feature(fname, fvalue)
 
     def del_feature(self, pr_name):
         """
         Permanently deletes a node's feature.
         """
         if hasattr(self, pr_name):
+            old_value = getattr(self, pr_name)
             delattr(self, pr_name)
             self.features.remove(pr_name)
+            if _ATTR_INDEXES:
+                _attr_changed(self, pr_name, old_value)
+
+    def enable_attr_index(self):
+        """
+        Enables an index of node attributes for the tree under this
+        node, which speeds up :func:`TreeNode.search_nodes`,
+        :func:`TreeNode.get_leaves_by_name` and any method accepting
+        node names (i.e. prune, get_common_ancestor, set_outgroup or
+        get_distance) when called on this node or any of its
+        descendants.
+
+        For every searched attribute, a map from values to nodes is
+        built on the first search and reused by the next ones. Maps
+        are updated in place when nodes are added or removed (using
+        add_child, detach, delete, prune, etc.) and when node names,
+        branch lengths, support values or features set with
+        add_feature change. Other attributes set directly as normal
+        python attributes (i.e. node.species = "Hsa") are not tracked:
+        call this method again to rebuild the index after such changes.
+        Attributes computed by the node class (i.e. the species of
+        PhyloTree nodes) are never indexed. Matches are returned in the
+        same order as without the index.
+
+        While any index is enabled, changing a node requires visiting
+        its ancestors, which is slower for very deep trees.
+        """
+        if self._attr_index is not None:
+            self._attr_index.release()
+        self._attr_index = _AttrIndex(self)
+
+    def disable_attr_index(self):
+        """
+        Removes the attribute index of this node (see
+        :func:`TreeNode.enable_attr_index`).
+        """
+        if self._attr_index is not None:
+            self._attr_index.release()
+        self._attr_index = None
+
+    def _get_attr_index(self):
+        """ Returns the attribute index covering this node, if any."""
+        node = self
+        while node is not None:
+            if node._attr_index is not None:
+                return node._attr_index
+            node = node._up
+        return None
+
+    def enable_subtree_stats(self):
+        """
+        Enables cached statistics (see
+        :func:`TreeNode.get_subtree_stats`) for all nodes under this
+        node, so they are computed only once and reused by methods
+        such as get_farthest_leaf, get_closest_leaf, ladderize,
+        convert_to_ultrametric, get_midpoint_outgroup or len().
+
+        Statistics are computed in a single postorder pass. Any change
+        in the topology or branch lengths of the tree (using
+        add_child, delete, set_outgroup, node.dist = x, etc.) marks
+        the statistics of the modified node and its ancestors as
+        dirty, so only those are recomputed when needed again. Nodes
+        attached to the tree are added to the cache.
+
+        Cached distances are summed from the leaves up, so when
+        several leaves are at the same distance, rounding errors may
+        lead get_farthest_leaf or get_closest_leaf to return a
+        different one than with statistics disabled.
+        """
+        if self._stats is None:
+            self._stats = False
+        self._get_stats()
+
+    def disable_subtree_stats(self):
+        """
+        Removes the cached statistics of this node, its descendants
+        and its ancestors (see :func:`TreeNode.enable_subtree_stats`).
+        """
+        for n in self.traverse():
+            n._stats = None
+        node = self._up
+        while node is not None and node._stats is not None:
+            node._stats = None
+            node = node._up
+
+    def get_subtree_stats(self):
+        """
+        Returns a SubtreeStats tuple describing the subtree under this
+        node, which contains the following values:
+
+          - leaves: number of leaves.
+          - max_depth: distance to the farthest leaf.
+          - min_depth: distance to the closest leaf.
+          - max_edges: number of branches to the farthest leaf in
+            topology.
+          - min_edges: number of branches to the closest leaf in
+            topology.
+          - length: sum of all branch lengths (the branch of this node
+            is not included).
+
+        Cached values are used when enabled (see
+        :func:`TreeNode.enable_subtree_stats`).
+        """
+        stats = self._get_stats()
+        if stats is None:
+            node2stats = {}
+            for n in reversed(list(self.traverse("preorder"))):
+                children = n.children
+                node2stats[n] = _get_node_stats(children, [node2stats.pop(ch) for ch in children])
+            stats = node2stats[self]
+        return stats
+
+    def _get_stats(self):
+        """ Returns the cached statistics of this node, recomputing the
+        dirty ones under it, or None if they are not enabled."""
+        stats = self._stats
+        if stats is not False:
+            return stats
+        # Nodes with valid statistics are not expanded
+        for n in reversed(list(self.traverse("preorder", is_leaf_fn=_has_valid_stats))):
+            if not n._stats:
+                children = n._children
+                n._stats = _get_node_stats(children, [ch._stats for ch in children])
+        return self._stats
 
     # Topology management
     def add_child(self, child=None, name=None, dist=None, support=None):
@@ -523,6 +712,18 @@ class TreeNode(object):
             else:
                 return 0
 
+        def load_depth(node):
+            # Number of ancestors of each node, computed only once per
+            # node
+            path = []
+            while node is not None and node not in n2depth:
+                path.append(node)
+                node = node.up
+            depth = n2depth[node] if node is not None else -1
+            for n in reversed(path):
+                depth += 1
+                n2depth[n] = depth
+
         to_keep = set(_translate_nodes(self, *nodes))
         start, node2path = self.get_common_ancestor(to_keep, get_path=True)
         to_keep.add(self)
@@ -534,8 +735,7 @@ class TreeNode(object):
         for seed, path in six.iteritems(node2path):
             for visited_node in path:
                 if visited_node not in n2depth:
-                    depth = visited_node.get_distance(start, topology_only=True)
-                    n2depth[visited_node] = depth
+                    load_depth(visited_node)
                 if visited_node is not seed:
                     n2count.setdefault(visited_node, set()).add(seed)
 
@@ -811,7 +1011,9 @@ class TreeNode(object):
           "dist"]). Use an empty list to export all available features
           in each node (features=[])
 
-        :argument outfile: writes the output to a given file
+        :argument outfile: writes the output to a given file path or
+          file-like object. The newick text is then written in chunks,
+          and never fully built in memory.
 
         :argument format: defines the newick standard used to encode the
           tree. See tutorial for details.
@@ -832,18 +1034,52 @@ class TreeNode(object):
 
         """
 
-        nw = write_newick(self, features=features,
-                          format=format,
-                          is_leaf_fn=is_leaf_fn,
-                          format_root_node=format_root_node,
-                          dist_formatter=dist_formatter,
-                          support_formatter=support_formatter,
-                          name_formatter=name_formatter)
+        chunks = iter_newick(self, features=features,
+                             format=format,
+                             is_leaf_fn=is_leaf_fn,
+                             format_root_node=format_root_node,
+                             dist_formatter=dist_formatter,
+                             support_formatter=support_formatter,
+                             name_formatter=name_formatter)
 
-        if outfile is not None:
-            open(outfile, "w").write(nw)
+        if outfile is None:
+            return ''.join(chunks)
+        elif hasattr(outfile, "write"):
+            outfile.writelines(chunks)
         else:
-            return nw
+            with open(outfile, "w") as OUT:
+                OUT.writelines(chunks)
+
+    def dump_binary(self, outfile=None, features=None):
+        """
+        Saves the tree under this node using a compact binary format,
+        which is much faster to write and load than newick or pickle
+        serialization. Topology, names, branch lengths, support values
+        and node features are stored. String, float, int and bool
+        features keep their type, while any other value is pickled.
+
+        :argument None outfile: path or file-like object (opened in
+          binary mode) where the tree is written. If not provided, the
+          binary data is returned.
+
+        :argument None features: list of node features to store. All
+          features are stored by default.
+
+        Trees are loaded back using :func:`TreeNode.load_binary`.
+        """
+        return write_binary_tree(self, outfile=outfile, features=features)
+
+    @classmethod
+    def load_binary(cls, source):
+        """
+        Loads a tree saved with :func:`TreeNode.dump_binary` and returns
+        its root node. Nodes are created as instances of the class used
+        to call this method (i.e. PhyloTree.load_binary(path)).
+
+        :argument source: path to the binary file, which is memory
+          mapped while loading, or the binary data itself.
+        """
+        return read_binary_tree(source, node_class=cls)
 
     def get_tree_root(self):
         """
@@ -925,12 +1161,20 @@ class TreeNode(object):
         dealing with huge trees.
         """
 
+        index = self._get_attr_index()
+        if index is not None:
+            matches = index.search(self, conditions)
+            if matches is not None:
+                for n in matches:
+                    yield n
+                return
+
+        conditions = list(conditions.items())
         for n in self.traverse():
-            conditions_passed = 0
-            for key, value in six.iteritems(conditions):
-                if hasattr(n, key) and getattr(n, key) == value:
-                    conditions_passed +=1
-            if conditions_passed == len(conditions):
+            for key, value in conditions:
+                if not getattr(n, key, _MISSING) == value:
+                    break
+            else:
                 yield n
 
     def search_nodes(self, **conditions):
@@ -1015,6 +1259,96 @@ class TreeNode(object):
                 current = current.up
         return dist
 
+    def get_distance_matrix(self, topology_only=False, leaves_only=True):
+        """
+        Returns the distances between all the nodes under this node,
+        computed in a single traversal of the tree.
+
+        :argument False topology_only: If set to True, distances will
+          refer to the number of nodes between each pair of nodes.
+
+        :argument True leaves_only: If set to False, distances among
+          internal nodes are also returned.
+
+        :returns: a tuple containing a numpy matrix of distances and the
+          list of nodes (in preorder) corresponding to its rows and
+          columns.
+
+        Branch length distances match the ones returned by
+        :func:`TreeNode.get_distance`. Topology distances are the number
+        of nodes strictly between each pair of nodes, which is also what
+        :func:`TreeNode.get_distance` returns unless one node is an
+        ancestor of the other (in such case, get_distance also counts
+        one of the two nodes, depending on the order of the
+        arguments). The matrix requires n^2 * 8 bytes of memory; use
+        :func:`TreeNode.iter_distance_matrix` to process larger trees by
+        blocks of rows.
+        """
+        nodes, depths, spans = self._get_distance_layout(topology_only,
+                                                         leaves_only)
+        matrix = numpy.zeros((len(nodes), len(nodes)))
+        _fill_distances(matrix, 0, depths, spans, topology_only)
+        return matrix, nodes
+
+    def iter_distance_matrix(self, topology_only=False, leaves_only=True,
+                             chunk_size=1000):
+        """
+        Iterates over blocks of rows of the distance matrix returned by
+        :func:`TreeNode.get_distance_matrix`, so only chunk_size rows are
+        kept in memory at a time.
+
+        :argument 1000 chunk_size: maximum number of rows in each block.
+
+        :returns: an iterator over tuples containing the list of nodes
+          in the rows of each block and a numpy matrix with their
+          distances to all the nodes. Columns follow the order of the
+          rows across all the blocks.
+        """
+        nodes, depths, spans = self._get_distance_layout(topology_only,
+                                                         leaves_only)
+        for start in range(0, len(nodes), chunk_size):
+            end = min(start + chunk_size, len(nodes))
+            block = numpy.zeros((end - start, len(nodes)))
+            _fill_distances(block, start, depths, spans, topology_only)
+            yield nodes[start:end], block
+
+    def _get_distance_layout(self, topology_only, leaves_only):
+        """ Returns the nodes used in distance matrices, their depths and,
+        for every internal node, the range of rows under each of its
+        children. """
+        if numpy is None:
+            raise TreeError("numpy is required to compute distance matrices")
+
+        node2depth = {self: 0.0}
+        node2index = {}
+        nodes = []
+        visited = []
+        for n in self.traverse("preorder"):
+            if n is not self:
+                node2depth[n] = node2depth[n._up] + (1 if topology_only else n.dist)
+            if not leaves_only or not n.children:
+                node2index[n] = len(nodes)
+                nodes.append(n)
+            visited.append(n)
+
+        # Nodes under each node are stored contiguously (preorder), so
+        # each subtree is represented by the range of its rows
+        node2range = {}
+        spans = []
+        for n in reversed(visited):
+            index = node2index.get(n)
+            if not n.children:
+                node2range[n] = (index, index + 1)
+                continue
+            ranges = [node2range.pop(ch) for ch in n.children]
+            if index is not None:
+                ranges.insert(0, (index, index + 1))
+            node2range[n] = (ranges[0][0], ranges[-1][1])
+            spans.append((node2depth[n], ranges))
+
+        depths = numpy.array([node2depth[n] for n in nodes], dtype=float)
+        return nodes, depths, spans
+
     def get_farthest_node(self, topology_only=False):
         """
         Returns the node's farthest descendant or ancestor node, and the
@@ -1063,6 +1397,26 @@ class TreeNode(object):
         if (is_leaf_fn and is_leaf_fn(self)) or self.is_leaf():
             return self, 0.0, self, 0.0
 
+        if is_leaf_fn is None and self._get_stats() is not None:
+            # Follow the cached distances down to the leaves
+            if topology_only:
+                max_key = lambda ch: ch._stats.max_edges
+                min_key = lambda ch: ch._stats.min_edges
+                max_dist = float(self._stats.max_edges - 1)
+                min_dist = float(self._stats.min_edges - 1)
+            else:
+                max_key = lambda ch: ch.dist + ch._stats.max_depth
+                min_key = lambda ch: ch.dist + ch._stats.min_depth
+                max_dist = self._stats.max_depth
+                min_dist = self._stats.min_depth
+            max_node = self
+            while max_node.children:
+                max_node = max(max_node.children, key=max_key)
+            min_node = self
+            while min_node.children:
+                min_node = min(min_node.children, key=min_key)
+            return min_node, min_dist, max_node, max_dist
+
         min_dist = None
         min_node = None
         max_dist = None
@@ -1128,12 +1482,38 @@ class TreeNode(object):
         Returns the node that divides the current tree into two distance-balanced
         partitions.
         """
-        # Gets the farthest node to the current root
         root = self.get_tree_root()
-        nA, r2A_dist = root.get_farthest_leaf()
-        nB, A2B_dist = nA.get_farthest_node()
+        if root._get_stats() is not None:
+            get_height = lambda n: n._stats.max_depth
+        else:
+            # Distance from each node to its farthest leaf, computed for
+            # all nodes in a single bottom-up pass (reversed preorder)
+            node2height = {}
+            for n in reversed(list(root.traverse("preorder"))):
+                children = n.children
+                if children:
+                    node2height[n] = max([ch.dist + node2height[ch] for ch in children])
+                else:
+                    node2height[n] = 0.0
+            get_height = node2height.__getitem__
+
+        # Gets the farthest leaf to the current root
+        nA = root
+        while nA.children:
+            nA = max(nA.children, key=lambda ch: ch.dist + get_height(ch))
+
+        # and the distance to the farthest leaf from it, which is always
+        # found under a sister of one of its ancestors
+        A2B_dist = 0.0
+        cdist = nA.dist
+        prev, current = nA, nA.up
+        while current is not None:
+            for ch in current.children:
+                if ch is not prev:
+                    A2B_dist = max(A2B_dist, cdist + ch.dist + get_height(ch))
+            cdist += current.dist
+            prev, current = current, current.up
 
-        outgroup = nA
         middist  = A2B_dist / 2.0
         cdist = 0
         current = nA
@@ -1147,7 +1527,7 @@ class TreeNode(object):
 
     def populate(self, size, names_library=None, reuse_names=False,
                  random_branches=False, branch_range=(0,1),
-                 support_range=(0,1)):
+                 support_range=(0,1), model=None):
         """
         Generates a random topology by populating current node.
 
@@ -1168,6 +1548,15 @@ class TreeNode(object):
         this range of values will be used to generate random branch
         support values.
 
+        :argument None model: If "yule", "coalescent" or "uniform",
+          the topology is sampled from the given model using numpy,
+          which is much faster for large trees (see
+          :func:`ete3.coretype.treegen.random_tree`). Branch lengths of
+          "yule" and "coalescent" trees are the waiting times between
+          speciation or coalescence events. By default, the original
+          algorithm is used, so trees generated after a given
+          random.seed() do not change.
+
         """
         NewNode = self.__class__
 
@@ -1182,26 +1571,48 @@ class TreeNode(object):
         else:
             root = self
 
-        next_deq = deque([root])
+        if model is not None:
+            if numpy is None:
+                raise TreeError("numpy is required to generate trees from a model")
+            top = treegen.random_tree(size, model=model, names_library=names_library,
+                                      reuse_names=reuse_names,
+                                      random_branches=random_branches,
+                                      branch_range=branch_range,
+                                      support_range=support_range).to_tree(NewNode)
+            if top.children:
+                for ch in top.get_children():
+                    root.add_child(child=ch)
+            else:
+                root.name = top.name
+            return
+
+        # Nodes are created under a temporary root, which is much faster
+        # than adding them one by one to the tree
+        new_node = _get_node_factory(NewNode)
+        top = new_node()
+        next_deq = deque([top])
         for i in range(size-1):
             if random.randint(0, 1):
                 p = next_deq.pop()
             else:
                 p = next_deq.popleft()
 
-            c1 = p.add_child()
-            c2 = p.add_child()
+            c1 = new_node()
+            c2 = new_node()
+            c1._up = p
+            c2._up = p
+            p._children.extend([c1, c2])
             next_deq.extend([c1, c2])
             if random_branches:
-                c1.dist = random.uniform(*branch_range)
-                c2.dist = random.uniform(*branch_range)
-                c1.support = random.uniform(*branch_range)
-                c2.support = random.uniform(*branch_range)
+                c1._dist = random.uniform(*branch_range)
+                c2._dist = random.uniform(*branch_range)
+                c1._support = random.uniform(*support_range)
+                c2._support = random.uniform(*support_range)
             else:
-                c1.dist = 1.0
-                c2.dist = 1.0
-                c1.support = 1.0
-                c2.support = 1.0
+                c1._dist = 1.0
+                c2._dist = 1.0
+                c1._support = 1.0
+                c2._support = 1.0
 
         # next contains leaf nodes
         charset =  "abcdefghijklmnopqrstuvwxyz"
@@ -1217,8 +1628,13 @@ class TreeNode(object):
                     tname = names_library.pop()
             else:
                 tname = ''.join(next(avail_names))
-            n.name = tname
+            if n is top:
+                root.name = tname
+            else:
+                n.name = tname
 
+        for ch in top.get_children():
+            root.add_child(child=ch)
 
     def set_outgroup(self, outgroup):
         """
@@ -1389,9 +1805,23 @@ class TreeNode(object):
              objects even if attributes point to lambda functions,
              etc.)
 
+           - "clone": Nodes are copied by traversing the tree, without
+             serialisation (fastest method). Node attributes are copied,
+             but their values are shared by both trees (copy on write):
+             setting a feature in a copy does not affect the original
+             node, while in-place changes of mutable values (i.e. lists
+             or dicts) are seen in both trees.
+
+           - "deepclone": As "clone", but attribute values are copied
+             using the standard "copy.deepcopy" function.
+
         """
         method = method.lower()
-        if method=="newick":
+        if method == "clone":
+            new_node = self._clone(deep=False)
+        elif method == "deepclone":
+            new_node = self._clone(deep=True)
+        elif method=="newick":
             new_node = self.__class__(self.write(features=["name"], format_root_node=True))
         elif method=="newick-extended":
             self.write(features=[], format_root_node=True)
@@ -1411,6 +1841,41 @@ class TreeNode(object):
 
         return new_node
 
+    @utils.without_gc
+    def _clone(self, deep=False, descendants=True):
+        """ Returns a copy of the tree under this node, cloning the
+        attributes of each node in a single traversal. If descendants is
+        False, only this node is copied. """
+        memo = {}
+        new_root = None
+        to_visit = [(self, None)]
+        while to_visit:
+            node, parent = to_visit.pop()
+            state = node.__dict__.copy()
+            state.pop("_attr_index", None)
+            state["_up"] = parent
+            state["_children"] = []
+            if deep:
+                for key, value in six.iteritems(state):
+                    if key not in _CLONE_STRUCTURE:
+                        state[key] = copy.deepcopy(value, memo)
+            else:
+                if state.get("_img_style") is not None:
+                    # Styles are usually modified in place
+                    state["_img_style"] = copy.copy(state["_img_style"])
+
+            state["features"] = set(node.features)
+            new_node = node.__class__.__new__(node.__class__)
+            new_node.__dict__ = state
+            if parent is None:
+                new_root = new_node
+            else:
+                parent._children.append(new_node)
+            if descendants:
+                for ch in reversed(node._children):
+                    to_visit.append((ch, new_node))
+        return new_root
+
     def _asciiArt(self, char1='-', show_internal=True, compact=False, attributes=None):
         """
         Returns the ASCII representation of the tree.
@@ -1419,24 +1884,34 @@ class TreeNode(object):
         """
         if not attributes:
             attributes = ["name"]
-        node_name = ', '.join(map(str, [getattr(self, v) for v in attributes if hasattr(self, v)]))
 
-        LEN = max(3, len(node_name) if not self.children or show_internal else 3)
-        PAD = ' ' * LEN
-        PA = ' ' * (LEN-1)
-        if not self.is_leaf():
+        # Drawings are built from the leaves up. The first character of
+        # the line connecting each node to its parent depends on the node
+        # position among its sisters, and it is set when drawing the
+        # parent.
+        node2art = {}
+        for node in self.traverse("postorder"):
+            node_name = ', '.join(map(str, [getattr(node, v) for v in attributes if hasattr(node, v)]))
+            if node.is_leaf():
+                node2art[node] = (['-' + '-' + node_name], 0)
+                continue
+
+            LEN = max(3, len(node_name) if show_internal else 3)
+            PAD = ' ' * LEN
+            PA = ' ' * (LEN-1)
             mids = []
             result = []
-            for c in self.children:
-                if len(self.children) == 1:
+            for c in node.children:
+                if len(node.children) == 1:
                     char2 = '/'
-                elif c is self.children[0]:
+                elif c is node.children[0]:
                     char2 = '/'
-                elif c is self.children[-1]:
+                elif c is node.children[-1]:
                     char2 = '\\'
                 else:
                     char2 = '-'
-                (clines, mid) = c._asciiArt(char2, show_internal, compact, attributes)
+                (clines, mid) = node2art.pop(c)
+                clines[mid] = char2 + clines[mid][1:]
                 mids.append(mid+len(result))
                 result.extend(clines)
                 if not compact:
@@ -1446,14 +1921,16 @@ class TreeNode(object):
             (lo, hi, end) = (mids[0], mids[-1], len(result))
             prefixes = [PAD] * (lo+1) + [PA+'|'] * (hi-lo-1) + [PAD] * (end-hi)
             mid = int((lo + hi) / 2)
-            prefixes[mid] = char1 + '-'*(LEN-2) + prefixes[mid][-1]
+            prefixes[mid] = '-' + '-'*(LEN-2) + prefixes[mid][-1]
             result = [p+l for (p,l) in zip(prefixes, result)]
             if show_internal:
                 stem = result[mid]
                 result[mid] = stem[0] + node_name + stem[len(node_name)+1:]
-            return (result, mid)
-        else:
-            return ([char1 + '-' + node_name], 0)
+            node2art[node] = (result, mid)
+
+        (result, mid) = node2art[self]
+        result[mid] = char1 + result[mid][1:]
+        return (result, mid)
 
     def get_ascii(self, show_internal=True, compact=False, attributes=None):
         """
@@ -1514,20 +1991,24 @@ class TreeNode(object):
 
         """
 
-        if not self.is_leaf():
-            n2s = {}
-            for n in self.get_children():
-                s = n.ladderize(direction=direction)
-                n2s[n] = s
+        if self._get_stats() is not None:
+            for n in self.traverse():
+                if n.children:
+                    n.children.sort(key=lambda x: x._stats.leaves)
+                    if direction == 1:
+                        n.children.reverse()
+            return self._stats.leaves
 
-            self.children.sort(key=lambda x: n2s[x])
-            if direction == 1:
-                self.children.reverse()
-            size = sum(n2s.values())
-        else:
-            size = 1
-
-        return size
+        n2s = {}
+        for n in self.traverse("postorder"):
+            if n.is_leaf():
+                n2s[n] = 1
+            else:
+                n.children.sort(key=lambda x: n2s[x])
+                if direction == 1:
+                    n.children.reverse()
+                n2s[n] = sum([n2s.pop(ch) for ch in n.children])
+        return n2s[self]
 
     def sort_descendants(self, attr="name"):
         """
@@ -1569,24 +2050,21 @@ class TreeNode(object):
         if _store is None:
             _store = {}
 
-        for ch in self.children:
-            ch.get_cached_content(store_attr=store_attr,
-                                  container_type=container_type,
-                                  _store=_store)
-        if self.children:
-            val = container_type()
-            for ch in self.children:
-                if type(val) == list:
-                    val.extend(_store[ch])
-                if type(val) == set:
-                    val.update(_store[ch])
-            _store[self] = val
-        else:
-            if store_attr is None:
-                val = self
+        for node in self.traverse("postorder"):
+            if node.children:
+                val = container_type()
+                for ch in node.children:
+                    if type(val) == list:
+                        val.extend(_store[ch])
+                    if type(val) == set:
+                        val.update(_store[ch])
+                _store[node] = val
             else:
-                val = getattr(self, store_attr)
-            _store[self] = container_type([val])
+                if store_attr is None:
+                    val = node
+                else:
+                    val = getattr(node, store_attr)
+                _store[node] = container_type([val])
         return _store
 
     def robinson_foulds(self, t2, attr_t1="name", attr_t2="name",
@@ -2044,12 +2522,16 @@ class TreeNode(object):
 
         # pre-calculate how many splits remain under each node
         node2max_depth = {}
-        for node in self.traverse("postorder"):
-            if not node.is_leaf():
-                max_depth = max([node2max_depth[c] for c in node.children]) + 1
-                node2max_depth[node] = max_depth
-            else:
-                node2max_depth[node] = 1
+        if self._get_stats() is not None:
+            for node in self.traverse():
+                node2max_depth[node] = node._stats.max_edges + 1
+        else:
+            for node in self.traverse("postorder"):
+                if not node.is_leaf():
+                    max_depth = max([node2max_depth[c] for c in node.children]) + 1
+                    node2max_depth[node] = max_depth
+                else:
+                    node2max_depth[node] = 1
         node2dist = {self: 0.0}
         if not tree_length:
             most_distant_leaf, tree_length = self.get_farthest_leaf()
@@ -2110,6 +2592,10 @@ class TreeNode(object):
         if type(values) != set:
             values = set(values)
 
+        if not unrooted:
+            return self.check_monophyly_groups([values], target_attr,
+                                               ignore_missing=ignore_missing)[0]
+
         # This is the only time I traverse the tree, then I use cached
         # leaf content
         n2leaves = self.get_cached_content()
@@ -2164,6 +2650,56 @@ class TreeNode(object):
             else:
                 return False, "paraphyletic", foreign_leaves
 
+    def check_monophyly_groups(self, groups, target_attr, ignore_missing=False):
+        """
+        Checks the monophyly of many groups of values at once, returning
+        the same results as :func:`TreeNode.check_monophyly` (for rooted
+        trees) for each of them.
+
+        Leaves are numbered only once, following the tree in preorder,
+        so the leaves of any node take a contiguous range of
+        positions. The common ancestor of a group is then found from
+        its first and last positions, and the group is monophyletic if
+        it fills the whole range of the ancestor. This allows checking
+        thousands of groups (i.e. all NCBI lineages) in a large tree.
+
+        :param groups: a dictionary of group names and the set of
+            values of each group, or a list of value sets.
+
+        :param target_attr: node attribute being used to check
+            monophyly.
+
+        :param False ignore_missing: Avoid raising an Exception when
+            missing attributes are found.
+
+        :returns: a dictionary (or a list if groups is not a
+                  dictionary) with the check_monophyly tuple of every
+                  group.
+
+        """
+        ranges = _LeafRanges(self)
+        value2positions = {}
+        for pos, leaf in enumerate(ranges.leaves):
+            value2positions.setdefault(getattr(leaf, target_attr), []).append(pos)
+
+        def check(values):
+            positions = []
+            missing_values = False
+            for value in set(values):
+                if value in value2positions:
+                    positions.extend(value2positions[value])
+                else:
+                    missing_values = True
+            if missing_values and not ignore_missing:
+                raise ValueError('The monophyly of the provided values could never be reached, as not all of them exist in the tree.'
+                                 ' Please check your target attribute and values, or set the ignore_missing flag to True')
+            positions.sort()
+            return ranges.check_monophyly(positions)
+
+        if isinstance(groups, dict):
+            return dict([(key, check(values)) for key, values in six.iteritems(groups)])
+        return [check(values) for values in groups]
+
     def get_monophyletic(self, values, target_attr):
         """
         .. versionadded:: 2.2
@@ -2185,9 +2721,22 @@ class TreeNode(object):
         if type(values) != set:
             values = set(values)
 
-        n2values = self.get_cached_content(store_attr=target_attr)
+        # Values found under each node are stored as bitsets, with an
+        # extra bit for any value not requested
+        value2bit = dict([(value, 1 << i) for i, value in enumerate(values)])
+        foreign_bit = 1 << len(values)
+        expected = foreign_bit - 1
+        n2bits = {}
+        for node in reversed(list(self.traverse("preorder"))):
+            if node.children:
+                bits = 0
+                for ch in node.children:
+                    bits |= n2bits[ch]
+            else:
+                bits = value2bit.get(getattr(node, target_attr), foreign_bit)
+            n2bits[node] = bits
 
-        is_monophyletic = lambda node: n2values[node] == values
+        is_monophyletic = lambda node: n2bits[node] == expected
         for match in self.iter_leaves(is_leaf_fn=is_monophyletic):
             if is_monophyletic(match):
                 yield match
@@ -2345,14 +2894,26 @@ class TreeNode(object):
         _ph.call()
         
 
+# Node attributes rebuilt when cloning trees
+_CLONE_STRUCTURE = set(["_up", "_children"])
+
 def _translate_nodes(root, *nodes):
     name2node = dict([ [n, None] for n in nodes if type(n) is str])
-    for n in root.traverse():
-        if n.name in name2node:
-            if name2node[n.name] is not None:
-                raise TreeError("Ambiguous node name: "+str(n.name))
-            else:
-                name2node[n.name] = n
+    index = root._get_attr_index() if name2node else None
+    if index is not None:
+        for name in name2node:
+            matches = index.search(root, {"name": name})
+            if len(matches) > 1:
+                raise TreeError("Ambiguous node name: "+str(name))
+            elif matches:
+                name2node[name] = matches[0]
+    elif name2node:
+        for n in root.traverse():
+            if n.name in name2node:
+                if name2node[n.name] is not None:
+                    raise TreeError("Ambiguous node name: "+str(n.name))
+                else:
+                    name2node[n.name] = n
 
     if None in list(name2node.values()):
         notfound = [key for key, value in six.iteritems(name2node) if value is None]
@@ -2372,6 +2933,336 @@ def _translate_nodes(root, *nodes):
     else:
         return valid_nodes
 
+def _fill_distances(matrix, offset, depths, spans, topology_only):
+    """ Fills the rows of matrix with the distances of nodes starting at
+    offset to all nodes. The distance between two nodes is the sum of
+    their depths minus twice the depth of the node where they split."""
+    first, last = offset, offset + matrix.shape[0]
+    for depth, ranges in spans:
+        if ranges[-1][1] <= first or ranges[0][0] >= last:
+            continue
+        start, end = ranges[0][0], ranges[-1][1]
+        base = 2 * depth + (1 if topology_only else 0)
+        for r_start, r_end in ranges:
+            row_start, row_end = max(r_start, first), min(r_end, last)
+            if row_start >= row_end:
+                continue
+            rows = depths[row_start:row_end, None] - base
+            block = matrix[row_start - offset:row_end - offset]
+            # columns of sister subtrees, at both sides of the range
+            block[:, start:r_start] = rows + depths[start:r_start]
+            block[:, r_end:end] = rows + depths[r_end:end]
+
+_MISSING = object()
+
+def _get_attr_indexes(node):
+    """ Returns the attribute indexes covering node."""
+    indexes = []
+    while node is not None:
+        if node._attr_index is not None:
+            indexes.append(node._attr_index)
+        node = node._up
+    return indexes
+
+def _move_indexed_nodes(node, old_up, new_up):
+    """ Updates the attribute indexes covering node after moving it from
+    old_up to new_up."""
+    if old_up is not None and old_up._up is new_up:
+        # Moved one level up (i.e. when its parent is deleted), so it
+        # only leaves the index of its old parent, if any
+        if old_up._attr_index is not None:
+            old_up._attr_index.remove_nodes(node)
+        return
+    elif new_up is not None and new_up._up is old_up:
+        if new_up._attr_index is not None:
+            new_up._attr_index.add_nodes(node)
+        return
+
+    old_indexes = _get_attr_indexes(old_up)
+    new_indexes = _get_attr_indexes(new_up)
+    for index in old_indexes:
+        if index not in new_indexes:
+            index.remove_nodes(node)
+    for index in new_indexes:
+        if index not in old_indexes:
+            index.add_nodes(node)
+
+def _attr_changed(node, attr, old_value):
+    for index in _get_attr_indexes(node):
+        index.update_node(node, attr, old_value)
+
+class _AttrIndex(object):
+    """ Maps the values of node attributes to the nodes under a given
+    root. Maps are built for each attribute when first searched, and
+    updated when nodes are added, removed or change their attributes.
+    Nodes of every value are kept as dictionary keys, so they can be
+    added and removed in constant time. Updates can be safely repeated.
+    """
+
+    def __init__(self, root):
+        global _ATTR_INDEXES
+        self.root = root
+        self.maps = {}
+        self.active = True
+        _ATTR_INDEXES += 1
+
+    def release(self):
+        """ Stops counting this index as enabled, so node changes are
+        not notified to it anymore."""
+        global _ATTR_INDEXES
+        if self.active:
+            self.active = False
+            self.maps = {}
+            _ATTR_INDEXES -= 1
+
+    def __del__(self):
+        # Indexes are usually released when disabled. Root and index
+        # refer to each other, so this only happens after a collection.
+        self.release()
+
+    def __getstate__(self):
+        # Maps are rebuilt on demand
+        return {"root": self.root, "maps": {}}
+
+    def __setstate__(self, state):
+        global _ATTR_INDEXES
+        self.__dict__.update(state)
+        self.active = True
+        _ATTR_INDEXES += 1
+
+    def lookup(self, attr, value):
+        """ Returns the nodes whose attribute is equal to value, or None
+        if value or attribute cannot be indexed."""
+        value2nodes = self.maps.get(attr)
+        if value2nodes is None:
+            if attr not in _INDEXED_PROPERTIES and hasattr(type(self.root), attr):
+                # Computed by the node class, so changes are not seen
+                return None
+            value2nodes = self.maps[attr] = {}
+            for n in self.root.traverse():
+                _index_node(value2nodes, n, getattr(n, attr, _MISSING))
+        try:
+            return list(value2nodes.get(value, ()))
+        except TypeError:
+            return None
+
+    def update_node(self, node, attr, old_value):
+        """ Moves node from the nodes of its old attribute value to the
+        ones of its current value."""
+        value2nodes = self.maps.get(attr)
+        if value2nodes is not None:
+            _unindex_node(value2nodes, node, old_value)
+            _index_node(value2nodes, node, getattr(node, attr, _MISSING))
+
+    def add_nodes(self, node):
+        """ Adds node and all its descendants."""
+        if self.maps:
+            nodes = _get_linked_descendants(node)
+            for attr, value2nodes in six.iteritems(self.maps):
+                for n in nodes:
+                    _index_node(value2nodes, n, getattr(n, attr, _MISSING))
+
+    def remove_nodes(self, node):
+        """ Removes node and all its descendants."""
+        if self.maps:
+            nodes = _get_linked_descendants(node)
+            for attr, value2nodes in six.iteritems(self.maps):
+                for n in nodes:
+                    _unindex_node(value2nodes, n, getattr(n, attr, _MISSING))
+
+    def replace_nodes(self, old_children, new_children):
+        """ Updates the index after the list of children of a node has
+        been replaced."""
+        if not self.maps:
+            return
+        old_ids = set(map(id, old_children))
+        new_ids = set(map(id, new_children))
+        for ch in old_children:
+            if id(ch) not in new_ids:
+                self.remove_nodes(ch)
+        for ch in new_children:
+            if id(ch) not in old_ids:
+                self.add_nodes(ch)
+
+    def search(self, node, conditions):
+        """ Returns the nodes under node matching all the conditions
+        (attribute=value), or None if they cannot be searched using the
+        index."""
+        keys = sorted(conditions, key=lambda k: k != "name")
+        candidates = None
+        for key in keys:
+            candidates = self.lookup(key, conditions[key])
+            if candidates is not None:
+                break
+        if candidates is None:
+            return None
+
+        matches = []
+        for n in candidates:
+            for key, value in six.iteritems(conditions):
+                if not getattr(n, key, _MISSING) == value:
+                    break
+            else:
+                matches.append(n)
+
+        if len(matches) == 1 and node is self.root:
+            return matches
+        # Sorted as visited by traverse() (levelorder)
+        keyed = []
+        for n in matches:
+            path = _get_child_path(n, node)
+            if path is not None:
+                keyed.append(((len(path), path), n))
+        keyed.sort(key=lambda match: match[0])
+        return [n for key, n in keyed]
+
+# Node properties stored in the node itself
+_INDEXED_PROPERTIES = set(["name", "dist", "support"])
+
+def _get_child_path(node, ancestor):
+    """ Returns the positions of the children leading from ancestor to
+    node, or None if node is not under ancestor."""
+    path = []
+    while node is not ancestor:
+        up = node._up
+        if up is None:
+            return None
+        path.append(up._children.index(node))
+        node = up
+    path.reverse()
+    return path
+
+def _get_linked_descendants(node):
+    """ Returns node and its descendants, skipping children that have
+    already been moved to other nodes (i.e. when a node is deleted, its
+    children are attached to its parent but still listed as its
+    children)."""
+    nodes = [node]
+    for n in nodes:
+        for ch in n._children:
+            if ch._up is n:
+                nodes.append(ch)
+    return nodes
+
+def _index_node(value2nodes, node, value):
+    if value is not _MISSING:
+        try:
+            value2nodes.setdefault(value, {})[node] = None
+        except TypeError:
+            # unhashable values are not indexed
+            pass
+
+def _unindex_node(value2nodes, node, value):
+    if value is not _MISSING:
+        try:
+            nodes = value2nodes.get(value)
+        except TypeError:
+            return
+        if nodes is not None:
+            nodes.pop(node, None)
+            if not nodes:
+                del value2nodes[value]
+
+class _LeafRanges(object):
+    """ Numbers the leaves under a root node in preorder, so the leaves
+    of any node are found in a contiguous range of positions. Groups of
+    leaves are handled as sorted lists of positions."""
+
+    def __init__(self, root):
+        self.root = root
+        self.leaves = []
+        self.node2range = {}
+        nodes = list(root.traverse("preorder"))
+        node2start = {}
+        for node in nodes:
+            node2start[node] = len(self.leaves)
+            if not node.children:
+                self.leaves.append(node)
+        for node in reversed(nodes):
+            if node.children:
+                end = self.node2range[node.children[-1]][1]
+            else:
+                end = node2start[node] + 1
+            self.node2range[node] = (node2start[node], end)
+
+    def get_common_ancestor(self, first, last):
+        """ Returns the common ancestor of the leaves between two
+        positions."""
+        node = self.leaves[first]
+        while self.node2range[node][1] <= last:
+            node = node.up
+        return node
+
+    def check_monophyly(self, positions):
+        """ Returns the check_monophyly tuple for the leaves at the
+        given sorted positions."""
+        if not positions:
+            raise TreeError("Nodes are not connected!")
+        elif len(positions) == 1:
+            # As in get_common_ancestor, single nodes are grouped with
+            # the root node
+            common = self.root
+        else:
+            common = self.get_common_ancestor(positions[0], positions[-1])
+        start, end = self.node2range[common]
+        if len(positions) == end - start:
+            return True, "monophyletic", set()
+
+        targets = set(positions)
+        foreign = [pos for pos in range(start, end) if pos not in targets]
+        # if the common ancestor of all foreign leaves is self
+        # contained, we have a paraphyly. Otherwise, polyphyly.
+        if len(foreign) == 1:
+            poly_common = self.root
+        else:
+            poly_common = self.get_common_ancestor(foreign[0], foreign[-1])
+        poly_start, poly_end = self.node2range[poly_common]
+        index = bisect_left(positions, poly_start)
+        if index < len(positions) and positions[index] < poly_end:
+            clade_type = "polyphyletic"
+        else:
+            clade_type = "paraphyletic"
+        return False, clade_type, set([self.leaves[pos] for pos in foreign])
+
+def _has_valid_stats(node):
+    return bool(node._stats)
+
+_LEAF_STATS = SubtreeStats(1, 0.0, 0.0, 0, 0, 0.0)
+
+def _get_node_stats(children, child_stats):
+    """ Returns the SubtreeStats of a node given its children and their
+    statistics."""
+    if not children:
+        return _LEAF_STATS
+    leaves, max_depth, min_depth, max_edges, min_edges, length = child_stats[0]
+    dist = children[0]._dist
+    max_depth += dist
+    min_depth += dist
+    length += dist
+    for i in range(1, len(children)):
+        ch_leaves, ch_max, ch_min, ch_max_edges, ch_min_edges, ch_length = child_stats[i]
+        dist = children[i]._dist
+        leaves += ch_leaves
+        if ch_max + dist > max_depth:
+            max_depth = ch_max + dist
+        if ch_min + dist < min_depth:
+            min_depth = ch_min + dist
+        if ch_max_edges > max_edges:
+            max_edges = ch_max_edges
+        if ch_min_edges < min_edges:
+            min_edges = ch_min_edges
+        length += ch_length + dist
+    return SubtreeStats(leaves, max_depth, min_depth, max_edges + 1,
+                        min_edges + 1, length)
+
+def _invalidate_stats(node):
+    """ Marks the cached statistics of node and its ancestors as
+    dirty. Nodes above a dirty or non cached node never hold valid
+    statistics, so there is no need to go further."""
+    while node is not None and node._stats:
+        node._stats = False
+        node = node._up
+
 # Alias
 #: .. currentmodule:: ete3
 Tree = TreeNode
@@ -0,0 +1,381 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+"""
+Fast generation of random binary trees.
+
+Random trees are generated as flat arrays holding one value per node, in
+preorder: the first and second child of every node (-1 for leaves),
+parent indexes, branch lengths, support values and leaf names. All
+random values are sampled at once with numpy, and trees can be written
+as newick or in the binary tree format, or converted into tree nodes,
+without creating any intermediate node instance.
+
+Supported models:
+
+  - "yule": pure birth process. Branch lengths are the waiting times
+    between speciation events, so trees are ultrametric.
+
+  - "coalescent": Kingman's coalescent. Branch lengths are the waiting
+    times between coalescence events, so trees are ultrametric.
+
+  - "uniform": all rooted labeled topologies are equally likely. Branch
+    lengths are sampled from a uniform distribution.
+"""
+from __future__ import absolute_import
+
+import array
+import itertools
+import random
+
+from six.moves import range, zip
+
+from .. import numpy
+from ..parser import newick
+from ..parser.binary_tree import _write_columns, _link_nodes
+from ..utils import without_gc
+
+__all__ = ["MODELS", "CompactTree", "random_tree"]
+
+MODELS = ["yule", "coalescent", "uniform"]
+
+class CompactTree(object):
+    """ Binary tree stored as flat arrays, one value per node in
+    preorder. The root node is always the first one.
+
+    :argument children: list of (first child, second child) index
+      tuples. Leaves have (-1, -1) as children.
+
+    :argument dists: list of branch lengths.
+
+    :argument supports: list of branch support values.
+
+    :argument names: list of node names.
+    """
+    def __init__(self, children, dists, supports, names):
+        self.children = children
+        self.dists = dists
+        self.supports = supports
+        self.names = names
+
+        self.parents = [-1] * len(children)
+        for index, (ch1, ch2) in enumerate(children):
+            if ch1 >= 0:
+                self.parents[ch1] = index
+                self.parents[ch2] = index
+
+    def __len__(self):
+        """ Returns the number of leaves """
+        return (len(self.children) + 1) // 2
+
+    def get_leaf_names(self):
+        """ Returns the list of leaf names, in preorder. """
+        return [name for (ch1, ch2), name in zip(self.children, self.names)
+                if ch1 < 0]
+
+    @without_gc
+    def to_tree(self, node_class=None):
+        """ Returns the root of a new tree with the same topology,
+        branch lengths, support values and names.
+
+        :argument None node_class: class used to create nodes. TreeNode
+          is used by default.
+        """
+        if node_class is None:
+            from .tree import TreeNode
+            node_class = TreeNode
+        nodes = _link_nodes(node_class, self.parents, self.dists, self.supports)
+        for node, name in zip(nodes, self.names):
+            node.name = name
+        return nodes[0]
+
+    def iter_newick(self, format=0, format_root_node=False, dist_formatter=None,
+                    support_formatter=None, name_formatter=None):
+        """ Iteratively exports the tree in newick format, yielding its
+        representation in chunks. Arguments are the same as in
+        :func:`TreeNode.write`. """
+        formatters = dict(dist_formatter=dist_formatter,
+                          support_formatter=support_formatter,
+                          name_formatter=name_formatter)
+        format_leaf = newick.get_node_formatter("leaf", format, **formatters)
+        format_internal = newick.get_node_formatter("internal", format, **formatters)
+
+        # A single object exposes the data of every formatted node
+        node = _NodeData()
+        children, names, dists, supports = self.children, self.names, self.dists, self.supports
+
+        chunk = []
+        append = chunk.append
+        # Nodes are pushed as their index, and as -index-1 when all
+        # their descendants have been visited
+        to_visit = [0]
+        pop = to_visit.pop
+        push = to_visit.append
+        while to_visit:
+            index = pop()
+            if index < 0:
+                index = -index - 1
+                append(")")
+                if index or format_root_node:
+                    node.name, node.dist, node.support = \
+                        names[index], dists[index], supports[index]
+                    append(format_internal(node))
+            else:
+                parent = self.parents[index]
+                if parent >= 0 and children[parent][1] == index:
+                    append(",")
+                ch1, ch2 = children[index]
+                if ch1 < 0:
+                    node.name, node.dist, node.support = \
+                        names[index], dists[index], supports[index]
+                    append(format_leaf(node))
+                else:
+                    append("(")
+                    push(-index - 1)
+                    push(ch2)
+                    push(ch1)
+
+            if len(chunk) >= newick.CHUNK_SIZE:
+                yield ''.join(chunk)
+                del chunk[:]
+
+        append(";")
+        yield ''.join(chunk)
+
+    def write(self, outfile=None, format=0, format_root_node=False,
+              dist_formatter=None, support_formatter=None, name_formatter=None):
+        """ Returns the newick representation of the tree or, if
+        outfile is provided, writes it to the given file path or
+        file-like object. Other arguments are the same as in
+        :func:`TreeNode.write`. """
+        chunks = self.iter_newick(format=format,
+                                  format_root_node=format_root_node,
+                                  dist_formatter=dist_formatter,
+                                  support_formatter=support_formatter,
+                                  name_formatter=name_formatter)
+        if outfile is None:
+            return ''.join(chunks)
+        elif hasattr(outfile, "write"):
+            outfile.writelines(chunks)
+        else:
+            with open(outfile, "w") as OUT:
+                OUT.writelines(chunks)
+
+    def dump_binary(self, outfile=None):
+        """ Saves the tree in the binary tree format (see
+        :func:`TreeNode.dump_binary`). If outfile is None, the binary
+        data is returned."""
+        return _write_columns(array.array("i", self.parents),
+                              array.array("d", self.dists),
+                              array.array("d", self.supports),
+                              [("name", self.names)], outfile)
+
+class _NodeData(object):
+    __slots__ = ["name", "dist", "support"]
+
+def random_tree(size, model="yule", names_library=None, reuse_names=False,
+                random_branches=False, branch_range=(0, 1), support_range=(0, 1),
+                rate=1.0, random_state=None):
+    """ Generates a random binary tree with the given number of leaves
+    and returns it as a :class:`CompactTree` instance.
+
+    :argument "yule" model: "yule", "coalescent" or "uniform".
+
+    :argument None names_library: If provided, names library (list,
+      set, dict, etc.) will be used to name leaves.
+
+    :argument False reuse_names: If True, names are randomly picked
+      from names_library, so they will not be necessarily unique.
+
+    :argument False random_branches: If True, support values (and
+      branch lengths of "uniform" trees) will be randomized. Otherwise,
+      they are set to 1.0.
+
+    :argument (0,1) branch_range: range of branch lengths of "uniform"
+      trees, when random_branches is True.
+
+    :argument (0,1) support_range: range of support values, when
+      random_branches is True.
+
+    :argument 1.0 rate: speciation rate of "yule" trees, or
+      coalescence rate of each pair of lineages in "coalescent" trees.
+
+    :argument None random_state: seed or numpy RandomState instance
+      used to sample random values. By default, it is seeded from the
+      :mod:`random` module, so random.seed() makes results reproducible.
+    """
+    if numpy is None:
+        raise ImportError("numpy is required to generate random trees")
+    if model not in MODELS:
+        raise ValueError("Unknown tree model [%s]. Use one of: %s" %(model, ", ".join(MODELS)))
+    if size < 1:
+        raise ValueError("Trees must have at least one leaf")
+
+    if random_state is None:
+        random_state = numpy.random.RandomState(random.getrandbits(32))
+    elif not isinstance(random_state, numpy.random.RandomState):
+        random_state = numpy.random.RandomState(random_state)
+
+    nnodes = 2 * size - 1
+    if model == "uniform":
+        root, first, second = _insert_leaves(size, random_state)
+        if random_branches:
+            dists = random_state.uniform(branch_range[0], branch_range[1], nnodes)
+        else:
+            dists = numpy.ones(nnodes)
+    else:
+        root = 0
+        first, second, dists = _split_lineages(size, model, rate, random_state)
+
+    # Nodes are sorted in preorder
+    order = _get_preorder(root, first, second)
+    index = numpy.empty(nnodes, dtype=int)
+    index[order] = numpy.arange(nnodes)
+    first = numpy.asarray(first)[order]
+    second = numpy.asarray(second)[order]
+    is_leaf = first < 0
+    first = numpy.where(is_leaf, -1, index[first])
+    second = numpy.where(is_leaf, -1, index[second])
+    dists = dists[order]
+    dists[0] = 0.0
+
+    if random_branches:
+        supports = random_state.uniform(support_range[0], support_range[1], nnodes)
+        supports[0] = 1.0
+    else:
+        supports = numpy.ones(nnodes)
+
+    nleaves = size
+    if names_library:
+        library = list(names_library)
+        if reuse_names:
+            leaf_names = [library[i] for i in random_state.randint(len(library), size=nleaves)]
+        elif len(library) < nleaves:
+            raise ValueError("names_library has less names than leaves")
+        else:
+            leaf_names = library[:nleaves]
+    else:
+        charset = "abcdefghijklmnopqrstuvwxyz"
+        avail_names = itertools.combinations_with_replacement(charset, 10)
+        leaf_names = [''.join(next(avail_names)) for _ in range(nleaves)]
+    names = [""] * nnodes
+    for i, name in zip(numpy.flatnonzero(is_leaf).tolist(), leaf_names):
+        names[i] = name
+
+    return CompactTree(list(zip(first.tolist(), second.tolist())),
+                       dists.tolist(), supports.tolist(), names)
+
+def _split_lineages(size, model, rate, random_state):
+    """ Grows a tree by splitting random lineages, as in the Yule
+    process (or by merging random lineages back in time, which results
+    in the same distribution of topologies). Returns the children of
+    each node and branch lengths. """
+    nnodes = 2 * size - 1
+    first = [-1] * nnodes
+    second = [-1] * nnodes
+    # Split in which each node is divided (leaves are never divided)
+    split = numpy.full(nnodes, size - 1, dtype=int)
+
+    # Index of the lineage divided in each split
+    picks = (random_state.random_sample(size - 1) * numpy.arange(1, size)).astype(int)
+    lineages = [0]
+    for step, lineage in enumerate(picks.tolist()):
+        node = lineages[lineage]
+        ch1, ch2 = 2 * step + 1, 2 * step + 2
+        first[node] = ch1
+        second[node] = ch2
+        split[node] = step
+        lineages[lineage] = ch1
+        lineages.append(ch2)
+
+    # Waiting times while there are k lineages
+    k = numpy.arange(2, size + 1, dtype=float)
+    if model == "yule":
+        rates = k * rate
+    else:
+        rates = k * (k - 1) / 2.0 * rate
+    # times[i] is the time of split i. The last value is the time of the
+    # present.
+    times = numpy.zeros(size)
+    numpy.cumsum(random_state.exponential(1.0 / rates), out=times[1:])
+
+    # Nodes 2i+1 and 2i+2 were created in split i
+    birth = numpy.zeros(nnodes)
+    birth[1:] = times[numpy.arange(nnodes - 1) // 2]
+    dists = times[split] - birth
+    return first, second, dists
+
+def _insert_leaves(size, random_state):
+    """ Grows a tree by attaching every new leaf to a random branch,
+    including the one above the root. Returns the root index and the
+    children of each node. """
+    nnodes = 2 * size - 1
+    first = [-1] * nnodes
+    second = [-1] * nnodes
+    parents = [-1] * nnodes
+    root = 0
+
+    # Branch in which the leaf is attached, out of the 2i-1 existing
+    # ones when there are i leaves.
+    picks = (random_state.random_sample(size - 1) * numpy.arange(1, 2 * size - 2, 2)).astype(int)
+    for step, node in enumerate(picks.tolist()):
+        new_parent, new_leaf = 2 * step + 1, 2 * step + 2
+        parent = parents[node]
+        parents[new_parent] = parent
+        if parent < 0:
+            root = new_parent
+        elif first[parent] == node:
+            first[parent] = new_parent
+        else:
+            second[parent] = new_parent
+        first[new_parent] = node
+        second[new_parent] = new_leaf
+        parents[node] = new_parent
+        parents[new_leaf] = new_parent
+    return root, first, second
+
+def _get_preorder(root, first, second):
+    order = []
+    to_visit = [root]
+    while to_visit:
+        node = to_visit.pop()
+        order.append(node)
+        if first[node] >= 0:
+            to_visit.append(second[node])
+            to_visit.append(first[node])
+    return order
@@ -132,14 +132,13 @@ class EvolNode(PhyloNode):
 
     def _label_internal_nodes(self, nid=None):
         """
-        nid needs to be a list in order to keep count through recursivity
+        nid needs to be a list in order to keep count across calls
         """
-        for node in self.get_children():
+        for node in self.iter_descendants("preorder"):
             if node.is_leaf():
                 continue
             nid[0] += 1
             node.add_feature('node_id', nid[0])
-            node._label_internal_nodes(nid)
 
     def _label_as_paml(self):
         '''
@@ -59,6 +59,8 @@ import tarfile
 import six
 from six.moves import map
 
+from ..coretype.tree import _LeafRanges
+
 
 c = None
 
@@ -526,32 +528,33 @@ class NCBITaxa(object):
         CURRENTLY EXPERIMENTAL
 
         """
-        if not n2content:
-            n2content = t.get_cached_content()
-
-        tax2node = defaultdict(set)
-
-        unknown = set()
-        for leaf in t.iter_leaves():
+        # Leaves are numbered in preorder, so the leaves under any node
+        # take a contiguous range of positions, and lineages are
+        # checked by comparing the number of known leaves in the range
+        # of their common ancestor. n2content is no longer needed.
+        ranges = _LeafRanges(t)
+        tax2positions = defaultdict(list)
+        known_before = [0]
+        for pos, leaf in enumerate(ranges.leaves):
             if leaf.sci_name.lower() != "unknown":
-                lineage = taxa_lineages[leaf.taxid]
-                for index, tax in enumerate(lineage):
-                    tax2node[tax].add(leaf)
+                for tax in taxa_lineages[leaf.taxid]:
+                    positions = tax2positions[tax]
+                    if not positions or positions[-1] != pos:
+                        positions.append(pos)
+                known_before.append(known_before[-1] + 1)
             else:
-                unknown.add(leaf)
+                known_before.append(known_before[-1])
 
         broken_branches = defaultdict(set)
         broken_clades = set()
-        for tax, leaves in six.iteritems(tax2node):
-            if len(leaves) > 1:
-                common = t.get_common_ancestor(leaves)
-            else:
-                common = list(leaves)[0]
-            if (leaves ^ set(n2content[common])) - unknown:
+        for tax, positions in six.iteritems(tax2positions):
+            common = ranges.get_common_ancestor(positions[0], positions[-1])
+            start, end = ranges.node2range[common]
+            if known_before[end] - known_before[start] > len(positions):
                 broken_branches[common].add(tax)
                 broken_clades.add(tax)
 
-        broken_clade_sizes = [len(tax2node[tax]) for tax in broken_clades]
+        broken_clade_sizes = [len(tax2positions[tax]) for tax in broken_clades]
         return broken_branches, broken_clades, broken_clade_sizes
 
 
@@ -0,0 +1,414 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+"""
+Compact binary serialization of tree structures.
+
+Trees are stored as a set of typed columns (one value per node, in
+preorder): the index of each node's parent, branch lengths, support
+values, names and any other node feature. String values are stored in
+tables of unique values, so repeated values (i.e. species codes) are
+only stored once. Feature values of other types are pickled.
+
+Files start with a fixed size preamble (magic string, format version and
+header size), followed by a JSON header describing the columns and the
+raw content of every column, aligned to 8 bytes.
+"""
+from __future__ import absolute_import
+
+import array
+import copy
+import json
+import mmap
+import struct
+import sys
+from itertools import count
+
+import six
+from six.moves import cPickle, range, zip
+
+from ..utils import without_gc
+
+__all__ = ["read_binary_tree", "write_binary_tree"]
+
+MAGIC = b"ETE3TREE"
+VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGNMENT = 8
+
+# Types that can be safely shared among nodes created from a template
+_IMMUTABLE_TYPES = (type(None), bool, float, tuple, frozenset, type,
+                    six.binary_type, six.text_type) + six.integer_types
+
+try:
+    array.array("q")
+    _INT64 = "q"
+except ValueError:
+    _INT64 = None
+
+class BinaryTreeError(Exception):
+    """Exception raised for malformed binary tree files."""
+    pass
+
+def write_binary_tree(root, outfile=None, features=None):
+    """ Serializes the tree under root in the binary tree format.
+
+    :argument None outfile: path or file-like object (opened in binary
+      mode) where the tree is written. If None, the binary data is
+      returned.
+
+    :argument None features: list of node features to store, in
+      addition to name, dist and support. All features are stored by
+      default.
+    """
+    nodes = list(root.traverse("preorder"))
+    node2index = dict((id(n), i) for i, n in enumerate(nodes))
+    parents = array.array("i", [-1] + [node2index[id(n.up)] for n in nodes[1:]])
+
+    if features is None:
+        features = []
+        visited = set(["name", "dist", "support"])
+        for n in nodes:
+            for f in n.features:
+                if f not in visited:
+                    visited.add(f)
+                    features.append(f)
+    else:
+        features = [f for f in features if f not in ("name", "dist", "support")]
+
+    feature_values = []
+    for fname in ["name"] + features:
+        if fname == "name":
+            values = [n.name for n in nodes]
+        else:
+            values = [getattr(n, fname, _MISSING) if fname in n.features else _MISSING
+                      for n in nodes]
+        feature_values.append((fname, values))
+
+    return _write_columns(parents, array.array("d", [n.dist for n in nodes]),
+                          array.array("d", [n.support for n in nodes]),
+                          feature_values, outfile)
+
+def _write_columns(parents, dists, supports, feature_values, outfile):
+    """ Writes a tree given as arrays of parent indexes, branch lengths
+    and support values (in preorder), and a list of (feature name,
+    values) tuples. """
+    columns = []
+    columns.append(("parents", "i", parents))
+    columns.append(("dist", "d", dists))
+    columns.append(("support", "d", supports))
+
+    header_features = []
+    for fname, values in feature_values:
+        ftype, fcolumns = _encode_column(values)
+        header_features.append({"name": fname, "type": ftype})
+        for suffix, typecode, data in fcolumns:
+            columns.append(("feature:%s:%s" %(fname, suffix), typecode, data))
+
+    sections = []
+    blobs = []
+    offset = 0
+    for name, typecode, data in columns:
+        if isinstance(data, array.array):
+            if sys.byteorder != "little":
+                data = array.array(data.typecode, data)
+                data.byteswap()
+            data = _array_to_bytes(data)
+        sections.append({"name": name, "type": typecode,
+                         "itemsize": array.array(typecode).itemsize,
+                         "offset": offset, "size": len(data)})
+        padding = (-len(data)) % _ALIGNMENT
+        blobs.append(data)
+        blobs.append(b"\0" * padding)
+        offset += len(data) + padding
+
+    header = json.dumps({"nodes": len(parents), "features": header_features,
+                         "sections": sections}).encode("utf-8")
+    header += b" " * ((-(_PREAMBLE.size + len(header))) % _ALIGNMENT)
+    chunks = [_PREAMBLE.pack(MAGIC, VERSION, len(header)), header] + blobs
+
+    if outfile is None:
+        return b"".join(chunks)
+    elif hasattr(outfile, "write"):
+        for chunk in chunks:
+            outfile.write(chunk)
+    else:
+        with open(outfile, "wb") as OUT:
+            for chunk in chunks:
+                OUT.write(chunk)
+
+def read_binary_tree(source, node_class=None):
+    """ Loads a tree stored in the binary tree format and returns its
+    root node.
+
+    :argument source: path to a binary tree file, which is memory
+      mapped while loading, or the binary data itself.
+
+    :argument None node_class: class used to create nodes. TreeNode
+      is used by default.
+    """
+    if node_class is None:
+        from ..coretype.tree import TreeNode
+        node_class = TreeNode
+
+    # Under python 2, paths and binary data are both str instances
+    if isinstance(source, (bytearray, memoryview)) or \
+       (isinstance(source, bytes) and (not six.PY2 or source.startswith(MAGIC))):
+        return _load(source, node_class)
+
+    with open(source, "rb") as handle:
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return _load(data, node_class)
+        finally:
+            data.close()
+
+@without_gc
+def _load(data, node_class):
+    view = memoryview(data)
+    try:
+        nnodes, features, columns = _read_sections(view)
+    finally:
+        # Open views would prevent closing a memory mapped file
+        if hasattr(view, "release"):
+            view.release()
+        del view
+
+    for name in ("parents", "dist", "support"):
+        if name not in columns:
+            raise BinaryTreeError("Missing section [%s]" %name)
+        if len(columns[name]) != nnodes:
+            raise BinaryTreeError("Wrong number of values in section [%s]" %name)
+    nodes = _link_nodes(node_class, columns["parents"], columns["dist"], columns["support"])
+
+    for fname, ftype in features:
+        prefix = "feature:%s:" %fname
+        fcolumns = dict((name[len(prefix):], values) for name, values in six.iteritems(columns)
+                        if name.startswith(prefix))
+        for suffix in ("index", "mask", "values"):
+            if suffix in fcolumns and len(fcolumns[suffix]) != nnodes:
+                raise BinaryTreeError("Wrong number of values in feature column [%s]" %fname)
+        try:
+            values = _decode_column(ftype, fcolumns, nnodes)
+        except (KeyError, IndexError) as e:
+            raise BinaryTreeError("Malformed feature column [%s]: %r" %(fname, e))
+        if len(values) != nnodes:
+            raise BinaryTreeError("Wrong number of values in feature column [%s]" %fname)
+        if fname == "name":
+            for node, value in zip(nodes, values):
+                node.name = value
+        else:
+            for node, value in zip(nodes, values):
+                if value is not _MISSING:
+                    setattr(node, fname, value)
+                    node.features.add(fname)
+
+    if not nodes:
+        raise BinaryTreeError("Empty tree")
+    return nodes[0]
+
+def _read_sections(view):
+    """ Parses the preamble and header of a binary tree file and returns
+    the number of nodes, the list of (name, type) features and a
+    dictionary with the content of every section. Byte
+    sections are copied, so no view of the data is kept. """
+    if len(view) < _PREAMBLE.size:
+        raise BinaryTreeError("Not a binary tree file")
+    magic, version, header_size = _PREAMBLE.unpack(view[:_PREAMBLE.size].tobytes())
+    if magic != MAGIC:
+        raise BinaryTreeError("Not a binary tree file")
+    if version > VERSION:
+        raise BinaryTreeError("Unsupported binary tree format version: %s" %version)
+    start = _PREAMBLE.size + header_size
+    if start > len(view):
+        raise BinaryTreeError("Truncated binary tree file")
+    try:
+        header = json.loads(view[_PREAMBLE.size:start].tobytes().decode("utf-8"))
+        nnodes = header["nodes"]
+        sections = [(sec["name"], str(sec["type"]), sec["itemsize"],
+                     start + sec["offset"], sec["size"]) for sec in header["sections"]]
+        features = [(f["name"], f["type"]) for f in header["features"]]
+    except (ValueError, KeyError, TypeError) as e:
+        raise BinaryTreeError("Malformed binary tree header: %r" %e)
+    if not isinstance(nnodes, six.integer_types) or nnodes < 0:
+        raise BinaryTreeError("Malformed binary tree header: wrong number of nodes")
+
+    columns = {}
+    for name, typecode, itemsize, begin, size in sections:
+        if not isinstance(begin, six.integer_types) or not isinstance(size, six.integer_types) \
+           or size < 0 or begin < start or begin + size > len(view):
+            raise BinaryTreeError("Section [%s] out of file bounds" %name)
+        if typecode == "B":
+            columns[name] = view[begin:begin + size].tobytes()
+            continue
+        try:
+            values = array.array(typecode)
+        except (ValueError, TypeError):
+            raise BinaryTreeError("Unknown type in section [%s]" %name)
+        if values.itemsize != itemsize or size % itemsize:
+            raise BinaryTreeError("Incompatible item size in section [%s]" %name)
+        raw = view[begin:begin + size]
+        try:
+            _array_from_bytes(values, raw)
+        finally:
+            if hasattr(raw, "release"):
+                raw.release()
+            del raw
+        if sys.byteorder != "little":
+            values.byteswap()
+        columns[name] = values
+    return nnodes, features, columns
+
+def _link_nodes(node_class, parents, dists, supports):
+    """ Creates and connects the nodes of a tree given as arrays of
+    parent indexes, branch lengths and support values, in preorder.
+    Returns the list of nodes. """
+    new_node = _get_node_factory(node_class)
+    nodes = [new_node() for _ in range(len(parents))]
+    for i, node, parent, dist, support in zip(count(), nodes, parents, dists, supports):
+        node._dist = dist
+        node._support = support
+        if i:
+            # Parents always precede their children
+            if not 0 <= parent < i:
+                raise BinaryTreeError("Wrong parent index for node %d" %i)
+            up = nodes[parent]
+            up._children.append(node)
+            node._up = up
+    return nodes
+
+# Column encoding
+
+_MISSING = object()
+
+def _encode_column(values):
+    """ Returns the type of a feature column and the list of sections
+    (suffix, typecode, data) storing its values."""
+    types = set(type(v) for v in values if v is not _MISSING)
+    mask = array.array("b", [0 if v is _MISSING else 1 for v in values])
+
+    if types == set([str]):
+        table = {}
+        index = array.array("i")
+        for v in values:
+            if v is _MISSING:
+                index.append(-1)
+            else:
+                index.append(table.setdefault(v, len(table)))
+        unique = [None] * len(table)
+        for v, i in six.iteritems(table):
+            unique[i] = v
+        offsets, blob = _encode_blobs([_str_to_bytes(v) for v in unique])
+        return "str", [("index", "i", index), ("offsets", offsets.typecode, offsets),
+                       ("data", "B", blob)]
+    elif types == set([float]):
+        data = array.array("d", [0.0 if v is _MISSING else v for v in values])
+        return "float", [("mask", "b", mask), ("values", "d", data)]
+    elif types == set([bool]):
+        data = array.array("b", [-1 if v is _MISSING else int(v) for v in values])
+        return "bool", [("values", "b", data)]
+    elif _INT64 and types == set([int]) and \
+         all([-2**63 <= v < 2**63 for v in values if v is not _MISSING]):
+        data = array.array(_INT64, [0 if v is _MISSING else v for v in values])
+        return "int", [("mask", "b", mask), ("values", _INT64, data)]
+    else:
+        offsets, blob = _encode_blobs([b"" if v is _MISSING else cPickle.dumps(v, 2)
+                                       for v in values])
+        return "pickle", [("mask", "b", mask), ("offsets", offsets.typecode, offsets),
+                          ("data", "B", blob)]
+
+def _decode_column(ftype, columns, nnodes):
+    if ftype == "str":
+        unique = [_bytes_to_str(v) for v in _decode_blobs(columns["offsets"], columns["data"])]
+        return [_MISSING if i < 0 else unique[i] for i in columns["index"]]
+    elif ftype == "float":
+        return [v if m else _MISSING for m, v in zip(columns["mask"], columns["values"])]
+    elif ftype == "bool":
+        return [_MISSING if v < 0 else bool(v) for v in columns["values"]]
+    elif ftype == "int":
+        return [int(v) if m else _MISSING for m, v in zip(columns["mask"], columns["values"])]
+    elif ftype == "pickle":
+        blobs = _decode_blobs(columns["offsets"], columns["data"])
+        return [cPickle.loads(b) if m else _MISSING for m, b in zip(columns["mask"], blobs)]
+    else:
+        raise BinaryTreeError("Unknown column type: %s" %ftype)
+
+def _encode_blobs(blobs):
+    offsets = array.array(_INT64 or "l", [0])
+    total = 0
+    for b in blobs:
+        total += len(b)
+        offsets.append(total)
+    return offsets, b"".join(blobs)
+
+def _decode_blobs(offsets, data):
+    if not len(offsets) or offsets[0] != 0 or offsets[-1] != len(data):
+        raise BinaryTreeError("Blob offsets do not match data size")
+    return [data[offsets[i]:offsets[i+1]] for i in range(len(offsets) - 1)]
+
+def _str_to_bytes(value):
+    return value if six.PY2 else value.encode("utf-8")
+
+def _bytes_to_str(value):
+    return value if six.PY2 else value.decode("utf-8")
+
+def _array_to_bytes(values):
+    return values.tobytes() if hasattr(values, "tobytes") else values.tostring()
+
+def _array_from_bytes(values, raw):
+    if hasattr(values, "frombytes"):
+        values.frombytes(raw)
+    else:
+        values.fromstring(raw.tobytes())
+
+def _get_node_factory(node_class):
+    """ Returns a function creating empty nodes of the given class.
+    Nodes are cloned from a template instance, which is much faster than
+    calling the class constructor for every node. """
+    template = node_class()
+    state = template.__dict__
+    mutable = [k for k, v in six.iteritems(state) if not isinstance(v, _IMMUTABLE_TYPES)]
+    new = node_class.__new__
+    def new_node():
+        node = new(node_class)
+        node_state = state.copy()
+        for key in mutable:
+            node_state[key] = copy.copy(state[key])
+        node.__dict__ = node_state
+        return node
+    return new_node
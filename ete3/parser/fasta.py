@@ -41,9 +41,48 @@ from __future__ import print_function
 
 import os
 import string
-import textwrap
 from sys import stderr as STDERR
 from six.moves import map
+from six.moves import range
+
+def _open_source(source):
+    """ Returns an iterator over the lines of a file (plain or gzipped)
+    or a text string."""
+    if os.path.isfile(source):
+        if source.endswith('.gz'):
+            import gzip
+            import io
+            return io.TextIOWrapper(gzip.open(source))
+        else:
+            return open(source)
+    else:
+        return iter(source.split("\n"))
+
+# Approximate number of characters joined into each chunk by the
+# streaming writers
+WRITE_BUFFER = 2**20
+
+def _write_chunks(chunks, outfile):
+    """ Writes the text chunks into outfile (a path or a file-like
+    object), or returns them as a single string if outfile is None."""
+    if outfile is None:
+        return "".join(chunks)
+    if hasattr(outfile, "write"):
+        outfile.writelines(chunks)
+    else:
+        with open(outfile, "w") as OUT:
+            OUT.writelines(chunks)
+
+def _iter_wrapped(seq, width, start=0):
+    """ Yields the lines of seq[start:] with the given width, separated by
+    newlines (not added after the last line) and grouped in chunks of
+    about WRITE_BUFFER characters."""
+    step = max(width, WRITE_BUFFER // width * width)
+    for chunk_start in range(start, len(seq), step):
+        if chunk_start > start:
+            yield "\n"
+        chunk_end = min(chunk_start + step, len(seq))
+        yield "\n".join([seq[k:k+width] for k in range(chunk_start, chunk_end, width)])
 
 def read_fasta(source, obj=None, header_delimiter="\t", fix_duplicates=True):
     """ Reads a collection of sequences econded in FASTA format."""
@@ -58,16 +97,11 @@ def read_fasta(source, obj=None, header_delimiter="\t", fix_duplicates=True):
     seq_id = -1
 
     # Prepares handle from which read sequences
-    if os.path.isfile(source):
-        if source.endswith('.gz'):
-            import gzip
-            _source = gzip.open(source)
-        else:
-            _source = open(source, "rU")
-    else:
-        _source = iter(source.split("\n"))
+    _source = _open_source(source)
 
     seq_name = None
+    # Sequence lines are joined once the whole entry has been read
+    seq_chunks = []
     for line in _source:
         line = line.strip()
         if line.startswith('#') or not line:
@@ -75,9 +109,12 @@ def read_fasta(source, obj=None, header_delimiter="\t", fix_duplicates=True):
         # Reads seq number
         elif line.startswith('>'):
             # Checks if previous name had seq
-            if seq_id>-1 and SC.id2seq[seq_id] == "":
-                raise Exception("No sequence found for "+seq_name)
-            
+            if seq_id>-1:
+                if not seq_chunks:
+                    raise Exception("No sequence found for "+seq_name)
+                SC.id2seq[seq_id] = "".join(seq_chunks)
+                seq_chunks = []
+
             seq_id += 1
             # Takes header info
             seq_header_fields = [_f.strip() for _f in line[1:].split(header_delimiter)]
@@ -105,7 +142,10 @@ def read_fasta(source, obj=None, header_delimiter="\t", fix_duplicates=True):
             s = line.strip().replace(" ","")
 
             # append to seq_string
-            SC.id2seq[seq_id] += s
+            seq_chunks.append(s)
+
+    if seq_id > -1:
+        SC.id2seq[seq_id] = "".join(seq_chunks)
 
     if seq_name and SC.id2seq[seq_id] == "":
         print(seq_name,"has no sequence", file=STDERR)
@@ -114,21 +154,65 @@ def read_fasta(source, obj=None, header_delimiter="\t", fix_duplicates=True):
     # Everything ok
     return SC
 
+def index_fasta(fname, header_delimiter="\t", fix_duplicates=True):
+    """ Scans a FASTA file and returns the list of its entries, without
+    loading the sequences. Each entry is a tuple containing the
+    sequence name, header comments and a list of (offset, length)
+    segments of the file in which the sequence is written."""
+
+    entries = []
+    names = set([])
+    seq_name = None
+    segments = None
+    offset = 0
+    # Lines are read in binary mode, so offsets are byte positions
+    with open(fname, "rb") as _source:
+        for raw_line in _source:
+            line_start = offset
+            offset += len(raw_line)
+            line = raw_line.decode("ascii", "replace").strip()
+            if line.startswith('#') or not line:
+                continue
+            elif line.startswith('>'):
+                if seq_name is not None and not segments:
+                    raise Exception("No sequence found for "+seq_name)
+
+                seq_header_fields = [_f.strip() for _f in line[1:].split(header_delimiter)]
+                seq_name = seq_header_fields[0]
+                if fix_duplicates and seq_name in names:
+                    tag = str(len([k for k in names if k.endswith(seq_name)]))
+                    old_name = seq_name
+                    seq_name = tag+"_"+seq_name
+                    print("Duplicated entry [%s] was renamed to [%s]" %(old_name, seq_name), file=STDERR)
+                names.add(seq_name)
+                segments = []
+                entries.append((seq_name, seq_header_fields[1:], segments))
+            else:
+                if seq_name is None:
+                    raise Exception("Error reading sequences: Wrong format.")
+                # Consecutive sequence lines are merged into a single
+                # segment
+                if segments and segments[-1][0] + segments[-1][1] == line_start:
+                    segments[-1][1] += len(raw_line)
+                else:
+                    segments.append([line_start, len(raw_line)])
+
+    if seq_name is not None and not segments:
+        raise Exception("No sequence found for "+seq_name)
+    return entries
+
 def write_fasta(sequences, outfile = None, seqwidth = 80):
-    """ Writes a SeqGroup python object using FASTA format. """
-
-    wrapper = textwrap.TextWrapper()
-    wrapper.break_on_hyphens = False
-    wrapper.replace_whitespace = False
-    wrapper.expand_tabs = False
-    wrapper.break_long_words = True
-    wrapper.width = 80
-    text =  '\n'.join([">%s\n%s\n" %( "\t".join([name]+comment), wrapper.fill(seq)) for
-                       name, seq, comment in sequences])
-
-    if outfile is not None:
-        OUT = open(outfile,"w")
-        OUT.write(text)
-        OUT.close()
-    else:
-        return text
+    """ Writes a SeqGroup python object using FASTA format. If outfile
+    (a path or file-like object) is provided, the text is written in
+    chunks and never fully built in memory. Otherwise, it is
+    returned. """
+    return _write_chunks(_iter_fasta_chunks(sequences, seqwidth), outfile)
+
+def _iter_fasta_chunks(sequences, seqwidth):
+    for i, (name, seq, comment) in enumerate(sequences):
+        if i:
+            yield "\n"
+        yield ">%s\n" %"\t".join([name]+comment)
+        for chunk in _iter_wrapped(seq, seqwidth):
+            yield chunk
+        yield "\n"
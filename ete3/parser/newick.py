@@ -43,12 +43,13 @@ import os
 import six
 from six.moves import map
 
-__all__ = ["read_newick", "write_newick", "print_supported_formats"]
+__all__ = ["read_newick", "write_newick", "iter_newick", "print_supported_formats"]
 
 ITERABLE_TYPES = set([list, set, tuple, frozenset])
 
 # Regular expressions used for reading newick format
 _ILEGAL_NEWICK_CHARS = ":;(),\[\]\t\n\r="
+_ILEGAL_NEWICK_RE = re.compile("["+_ILEGAL_NEWICK_CHARS+"]")
 _NON_PRINTABLE_CHARS_RE = "[\x00-\x1f]+"
 
 _NHX_RE = "\[&&NHX:[^\]]*\]"
@@ -64,6 +65,9 @@ FLOAT_FORMATTER = "%0.6g"
 #DIST_FORMATTER = ":"+FLOAT_FORMATTER
 NAME_FORMATTER = "%s"
 
+# Number of newick fragments joined into each chunk when writing
+CHUNK_SIZE = 10000
+
 def set_float_format(formatter):
     ''' Set the conversion format used to represent float distances and support
     values in the newick representation of trees.
@@ -130,6 +134,21 @@ def format_node(node, node_type, format,
                 dist_formatter=None,
                 support_formatter=None,
                 name_formatter=None):
+    node_formatter = get_node_formatter(node_type, format,
+                                        dist_formatter=dist_formatter,
+                                        support_formatter=support_formatter,
+                                        name_formatter=name_formatter)
+    return node_formatter(node)
+
+def get_node_formatter(node_type, format,
+                       dist_formatter=None,
+                       support_formatter=None,
+                       name_formatter=None):
+    """ Returns a function that formats the data of "leaf" or "internal"
+    nodes according to the given newick format. Format settings are
+    resolved only once, so the same function can be applied to all the
+    nodes in a tree."""
+
     if dist_formatter is None: dist_formatter = FLOAT_FORMATTER
     if support_formatter is None: support_formatter = FLOAT_FORMATTER
     if name_formatter is None: name_formatter = NAME_FORMATTER
@@ -147,41 +166,50 @@ def format_node(node, node_type, format,
         converterFn2 = NW_FORMAT[format][3][1]
         flexible1 = NW_FORMAT[format][2][2]
 
+    safe_text = _ILEGAL_NEWICK_RE.sub
+    empty_name = "NoName" if container1 == 'name' and not flexible1 else ""
+
     if converterFn1 == str:
-        try:
-            FIRST_PART = re.sub("["+_ILEGAL_NEWICK_CHARS+"]", "_", \
-                                  str(getattr(node, container1)))
-            if not FIRST_PART and container1 == 'name' and not flexible1:
-                FIRST_PART = "NoName"
-        except (AttributeError, TypeError):
-            FIRST_PART = "?"
-        FIRST_PART = name_formatter %FIRST_PART
+        def first_part(node):
+            try:
+                FIRST_PART = safe_text("_", str(getattr(node, container1)))
+                if not FIRST_PART:
+                    FIRST_PART = empty_name
+            except (AttributeError, TypeError):
+                FIRST_PART = "?"
+            return name_formatter %FIRST_PART
     elif converterFn1 is None:
-        FIRST_PART = ""
+        first_part = None
     else:
-        try:
-            #FIRST_PART =  "%0.6f" %(converterFn2(getattr(node, container1)))
-            FIRST_PART = support_formatter %(converterFn2(getattr(node, container1)))
-        except (ValueError, TypeError):
-            FIRST_PART = "?"
-
+        def first_part(node):
+            try:
+                return support_formatter %(converterFn2(getattr(node, container1)))
+            except (ValueError, TypeError):
+                return "?"
 
     if converterFn2 == str:
-        try:
-            SECOND_PART = ":"+re.sub("["+_ILEGAL_NEWICK_CHARS+"]", "_", \
-                                  str(getattr(node, container2)))
-        except (ValueError, TypeError):
-            SECOND_PART = ":?"
+        def second_part(node):
+            try:
+                return ":"+safe_text("_", str(getattr(node, container2)))
+            except (ValueError, TypeError):
+                return ":?"
     elif converterFn2 is None:
-        SECOND_PART = ""
+        second_part = None
     else:
-        try:
-            #SECOND_PART = ":%0.6f" %(converterFn2(getattr(node, container2)))
-            SECOND_PART = ":%s" %(dist_formatter %(converterFn2(getattr(node, container2))))
-        except (ValueError, TypeError):
-            SECOND_PART = ":?"
-
-    return "%s%s" %(FIRST_PART, SECOND_PART)
+        def second_part(node):
+            try:
+                return ":%s" %(dist_formatter %(converterFn2(getattr(node, container2))))
+            except (ValueError, TypeError):
+                return ":?"
+
+    if first_part is None and second_part is None:
+        return lambda node: ""
+    elif second_part is None:
+        return first_part
+    elif first_part is None:
+        return second_part
+    else:
+        return lambda node: first_part(node) + second_part(node)
 
 
 def print_supported_formats():
@@ -391,64 +419,118 @@ def write_newick(rootnode, features=None, format=1, format_root_node=True,
                  name_formatter=None):
     """ Iteratively export a tree structure and returns its NHX
     representation. """
+    return ''.join(iter_newick(rootnode, features=features, format=format,
+                               format_root_node=format_root_node,
+                               is_leaf_fn=is_leaf_fn,
+                               dist_formatter=dist_formatter,
+                               support_formatter=support_formatter,
+                               name_formatter=name_formatter))
+
+def iter_newick(rootnode, features=None, format=1, format_root_node=True,
+                is_leaf_fn=None, dist_formatter=None, support_formatter=None,
+                name_formatter=None):
+    """ Iteratively export a tree structure, yielding its NHX
+    representation in chunks of about CHUNK_SIZE nodes. Arguments are the
+    same as in :func:`write_newick`."""
+    formatters = dict(dist_formatter=dist_formatter,
+                      support_formatter=support_formatter,
+                      name_formatter=name_formatter)
+    format_leaf = get_node_formatter("leaf", format, **formatters)
+    format_internal = get_node_formatter("internal", format, **formatters)
+    format_features = _FeaturesFormatter(features)
+
     newick = []
+    append = newick.append
     leaf = is_leaf_fn if is_leaf_fn else lambda n: not bool(n.children)
     for postorder, node in rootnode.iter_prepostorder(is_leaf_fn=is_leaf_fn):
         if postorder:
-            newick.append(")")
+            append(")")
             if node.up is not None or format_root_node:
-                newick.append(format_node(node, "internal", format,
-                                          dist_formatter=dist_formatter,
-                                          support_formatter=support_formatter,
-                                          name_formatter=name_formatter))
-                newick.append(_get_features_string(node, features))
+                append(format_internal(node))
+                append(format_features(node))
         else:
-            if node is not rootnode and node != node.up.children[0]:
-                newick.append(",")
+            if node is not rootnode and node is not node.up.children[0]:
+                append(",")
 
             if leaf(node):
-                safe_name = re.sub("["+_ILEGAL_NEWICK_CHARS+"]", "_", \
-                               str(getattr(node, "name")))
-                newick.append(format_node(node, "leaf", format,
-                              dist_formatter=dist_formatter,
-                              support_formatter=support_formatter,
-                              name_formatter=name_formatter))
-                newick.append(_get_features_string(node, features))
+                append(format_leaf(node))
+                append(format_features(node))
             else:
-                newick.append("(")
+                append("(")
+
+        if len(newick) >= CHUNK_SIZE:
+            yield ''.join(newick)
+            del newick[:]
 
-    newick.append(";")
-    return ''.join(newick)
+    append(";")
+    yield ''.join(newick)
 
 def _get_features_string(self, features=None):
     """ Generates the extended newick string NHX with extra data about
     a node. """
-    string = ""
-    if features is None:
-        features = []
-    elif features == []:
-        features = self.features
+    return _FeaturesFormatter(features)(self)
 
-    for pr in features:
-        if hasattr(self, pr):
-            raw = getattr(self, pr)
-            if type(raw) in ITERABLE_TYPES:
-                raw = '|'.join(map(str, raw))
-            elif type(raw) == dict:
-                raw = '|'.join(map(lambda x,y: "%s-%s" %(x, y), six.iteritems(raw)))
-            elif type(raw) == str:
-                pass
-            else:
-                raw = str(raw)
+def _join_iterable(raw):
+    return '|'.join(map(str, raw))
 
-            value = re.sub("["+_ILEGAL_NEWICK_CHARS+"]", "_", \
-                             raw)
-            if string != "":
-                string +=":"
-            string +="%s=%s"  %(pr, str(value))
-    if string != "":
-        string = "[&&NHX:"+string+"]"
+def _join_dict(raw):
+    return '|'.join(["%s-%s" %(k, v) for k, v in six.iteritems(raw)])
 
-    return string
+_MISSING = object()
+_NUMERIC_TYPES = set(six.integer_types + (float, bool))
+
+# Text conversion of feature values by type. Strings are kept as they
+# are and any other type is converted using str()
+_FEATURE_CONVERTERS = {
+    list: _join_iterable,
+    set: _join_iterable,
+    tuple: _join_iterable,
+    frozenset: _join_iterable,
+    dict: _join_dict,
+}
+
+class _FeaturesFormatter(object):
+    """ Generates the NHX string of the given features for any node.
+    Newick-safe versions of feature values are cached, as the same
+    values (i.e. species names) are usually repeated across nodes. """
+
+    MAX_CACHE_SIZE = 10000
+
+    def __init__(self, features=None):
+        self.features = features
+        self.safe_values = {}
+
+    def get_safe_value(self, raw):
+        raw_type = type(raw)
+        if raw_type is str:
+            try:
+                return self.safe_values[raw]
+            except KeyError:
+                if len(self.safe_values) >= self.MAX_CACHE_SIZE:
+                    self.safe_values.clear()
+                safe_value = self.safe_values[raw] = _ILEGAL_NEWICK_RE.sub("_", raw)
+                return safe_value
+        elif raw_type in _NUMERIC_TYPES:
+            # Numbers never contain illegal newick characters
+            return str(raw)
+        converter = _FEATURE_CONVERTERS.get(raw_type, str)
+        return _ILEGAL_NEWICK_RE.sub("_", converter(raw))
+
+    def __call__(self, node):
+        features = self.features
+        if features is None:
+            return ""
+        elif features == []:
+            features = node.features
+
+        string = []
+        get_safe_value = self.get_safe_value
+        for pr in features:
+            raw = getattr(node, pr, _MISSING)
+            if raw is not _MISSING:
+                string.append("%s=%s" %(pr, get_safe_value(raw)))
+        if string:
+            return "[&&NHX:"+":".join(string)+"]"
+        return ""
 
 
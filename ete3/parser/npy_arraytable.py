@@ -0,0 +1,94 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+from __future__ import absolute_import
+
+import json
+import os
+
+from .. import numpy
+
+__all__ = ['read_npy_arraytable', 'write_npy_arraytable', 'get_names_file']
+
+def get_names_file(fname):
+    """ Returns the path of the file storing row and column names of a
+    binary matrix file."""
+    base, ext = os.path.splitext(fname)
+    if ext.lower() != ".npy":
+        base = fname
+    return base + ".names.json"
+
+def read_npy_arraytable(fname, mmap_mode="r", arraytable_object=None):
+    """ Reads a matrix stored in numpy binary format (.npy). Row and
+    column names are read from the companion names file.
+
+    :argument "r" mmap_mode: If not None, the matrix is memory-mapped
+      instead of loaded into memory (see numpy.load). Use "r+" or "c"
+      to allow modifications.
+    """
+    if arraytable_object is None:
+        from ..coretype import arraytable
+        A = arraytable.ArrayTable()
+    else:
+        A = arraytable_object
+
+    with open(get_names_file(fname)) as names_file:
+        names = json.load(names_file)
+
+    matrix = numpy.load(fname, mmap_mode=mmap_mode)
+    if matrix.ndim != 2:
+        raise ValueError("Expecting a 2D matrix in %s" % fname)
+
+    A.mtype = names.get("mtype", str(matrix.dtype))
+    A.rowNames = list(names["rows"])
+    A.colNames = list(names["cols"])
+    A._link_names2matrix(matrix)
+    return A
+
+def write_npy_arraytable(A, fname):
+    """ Writes the matrix of an ArrayTable in numpy binary format (.npy)
+    and its row and column names in a companion names file. """
+    numpy.save(fname, numpy.asarray(A.matrix))
+    if not fname.endswith(".npy"):
+        # numpy.save adds the extension
+        fname += ".npy"
+    with open(get_names_file(fname), "w") as names_file:
+        json.dump({"rows": list(A.rowNames),
+                   "cols": list(A.colNames),
+                   "mtype": A.mtype}, names_file)
+    return fname
@@ -40,12 +40,12 @@ from __future__ import print_function
 # #END_LICENSE#############################################################
 
 
-import os
 import string
 from sys import stderr as STDERR
 from re import search
 from six.moves import map
-from six.moves import range
+
+from .fasta import _open_source, _write_chunks, _iter_wrapped
 
 def read_paml (source, obj=None, header_delimiter="\t", fix_duplicates=True):
     """ Reads a collection of sequences econded in PAML format... that is, something between PHYLIP and fasta
@@ -89,15 +89,15 @@ def read_paml (source, obj=None, header_delimiter="\t", fix_duplicates=True):
     seq_id = -1
 
     # Prepares handle from which read sequences
-    if os.path.isfile(source):
-        _source = open(source, "rU")
-    else:
-        _source = iter(source.split("\n"))
+    _source = _open_source(source)
 
     seq_name = None
     num_seq = 0
     len_seq = 0
     in_seq  = False
+    # Sequence lines are joined once the whole entry has been read
+    seq_chunks = []
+    current_len = 0
     for line in _source:
         line = line.strip()
         if line.startswith('#') or not line:
@@ -106,8 +106,12 @@ def read_paml (source, obj=None, header_delimiter="\t", fix_duplicates=True):
         elif line.startswith('>') or ((num_seq and len_seq) and not in_seq):
             line = line.replace('>','')
             # Checks if previous name had seq
-            if seq_id>-1 and SC.id2seq[seq_id] == "":
-                raise Exception("No sequence found for "+seq_name)
+            if seq_id>-1:
+                if not seq_chunks:
+                    raise Exception("No sequence found for "+seq_name)
+                SC.id2seq[seq_id] = "".join(seq_chunks)
+                seq_chunks = []
+                current_len = 0
 
             seq_id += 1
             # Takes header info
@@ -143,13 +147,17 @@ def read_paml (source, obj=None, header_delimiter="\t", fix_duplicates=True):
                 s = line.strip().replace(" ","")
 
                 # append to seq_string
-                SC.id2seq[seq_id] += s
+                seq_chunks.append(s)
+                current_len += len(s)
                 if len_seq:
-                    if len(SC.id2seq[seq_id]) == len_seq:
+                    if current_len == len_seq:
                         in_seq=False
-                    elif len(SC.id2seq[seq_id]) > len_seq:
+                    elif current_len > len_seq:
                         raise  Exception("Error reading sequences: Wrong sequence length.\n"+line)
 
+    if seq_id > -1:
+        SC.id2seq[seq_id] = "".join(seq_chunks)
+
     if seq_name and SC.id2seq[seq_id] == "":
         print(seq_name,"has no sequence", file=STDERR)
         return None
@@ -161,20 +169,22 @@ def write_paml(sequences, outfile = None, seqwidth = 80):
     """
     Writes a SeqGroup python object using PAML format.
     sequences are ordered, because PAML labels tree according to this.
+    If outfile (a path or file-like object) is provided, the text is
+    written in chunks and never fully built in memory.
     """
-    text =  ' %d %d\n' % (len (sequences), len (sequences.get_entries()[0][1]))
-    text += '\n'.join(["%s\n%s" %( "\t".join([name]+comment), _seq2str(seq)) for
-                       name, seq, comment in sorted(sequences)])
-    if outfile is not None:
-        OUT = open(outfile,"w")
-        OUT.write(text)
-        OUT.close()
-    else:
-        return text
-
-def _seq2str(seq, seqwidth = 80):
-    sequence = ""
-    for i in range(0,len(seq),seqwidth):
-        sequence+= seq[i:i+seqwidth] + "\n"
-    return sequence
-
+    return _write_chunks(_iter_paml_chunks(sequences, seqwidth), outfile)
+
+def _iter_paml_chunks(sequences, seqwidth):
+    names = sorted(sequences.name2id)
+    seqlen = len(sequences.get_seq(names[0])) if names else 0
+    yield ' %d %d\n' % (len(sequences), seqlen)
+    for i, name in enumerate(names):
+        seqid = sequences.name2id[name]
+        seq = sequences.id2seq[seqid]
+        if i:
+            yield "\n"
+        yield "%s\n" %"\t".join([name]+sequences.id2comment.get(seqid, []))
+        for chunk in _iter_wrapped(seq, seqwidth):
+            yield chunk
+        if seq:
+            yield "\n"
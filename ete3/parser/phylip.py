@@ -39,124 +39,171 @@ from __future__ import print_function
 #
 # #END_LICENSE#############################################################
 
-import os
 import re
 from sys import stderr as STDERR
 import six
 from six.moves import range
 
-def read_phylip(source, interleaved=True, obj=None,
-                relaxed=False, fix_duplicates=True):
-    if obj is None:
-        from ..coretype import SeqGroup
-        SG = SeqGroup()
-    else:
-        SG = obj
+from .. import numpy
+from .fasta import _open_source, _write_chunks, _iter_wrapped
 
-    # Prepares handle from which read sequences
-    if os.path.isfile(source):
-        if source.endswith('.gz'):
-            import gzip
-            _source = gzip.open(source)
-        else:
-            _source = open(source, "rU")
-    else:
-        _source = iter(source.split("\n"))
+_WHITESPACE = re.compile(r"\s")
+
+# Approximate number of characters retrieved at once from all sequences
+# when writing interleaved alignments. Larger windows of columns need
+# fewer accesses to each sequence.
+INTERLEAVED_BUFFER = 2**25
+
+def _scan_phylip(lines, interleaved, relaxed, fix_duplicates):
+    """ Parses phylip lines, given as (offset, line) tuples, and yields a
+    (seqid, name, offset, column, end, fragment) tuple for every piece of sequence
+    found. ``name`` is only reported with the first fragment of each
+    sequence, ``column`` is the position in the line at which the
+    fragment starts, ``end`` is the length of the raw line and
+    ``fragment`` contains the sequence characters (whitespace
+    removed)."""
 
     nchar, ntax = None, None
-    counter = 0
     id_counter = 0
-    for line in _source:
-        line = line.strip("\n")
+    names = []
+    name2id = {}
+    lengths = []
+    for offset, line in lines:
+        end = len(line)
+        line = line.strip("\n").rstrip("\r")
         # Passes comments and blank lines
         if not line or line[0] == "#":
             continue
         # Reads head
         if not nchar or not ntax:
-            m = re.match("^\s*(\d+)\s+(\d+)",line)
+            m = re.match(r"^\s*(\d+)\s+(\d+)",line)
             if m:
                 ntax  = int (m.groups()[0])
                 nchar = int (m.groups()[1])
             else:
                 raise Exception("A first line with the alignment dimension is required")
-        # Reads sequences
-        else:
-            if not interleaved:
-                # Reads names and sequences
-                if SG.id2name.get(id_counter, None) is None:
-                    if relaxed:
-                        m = re.match("^([^ ]+)(.+)", line)
-                    else:
-                        m = re.match("^(.{10})(.+)", line)
-                    if m:
-                        name = m.groups()[0].strip()
-                        if fix_duplicates and name in SG.name2id:
-                            tag = str(len([k for k in list(SG.name2id.keys()) \
-                                              if k.endswith(name)]))
-                            old_name = name
-                            # Tag is in the beginning to avoid being
-                            # cut it by the 10 chars limit
-                            name = tag+"_"+name
-                            print("Duplicated entry [%s] was renamed to [%s]" %\
-                                (old_name, name), file=STDERR)
-                        SG.id2name[id_counter] = name
-                        SG.name2id[name] = id_counter
-                        SG.id2seq[id_counter] = ""
-                        line = m.groups()[1]
-                    else:
-                        raise Exception("Wrong phylip sequencial format.")
-                SG.id2seq[id_counter] += re.sub("\s","", line)
-                if len(SG.id2seq[id_counter]) == nchar:
-                    id_counter += 1
-                    name = None
-                elif len(SG.id2seq[id_counter]) > nchar:
-                    raise Exception("Unexpected length of sequence [%s] [%s]." %(name,SG.id2seq[id_counter]))
+            continue
+
+        name, column = None, 0
+        if (not interleaved and id_counter == len(names)) or \
+           (interleaved and len(names) < ntax):
+            # Reads names and sequences
+            if relaxed:
+                m = re.match("^([^ ]+)(.+)", line)
             else:
-                if len(SG)<ntax:
-                    if relaxed:
-                        m = re.match("^([^ ]+)(.+)", line)
-                    else:
-                        m = re.match("^(.{10})(.+)",line)
-                    if m:
-                        name = m.groups()[0].strip()
-
-                        seq = re.sub("\s","",m.groups()[1])
-                        SG.id2seq[id_counter] = seq
-                        SG.id2name[id_counter] = name
-                        if fix_duplicates and name in SG.name2id:
-                            tag = str(len([k for k in list(SG.name2id.keys()) \
-                                              if k.endswith(name)]))
-                            old_name = name
-                            name = tag+"_"+name
-                            print("Duplicated entry [%s] was renamed to [%s]" %\
-                                (old_name, name), file=STDERR)
-                        SG.name2id[name] = id_counter
-                        id_counter += 1
-                    else:
-                        raise Exception("Unexpected number of sequences.")
+                m = re.match("^(.{10})(.+)",line)
+            if not m:
+                if interleaved:
+                    raise Exception("Unexpected number of sequences.")
                 else:
-                    seq = re.sub("\s", "", line)
-                    if id_counter == len(SG):
-                        id_counter = 0
-                    SG.id2seq[id_counter] += seq
-                    id_counter += 1
+                    raise Exception("Wrong phylip sequencial format.")
+            name = m.groups()[0].strip()
+            if fix_duplicates and name in name2id:
+                tag = str(len([k for k in names if k.endswith(name)]))
+                old_name = name
+                # Tag is in the beginning to avoid being
+                # cut it by the 10 chars limit
+                name = tag+"_"+name
+                print("Duplicated entry [%s] was renamed to [%s]" %\
+                    (old_name, name), file=STDERR)
+            if interleaved:
+                id_counter = len(names)
+            names.append(name)
+            name2id[name] = id_counter
+            lengths.append(0)
+            column = m.start(2)
+        elif interleaved and id_counter == len(names):
+            id_counter = 0
+
+        fragment = _WHITESPACE.sub("", line[column:])
+        lengths[id_counter] += len(fragment)
+        yield id_counter, name, offset, column, end, fragment
+
+        if not interleaved:
+            if lengths[id_counter] == nchar:
+                id_counter += 1
+            elif lengths[id_counter] > nchar:
+                raise Exception("Unexpected length of sequence [%s]." %(names[id_counter]))
+        else:
+            id_counter += 1
 
-    if len(SG) != ntax:
+    if len(names) != ntax:
         raise Exception("Unexpected number of sequences.")
 
     # Check lenght of all seqs
-    for i in list(SG.id2seq.keys()):
-        if len(SG.id2seq[i]) != nchar:
-            raise Exception("Unexpected lenght of sequence [%s]" %SG.id2name[i])
+    for i, length in enumerate(lengths):
+        if length != nchar:
+            raise Exception("Unexpected lenght of sequence [%s]" %names[i])
+
+def read_phylip(source, interleaved=True, obj=None,
+                relaxed=False, fix_duplicates=True):
+    if obj is None:
+        from ..coretype import SeqGroup
+        SG = SeqGroup()
+    else:
+        SG = obj
+
+    # Prepares handle from which read sequences
+    _source = _open_source(source)
+
+    # Sequence fragments are joined once all of them have been read
+    seq_chunks = []
+    for seqid, name, offset, column, end, fragment in \
+            _scan_phylip(((None, line) for line in _source), interleaved,
+                         relaxed, fix_duplicates):
+        if name is not None:
+            SG.id2name[seqid] = name
+            SG.name2id[name] = seqid
+            seq_chunks.append([])
+        seq_chunks[seqid].append(fragment)
+
+    for seqid, chunks in enumerate(seq_chunks):
+        SG.id2seq[seqid] = "".join(chunks)
 
     return SG
 
-def write_phylip(aln, outfile=None, interleaved=True, relaxed=False):
-    width = 60
-    seq_visited = set([])
+def index_phylip(fname, interleaved=True, relaxed=False, fix_duplicates=True):
+    """ Scans a phylip file and returns the list of its entries, without
+    loading the sequences. Each entry is a tuple containing the
+    sequence name, an empty list of comments and a list of (offset,
+    length) segments of the file in which the sequence is written."""
 
-    show_name_warning = False
-    lenghts = set((len(seq) for seq in list(aln.id2seq.values())))
+    def iter_lines(handle):
+        offset = 0
+        for raw_line in handle:
+            # latin-1 maps every byte to a single character, so columns
+            # are also byte positions
+            yield offset, raw_line.decode("latin-1")
+            offset += len(raw_line)
+
+    entries = []
+    with open(fname, "rb") as handle:
+        for seqid, name, offset, column, end, fragment in \
+                _scan_phylip(iter_lines(handle), interleaved, relaxed,
+                             fix_duplicates):
+            if name is not None:
+                entries.append((name, [], []))
+            segments = entries[seqid][2]
+            start = offset + column
+            # Consecutive lines of the same sequence are merged into a
+            # single segment
+            if segments and segments[-1][0] + segments[-1][1] == start:
+                segments[-1][1] += end - column
+            else:
+                segments.append([start, end - column])
+    return entries
+
+def write_phylip(aln, outfile=None, interleaved=True, relaxed=False):
+    """ Writes a SeqGroup python object using PHYLIP format. If outfile
+    (a path or file-like object) is provided, the text is written in
+    chunks and never fully built in memory. Otherwise, it is
+    returned. """
+    # Sequences are validated before any output is written
+    get_length = getattr(aln.id2seq, "get_length", None)
+    if get_length is not None:
+        lenghts = set((get_length(seqid) for seqid in aln.id2seq))
+    else:
+        lenghts = set((len(seq) for seq in six.itervalues(aln.id2seq)))
     if len(lenghts) >1:
         raise Exception("Phylip format requires sequences of equal lenght.")
     seqlength = lenghts.pop()
@@ -166,47 +213,107 @@ def write_phylip(aln, outfile=None, interleaved=True, relaxed=False):
     else:
         name_fix = max([len(name) for name in list(aln.id2name.values())])
 
-    alg_lines = []
-    alg_text = " %d %d" %(len(aln), seqlength)
-    alg_lines.append(alg_text)
+    chunks = _iter_phylip_chunks(aln, seqlength, name_fix, interleaved, relaxed)
+    return _write_chunks(chunks, outfile)
+
+def _format_blocks(prefixes, blanks, segments, width):
+    """ Returns the interleaved blocks of lines for the given sequence
+    segments, using prefixes for the first block and blanks for the
+    rest. Each block is preceded by an empty line."""
+    if numpy is not None and len(segments[0]) >= width and width % 10 == 0:
+        try:
+            return _format_blocks_numpy(prefixes, blanks, segments, width)
+        except UnicodeError:
+            pass
+
+    blocks = []
+    for i in range(0, len(segments[0]), width):
+        lines = [""]
+        for prefix, segment in zip(prefixes if i == 0 else blanks, segments):
+            seq = segment[i:i+width]
+            lines.append(prefix + ' '.join([seq[k:k+10] for k in range(0, len(seq), 10)]))
+        lines.append("")
+        blocks.append("\n".join(lines))
+    return "".join(blocks)
+
+def _format_blocks_numpy(prefixes, blanks, segments, width):
+    # Full blocks are laid out in a preallocated byte matrix, with one
+    # row per block containing a newline followed by all its lines
+    nseqs = len(segments)
+    seqlen = len(segments[0])
+    nblocks = seqlen // width
+    prefix_len = len(prefixes[0])
+    line_len = prefix_len + width + width // 10
+    encoded = [_to_bytes(seg[:nblocks*width]) for seg in segments]
+    residues = numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8)
+    residues = residues.reshape(nseqs, nblocks, width).transpose(1, 0, 2)
+
+    lines = numpy.empty((nblocks, nseqs, line_len), dtype=numpy.uint8)
+    lines.fill(ord(" "))
+    lines[:, :, -1] = ord("\n")
+    lines[0, :, :prefix_len] = _to_byte_matrix(prefixes)
+    lines[1:, :, :prefix_len] = _to_byte_matrix(blanks)
+    columns = numpy.arange(width)
+    lines[:, :, prefix_len + columns + columns // 10] = residues
+
+    blocks = numpy.empty((nblocks, 1 + nseqs * line_len), dtype=numpy.uint8)
+    blocks[:, 0] = ord("\n")
+    blocks[:, 1:] = lines.reshape(nblocks, nseqs * line_len)
+    text = blocks.tobytes()
+    if not isinstance(text, str):
+        text = text.decode("latin-1")
+
+    if seqlen % width:
+        remaining = [seg[nblocks*width:] for seg in segments]
+        text += _format_blocks(blanks, blanks, remaining, width)
+    return text
+
+def _to_bytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode("latin-1")
+
+def _to_byte_matrix(strings):
+    data = _to_bytes("".join(strings))
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(len(strings), -1)
+
+def _iter_phylip_chunks(aln, seqlength, name_fix, interleaved, relaxed):
+    width = 60
+    show_name_warning = False
+
+    yield " %d %d" %(len(aln), seqlength)
     if interleaved:
-        visited = set([])
-        for i in range(0, seqlength, width):
-            for j in six.iterkeys(aln.id2name): #xrange(len(aln)):
-                name =  aln.id2name[j]
-                if not relaxed and len(name)>name_fix:
-                    name = name[:name_fix]
-                    show_name_warning = True
-
-                seq = aln.id2seq[j][i:i+width]
-                if j not in visited:
-                    name_str = "%s   " %name.ljust(name_fix)
-                    visited.add(j)
-                else:
-                    name_str = "".ljust(name_fix+3)
+        seqids = list(aln.id2name.keys())
+        names = []
+        for j in seqids:
+            name = aln.id2name[j]
+            if not relaxed and len(name)>name_fix:
+                name = name[:name_fix]
+                show_name_warning = True
+            names.append("%s   " %name.ljust(name_fix))
+        blanks = ["".ljust(name_fix+3)] * len(names)
 
-                seq_str = ' '.join([seq[k:k+10] for k in range(0, len(seq), 10)])
-                line_str = "%s%s" %(name_str, seq_str)
-                alg_lines.append(line_str)
-            alg_lines.append("")
+        # Sequences are sliced in windows of columns. Sequences stored
+        # on disk are sliced without reading them in full, if possible.
+        get_slice = getattr(aln.id2seq, "get_slice", None)
+        if get_slice is None:
+            get_slice = lambda seqid, start, end: aln.id2seq[seqid][start:end]
+        window = max(width, INTERLEAVED_BUFFER // max(len(seqids), 1) // width * width)
+        for w in range(0, seqlength, window):
+            segments = [get_slice(j, w, w+window) for j in seqids]
+            # Names are only shown in the first block
+            prefixes = names if w == 0 else blanks
+            yield _format_blocks(prefixes, blanks, segments, width)
     else:
+        first_width = width-name_fix-3
         for name, seq, comments in aln.iter_entries():
             if not relaxed and len(name)>10:
                 name = name[:name_fix]
                 show_name_warning = True
-            line_str = "%s   %s\n%s" %\
-                (name.ljust(name_fix), seq[0:width-name_fix-3], '\n'.join([seq[k:k+width]  \
-                                      for k in range(width-name_fix-3, len(seq), width)]))
-            alg_lines.append(line_str)
-        alg_lines.append("")
-
+            yield "\n%s   %s\n" %(name.ljust(name_fix), seq[0:first_width])
+            for chunk in _iter_wrapped(seq, width, start=first_width):
+                yield chunk
+        yield "\n"
 
     if show_name_warning:
         print("Warning! Some sequence names were cut to 10 characters!!", file=STDERR)
-    alg_text = '\n'.join(alg_lines)
-    if outfile is not None:
-        OUT = open(outfile, "w")
-        OUT.write(alg_text)
-        OUT.close()
-    else:
-        return alg_text
@@ -40,6 +40,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import re
+import warnings
 from sys import stderr
 
 from .. import numpy
@@ -48,6 +49,25 @@ from six.moves import map
 
 __all__ = ['read_arraytable', 'write_arraytable']
 
+# Number of matrix rows converted to numpy at once
+CHUNK_SIZE = 10000
+
+def _parse_chunk(rows, ncols, mtype):
+    """ Converts a list of rows (tab-delimited value fields) into a
+    numpy matrix. Empty fields are read as nan. """
+    with warnings.catch_warnings():
+        # numpy warns when the text cannot be fully parsed, which is
+        # handled by the slow path below
+        warnings.simplefilter("ignore")
+        values = numpy.fromstring("\t".join(rows), dtype=mtype, sep="\t")
+    if values.size == len(rows) * ncols:
+        return values.reshape(len(rows), ncols)
+
+    # Empty or blank fields
+    fields = numpy.char.strip(numpy.array([r.split("\t") for r in rows], dtype=str))
+    fields[fields == ""] = "nan"
+    return fields.astype(mtype).reshape(len(rows), ncols)
+
 def read_arraytable(matrix_file, mtype="float", arraytable_object = None):
     """ Reads a text tab-delimited matrix from file """
 
@@ -58,9 +78,12 @@ def read_arraytable(matrix_file, mtype="float", arraytable_object = None):
         A = arraytable_object
 
     A.mtype          = mtype
+    chunks              = []
     temp_matrix         = []
     rowname_counter     = {}
     colname_counter     = {}
+    rownames            = set()
+    colnames            = set()
     row_dup_flag = False
     col_dup_flag = False
 
@@ -78,21 +101,20 @@ def read_arraytable(matrix_file, mtype="float", arraytable_object = None):
         # Skip empty lines
         if not line:
             continue
-        # Get fields in line
-        fields = line.split("\t")
         # Read column names
-        if line[0]=='#' and re.match("#NAMES",fields[0],re.IGNORECASE):
+        if line[0]=='#' and re.match("#NAMES",line,re.IGNORECASE):
+            fields = line.split("\t")
             counter = 0
             for colname in fields[1:]:
                 colname = colname.strip()
 
                 # Handle duplicated col names by adding a number
                 colname_counter[colname] = colname_counter.get(colname,0) + 1
-                if colname in A.colValues:
+                if colname in colnames:
                     colname += "_%d" % colname_counter[colname]
                     col_dup_flag = True
                 # Adds colname
-                A.colValues[colname] = None
+                colnames.add(colname)
                 A.colNames.append(colname)
             if col_dup_flag:
                 print("Duplicated column names were renamed.", file=stderr)
@@ -104,29 +126,28 @@ def read_arraytable(matrix_file, mtype="float", arraytable_object = None):
         # Read values (only when column names are loaded)
         elif A.colNames:
             # Checks shape
-            if len(fields)-1 != len(A.colNames):
+            if line.count("\t") != len(A.colNames):
                 raise ValueError("Invalid number of columns. Expecting:%d" % len(A.colNames))
 
             # Extracts row name and remove it from fields
-            rowname  = fields.pop(0).strip()
+            rowname, values = line.split("\t", 1)
+            rowname = rowname.strip()
 
             # Handles duplicated row names by adding a number
             rowname_counter[rowname] = rowname_counter.get(rowname,0) + 1
-            if rowname in A.rowValues:
+            if rowname in rownames:
                 rowname += "_%d" % rowname_counter[rowname]
-                row_dup_names = True
+                row_dup_flag = True
 
             # Adds row name
-            A.rowValues[rowname] = None
+            rownames.add(rowname)
             A.rowNames.append(rowname)
 
-            # Reads row values
-            values = []
-            for f in fields:
-                if f.strip()=="":
-                    f = numpy.nan
-                values.append(f)
+            # Row values are converted to numpy in chunks
             temp_matrix.append(values)
+            if len(temp_matrix) == CHUNK_SIZE:
+                chunks.append(_parse_chunk(temp_matrix, len(A.colNames), A.mtype))
+                temp_matrix = []
         else:
             raise ValueError("Column names are required.")
 
@@ -134,7 +155,12 @@ def read_arraytable(matrix_file, mtype="float", arraytable_object = None):
         print("Duplicated row names were renamed.", file=stderr)
 
     # Convert all read lines into a numpy matrix
-    vmatrix = numpy.array(temp_matrix).astype(A.mtype)
+    if temp_matrix or not chunks:
+        chunks.append(_parse_chunk(temp_matrix, len(A.colNames), A.mtype))
+    if len(chunks) == 1:
+        vmatrix = chunks[0]
+    else:
+        vmatrix = numpy.concatenate(chunks)
 
     # Updates indexes to link names and vectors in matrix
     A._link_names2matrix(vmatrix)
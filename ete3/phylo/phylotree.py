@@ -51,7 +51,7 @@ import os
 import re
 import itertools
 from collections import defaultdict
-from .. import TreeNode, SeqGroup, NCBITaxa
+from .. import TreeNode, SeqGroup, SeqMatrix, NCBITaxa
 from .reconciliation import get_reconciled_tree
 from . import spoverlap
 
@@ -201,10 +201,31 @@ def iter_sptrees(sptrees, nid2node, features=None, newick_only=False):
             yield t
 
 def _get_subtrees_recursive(node, full_copy=True):
+    # The subtrees of every node are computed before the ones of the
+    # nodes depending on them (using an explicit stack instead of
+    # recursion, so very deep trees can be processed)
+    calls = []
+    to_visit = [node]
+    while to_visit:
+        _n = to_visit.pop(-1)
+        calls.append(_n)
+        if is_dup(_n):
+            to_visit.extend(_n.children)
+        else:
+            for dp in _n.iter_leaves(is_leaf_fn=is_dup):
+                if is_dup(dp):
+                    to_visit.extend(dp.children)
+
+    node2subtrees = {}
+    for _n in reversed(calls):
+        node2subtrees[_n] = _get_node_subtrees(_n, node2subtrees, full_copy)
+    return node2subtrees[node]
+
+def _get_node_subtrees(node, node2subtrees, full_copy):
     if is_dup(node):
         sp_trees = []
         for ch in node.children:
-            sp_trees.extend(_get_subtrees_recursive(ch, full_copy=full_copy))
+            sp_trees.extend(node2subtrees.pop(ch))
         return sp_trees
 
     # saves a list of duplication nodes under current node
@@ -225,7 +246,7 @@ def _get_subtrees_recursive(node, full_copy=True):
             #get all sibling sptrees in each side of the
             #duplication. Each subtree is pointed to its anchor
             for ch in dp.children:
-                for subt in _get_subtrees_recursive(ch, full_copy=full_copy):
+                for subt in node2subtrees.pop(ch):
                     if not full_copy:
                         subt = node.__class__(subt)
                     subt.up = anchor
@@ -249,7 +270,7 @@ def _get_subtrees_recursive(node, full_copy=True):
             if full_copy:
                  back_up = node.up
                  node.up = None
-                 _node = node.copy()
+                 _node = node.copy("clone")
                  node.up = back_up
             else:
                 _node = node.write(format=9, features=["name", "evoltype"])
@@ -261,7 +282,7 @@ def _get_subtrees_recursive(node, full_copy=True):
         if full_copy:
             back_up = node.up
             node.up = None
-            _node = node.copy()
+            _node = node.copy("clone")
             node.up = back_up
         else:
             _node = node.write(format=9, features=["name", "evoltype"])
@@ -275,11 +296,16 @@ def get_subparts(n):
         return getattr(n, "evoltype", None) == "D"
 
     subtrees = []
-    if is_dup(n):
-        for ch in n.get_children():
-            ch.detach()
-            subtrees.extend(get_subparts(ch))
-    else:
+    to_process = [n]
+    while to_process:
+        n = to_process.pop(-1)
+        if is_dup(n):
+            children = n.get_children()
+            for ch in children:
+                ch.detach()
+            to_process.extend(reversed(children))
+            continue
+
         to_visit = []
         for _n in n.iter_leaves(is_leaf_fn=is_dup):
             if is_dup(_n):
@@ -303,8 +329,9 @@ def get_subparts(n):
         else:
             subtrees.append(n)
 
-        for _n in to_visit:
-            subtrees.extend(get_subparts(_n))
+        # subparts under duplications are processed next, keeping the
+        # same order as in a recursive traversal
+        to_process.extend(reversed(to_visit))
 
     return subtrees
 
@@ -379,6 +406,35 @@ class PhyloNode(TreeNode):
     #manually set (see :func:`PhyloNode.set_species_naming_function`).
     species = property(fget = _get_species, fset = _set_species)
 
+    # Sequences linked by reference (see link_to_alignment) are kept in
+    # the alignment object and only retrieved when accessed.
+    _alg_ref = None
+
+    def _get_sequence(self):
+        if self._alg_ref is not None:
+            alg, name = self._alg_ref
+            return alg.get_seq(name)
+        try:
+            return self.__dict__["_sequence"]
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute 'sequence'"
+                                 %self.__class__.__name__)
+
+    def _set_sequence(self, value):
+        self._alg_ref = None
+        self._sequence = value
+
+    def _del_sequence(self):
+        if self._alg_ref is None and "_sequence" not in self.__dict__:
+            raise AttributeError("sequence")
+        self._alg_ref = None
+        self.__dict__.pop("_sequence", None)
+
+    #: .. currentmodule:: ete3
+    #:
+    #Sequence associated to the node (see :func:`PhyloNode.link_to_alignment`)
+    sequence = property(fget=_get_sequence, fset=_set_sequence, fdel=_del_sequence)
+
     def __init__(self, newick=None, alignment=None, alg_format="fasta", \
                  sp_naming_function=_parse_species, format=0, **kargs):
 
@@ -425,22 +481,47 @@ class PhyloNode(TreeNode):
                 if n.is_leaf():
                     n.features.add("species")
 
-    def link_to_alignment(self, alignment, alg_format="fasta", **kwargs):
+    def link_to_alignment(self, alignment, alg_format="fasta", lazy=False, **kwargs):
+        """
+        Sets the ``sequence`` attribute of the nodes under this one
+        whose names are found in the given alignment.
+
+        :argument alignment: a SeqGroup or SeqMatrix instance, or the
+          path (or text) of an alignment in the given ``alg_format``.
+
+        :argument "fasta" alg_format: "fasta", "phylip", "iphylip",
+          "phylip_relaxed", "iphylip_relaxed" or "paml".
+
+        :argument False lazy: If True, nodes keep a reference to the
+          alignment entry instead of the sequence itself, which is
+          retrieved every time ``node.sequence`` is accessed. When the
+          alignment is an uncompressed fasta or phylip file, it is also
+          indexed rather than loaded (see :class:`SeqGroup`), so
+          sequences are read from disk on demand. Setting
+          ``node.sequence`` replaces the reference.
+        """
         missing_leaves = []
         missing_internal = []
-        if type(alignment) == SeqGroup:
+        if isinstance(alignment, (SeqGroup, SeqMatrix)):
             alg = alignment
         else:
-            alg = SeqGroup(alignment, format=alg_format, **kwargs)
+            indexable = lazy and os.path.isfile(alignment) and \
+                        not alignment.endswith(".gz") and \
+                        alg_format.lower() != "paml"
+            alg = SeqGroup(alignment, format=alg_format, lazy=indexable, **kwargs)
         # sets the seq of
         for n in self.traverse():
-            try:
-                n.add_feature("sequence",alg.get_seq(n.name))
-            except KeyError:
-                if n.is_leaf():
-                    missing_leaves.append(n.name)
+            if n.name in alg:
+                if lazy:
+                    n.__dict__.pop("_sequence", None)
+                    n._alg_ref = (alg, n.name)
+                    n.features.add("sequence")
                 else:
-                    missing_internal.append(n.name)
+                    n.add_feature("sequence", alg.get_seq(n.name))
+            elif n.is_leaf():
+                missing_leaves.append(n.name)
+            else:
+                missing_internal.append(n.name)
         if len(missing_leaves)>0:
             print("Warnning: [%d] terminal nodes could not be found in the alignment." %\
                 len(missing_leaves), file=sys.stderr)
@@ -686,10 +767,7 @@ class PhyloNode(TreeNode):
 
         :returns: species_trees
         """
-        try:
-            t = self.copy()
-        except Exception:
-            t = self.copy("deepcopy")
+        t = self.copy("clone")
 
         if autodetect_duplications:
             dups = 0
@@ -724,7 +802,7 @@ class PhyloNode(TreeNode):
         if species and type(species) not in set(["set", "frozenset"]):
             raise ValueError("species argument should be a set, frozenset")
 
-        prunned = self.copy("deepcopy") if return_copy else self
+        prunned = self.copy("clone") if return_copy else self
         n2sp = prunned.get_cached_content(store_attr="species")
         n2leaves = prunned.get_cached_content()
         is_expansion = lambda n: (len(n2sp[n])==1 and len(n2leaves[n])>1
@@ -793,20 +871,28 @@ class PhyloNode(TreeNode):
 
 
     def ncbi_compare(self, autodetect_duplications=True, cached_content=None):
-        if not cached_content:
-            cached_content = self.get_cached_content()
-        cached_species = set([n.species for n in cached_content[self]])
+        if cached_content:
+            leaves = cached_content[self]
+        else:
+            leaves = self.get_leaves()
+        cached_species = set([n.species for n in leaves])
 
-        if len(cached_species) != len(cached_content[self]):
+        if len(cached_species) != len(leaves):
             print(cached_species)
-            ntrees, ndups, target_trees = self.get_speciation_trees(autodetect_duplications=autodetect_duplications, map_features=["taxid"])
+            ntrees, ndups, target_trees = self.get_speciation_trees(autodetect_duplications=autodetect_duplications, map_features=["taxid", "sci_name", "lineage"])
         else:
             target_trees = [self]
 
 
         ncbi = NCBITaxa()
+        results = []
         for t in target_trees:
-            ncbi.get_broken_branches(t, cached_content)
+            # leaves are expected to be annotated with their NCBI lineage
+            # (see annotate_ncbi_taxa)
+            taxa_lineages = dict([(leaf.taxid, leaf.lineage)
+                                  for leaf in t.iter_leaves()])
+            results.append(ncbi.get_broken_branches(t, taxa_lineages))
+        return results
 
 
 
@@ -38,7 +38,6 @@ from __future__ import absolute_import
 #
 # #END_LICENSE#############################################################
 
-import copy
 from .evolevents import EvolEvent
 
 
@@ -46,69 +45,76 @@ def get_reconciled_tree(node, sptree, events):
     """ Returns the recoliation gene tree with a provided species
     topology """
 
-    if len(node.children) == 2:
-        # First visit childs
-        morphed_childs = []
-        for ch in node.children:
-            mc, ev = get_reconciled_tree(ch, sptree, events)
-            morphed_childs.append(mc)
-
-        # morphed childs are the reconciled children. I trust its
-        # topology. Remember tree is visited on recursive post-order
-        sp_child_0 = morphed_childs[0].get_species()
-        sp_child_1 = morphed_childs[1].get_species()
-        all_species = sp_child_1 | sp_child_0
-
-        # If childs represents a duplication (duplicated species)
-        # Check that both are reconciliated to the same species
-        if len(sp_child_0 & sp_child_1) > 0:
-            newnode = copy.deepcopy(node)
-            newnode.up = None
-            newnode.children = []
-            template = _get_expected_topology(sptree, all_species)
-            # replaces child0 partition on the template
-            newmorphed0, matchnode = _replace_on_template(template, morphed_childs[0])
-            # replaces child1 partition on the template
-            newmorphed1, matchnode = _replace_on_template(template, morphed_childs[1])
-            newnode.add_child(newmorphed0)
-            newnode.add_child(newmorphed1)
-            newnode.add_feature("evoltype", "D")
-            node.add_feature("evoltype", "D")
-            e = EvolEvent()
-            e.etype = "D"
-            e.inparalogs = node.children[0].get_leaf_names()
-            e.outparalogs = node.children[1].get_leaf_names()
-            e.in_seqs  = node.children[0].get_leaf_names()
-            e.out_seqs = node.children[1].get_leaf_names()
-            events.append(e)
-            return newnode, events
-
-        # Otherwise, we need to reconciliate species at both sides
-        # into a single partition.
+    # Nodes are visited in post-order using an explicit stack, so the
+    # reconciled children of each node are always available.
+    node2morphed = {}
+    for n in node.traverse("postorder"):
+        if len(n.children) == 2:
+            morphed_childs = [node2morphed.pop(ch) for ch in n.children]
+            node2morphed[n] = _reconcile_node(n, morphed_childs, sptree, events)
+        elif len(n.children)==0:
+            node2morphed[n] = n.copy("deepclone")
         else:
-            # gets the topology expected by the observed species
-            template = _get_expected_topology(sptree, all_species)
-            # replaces child0 partition on the template
-            template, matchnode = _replace_on_template(template, morphed_childs[0] )
-            # replaces child1 partition on the template
-            template, matchnode = _replace_on_template(template, morphed_childs[1])
-            template.add_feature("evoltype","S")
-            node.add_feature("evoltype","S")
-            e = EvolEvent()
-            e.etype = "S"
-            e.inparalogs = node.children[0].get_leaf_names()
-            e.orthologs = node.children[1].get_leaf_names()
-            e.in_seqs  = node.children[0].get_leaf_names()
-            e.out_seqs = node.children[1].get_leaf_names()
-            events.append(e)
-            return template, events
-    elif len(node.children)==0:
-        return copy.deepcopy(node), events
+            raise ValueError("Algorithm can only work with binary trees.")
+    return node2morphed[node], events
+
+def _reconcile_node(node, morphed_childs, sptree, events):
+    # morphed childs are the reconciled children. I trust its
+    # topology. Remember tree is visited on post-order
+    sp_child_0 = morphed_childs[0].get_species()
+    sp_child_1 = morphed_childs[1].get_species()
+    all_species = sp_child_1 | sp_child_0
+
+    # If childs represents a duplication (duplicated species)
+    # Check that both are reconciliated to the same species
+    if len(sp_child_0 & sp_child_1) > 0:
+        newnode = _copy_node(node)
+        newnode.up = None
+        newnode.children = []
+        template = _get_expected_topology(sptree, all_species)
+        # replaces child0 partition on the template
+        newmorphed0, matchnode = _replace_on_template(template, morphed_childs[0])
+        # replaces child1 partition on the template
+        newmorphed1, matchnode = _replace_on_template(template, morphed_childs[1])
+        newnode.add_child(newmorphed0)
+        newnode.add_child(newmorphed1)
+        newnode.add_feature("evoltype", "D")
+        node.add_feature("evoltype", "D")
+        e = EvolEvent()
+        e.etype = "D"
+        e.inparalogs = node.children[0].get_leaf_names()
+        e.outparalogs = node.children[1].get_leaf_names()
+        e.in_seqs  = node.children[0].get_leaf_names()
+        e.out_seqs = node.children[1].get_leaf_names()
+        events.append(e)
+        return newnode
+
+    # Otherwise, we need to reconciliate species at both sides
+    # into a single partition.
     else:
-        raise ValueError("Algorithm can only work with binary trees.")
+        # gets the topology expected by the observed species
+        template = _get_expected_topology(sptree, all_species)
+        # replaces child0 partition on the template
+        template, matchnode = _replace_on_template(template, morphed_childs[0] )
+        # replaces child1 partition on the template
+        template, matchnode = _replace_on_template(template, morphed_childs[1])
+        template.add_feature("evoltype","S")
+        node.add_feature("evoltype","S")
+        e = EvolEvent()
+        e.etype = "S"
+        e.inparalogs = node.children[0].get_leaf_names()
+        e.orthologs = node.children[1].get_leaf_names()
+        e.in_seqs  = node.children[0].get_leaf_names()
+        e.out_seqs = node.children[1].get_leaf_names()
+        events.append(e)
+        return template
+
+def _copy_node(node):
+    """ Returns a copy of node without its descendants """
+    return node._clone(deep=True, descendants=False)
 
 def _replace_on_template(orig_template, node):
-    template = copy.deepcopy(orig_template)
+    template = orig_template.copy("clone")
     # detects partition within topo that matchs child1 species
     nodespcs = node.get_species()
     spseed = list(nodespcs)[0]  # any sp name woulbe ok
@@ -118,7 +124,7 @@ def _replace_on_template(orig_template, node):
     while len(nodespcs - set(subtopo.get_leaf_names() ) )>0:
         subtopo= subtopo.up
     # Puts original partition on the expected topology template
-    nodecp = copy.deepcopy(node)
+    nodecp = node.copy("clone")
     if subtopo.up is None:
         return nodecp, nodecp
     else:
@@ -137,7 +143,7 @@ def _get_expected_topology(t, species):
     sps = set(species)
     while sps-set(node.get_leaf_names()) != set([]):
         node = node.up
-    template = copy.deepcopy(node)
+    template = node.copy("deepclone")
     # make get_species() to work
     #template._speciesFunction = _get_species_on_TOL
     template.set_species_naming_function(_get_species_on_TOL)
@@ -174,7 +180,7 @@ def get_reconciled_tree_zmasek(gtree, sptree, inplace=False):
         for node in tree.traverse(): node.del_feature("M")
 
     if not inplace:
-        gtree = gtree.copy('deepcopy')
+        gtree = gtree.copy('clone')
 
     # check for missing species
     missing_sp = gtree.get_species() - sptree.get_species()
@@ -0,0 +1,370 @@
+from __future__ import absolute_import
+from __future__ import print_function
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+# Opt-in instrumentation of the most expensive ETE operations. Once
+# enable() is called, the functions listed in TARGETS are wrapped so
+# that the number of calls, time and (optionally) peak memory of each
+# operation are recorded. Original functions are restored by disable(),
+# so instrumentation has no cost unless it is enabled:
+#
+#   from ete3 import profiling
+#   profiling.enable()
+#   t1.robinson_foulds(t2)
+#   profiling.disable()
+#   profiling.print_stats()
+#   profiling.dump_stats("ete.prof") # readable with pstats.Stats
+
+import json
+import time
+import marshal
+import inspect
+import threading
+import functools
+from importlib import import_module
+
+import six
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from . import utils
+
+__all__ = ["enable", "disable", "is_enabled", "reset", "get_stats",
+           "dump_json", "dump_stats", "print_stats"]
+
+# (module, attribute, operation name). Attributes can be module
+# functions or "Class.method". Missing modules or attributes are
+# silently skipped, as some of them depend on optional packages.
+TARGETS = [
+    ("ete3.coretype.tree", "read_newick", "newick.read"),
+    ("ete3.parser.newick", "read_newick", "newick.read"),
+    ("ete3.coretype.tree", "TreeNode.write", "newick.write"),
+    ("ete3.evol.evoltree", "EvolNode.write", "newick.write"),
+    ("ete3.coretype.tree", "TreeNode._iter_descendants_preorder", "traverse.preorder"),
+    ("ete3.coretype.tree", "TreeNode._iter_descendants_postorder", "traverse.postorder"),
+    ("ete3.coretype.tree", "TreeNode._iter_descendants_levelorder", "traverse.levelorder"),
+    ("ete3.coretype.tree", "TreeNode.iter_prepostorder", "traverse.prepostorder"),
+    ("ete3.coretype.tree", "TreeNode.get_cached_content", "get_cached_content"),
+    ("ete3.coretype.tree", "TreeNode.compare", "compare"),
+    ("ete3.coretype.tree", "TreeNode.robinson_foulds", "robinson_foulds"),
+    ("ete3.coretype.tree", "TreeNode.render", "render"),
+    ("ete3.coretype.tree", "TreeNode.show", "show"),
+    ("ete3.evol.evoltree", "EvolNode.render", "render"),
+    ("ete3.evol.evoltree", "EvolNode.show", "show"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_fuzzy_name_translation", "ncbi.get_fuzzy_name_translation"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_rank", "ncbi.get_rank"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_lineage", "ncbi.get_lineage"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_common_names", "ncbi.get_common_names"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_taxid_translator", "ncbi.get_taxid_translator"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_name_translator", "ncbi.get_name_translator"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.translate_to_names", "ncbi.translate_to_names"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_descendant_taxa", "ncbi.get_descendant_taxa"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.get_topology", "ncbi.get_topology"),
+    ("ete3.ncbi_taxonomy.ncbiquery", "NCBITaxa.annotate_tree", "ncbi.annotate_tree"),
+    # Jobs are actually launched by a background process, so the
+    # main process can only account for the time spent preparing them.
+    ("ete3.tools.phylobuild_lib.master_task", "Task.iter_waiting_jobs", "phylobuild.launch"),
+    ("ete3.tools.phylobuild_lib.sge", "launch_jobs", "phylobuild.sge_launch"),
+]
+
+_timer = getattr(time, "perf_counter", time.time)
+
+_PATCHED = []
+_STATS = {}
+_TRACK_MEMORY = False
+_STARTED_TRACEMALLOC = False
+_LOCAL = threading.local()
+
+class _OpStats(object):
+    __slots__ = ["key", "calls", "primitive_calls", "tottime", "cumtime",
+                 "peak_memory", "callers", "active"]
+
+    def __init__(self, key):
+        self.key = key
+        self.calls = 0
+        self.primitive_calls = 0
+        self.tottime = 0.0
+        self.cumtime = 0.0
+        self.peak_memory = 0
+        self.callers = {}
+        self.active = 0
+
+class _Frame(object):
+    __slots__ = ["stat", "start", "subtime", "mem_start", "mem_peak"]
+
+def _get_op_stats(op, func):
+    stat = _STATS.get(op)
+    if stat is None:
+        code = getattr(func, "__code__", None)
+        if code is not None:
+            key = (code.co_filename, code.co_firstlineno, op)
+        else:
+            key = ("~", 0, op)
+        stat = _STATS[op] = _OpStats(key)
+    return stat
+
+def _get_stack():
+    try:
+        return _LOCAL.stack
+    except AttributeError:
+        _LOCAL.stack = []
+        return _LOCAL.stack
+
+def _count_call(stat, stack):
+    stat.calls += 1
+    if not stat.active:
+        stat.primitive_calls += 1
+    caller = stack[-1].stat.key if stack else None
+    stat.callers[caller] = stat.callers.get(caller, 0) + 1
+
+def _enter(stat):
+    stack = _get_stack()
+    stat.active += 1
+
+    frame = _Frame()
+    frame.stat = stat
+    frame.subtime = 0.0
+    if _TRACK_MEMORY:
+        current, peak = tracemalloc.get_traced_memory()
+        # Peaks are reset for every operation, so the peak reached so
+        # far must be kept by the calling one.
+        if stack:
+            stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+        tracemalloc.reset_peak()
+        frame.mem_start = frame.mem_peak = current
+    stack.append(frame)
+    frame.start = _timer()
+    return frame
+
+def _exit(frame):
+    elapsed = _timer() - frame.start
+    stack = _get_stack()
+    stack.pop()
+    stat = frame.stat
+    stat.tottime += elapsed - frame.subtime
+    stat.active -= 1
+    if not stat.active:
+        # Reentrant calls are already part of the outermost one
+        stat.cumtime += elapsed
+    if stack:
+        stack[-1].subtime += elapsed
+
+    if _TRACK_MEMORY and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(frame.mem_peak, peak)
+        stat.peak_memory = max(stat.peak_memory, peak - frame.mem_start)
+        if stack:
+            stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+        tracemalloc.reset_peak()
+
+def _iter_profiled(stat, generator):
+    # Only the time spent producing items is accounted
+    try:
+        while True:
+            frame = _enter(stat)
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                _exit(frame)
+            yield item
+    finally:
+        generator.close()
+
+def _wrap(func, op):
+    stat = _get_op_stats(op, func)
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kargs):
+            _count_call(stat, _get_stack())
+            return _iter_profiled(stat, func(*args, **kargs))
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kargs):
+            _count_call(stat, _get_stack())
+            frame = _enter(stat)
+            try:
+                return func(*args, **kargs)
+            finally:
+                _exit(frame)
+    return wrapper
+
+def _resolve(modname, attr):
+    try:
+        owner = import_module(modname)
+    except ImportError:
+        return None, None, None
+    path = attr.split(".")
+    for name in path[:-1]:
+        owner = getattr(owner, name, None)
+        if owner is None:
+            return None, None, None
+    name = path[-1]
+    # Only wrap attributes defined by the owner itself, inherited
+    # methods are wrapped in their own class
+    func = vars(owner).get(name, None)
+    if not inspect.isfunction(func):
+        return None, None, None
+    return owner, name, func
+
+def enable(memory=False):
+    """ Starts recording the calls to ETE operations. Stats from
+    previous profiling sessions are kept unless :func:`reset` is
+    called.
+
+    :argument False memory: if True, the peak memory allocated by each
+      operation is also tracked using the tracemalloc module (Python
+      >= 3.9). Note that tracing memory allocations considerably slows
+      down execution.
+
+    """
+    global _TRACK_MEMORY, _STARTED_TRACEMALLOC
+    if memory and (tracemalloc is None or not hasattr(tracemalloc, "reset_peak")):
+        raise ValueError("Memory profiling requires tracemalloc.reset_peak (Python >= 3.9)")
+
+    if _PATCHED:
+        disable()
+
+    if memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _STARTED_TRACEMALLOC = True
+        _TRACK_MEMORY = True
+
+    for modname, attr, op in TARGETS:
+        owner, name, func = _resolve(modname, attr)
+        if owner is not None:
+            setattr(owner, name, _wrap(func, op))
+            _PATCHED.append((owner, name, func))
+
+def disable():
+    """ Stops recording and restores the original ETE functions. """
+    global _TRACK_MEMORY, _STARTED_TRACEMALLOC
+    while _PATCHED:
+        owner, name, func = _PATCHED.pop()
+        setattr(owner, name, func)
+    if _STARTED_TRACEMALLOC:
+        tracemalloc.stop()
+        _STARTED_TRACEMALLOC = False
+    _TRACK_MEMORY = False
+
+def is_enabled():
+    """ Returns True if ETE operations are being profiled. """
+    return bool(_PATCHED)
+
+def reset():
+    """ Discards all recorded stats. """
+    # Wrappers keep a reference to their stats, so they are cleared in
+    # place
+    for stat in six.itervalues(_STATS):
+        stat.__init__(stat.key)
+
+def get_stats():
+    """ Returns a dictionary with the stats of each called operation:
+    number of calls, cumulative time (including reentrant and nested
+    operations), own time (excluding other profiled operations) and
+    peak memory in bytes (0 if memory is not tracked).
+    """
+    stats = {}
+    for op, stat in six.iteritems(_STATS):
+        if not stat.calls:
+            continue
+        stats[op] = {
+            "calls": stat.calls,
+            "cumtime": stat.cumtime,
+            "tottime": stat.tottime,
+            "peak_memory": stat.peak_memory,
+        }
+    return stats
+
+def dump_json(outfile=None):
+    """ Exports current stats as JSON.
+
+    :argument None outfile: if provided, stats are written to the
+      given file path. Otherwise, the JSON string is returned.
+    """
+    data = json.dumps(get_stats(), indent=2, sort_keys=True)
+    if outfile is None:
+        return data
+    with open(outfile, "w") as OUT:
+        OUT.write(data)
+
+def dump_stats(outfile):
+    """ Writes current stats in the same format used by cProfile, so
+    they can be loaded and sorted with ``pstats.Stats(outfile)``. Each
+    operation is reported as a function named after it. """
+    op2key = dict((stat.key, op) for op, stat in six.iteritems(_STATS) if stat.calls)
+    pstats = {}
+    for op, stat in six.iteritems(_STATS):
+        if not stat.calls:
+            continue
+        # Calls made from non profiled code are not reported
+        callers = dict((caller, ncalls) for caller, ncalls in six.iteritems(stat.callers)
+                       if caller in op2key)
+        pstats[stat.key] = (stat.primitive_calls, stat.calls,
+                            stat.tottime, stat.cumtime, callers)
+    with open(outfile, "wb") as OUT:
+        marshal.dump(pstats, OUT)
+
+def print_stats(sort="cumtime", limit=None):
+    """ Prints a table summarizing current stats.
+
+    :argument "cumtime" sort: "calls", "cumtime", "tottime",
+      "peak_memory" or "name".
+    :argument None limit: maximum number of operations shown.
+    """
+    stats = get_stats()
+    if not stats:
+        return
+    if sort == "name":
+        ops = sorted(stats)
+    else:
+        ops = sorted(stats, key=lambda op: stats[op][sort], reverse=True)
+    rows = [[op, stats[op]["calls"],
+             "%0.4f" %stats[op]["cumtime"],
+             "%0.4f" %stats[op]["tottime"],
+             stats[op]["peak_memory"]] for op in ops[:limit]]
+    utils.print_table(rows, header=["operation", "calls", "cumtime", "tottime",
+                                    "peak memory"], max_col_width=40)
@@ -0,0 +1,83 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+from .core import benchmark, random_tree, SkipBenchmark
+from ... import numpy, ClusterTree, ArrayTable
+from ...clustering import clustvalidation
+
+#: Number of conditions of random expression matrices
+NCONDITIONS = 200
+
+def _random_arraytable(names, ncols, seed=0):
+    matrix = numpy.random.RandomState(seed).normal(size=(len(names), ncols))
+    A = ArrayTable()
+    A.rowNames = list(names)
+    A.colNames = ["col%d" %i for i in range(ncols)]
+    A.mtype = "float"
+    A._link_names2matrix(matrix)
+    return A
+
+def _linked_tree(size):
+    if numpy is None:
+        raise SkipBenchmark("numpy is not available")
+    t = random_tree(size, cls=ClusterTree)
+    t.link_to_arraytable(_random_arraytable(t.get_leaf_names(), NCONDITIONS))
+    t.set_distance_function(clustvalidation.default_dist)
+    return t
+
+@benchmark("clustering", "profiles")
+def profiles(size):
+    """ Aggregates the mean profile of all nodes """
+    t = _linked_tree(size)
+    return lambda: t.profile
+
+@benchmark("clustering", "silhouette", max_size=10000)
+def silhouette(size):
+    t = _linked_tree(size)
+    nodes = t.get_descendants()[:100]
+    def run():
+        for node in nodes:
+            node.get_silhouette()
+    return run
+
+@benchmark("stress", "clustering.profiles", sizes=[50000], stress=True)
+def stress_profiles(size):
+    return profiles(size)
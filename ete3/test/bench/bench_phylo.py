@@ -0,0 +1,91 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+import random
+
+from six.moves import range
+
+from .core import benchmark, random_tree
+from . import taxonomy
+from ... import PhyloTree, SeqGroup
+
+def _species_tree(size, nspecies, seed=0):
+    t = random_tree(size, seed=seed, cls=PhyloTree)
+    for i, leaf in enumerate(t.iter_leaves()):
+        leaf.name = "SP%d_%d" %(i % nspecies, i)
+    t.set_species_naming_function(lambda name: name.split("_")[0])
+    return t
+
+def _random_alignment(names, length, seed=0):
+    rnd = random.Random(seed)
+    lines = []
+    for name in names:
+        lines.append(">%s" %name)
+        lines.append(''.join(rnd.choice("ACGT-") for i in range(length)))
+    return SeqGroup('\n'.join(lines))
+
+@benchmark("phylo", "species_overlap", max_size=1000)
+def species_overlap(size):
+    t = _species_tree(size, max(size // 10, 2))
+    return lambda: t.get_descendant_evol_events()
+
+@benchmark("phylo", "annotate_ncbi_taxa")
+def annotate_ncbi_taxa(size):
+    dbfile = taxonomy.get_taxonomy_db()
+    species = taxonomy.get_species()
+    t = random_tree(size, cls=PhyloTree)
+    rnd = random.Random(size)
+    for i, leaf in enumerate(t.iter_leaves()):
+        leaf.name = "%s_%d" %(rnd.choice(species), i)
+    t.set_species_naming_function(lambda name: name.split("_")[0])
+    return lambda: t.annotate_ncbi_taxa(dbfile=dbfile)
+
+@benchmark("phylo", "link_to_alignment")
+def link_to_alignment(size):
+    t = random_tree(size, cls=PhyloTree)
+    alg = _random_alignment(t.get_leaf_names(), 1000)
+    return lambda: t.link_to_alignment(alg)
+
+@benchmark("phylo", "link_to_alignment.lazy")
+def link_to_alignment_lazy(size):
+    t = random_tree(size, cls=PhyloTree)
+    alg = _random_alignment(t.get_leaf_names(), 1000)
+    return lambda: t.link_to_alignment(alg, lazy=True)
@@ -0,0 +1,131 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+import os
+import random
+
+from six.moves import range
+
+from .core import benchmark, get_tmpdir
+from ... import SeqGroup
+from ...coretype.seqgroup import INDEX_EXTENSION
+
+# Sequences of large alignments are built from a pool of random ones
+_POOL_SIZE = 100
+
+def write_random_fasta(fname, nseqs, length, seed=0):
+    """ Writes a random alignment in fasta format and returns its path """
+    rnd = random.Random(seed)
+    pool = [''.join(rnd.choice("ACGT-") for i in range(length))
+            for j in range(min(nseqs, _POOL_SIZE))]
+    with open(fname, "w") as OUT:
+        for i in range(nseqs):
+            OUT.write(">s%d\n%s\n" %(i, pool[i % len(pool)]))
+    return fname
+
+def _get_alignment(nseqs, length):
+    fname = os.path.join(get_tmpdir(), "alg_%d_%d.fa" %(nseqs, length))
+    if not os.path.exists(fname):
+        write_random_fasta(fname, nseqs, length)
+    return fname
+
+@benchmark("seqgroup", "fasta.read")
+def fasta_read(size):
+    fname = _get_alignment(size, 1000)
+    return lambda: SeqGroup(fname)
+
+@benchmark("seqgroup", "fasta.index")
+def fasta_index(size):
+    fname = _get_alignment(size, 1000)
+    index = fname + INDEX_EXTENSION
+    def run():
+        if os.path.exists(index):
+            os.remove(index)
+        SeqGroup(fname, lazy=True)
+    return run
+
+@benchmark("seqgroup", "fasta.write")
+def fasta_write(size):
+    alg = SeqGroup(_get_alignment(size, 1000))
+    outfile = os.path.join(get_tmpdir(), "out.fa")
+    return lambda: alg.write(format="fasta", outfile=outfile)
+
+@benchmark("seqgroup", "phylip.write")
+def phylip_write(size):
+    alg = SeqGroup(_get_alignment(size, 1000))
+    outfile = os.path.join(get_tmpdir(), "out.phy")
+    return lambda: alg.write(format="phylip_relaxed", outfile=outfile)
+
+@benchmark("seqgroup", "iphylip.write")
+def iphylip_write(size):
+    alg = SeqGroup(_get_alignment(size, 1000))
+    outfile = os.path.join(get_tmpdir(), "out.iphy")
+    return lambda: alg.write(format="iphylip_relaxed", outfile=outfile)
+
+@benchmark("seqgroup", "to_matrix")
+def to_matrix(size):
+    alg = SeqGroup(_get_alignment(size, 1000))
+    return lambda: alg.to_matrix()
+
+@benchmark("stress", "fasta.write_1gb", sizes=[100000], stress=True)
+def stress_fasta_write(size):
+    """ Writes an alignment of ~1GB (size sequences of 10k columns)
+    whose sequences are read from disk on demand """
+    alg = SeqGroup(_get_alignment(size, 10000), lazy=True)
+    outfile = os.path.join(get_tmpdir(), "out_1gb.fa")
+    return lambda: alg.write(format="fasta", outfile=outfile)
+
+@benchmark("stress", "iphylip.write_1gb", sizes=[100000], stress=True)
+def stress_iphylip_write_lazy(size):
+    """ Writes an alignment of ~1GB (size sequences of 10k columns),
+    whose sequences are read from disk on demand, in interleaved phylip
+    format """
+    alg = SeqGroup(_get_alignment(size, 10000), lazy=True)
+    outfile = os.path.join(get_tmpdir(), "out_1gb.iphy")
+    return lambda: alg.write(format="iphylip_relaxed", outfile=outfile)
+
+@benchmark("stress", "iphylip.write_100mb", sizes=[10000], stress=True)
+def stress_iphylip_write(size):
+    """ Writes an alignment of ~100MB (size sequences of 10k columns)
+    loaded in memory in interleaved phylip format """
+    alg = SeqGroup(_get_alignment(size, 10000))
+    outfile = os.path.join(get_tmpdir(), "out_100mb.iphy")
+    return lambda: alg.write(format="iphylip_relaxed", outfile=outfile)
@@ -0,0 +1,344 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+import random
+
+from six.moves import range
+
+from .core import benchmark, random_tree, caterpillar_tree, SkipBenchmark
+from ... import Tree, numpy
+from ...coretype import treegen
+
+def _sample(items, size, seed=0):
+    return random.Random(seed).sample(items, min(size, len(items)))
+
+def _consume(iterator):
+    for item in iterator:
+        pass
+
+# Newick parsing and writing
+
+@benchmark("tree", "newick.read")
+def newick_read(size):
+    newick = random_tree(size).write()
+    return lambda: Tree(newick)
+
+@benchmark("tree", "newick.write")
+def newick_write(size):
+    t = random_tree(size)
+    return lambda: t.write()
+
+@benchmark("tree", "newick.write_features")
+def newick_write_features(size):
+    t = random_tree(size)
+    return lambda: t.write(format=1, features=["support"])
+
+@benchmark("tree", "binary.dump")
+def binary_dump(size):
+    t = random_tree(size)
+    return lambda: t.dump_binary()
+
+@benchmark("tree", "binary.load")
+def binary_load(size):
+    data = random_tree(size).dump_binary()
+    return lambda: Tree.load_binary(data)
+
+# Random tree generation
+
+@benchmark("tree", "populate")
+def populate(size):
+    def run():
+        Tree().populate(size, random_branches=True)
+    return run
+
+@benchmark("tree", "generate.yule")
+def generate_yule(size):
+    if numpy is None:
+        raise SkipBenchmark("numpy is not available")
+    return lambda: treegen.random_tree(size, model="yule").write()
+
+@benchmark("tree", "generate.uniform")
+def generate_uniform(size):
+    if numpy is None:
+        raise SkipBenchmark("numpy is not available")
+    return lambda: treegen.random_tree(size, model="uniform", random_branches=True).write()
+
+# Traversal strategies
+
+@benchmark("tree", "traverse.preorder")
+def traverse_preorder(size):
+    t = random_tree(size)
+    return lambda: _consume(t.traverse("preorder"))
+
+@benchmark("tree", "traverse.postorder")
+def traverse_postorder(size):
+    t = random_tree(size)
+    return lambda: _consume(t.traverse("postorder"))
+
+@benchmark("tree", "traverse.levelorder")
+def traverse_levelorder(size):
+    t = random_tree(size)
+    return lambda: _consume(t.traverse("levelorder"))
+
+@benchmark("tree", "traverse.prepostorder")
+def traverse_prepostorder(size):
+    t = random_tree(size)
+    return lambda: _consume(t.iter_prepostorder())
+
+@benchmark("tree", "get_cached_content")
+def get_cached_content(size):
+    t = random_tree(size)
+    return lambda: t.get_cached_content()
+
+# Copies
+
+@benchmark("tree", "copy.newick")
+def copy_newick(size):
+    t = random_tree(size)
+    return lambda: t.copy("newick")
+
+@benchmark("tree", "copy.cpickle")
+def copy_cpickle(size):
+    t = random_tree(size)
+    return lambda: t.copy("cpickle")
+
+@benchmark("tree", "copy.clone")
+def copy_clone(size):
+    t = random_tree(size)
+    return lambda: t.copy("clone")
+
+# Topology changes and queries
+
+@benchmark("tree", "prune")
+def prune(size):
+    t = random_tree(size)
+    targets = _sample(t.get_leaves(), max(size // 10, 2))
+    return lambda: t.prune(targets)
+
+@benchmark("tree", "prune.names")
+def prune_names(size):
+    t = random_tree(size)
+    names = [n.name for n in _sample(t.get_leaves(), max(size // 10, 2))]
+    return lambda: t.prune(names)
+
+@benchmark("tree", "prune.indexed_names")
+def prune_indexed_names(size):
+    t = random_tree(size)
+    t.enable_attr_index()
+    names = [n.name for n in _sample(t.get_leaves(), max(size // 10, 2))]
+    return lambda: t.prune(names)
+
+@benchmark("tree", "prune.preserve_branch_length")
+def prune_preserve_branch_length(size):
+    t = random_tree(size)
+    targets = _sample(t.get_leaves(), max(size // 10, 2))
+    return lambda: t.prune(targets, preserve_branch_length=True)
+
+@benchmark("tree", "set_outgroup")
+def set_outgroup(size):
+    t = random_tree(size)
+    outgroups = _sample(t.get_descendants(), 10)
+    def run():
+        for outgroup in outgroups:
+            t.set_outgroup(outgroup)
+    return run
+
+@benchmark("tree", "get_midpoint_outgroup")
+def get_midpoint_outgroup(size):
+    t = random_tree(size)
+    return lambda: t.get_midpoint_outgroup()
+
+@benchmark("tree", "get_common_ancestor")
+def get_common_ancestor(size):
+    t = random_tree(size)
+    leaves = t.get_leaves()
+    pairs = [_sample(leaves, 2, seed=i) for i in range(100)]
+    def run():
+        for a, b in pairs:
+            t.get_common_ancestor(a, b)
+    return run
+
+@benchmark("tree", "search_nodes")
+def search_nodes(size):
+    t = random_tree(size)
+    names = [n.name for n in _sample(t.get_leaves(), 10)]
+    def run():
+        for name in names:
+            t.search_nodes(name=name)
+    return run
+
+@benchmark("tree", "search_nodes.indexed")
+def search_nodes_indexed(size):
+    t = random_tree(size)
+    t.enable_attr_index()
+    names = [n.name for n in _sample(t.get_leaves(), 1000)]
+    def run():
+        for name in names:
+            t.search_nodes(name=name)
+    return run
+
+@benchmark("tree", "search_nodes.indexed_updates")
+def search_nodes_indexed_updates(size):
+    """ Searches interleaved with feature updates """
+    t = random_tree(size)
+    t.enable_attr_index()
+    names = [n.name for n in _sample(t.get_leaves(), 1000)]
+    def run():
+        for i, name in enumerate(names):
+            t.search_nodes(name=name)[0].add_feature("visited", i)
+    return run
+
+@benchmark("tree", "check_monophyly")
+def check_monophyly(size):
+    t = random_tree(size)
+    leaves = t.get_leaves()
+    groups = [[n.name for n in _sample(leaves, max(size // 100, 2), seed=i)]
+              for i in range(100)]
+    return lambda: t.check_monophyly_groups(groups, "name")
+
+@benchmark("tree", "enable_subtree_stats")
+def enable_subtree_stats(size):
+    t = random_tree(size)
+    return lambda: t.enable_subtree_stats()
+
+# Comparisons of unrooted trees are quadratic, so they only run on small
+# trees
+@benchmark("tree", "robinson_foulds", max_size=1000)
+def robinson_foulds(size):
+    t1 = random_tree(size, seed=1)
+    t2 = random_tree(size, seed=2)
+    # same leaf names in both trees
+    for leaf1, leaf2 in zip(t1.iter_leaves(), t2.iter_leaves()):
+        leaf2.name = leaf1.name
+    return lambda: t1.robinson_foulds(t2, unrooted_trees=True)
+
+@benchmark("tree", "compare", max_size=1000)
+def compare(size):
+    t1 = random_tree(size, seed=1)
+    t2 = random_tree(size, seed=2)
+    for leaf1, leaf2 in zip(t1.iter_leaves(), t2.iter_leaves()):
+        leaf2.name = leaf1.name
+    return lambda: t1.compare(t2, unrooted=True)
+
+# Stress benchmarks
+
+@benchmark("stress", "prune", sizes=[100000], stress=True)
+def stress_prune(size):
+    return prune(size)
+
+@benchmark("stress", "search_nodes", sizes=[100000], stress=True)
+def stress_search_nodes(size):
+    return search_nodes(size)
+
+@benchmark("stress", "prune.names", sizes=[100000], stress=True)
+def stress_prune_names(size):
+    return prune_names(size)
+
+@benchmark("stress", "prune.indexed_names", sizes=[100000], stress=True)
+def stress_prune_indexed_names(size):
+    return prune_indexed_names(size)
+
+@benchmark("stress", "search_nodes.indexed", sizes=[100000], stress=True)
+def stress_search_nodes_indexed(size):
+    return search_nodes_indexed(size)
+
+@benchmark("stress", "search_nodes.indexed_updates", sizes=[100000], stress=True)
+def stress_search_nodes_indexed_updates(size):
+    return search_nodes_indexed_updates(size)
+
+@benchmark("stress", "binary.dump", sizes=[500000], stress=True)
+def stress_binary_dump(size):
+    # ~1M nodes
+    return binary_dump(size)
+
+@benchmark("stress", "binary.load", sizes=[500000], stress=True)
+def stress_binary_load(size):
+    return binary_load(size)
+
+@benchmark("stress", "midpoint_rooting", sizes=[1000], stress=True)
+def stress_midpoint_rooting(size):
+    """ Midpoint rooting of many (size) trees of 1000 leaves """
+    trees = [random_tree(1000, seed=i) for i in range(size)]
+    def run():
+        for t in trees:
+            outgroup = t.get_midpoint_outgroup()
+            if outgroup is not None and outgroup is not t:
+                t.set_outgroup(outgroup)
+    return run
+
+# Deep (caterpillar) trees, beyond the recursion limit
+
+@benchmark("stress", "deep.newick.read", sizes=[200000], stress=True)
+def deep_newick_read(size):
+    newick = caterpillar_tree(size).write()
+    return lambda: Tree(newick)
+
+@benchmark("stress", "deep.newick.write", sizes=[200000], stress=True)
+def deep_newick_write(size):
+    t = caterpillar_tree(size)
+    return lambda: t.write()
+
+# Node contents of caterpillar trees grow quadratically, so cached
+# content is not benchmarked on them
+@benchmark("stress", "deep.traverse.postorder", sizes=[200000], stress=True)
+def deep_traverse_postorder(size):
+    t = caterpillar_tree(size)
+    return lambda: _consume(t.traverse("postorder"))
+
+@benchmark("stress", "deep.enable_subtree_stats", sizes=[200000], stress=True)
+def deep_enable_subtree_stats(size):
+    t = caterpillar_tree(size)
+    return lambda: t.enable_subtree_stats()
+
+@benchmark("stress", "deep.copy", sizes=[200000], stress=True)
+def deep_copy(size):
+    t = caterpillar_tree(size)
+    return lambda: t.copy("deepclone")
+
+@benchmark("stress", "deep.ladderize", sizes=[200000], stress=True)
+def deep_ladderize(size):
+    t = caterpillar_tree(size)
+    return lambda: t.ladderize()
+
+@benchmark("stress", "deep.get_midpoint_outgroup", sizes=[200000], stress=True)
+def deep_get_midpoint_outgroup(size):
+    t = caterpillar_tree(size)
+    return lambda: t.get_midpoint_outgroup()
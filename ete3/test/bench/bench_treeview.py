@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+import os
+
+from .core import benchmark, random_tree, get_tmpdir, SkipBenchmark
+
+def _get_tree_style(circular=False):
+    try:
+        from ...treeview import TreeStyle
+    except ImportError:
+        raise SkipBenchmark("treeview module (PyQt4) is not available")
+    ts = TreeStyle()
+    if circular:
+        ts.mode = "c"
+    return ts
+
+@benchmark("treeview", "render.png", max_size=10000)
+def render_png(size):
+    ts = _get_tree_style()
+    t = random_tree(size)
+    outfile = os.path.join(get_tmpdir(), "tree.png")
+    return lambda: t.render(outfile, tree_style=ts)
+
+@benchmark("treeview", "render.svg", max_size=10000)
+def render_svg(size):
+    ts = _get_tree_style()
+    t = random_tree(size)
+    outfile = os.path.join(get_tmpdir(), "tree.svg")
+    return lambda: t.render(outfile, tree_style=ts)
+
+@benchmark("treeview", "render.circular", max_size=10000)
+def render_circular(size):
+    ts = _get_tree_style(circular=True)
+    t = random_tree(size)
+    outfile = os.path.join(get_tmpdir(), "tree_c.png")
+    return lambda: t.render(outfile, tree_style=ts)
@@ -0,0 +1,300 @@
+from __future__ import absolute_import
+from __future__ import print_function
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+import os
+import gc
+import json
+import time
+import atexit
+import random
+import shutil
+import fnmatch
+import tempfile
+import platform
+import subprocess
+from collections import OrderedDict
+
+from six.moves import range
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from ... import Tree
+
+__all__ = ["SkipBenchmark", "benchmark", "BENCHMARKS", "DEFAULT_SIZES",
+           "iter_benchmarks", "run_benchmark", "run_benchmarks",
+           "save_results", "load_results", "compare_results",
+           "random_tree", "caterpillar_tree", "get_tmpdir"]
+
+#: Tree sizes (number of leaves) used by default
+DEFAULT_SIZES = [100, 1000, 10000]
+
+#: Registered benchmarks, in definition order
+BENCHMARKS = []
+
+_timer = getattr(time, "perf_counter", time.time)
+
+class SkipBenchmark(Exception):
+    """ Raised by benchmarks that cannot run in the current
+    environment (i.e. missing optional dependencies) """
+    pass
+
+class Benchmark(object):
+    """ A registered benchmark function. The function receives a size
+    and prepares the data needed by the benchmarked operation, which
+    is returned as a callable. Only the execution of the callable is
+    timed. """
+    def __init__(self, group, name, func, sizes=None, max_size=None,
+                 stress=False):
+        self.group = group
+        self.name = name
+        self.func = func
+        self.sizes = sizes
+        self.max_size = max_size
+        self.stress = stress
+
+    def __repr__(self):
+        return "Benchmark (%s)" %self.fullname
+
+    def _get_fullname(self):
+        return "%s.%s" %(self.group, self.name)
+    fullname = property(_get_fullname)
+
+    def get_sizes(self, sizes):
+        """ Returns the sizes at which the benchmark should run. Stress
+        benchmarks always run with their own sizes."""
+        if self.sizes is not None:
+            return self.sizes
+        elif self.max_size is not None:
+            return [s for s in sizes if s <= self.max_size]
+        return sizes
+
+def benchmark(group, name=None, sizes=None, max_size=None, stress=False):
+    """ Decorator registering a benchmark function.
+
+    :argument group: name of the benchmark group (i.e. "tree").
+    :argument None name: benchmark name. Function name is used by default.
+    :argument None sizes: fixed list of sizes. If not provided, the
+      sizes requested by the user are used.
+    :argument None max_size: skips requested sizes above this limit.
+    :argument False stress: stress benchmarks are only executed when
+      explicitly requested.
+    """
+    def register(func):
+        BENCHMARKS.append(Benchmark(group, name or func.__name__, func,
+                                    sizes=sizes, max_size=max_size,
+                                    stress=stress))
+        return func
+    return register
+
+def iter_benchmarks(patterns=None, stress=False):
+    """ Iterates over registered benchmarks whose full name
+    (group.name) matches any of the given shell-style patterns. Stress
+    benchmarks are only included if stress is True."""
+    for bench in BENCHMARKS:
+        if bench.stress and not stress:
+            continue
+        if patterns and not any(fnmatch.fnmatch(bench.fullname, p) or
+                                fnmatch.fnmatch(bench.group, p)
+                                for p in patterns):
+            continue
+        yield bench
+
+def run_benchmark(bench, size, repeat=3, memory=False):
+    """ Runs a benchmark at the given size and returns a dictionary with
+    the best and mean time of all repetitions. If memory is True, the
+    peak memory allocated by the operation is also measured in an extra
+    (untimed) run."""
+    times = []
+    for i in range(repeat):
+        func = bench.func(size)
+        gc.collect()
+        t1 = _timer()
+        func()
+        times.append(_timer() - t1)
+        del func
+
+    result = {"best": min(times),
+              "mean": sum(times) / len(times),
+              "repeat": repeat}
+
+    if memory:
+        if tracemalloc is None:
+            raise SkipBenchmark("tracemalloc is not available")
+        func = bench.func(size)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run_benchmarks(sizes=None, repeat=3, patterns=None, stress=False,
+                   memory=False, callback=None):
+    """ Runs all the selected benchmarks and returns their results,
+    together with information about the environment, as a dictionary
+    that can be saved as JSON.
+
+    :argument None sizes: tree sizes used by benchmarks with no fixed
+      sizes (default: DEFAULT_SIZES).
+    :argument 3 repeat: number of repetitions of each benchmark.
+    :argument None patterns: list of shell-style patterns to select
+      benchmarks by group or full name.
+    :argument False stress: includes stress benchmarks.
+    :argument False memory: measures peak memory usage.
+    :argument None callback: a function called after each run as
+      callback(benchmark, size, result).
+    """
+    if sizes is None:
+        sizes = DEFAULT_SIZES
+    results = {}
+    for bench in iter_benchmarks(patterns, stress=stress):
+        for size in bench.get_sizes(sizes):
+            try:
+                result = run_benchmark(bench, size, repeat=repeat, memory=memory)
+            except SkipBenchmark as e:
+                result = {"skipped": str(e)}
+            results.setdefault(bench.fullname, {})[str(size)] = result
+            if callback is not None:
+                callback(bench, size, result)
+    return {"info": get_environment_info(), "results": results}
+
+def get_environment_info():
+    """ Returns the versions of ETE, Python and the main dependencies, as
+    well as the git revision of ETE sources, if available. """
+    from ... import __version__
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+
+    srcdir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        with open(os.devnull, "w") as DEVNULL:
+            commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=srcdir,
+                                             stderr=DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {"ete": __version__,
+            "commit": commit,
+            "python": platform.python_version(),
+            "numpy": numpy_version,
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+def save_results(results, fname):
+    """ Saves benchmark results as JSON """
+    with open(fname, "w") as OUT:
+        json.dump(results, OUT, indent=2, sort_keys=True)
+
+def load_results(fname):
+    """ Loads benchmark results saved with :func:`save_results` """
+    with open(fname) as IN:
+        return json.load(IN)
+
+def compare_results(reference, results):
+    """ Compares the best times of two sets of results. Returns a list of
+    (benchmark, size, reference time, time, ratio) tuples for the
+    benchmarks found in both of them. Ratios above 1 mean that the
+    operation is slower than in the reference."""
+    comparison = []
+    ref_results = reference["results"]
+    for name in sorted(results["results"]):
+        size2result = results["results"][name]
+        for size in sorted(size2result, key=int):
+            old = ref_results.get(name, {}).get(size, {}).get("best")
+            new = size2result[size].get("best")
+            if old is None or new is None:
+                continue
+            ratio = new / old if old else float("inf")
+            comparison.append((name, int(size), old, new, ratio))
+    return comparison
+
+_TMPDIR = []
+
+def get_tmpdir():
+    """ Returns a temporary directory shared by all benchmarks, which is
+    removed at exit."""
+    if not _TMPDIR:
+        tmpdir = tempfile.mkdtemp(prefix="ete_bench_")
+        atexit.register(shutil.rmtree, tmpdir, True)
+        _TMPDIR.append(tmpdir)
+    return _TMPDIR[0]
+
+# Data generators. The last random trees are cached by size and seed,
+# and copies are returned so benchmarks can modify them.
+_TREE_CACHE = OrderedDict()
+_TREE_CACHE_SIZE = 2
+
+def random_tree(size, seed=0, random_branches=True, cls=Tree):
+    """ Returns a random tree with the given number of leaves. The same
+    topology is returned for the same size and seed."""
+    key = (size, seed, random_branches, cls)
+    if key not in _TREE_CACHE:
+        state = random.getstate()
+        random.seed("%s-%s" %(size, seed))
+        try:
+            t = cls()
+            t.populate(size, random_branches=random_branches)
+        finally:
+            random.setstate(state)
+        while len(_TREE_CACHE) >= _TREE_CACHE_SIZE:
+            _TREE_CACHE.popitem(last=False)
+        _TREE_CACHE[key] = t
+    return _TREE_CACHE[key].copy("clone")
+
+def caterpillar_tree(depth, cls=Tree):
+    """ Returns a fully unbalanced (caterpillar) tree with the given
+    number of internal levels, which is deeper than the recursion
+    limit for large depths."""
+    root = node = cls()
+    for i in range(depth):
+        node.add_child(name="leaf%d" %i, dist=1.0)
+        node = node.add_child(dist=1.0)
+    node.name = "leaf%d" %depth
+    return root
@@ -0,0 +1,121 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+
+# A small synthetic NCBI taxonomy, generated in the same taxdump format
+# distributed by NCBI, so the taxonomy database can be built without
+# downloading the full dump.
+
+import os
+import sys
+import tarfile
+from io import BytesIO
+
+from six.moves import range
+
+from .core import get_tmpdir
+
+#: Number of children of each node at each rank below the root
+RANKS = [("superkingdom", 2), ("phylum", 3), ("class", 3), ("order", 4),
+         ("family", 4), ("genus", 4), ("species", 5)]
+
+_DB = {}
+
+def iter_taxa():
+    """ Yields (taxid, parent taxid, rank, scientific name) for all the
+    nodes in the synthetic taxonomy, parents first."""
+    yield 1, 1, "no rank", "root"
+    level = [1]
+    taxid = 1
+    for rank, nchildren in RANKS:
+        next_level = []
+        for parent in level:
+            for i in range(nchildren):
+                taxid += 1
+                yield taxid, parent, rank, "%s %d" %(rank.capitalize(), taxid)
+                next_level.append(taxid)
+        level = next_level
+
+def get_species():
+    """ Returns the taxids of all the species in the synthetic taxonomy """
+    return [taxid for taxid, parent, rank, name in iter_taxa() if rank == "species"]
+
+def write_taxdump(fname):
+    """ Writes the synthetic taxonomy as a taxdump.tar.gz file """
+    nodes, names, merged = [], [], []
+    for taxid, parent, rank, name in iter_taxa():
+        nodes.append("%d\t|\t%d\t|\t%s\t|\n" %(taxid, parent, rank))
+        names.append("%d\t|\t%s\t|\t\t|\tscientific name\t|\n" %(taxid, name))
+        if rank == "species":
+            names.append("%d\t|\t%s synonym\t|\t\t|\tsynonym\t|\n" %(taxid, name))
+            if taxid % 10 == 0:
+                names.append("%d\t|\tcommon %d\t|\t\t|\tgenbank common name\t|\n" %(taxid, taxid))
+                # Old taxids merged into existing ones
+                merged.append("%d\t|\t%d\t|\n" %(taxid + 1000000, taxid))
+
+    with tarfile.open(fname, "w:gz") as tar:
+        for dmpname, lines in [("nodes.dmp", nodes), ("names.dmp", names),
+                               ("merged.dmp", merged)]:
+            data = ''.join(lines).encode()
+            info = tarfile.TarInfo(dmpname)
+            info.size = len(data)
+            tar.addfile(info, BytesIO(data))
+
+def get_taxonomy_db():
+    """ Returns the path of a sqlite database with the synthetic
+    taxonomy, which is created the first time it is requested."""
+    if "path" not in _DB:
+        from ...ncbi_taxonomy import ncbiquery
+
+        tmpdir = get_tmpdir()
+        dbfile = os.path.join(tmpdir, "taxa.sqlite")
+        # update_db works in the current directory and logs its progress
+        cwd, stdout, stderr = os.getcwd(), sys.stdout, sys.stderr
+        os.chdir(tmpdir)
+        sys.stdout = sys.stderr = open(os.devnull, "w")
+        try:
+            write_taxdump("taxdump.tar.gz")
+            ncbiquery.update_db(dbfile, "taxdump.tar.gz")
+        finally:
+            sys.stdout.close()
+            sys.stdout, sys.stderr = stdout, stderr
+            os.chdir(cwd)
+        _DB["path"] = dbfile
+    return _DB["path"]
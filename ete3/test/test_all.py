@@ -9,8 +9,11 @@ from .test_ncbiquery import *
 
 from .test_arraytable import *
 from .test_clustertree import *
+from .test_heatmap import *
+from .test_webplugin import *
 
 from .test_evol import *
+from .test_bench import *
 #from .test_xml_parsers import *
 
 from .test_treeview.test_all_treeview import *
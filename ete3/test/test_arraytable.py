@@ -1,5 +1,8 @@
 from __future__ import absolute_import
 import unittest
+import tempfile
+import shutil
+import os
 
 from .. import ClusterTree, ArrayTable
 from .datasets import *
@@ -45,3 +48,41 @@ class Test_Coretype_ArrayTable(unittest.TestCase):
 
         # Continue this......
 
+    def test_arraytable_binary(self):
+        """ Tests binary (memory-mapped) arraytables and chunked parsing"""
+        from .. import numpy
+        from ..parser import text_arraytable
+
+        A = ArrayTable(expression)
+        # Chunked conversion of text rows gives the same matrix
+        chunk_size = text_arraytable.CHUNK_SIZE
+        text_arraytable.CHUNK_SIZE = 3
+        try:
+            B = ArrayTable(expression)
+        finally:
+            text_arraytable.CHUNK_SIZE = chunk_size
+        self.assertEqual(A.matrix.tolist(), B.matrix.tolist())
+        self.assertEqual(A.rowNames, B.rowNames)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, "expression.npy")
+            A.write(fname)
+            M = ArrayTable(fname)
+            self.assertTrue(isinstance(M.matrix, numpy.memmap))
+            self.assertEqual(M.rowNames, A.rowNames)
+            self.assertEqual(M.colNames, A.colNames)
+            self.assertEqual(M.get_row_vector("C").tolist(),
+                             A.get_row_vector("C").tolist())
+            self.assertEqual(M.get_column_vector("col3").tolist(),
+                             A.get_column_vector("col3").tolist())
+            self.assertTrue(M.get_row_vector("nonexistent") is None)
+            self.assertTrue("A" in M.rowValues)
+            self.assertEqual(M.get_value_range(chunk_size=2),
+                             A.get_value_range())
+
+            t = ClusterTree("(((A,B),(C,(D,E))),(F,(G,H)));", text_array=M)
+            self.assertEqual((t&"A").profile.tolist(), A.get_row_vector("A").tolist())
+            del M, t
+        finally:
+            shutil.rmtree(tmpdir)
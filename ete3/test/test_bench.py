@@ -0,0 +1,46 @@
+from __future__ import absolute_import
+import os
+import json
+import tempfile
+import unittest
+
+from . import bench
+
+class Test_Benchmarks(unittest.TestCase):
+    """ Checks that benchmarks can run """
+    def test_run_benchmarks(self):
+        results = bench.run_benchmarks(sizes=[20], repeat=1, memory=True)
+        names = set(b.fullname for b in bench.iter_benchmarks())
+        self.assertEqual(set(results["results"]), names)
+        for name, size2result in results["results"].items():
+            result = size2result.get("20")
+            if result is None:
+                continue
+            if "skipped" not in result:
+                self.assertTrue(result["best"] >= 0)
+                self.assertTrue(result["peak_memory"] >= 0)
+
+        fd, fname = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            bench.save_results(results, fname)
+            loaded = bench.load_results(fname)
+        finally:
+            os.remove(fname)
+        self.assertEqual(loaded["results"], json.loads(json.dumps(results["results"])))
+
+        comparison = bench.compare_results(loaded, results)
+        self.assertTrue(comparison)
+        for name, size, old, new, ratio in comparison:
+            self.assertEqual(old, new)
+
+    def test_select_benchmarks(self):
+        selected = list(bench.iter_benchmarks(["tree.traverse.*"]))
+        self.assertTrue(selected)
+        self.assertTrue(all(b.name.startswith("traverse.") for b in selected))
+        stress = [b for b in bench.iter_benchmarks(stress=True) if b.stress]
+        self.assertTrue(stress)
+        self.assertFalse([b for b in bench.iter_benchmarks() if b.stress])
+
+if __name__ == '__main__':
+    unittest.main()
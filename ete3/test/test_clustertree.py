@@ -27,3 +27,136 @@ class Test_ClusterTree(unittest.TestCase):
         c3 = t.get_common_ancestor("F", "G", "H")
         print(t.get_dunn([c1, c2, c3]))
 
+
+    def test_distance_functions(self):
+        """ Tests batched distance functions used by cluster validation """
+        from .. import numpy
+        from ..clustering import clustvalidation as cv
+
+        matrix = numpy.array([[1.0, 2.0, 3.0, 4.0],
+                              [2.0, 4.0, 6.0, 8.0],
+                              [4.0, 3.0, 2.0, 1.0],
+                              [1.0, 1.0, 2.0, numpy.nan]])
+        v = numpy.array([1.0, 2.0, 3.0, 4.0])
+
+        self.assertEqual(cv.get_dist_vector(cv.pearson_dist, matrix, v)[:3].round(6).tolist(),
+                         [0.0, 0.0, 2.0])
+        spearman = cv.get_dist_vector(cv.spearman_dist, matrix, v)
+        self.assertEqual(spearman[:3].round(6).tolist(), [0.0, 0.0, 2.0])
+        self.assertTrue(numpy.isnan(spearman[3]))
+        self.assertAlmostEqual(cv.get_dist_vector(cv.square_euclidean_dist, matrix, v)[3],
+                               (0 + 1 + 1) / 3.0)
+
+        # Ties get average ranks
+        self.assertEqual(cv._rankdata([[3, 1, 3, 2], [1, 1, 1, 1]]).tolist(),
+                         [[3.5, 1.0, 3.5, 2.0], [2.5, 2.5, 2.5, 2.5]])
+
+        # Batched and per row results must be the same
+        for fn in [cv.pearson_dist, cv.spearman_dist, cv.euclidean_dist]:
+            per_row = [fn(row, v) for row in matrix[:3]]
+            batched = cv.get_dist_vector(lambda a, b: fn(a, b), matrix[:3], v)
+            self.assertTrue(numpy.allclose(per_row, batched))
+
+        mean, std = cv.safe_mean_vector([[1.0, numpy.nan], [3.0, 2.0], [5.0, 4.0]])
+        self.assertEqual(mean.tolist(), [3.0, 3.0])
+        self.assertTrue(numpy.allclose(std, [numpy.std([1, 3, 5]), 1.0]))
+
+        # Silhouettes do not depend on whether distances are batched
+        t = ClusterTree("(((A,B),(C,(D,E))),(F,(G,H)));", text_array=expression)
+        node = t.get_common_ancestor("C", "D", "E")
+        batched = node.get_silhouette(cv.euclidean_dist)
+        per_row = node.get_silhouette(lambda a, b: cv.euclidean_dist(a, b))
+        self.assertTrue(numpy.allclose(batched, per_row))
+
+    def test_profile_cache(self):
+        """ Tests that aggregated profiles follow topology changes """
+        from .. import numpy
+
+        def leaf_mean(node):
+            matrix = numpy.array([l.profile for l in node.iter_leaves()])
+            return numpy.nanmean(matrix, axis=0), numpy.nanstd(matrix, axis=0)
+
+        def check(tree):
+            for node in tree.traverse():
+                mean, std = leaf_mean(node)
+                self.assertTrue(numpy.allclose(node.profile, mean))
+                self.assertTrue(numpy.allclose(node.deviation, std))
+
+        t = ClusterTree("(((A,B),(C,(D,E))),(F,(G,H)));", text_array=expression)
+        check(t)
+        silhouette = t.get_common_ancestor("C", "D").silhouette
+
+        # Changes in topology invalidate cached values
+        t.set_outgroup(t&"A")
+        check(t)
+        (t&"D").detach()
+        check(t)
+        (t&"H").add_child(name="H")
+        (t&"H").children[0].profile = (t&"G").profile
+        check(t)
+        self.assertNotEqual(t.get_common_ancestor("C", "E").silhouette, silhouette)
+
+        # So does linking a new arraytable
+        t = ClusterTree("(((A,B),(C,(D,E))),(F,(G,H)));", text_array=expression)
+        root_profile = t.profile
+        t.children[0].link_to_arraytable(expression.replace("-", ""))
+        self.assertFalse(numpy.allclose(t.profile, root_profile))
+        check(t)
+
+    def test_profile_precision(self):
+        """ Tests deviations of large values with a small spread """
+        from .. import numpy
+        t = ClusterTree("(((A,B),(C,(D,E))),(F,(G,H)));", text_array=expression)
+        values = {}
+        for i, leaf in enumerate(t.iter_leaves()):
+            leaf.profile = 1e9 + numpy.array([0.1 * i, 0.01 * (i % 3), 5.0])
+            values[leaf.name] = leaf.profile
+        for node in t.traverse():
+            matrix = numpy.array([values[name] for name in node.get_leaf_names()])
+            self.assertTrue(numpy.allclose(node.deviation, matrix.std(axis=0), rtol=1e-6, atol=1e-9))
+        self.assertTrue(numpy.allclose(t.profile, numpy.mean(list(values.values()), axis=0)))
+
+    def test_from_arraytable(self):
+        """ Tests building cluster trees from arraytables """
+        from .. import numpy, ArrayTable
+        from ..clustering import linkage
+
+        A = ArrayTable(expression)
+        t = ClusterTree.from_arraytable(A, metric="euclidean", linkage="average")
+        self.assertEqual(sorted(t.get_leaf_names()), sorted(A.rowNames))
+        self.assertEqual((t&"A").profile.tolist(), A.get_row_vector("A").tolist())
+        # Tree is ultrametric and the root height is the last merge distance
+        Z = linkage.get_linkage(A.matrix, "euclidean", "average")
+        for leaf in t.iter_leaves():
+            self.assertAlmostEqual(t.get_distance(leaf), Z[-1, 2])
+
+        # Nearest-neighbor chain and distance-free clustering give the
+        # same results as clustering of the full distance matrix
+        dist = linkage.get_distance_matrix(A.matrix)
+        for method in linkage.LINKAGE_METHODS:
+            Z = linkage._nn_chain_linkage(dist.copy(), method)
+            self.assertEqual(Z.shape, (len(A.rowNames) - 1, 4))
+            self.assertEqual(Z[-1, 3], len(A.rowNames))
+            self.assertTrue((numpy.diff(Z[:, 2]) >= 0).all())
+
+        Z1 = linkage._nn_chain_linkage(dist.copy(), "single")
+        Z2 = linkage.get_linkage(A.matrix, "euclidean", "single", max_memory=0)
+        self.assertTrue(numpy.allclose(Z1[:, 2], Z2[:, 2]))
+        Z1 = linkage._nn_chain_linkage(dist.copy(), "ward")
+        Z2 = linkage.get_linkage(A.matrix, "euclidean", "ward", max_memory=0)
+        self.assertTrue(numpy.allclose(Z1[:, 2], Z2[:, 2]))
+        self.assertRaises(ValueError, linkage.get_linkage, A.matrix,
+                          "euclidean", "average", max_memory=0)
+
+        # Validation uses the same metric used for clustering
+        from ..clustering import clustvalidation
+        for metric in linkage.METRICS:
+            t = ClusterTree.from_arraytable(A, metric=metric)
+            self.assertNotEqual(t._fdist, None)
+            t.get_silhouette()
+        t = ClusterTree.from_arraytable(A, metric="cityblock")
+        self.assertEqual(t._fdist, clustvalidation.cityblock_dist)
+        self.assertAlmostEqual(clustvalidation.cityblock_dist([1, 2, 3], [2, 0, 3]), 3.0)
+        self.assertAlmostEqual(clustvalidation.cosine_dist([1, 0], [0, 2]), 1.0)
+        self.assertAlmostEqual(clustvalidation.cosine_dist([1, 1], [2, 2]), 0.0)
+        self.assertRaises(ValueError, ClusterTree.from_arraytable, A, metric="unknown")
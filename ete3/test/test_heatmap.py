@@ -0,0 +1,45 @@
+from __future__ import absolute_import
+import unittest
+
+from .. import numpy
+
+try:
+    from ..treeview import heatmap
+except ImportError:
+    heatmap = None
+
+@unittest.skipIf(heatmap is None, "treeview module could not be loaded")
+class Test_Heatmap(unittest.TestCase):
+    """ Tests the vectorized color mapping used by ProfileFace """
+
+    def test_color_indexes(self):
+        values = [-10, -2, -1, 0, 0.5, 1, 2, 10, numpy.nan]
+        indexes = heatmap.get_color_indexes(values, -2, 2, 0)
+        self.assertEqual(indexes.tolist(), [0, 0, 50, 100, 125, 150, 200, 200,
+                                            heatmap.NAN_INDEX])
+        # Zero is a valid value, not a missing one
+        self.assertEqual(heatmap.get_color_indexes([0.0], -1, 1, 0.5).tolist(), [67])
+
+    def test_color_lut(self):
+        lut = heatmap.get_color_lut(2)
+        self.assertTrue(lut is heatmap.get_color_lut(2))
+        self.assertEqual(len(lut), heatmap.NAN_INDEX + 1)
+        self.assertEqual(int(lut[heatmap.CENTER_INDEX]), 0xffffffff)
+        self.assertEqual(int(lut[heatmap.NAN_INDEX]), 0xff000000)
+        self.assertEqual(int(lut[0]), 0xff0000ff)
+        self.assertEqual(int(lut[200]), 0xffff0202)
+
+    def test_heatmap_buffer(self):
+        matrix = [[-1, 0, 1],
+                  [numpy.nan, 1, -1]]
+        buf = heatmap.get_heatmap_buffer(matrix, -1, 1, 0, width=6, cell_height=3)
+        self.assertEqual(buf.shape, (6, 6))
+        lut = heatmap.get_color_lut(2)
+        self.assertEqual(buf[0, 0], lut[0])
+        self.assertEqual(buf[2, 3], lut[heatmap.CENTER_INDEX])
+        self.assertEqual(buf[3, 1], lut[heatmap.NAN_INDEX])
+        self.assertEqual(buf[5, 5], lut[0])
+        self.assertEqual(buf[4, 2], lut[200])
+
+if __name__ == '__main__':
+    unittest.main()
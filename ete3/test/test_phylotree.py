@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 from __future__ import print_function
 import unittest
+import sys
 
 from .. import PhyloTree, SeqGroup
 from .datasets import *
@@ -81,6 +82,26 @@ class Test_phylo_module(unittest.TestCase):
         for l in t.get_leaves():
             self.assertEqual(l.sequence, alg2.get_seq(l.name))
 
+        # Sequences can be linked by reference, also from indexed files
+        open("/tmp/ete_test_link.fa", "w").write(fasta)
+        for alg, ref in [(alg2, alg2), (alg2.to_matrix(), alg2),
+                         ("/tmp/ete_test_link.fa", alg1)]:
+            t.link_to_alignment(alignment=alg, lazy=True)
+            for l in t.get_leaves():
+                self.assertEqual(l._alg_ref is not None, True)
+                self.assertEqual("sequence" in l.features, True)
+                self.assertEqual(l.sequence, ref.get_seq(l.name))
+            self.assertEqual(hasattr(t, "sequence"), False)
+        self.assertEqual(t.copy("cpickle").get_leaves()[0].sequence,
+                         t.get_leaves()[0].sequence)
+
+        leaf = t.get_leaves()[0]
+        leaf.sequence = "AAA"
+        self.assertEqual(leaf._alg_ref, None)
+        self.assertEqual(leaf.sequence, "AAA")
+        leaf.del_feature("sequence")
+        self.assertEqual(hasattr(leaf, "sequence"), False)
+
     def test_get_sp_overlap_on_all_descendants(self):
         """ Tests ortholgy prediction using the sp overlap"""
         # Creates a gene phylogeny with several duplication events at
@@ -272,6 +293,36 @@ class Test_phylo_module(unittest.TestCase):
 
         self.assertEqual(recon_tree.write(["evoltype"], format=9), PhyloTree(expected_recon).write(features=["evoltype"],format=9))
 
+    def test_deep_trees(self):
+        """ Tests that duplication based methods work on very deep trees """
+        depth = sys.getrecursionlimit() * 2
+        t = PhyloTree()
+        node = t
+        for i in range(depth):
+            node.add_feature("evoltype", "D")
+            node.add_child(name="Hsa_%d" %i)
+            node = node.add_child(name="Hsa_%d" %(i + depth))
+
+        sp_trees = t.split_by_dups(autodetect_duplications=False)
+        self.assertEqual(len(sp_trees), depth + 1)
+        ntrees, ndups, sp_trees = t.get_speciation_trees(autodetect_duplications=False)
+        self.assertEqual(ntrees, depth + 1)
+        self.assertEqual(ndups, depth)
+        self.assertEqual(sorted(len(sp_t) for sp_t in sp_trees), [1] * (depth + 1))
+
+        # Reconciliation is quadratic, so a shallower tree is enough to
+        # exceed the recursion limit of the former implementation
+        depth = 300
+        nw = "Ptr_001"
+        for i in range(depth):
+            nw = "(Hsa_%d,%s)" %(i, nw)
+        gene_tree = PhyloTree(nw + ";")
+        sptree = PhyloTree("(Hsa, Ptr);")
+        recon_tree, events = gene_tree.reconcile(sptree)
+        self.assertEqual(len(events), depth)
+        # Inferred losses are added as extra leaves
+        self.assertTrue(set(gene_tree.get_leaf_names()) <= set(recon_tree.get_leaf_names()))
+
     def test_miscelaneus(self):
         """ Test several things """
         # Creates a gene phylogeny with several duplication events at
@@ -73,6 +73,36 @@ class Test_Coretype_SeqGroup(unittest.TestCase):
         #SEQS.write(outfile="/tmp/iphylip_write_test.phy", format="iphylip")
         #SEQS.write(outfile="/tmp/iphylip_write_test.phy", format="phylip")
 
+    def test_lazy_loading(self):
+        """ Tests sequences read on demand from indexed files """
+        import os
+        for fmt, data in [("fasta", fasta_example),
+                          ("iphylip", phylip_interlived),
+                          ("phylip", phylip_sequencial)]:
+            fname = "/tmp/ete_test_lazy.%s" %fmt
+            open(fname, "w").write(data)
+            if os.path.exists(fname + ".seqidx"):
+                os.remove(fname + ".seqidx")
+            SEQS = SeqGroup(fname, format=fmt)
+            LAZY = SeqGroup(fname, format=fmt, lazy=True)
+            self.assertEqual(LAZY.is_lazy(), True)
+            self.assertEqual(SEQS.is_lazy(), False)
+            self.assertEqual(SEQS.get_entries(), LAZY.get_entries())
+            self.assertEqual(SEQS.write(format=fmt), LAZY.write(format=fmt))
+            self.assertEqual(len(SEQS), len(LAZY))
+
+            # The index is saved and reused
+            self.assertEqual(os.path.exists(fname + ".seqidx"), True)
+            LAZY = SeqGroup(fname, format=fmt, lazy=True)
+            self.assertEqual(SEQS.get_entries(), LAZY.get_entries())
+
+            # Modified sequences are kept in memory
+            name = LAZY.get_entries()[0][0]
+            LAZY.set_seq(name, "AAAA")
+            self.assertEqual(LAZY.get_seq(name), "AAAA")
+
+        self.assertRaises(ValueError, SeqGroup, fasta_example, lazy=True)
+
     def test_alg_from_scratch(self):
 
         alg = SeqGroup(phylip_sequencial, format="phylip")
@@ -89,5 +119,117 @@ class Test_Coretype_SeqGroup(unittest.TestCase):
         alg.write(format ="iphylip")
         alg.write(format ="phylip")
 
+    def test_streaming_writers(self):
+        """ Tests writing alignments in chunks to files and handles """
+        import random
+        import io
+        from ..parser import phylip, fasta
+        random.seed(1)
+        alg = SeqGroup()
+        for i in range(25):
+            alg.set_seq("sequence_%d" %i, "".join([random.choice("ACGT-") for _ in range(777)]))
+
+        formats = ["fasta", "phylip_relaxed", "iphylip_relaxed", "paml"]
+        buffer_size = phylip.INTERLEAVED_BUFFER, fasta.WRITE_BUFFER
+        try:
+            # Small buffers force several chunks per sequence
+            phylip.INTERLEAVED_BUFFER = fasta.WRITE_BUFFER = 120
+            for fmt in formats:
+                text = alg.write(format=fmt)
+                handle = io.StringIO() if str is not bytes else io.BytesIO()
+                alg.write(format=fmt, outfile=handle)
+                self.assertEqual(handle.getvalue(), text)
+                alg.write(format=fmt, outfile="/tmp/ete_test_writer")
+                self.assertEqual(open("/tmp/ete_test_writer").read(), text)
+
+                # Round trip, also with sequences read on demand
+                lazy = fmt != "paml"
+                for seqs in [SeqGroup(text, format=fmt),
+                             SeqGroup("/tmp/ete_test_writer", format=fmt, lazy=lazy)]:
+                    self.assertEqual(sorted(seqs.get_entries()), sorted(alg.get_entries()))
+                    self.assertEqual(seqs.write(format=fmt), text)
+        finally:
+            phylip.INTERLEAVED_BUFFER, fasta.WRITE_BUFFER = buffer_size
+
+    def test_lazy_slices(self):
+        """ Tests slicing sequences read on demand without loading them """
+        import random
+        random.seed(2)
+        for width in [0, 1, 7, 60]:
+            alg = SeqGroup()
+            for i in range(6):
+                alg.set_seq("seq%d" %i, "".join([random.choice("ACGT-") for _ in range(100)]))
+            text = alg.write(format="fasta")
+            if width:
+                # Rewrap sequences in lines of the given width
+                lines = []
+                for line in text.splitlines():
+                    if line.startswith(">"):
+                        lines.append(line)
+                    else:
+                        lines.extend([line[i:i+width] for i in range(0, len(line), width)])
+                text = "\n".join(lines) + "\n"
+            open("/tmp/ete_test_slices.fa", "w").write(text)
+            lazy = SeqGroup("/tmp/ete_test_slices.fa", lazy=True)
+            for name, seq, _ in alg.iter_entries():
+                self.assertEqual(lazy.id2seq.get_length(lazy.name2id[name]), len(seq))
+                for start, end in [(0, 100), (0, 1), (5, 61), (59, 60), (60, 120), (99, 100), (30, 30), (120, 130)]:
+                    self.assertEqual(lazy.id2seq.get_slice(lazy.name2id[name], start, end), seq[start:end])
+            self.assertEqual(lazy.write(format="iphylip"), alg.write(format="iphylip"))
+
+        # Irregular lines are also supported
+        open("/tmp/ete_test_slices.fa", "w").write(">a\nAC GT\nACG\n\nT\n>b\nACGTACGT\n")
+        lazy = SeqGroup("/tmp/ete_test_slices.fa", lazy=True)
+        self.assertEqual(lazy.id2seq.get_slice(lazy.name2id["a"], 1, 7), "CGTACG")
+        self.assertEqual(lazy.id2seq.get_length(lazy.name2id["a"]), 8)
+
+    def test_seq_matrix(self):
+        """ Tests vectorized alignment operations """
+        import math
+        alg = SeqGroup(phylip_sequencial, format="phylip")
+        matrix = alg.to_matrix()
+        names = [name for name, seq, comments in alg]
+        seqs = [alg.get_seq(n) for n in names]
+        self.assertEqual(len(matrix), len(alg))
+        self.assertEqual(matrix.ncols, len(seqs[0]))
+        self.assertEqual(matrix.get_seq("CYS1_DICDI"), CYS1_DICDI)
+        self.assertEqual(matrix.write(format="phylip"), alg.write(format="phylip"))
+
+        # Column statistics
+        gaps = matrix.get_gap_fraction()
+        conservation = matrix.get_conservation()
+        entropy = matrix.get_entropy()
+        for i in range(matrix.ncols):
+            column = [seq[i] for seq in seqs]
+            residues = [c for c in column if c != "-"]
+            self.assertAlmostEqual(gaps[i], column.count("-") / float(len(column)))
+            if not residues:
+                self.assertEqual(conservation[i] == conservation[i], False)
+                continue
+            freqs = [residues.count(c) / float(len(residues)) for c in set(residues)]
+            self.assertAlmostEqual(conservation[i], max(freqs))
+            self.assertAlmostEqual(entropy[i], -sum([f*math.log(f, 2) for f in freqs]))
+
+        # Pairwise identity
+        ident = matrix.get_identity_matrix()
+        for i, s1 in enumerate(seqs):
+            for j, s2 in enumerate(seqs):
+                pairs = [(a, b) for a, b in zip(s1, s2) if a != "-" and b != "-"]
+                expected = len([a for a, b in pairs if a == b]) / float(len(pairs))
+                self.assertAlmostEqual(ident[i, j], expected)
+
+        # Column and sequence selections
+        trimmed = matrix.trim(max_gap_fraction=0.0)
+        self.assertEqual(trimmed.ncols, len([g for g in gaps if g == 0.0]))
+        sub = matrix.select(names=names[:2], columns=slice(0, 10))
+        self.assertEqual(sub.names, names[:2])
+        self.assertEqual(sub.get_seq(names[1]), seqs[1][:10])
+        joined = sub.concat(matrix.select(names=names[1::-1], columns=slice(10, None)))
+        self.assertEqual(joined.get_seq(names[0]), seqs[0])
+        self.assertRaises(ValueError, sub.concat, matrix)
+        filled = sub.concat(matrix.select(names=names[1:3]), fill_char="-")
+        self.assertEqual(filled.get_seq(names[0]), seqs[0][:10] + "-"*matrix.ncols)
+        self.assertEqual(filled.get_seq(names[2]), "-"*10 + seqs[2])
+
 if __name__ == '__main__':
     unittest.main()
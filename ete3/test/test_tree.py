@@ -7,6 +7,7 @@ import time
 import itertools
 
 import sys
+import six
 from six.moves import range
 
 from .. import Tree, PhyloTree, TreeNode
@@ -253,6 +254,255 @@ class Test_Coretype_Tree(unittest.TestCase):
             nw = t.write(format=f, dist_formatter="%0.1f", name_formatter="TEST-%s", support_formatter="SUP-%0.1f")
             self.assertEqual(nw, result)
 
+    def test_streaming_newick_writer(self):
+        """ test writing newick chunks into files and handles """
+        import io
+        from ..parser import newick
+        t = Tree()
+        t.populate(200, random_branches=True)
+        for n in t.traverse():
+            n.add_features(species="Hsa:1", tags=["a", "b"], size=3)
+        features = ["species", "tags", "size"]
+        expected = t.write(features=features, format=1)
+        self.assertEqual(expected.count("[&&NHX:species=Hsa_1:tags=a|b:size=3]"), len(t.get_descendants()))
+
+        chunk_size = newick.CHUNK_SIZE
+        try:
+            # Small chunks force several writes
+            newick.CHUNK_SIZE = 7
+            chunks = list(newick.iter_newick(t, features=features, format=1,
+                                             format_root_node=False))
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual("".join(chunks), expected)
+
+            handle = io.StringIO() if str is not bytes else io.BytesIO()
+            t.write(features=features, format=1, outfile=handle)
+            self.assertEqual(handle.getvalue(), expected)
+            t.write(features=features, format=1, outfile="/tmp/ete_test_newick.nw")
+            self.assertEqual(open("/tmp/ete_test_newick.nw").read(), expected)
+        finally:
+            newick.CHUNK_SIZE = chunk_size
+
+    def test_binary_format(self):
+        """ test saving and loading trees in binary format """
+        import io
+        from ..parser.binary_tree import BinaryTreeError
+        t = Tree()
+        t.populate(50, random_branches=True)
+        for i, n in enumerate(t.traverse()):
+            n.add_features(species=["Hsa", "Mmu"][i % 2], size=i, ratio=i/3.0,
+                           flag=i % 3 == 0, tags=["a", i], label=u"n\u00f1")
+        t.children[0].add_feature("extra", {"a": 1})
+
+        data = t.dump_binary()
+        handle = io.BytesIO()
+        t.dump_binary(outfile=handle)
+        self.assertEqual(handle.getvalue(), data)
+        t.dump_binary(outfile="/tmp/ete_test_tree.bin")
+
+        features = ["species", "size", "ratio", "flag", "label", "extra"]
+        for t2 in [Tree.load_binary(data), Tree.load_binary("/tmp/ete_test_tree.bin")]:
+            self.assertEqual(t2.write(features=features, format_root_node=True),
+                             t.write(features=features, format_root_node=True))
+            for n1, n2 in zip(t.traverse(), t2.traverse()):
+                self.assertEqual(n1.features, n2.features)
+                for f in n1.features:
+                    self.assertEqual(getattr(n1, f), getattr(n2, f))
+                    self.assertEqual(type(getattr(n1, f)), type(getattr(n2, f)))
+
+        # Only selected features are saved
+        t2 = PhyloTree.load_binary(t.dump_binary(features=["species"]))
+        self.assertEqual(type(t2), PhyloTree)
+        self.assertEqual(t2.features, set(["name", "dist", "support", "species"]))
+        self.assertEqual([n.species for n in t2.iter_leaves()],
+                         [n.species for n in t.iter_leaves()])
+
+        self.assertRaises(BinaryTreeError, Tree.load_binary, b"ETE3TREX" + data[8:])
+
+        # Truncated and corrupted files are detected, also when mapped
+        header_end = data.index(b"}]}") + 3
+        nnodes = b'"nodes": %d' %len(list(t.traverse()))
+        broken = [data[:len(data)//2], data[:header_end + 40], data[:20],
+                  data[:16] + b"x" + data[17:],
+                  data.replace(nnodes, nnodes[:-1] + b" ", 1)]
+        for bad in broken:
+            self.assertRaises(BinaryTreeError, Tree.load_binary, bad)
+            open("/tmp/ete_test_tree.bin", "wb").write(bad)
+            self.assertRaises(BinaryTreeError, Tree.load_binary, "/tmp/ete_test_tree.bin")
+
+    def test_attr_index(self):
+        """ tests searches using the attribute index """
+        t = Tree()
+        t.populate(200, random_branches=True)
+        for i, leaf in enumerate(t.iter_leaves()):
+            leaf.add_features(group=i % 5, tags=[i])
+        ref = t.copy()
+        t.enable_attr_index()
+
+        def get_names(nodes):
+            return [n.name for n in nodes]
+
+        for name in ["aaaaaaaaaa", "aaaaaaaaab", "aaaaaaaaaz", "missing"]:
+            self.assertEqual(get_names(t.search_nodes(name=name)),
+                             get_names(ref.search_nodes(name=name)))
+        self.assertEqual(get_names(t.search_nodes(group=2)),
+                         get_names(ref.search_nodes(group=2)))
+        self.assertEqual(get_names(t.search_nodes(group=2, dist=1.0)),
+                         get_names(ref.search_nodes(group=2, dist=1.0)))
+        # unhashable values are still searched
+        self.assertEqual(get_names(t.search_nodes(tags=[3])),
+                         get_names(ref.search_nodes(tags=[3])))
+
+        # searches from descendants only return nodes under them
+        sub, refsub = t.children[0], ref.children[0]
+        self.assertEqual(get_names(sub.search_nodes(group=1)),
+                         get_names(refsub.search_nodes(group=1)))
+        leaf = t.get_leaves()[-1]
+        self.assertEqual(sub.get_leaves_by_name(leaf.name),
+                         [leaf] if leaf in sub else [])
+
+        # the index follows topology and feature changes
+        new = t.children[0].add_child(name="new_leaf")
+        self.assertEqual(t.search_nodes(name="new_leaf"), [new])
+        new.add_feature("group", 7)
+        self.assertEqual(t.search_nodes(group=7), [new])
+        new.delete()
+        self.assertEqual(t.search_nodes(name="new_leaf"), [])
+
+        names = random.sample(ref.get_leaf_names(), 20)
+        t.prune(names)
+        ref.prune(names)
+        self.assertEqual(t.write(features=["group"]), ref.write(features=["group"]))
+        self.assertEqual(set(t.get_common_ancestor(names[:3]).get_leaf_names()),
+                         set(ref.get_common_ancestor(names[:3]).get_leaf_names()))
+
+        other = [n for n in t.iter_leaves() if n.name != names[0]][0]
+        other.add_feature("name", names[0])
+        self.assertRaises(TreeError, t.get_common_ancestor, names[0], names[1])
+
+        # names, distances and supports are tracked when set directly
+        other.name = "renamed"
+        self.assertEqual(t.search_nodes(name="renamed"), [other])
+        self.assertEqual(len(t.search_nodes(name=names[0])), 1)
+        other.dist = 0.5
+        self.assertEqual(t.search_nodes(name="renamed", dist=0.5), [other])
+        self.assertEqual(t.search_nodes(name="renamed", dist=1.0), [])
+
+        # indexes of other trees are not affected by changes
+        t2 = Tree("((A,B),C);")
+        t2.enable_attr_index()
+        self.assertEqual(len(t2.search_nodes(name="A")), 1)
+        maps = t.children[0]._get_attr_index().maps
+        t2.add_child(name="D")
+        (t2&"A").add_feature("group", 1)
+        self.assertTrue(t.children[0]._get_attr_index().maps is maps)
+        self.assertEqual(t2.search_nodes(name="D")[0].up, t2)
+        self.assertEqual(t2.search_nodes(group=1), [t2&"A"])
+        # moved nodes are found in their new tree only
+        moved = t2.search_nodes(name="D")[0].detach()
+        self.assertEqual(t2.search_nodes(name="D"), [])
+        other.add_child(moved)
+        self.assertEqual(t.search_nodes(name="D"), [moved])
+        t2.children = [t2.children[0]]
+        self.assertEqual(t2.search_nodes(name="C"), [])
+
+        # copies keep working indexes
+        t3 = t.copy("cpickle")
+        (t3&"renamed").name = "copied"
+        self.assertEqual(len(t3.search_nodes(name="copied")), 1)
+        self.assertEqual(t.search_nodes(name="copied"), [])
+
+        t.disable_attr_index()
+        self.assertEqual(t._get_attr_index(), None)
+
+        # matches are sorted as without the index
+        t = Tree("((A,B)X,(A,C)Y);", format=1)
+        t.enable_attr_index()
+        for parent in ["Y", "X"]:
+            node = (t&parent).children[0]
+            node.name = "tmp"
+            self.assertEqual(len(t.search_nodes(name="A")), 1)
+            node.name = "A"
+        self.assertTrue((t&"A").up is t&"X")
+        self.assertEqual([n.up.name for n in t.search_nodes(name="A")], ["X", "Y"])
+        t = Tree("((A,(A,A)),A);")
+        expected = t.search_nodes(name="A")
+        t.enable_attr_index()
+        for n in reversed(expected):
+            n.name = "A"
+        self.assertEqual(t.search_nodes(name="A"), expected)
+
+        # attributes computed by the node class are not indexed
+        t = PhyloTree("((Hsa_1,Ptr_1),(Hsa_2,Ptr_2));")
+        t.enable_attr_index()
+        self.assertEqual(len(t.search_nodes(species="Hsa")), 2)
+        t.set_species_naming_function(lambda n: n.split("_")[1])
+        self.assertEqual(len(t.search_nodes(species="1")), 2)
+        (t&"Hsa_1").name = "Hsa_3"
+        self.assertEqual(len(t.search_nodes(species="1")), 1)
+        self.assertEqual(len(t.search_nodes(species="3")), 1)
+
+        # disabled indexes are not notified
+        from ..coretype import tree as tree_module
+        enabled = tree_module._ATTR_INDEXES
+        t.disable_attr_index()
+        self.assertEqual(tree_module._ATTR_INDEXES, enabled - 1)
+        t.enable_attr_index()
+        t.enable_attr_index()
+        self.assertEqual(tree_module._ATTR_INDEXES, enabled)
+        t.disable_attr_index()
+
+    def test_subtree_stats(self):
+        """ tests cached subtree statistics """
+        t = Tree("((A:1,(B:2,C:1)D:0.5)E:1,(F:0.5,G:3)H:2)root;", format=1)
+        E = t & "E"
+        self.assertEqual(E.get_subtree_stats(), (3, 2.5, 1, 2, 1, 4.5))
+        self.assertEqual(t.get_subtree_stats(), (5, 5, 2, 3, 2, 11))
+
+        t.enable_subtree_stats()
+        self.assertEqual(t.get_subtree_stats(), (5, 5, 2, 3, 2, 11))
+        self.assertEqual(len(t), 5)
+        self.assertEqual(t.get_farthest_leaf()[0].name, "G")
+        self.assertEqual(t.get_closest_leaf()[0].name, "A")
+        self.assertEqual(t.get_farthest_leaf(topology_only=True), (t & "B", 2.0))
+        self.assertEqual(t.check_monophyly(["B", "C"], "name")[1], "monophyletic")
+        self.assertFalse(t.check_monophyly(["A", "C"], "name")[0])
+
+        # statistics follow topology and branch length changes
+        (t & "G").dist = 1
+        self.assertEqual(t.get_farthest_leaf()[0].name, "B")
+        (t & "C").add_child(name="I", dist=4)
+        self.assertEqual(E.get_subtree_stats(), (3, 5.5, 1, 3, 1, 8.5))
+        self.assertEqual(t.get_farthest_leaf(), (t & "I", 6.5))
+        (t & "D").detach()
+        self.assertEqual(t.get_subtree_stats(), (3, 3, 2, 2, 2, 5.5))
+        t.set_outgroup(t & "A")
+        self.assertEqual(t.get_subtree_stats(), (3, 4.5, 0.5, 3, 1, 5.5))
+        t.ladderize()
+        self.assertEqual(t.write(format=9), "(A,((F,G)));")
+
+        # results match the non cached methods
+        t = Tree()
+        t.populate(100, random_branches=True)
+        ref = t.copy()
+        t.enable_subtree_stats()
+        for i in range(20):
+            # same changes in both trees, which keep identical node order
+            nodes, ref_nodes = list(t.traverse()), list(ref.traverse())
+            index = random.randint(1, len(nodes) - 1)
+            nodes[index].dist = ref_nodes[index].dist = random.random()
+            index = random.randint(1, len(nodes) - 1)
+            t.set_outgroup(nodes[index])
+            ref.set_outgroup(ref_nodes[index])
+            self.assertAlmostEqual(t.get_farthest_leaf()[1], ref.get_farthest_leaf()[1])
+            self.assertAlmostEqual(t.get_closest_leaf()[1], ref.get_closest_leaf()[1])
+            self.assertAlmostEqual(t.get_subtree_stats().length, ref.get_subtree_stats().length)
+            self.assertEqual(t.get_midpoint_outgroup().get_leaf_names(),
+                             ref.get_midpoint_outgroup().get_leaf_names())
+
+        t.disable_subtree_stats()
+        self.assertEqual(set([n._stats for n in t.traverse()]), set([None]))
+
     def test_tree_manipulation(self):
         """ tests operations which modify tree topology """
         nw_tree = "((Hola:1,Turtle:1.3)1:1,(A:0.3,B:2.4)1:0.43);"
@@ -597,6 +847,95 @@ class Test_Coretype_Tree(unittest.TestCase):
         self.assertEqual((t&'F').get_farthest_node(topology_only=True), (t&'A', 3.0))
         self.assertEqual((t&'F').get_farthest_node(topology_only=False), (t&'D', 11.0))
 
+    def test_distance_matrix(self):
+        t = Tree('(((A:0.5, B:1.0):1.0, C:5.0, G:0.1):1, (D:10.0, F:1.0):2.0):20;')
+        matrix, nodes = t.get_distance_matrix()
+        self.assertEqual([n.name for n in nodes], t.get_leaf_names())
+        self.assertEqual(matrix.shape, (6, 6))
+        for i, a in enumerate(nodes):
+            for j, b in enumerate(nodes):
+                self.assertAlmostEqual(matrix[i, j], t.get_distance(a, b))
+
+        matrix, nodes = t.get_distance_matrix(topology_only=True)
+        for i, a in enumerate(nodes):
+            for j, b in enumerate(nodes):
+                self.assertEqual(matrix[i, j], t.get_distance(a, b, topology_only=True))
+
+        # internal nodes and subtrees
+        sub = t.children[0]
+        matrix, nodes = sub.get_distance_matrix(leaves_only=False)
+        self.assertEqual(nodes, list(sub.traverse("preorder")))
+        for i, a in enumerate(nodes):
+            for j, b in enumerate(nodes):
+                self.assertAlmostEqual(matrix[i, j], sub.get_distance(a, b))
+
+        # topology distances among internal nodes count the nodes
+        # between each pair
+        matrix, nodes = t.get_distance_matrix(topology_only=True, leaves_only=False)
+        self.assertEqual(len(nodes), 10)
+        for i, a in enumerate(nodes):
+            for j, b in enumerate(nodes):
+                ancestor = t.get_common_ancestor(a, b)
+                if ancestor is a or ancestor is b:
+                    between = len(list(a.iter_ancestors())) - len(list(b.iter_ancestors()))
+                    self.assertEqual(matrix[i, j], max(abs(between) - 1, 0))
+                else:
+                    self.assertEqual(matrix[i, j], t.get_distance(a, b, topology_only=True))
+        self.assertTrue((matrix == matrix.T).all())
+
+        # blocks of rows
+        t = Tree()
+        t.populate(50, random_branches=True)
+        matrix, nodes = t.get_distance_matrix(leaves_only=False)
+        rows = []
+        for block_nodes, block in t.iter_distance_matrix(leaves_only=False,
+                                                         chunk_size=7):
+            self.assertTrue(len(block_nodes) <= 7)
+            self.assertEqual(block.shape, (len(block_nodes), len(nodes)))
+            rows.extend(block_nodes)
+            self.assertTrue((block == matrix[len(rows) - len(block_nodes):len(rows)]).all())
+        self.assertEqual(rows, nodes)
+
+    def test_deep_trees(self):
+        """ tests that tree algorithms do not exceed the recursion limit """
+        depth = sys.getrecursionlimit() * 3
+        t = Tree()
+        node = t
+        for i in range(depth):
+            node.add_child(name="l%d" %i)
+            node = node.add_child()
+        node.name = "last"
+
+        self.assertEqual(len(t.get_cached_content()[t]), depth + 1)
+        self.assertEqual(len(t.get_ascii(compact=True).split("\n")), depth + 2)
+        self.assertEqual(t.ladderize(), depth + 1)
+        self.assertEqual(t.children[0].name, "l0")
+        t2 = Tree(t.write(format=9))
+        self.assertEqual(t2.write(format=9), t.write(format=9))
+        t2 = t.copy("clone")
+        t2.prune(["l1", "l%d" %(depth - 1), "last"])
+        self.assertEqual(t2.write(format=9), "(l1,(l%d,last));" %(depth - 1))
+
+    def test_caterpillar_trees(self):
+        """ tests tree algorithms on a 10^5 deep caterpillar tree """
+        depth = 10**5
+        t = Tree()
+        node = t
+        for i in range(depth):
+            node.add_child(name="l%d" %i)
+            node = node.add_child()
+        node.name = "last"
+
+        self.assertEqual(len(t.get_leaves()), depth + 1)
+        self.assertEqual(t.get_distance("l0", "last"), depth + 1)
+        self.assertEqual(t.ladderize(), depth + 1)
+        newick = t.write(format=9)
+        self.assertEqual(Tree(newick).write(format=9), newick)
+        t2 = t.copy("clone")
+        self.assertEqual(len(t2), depth + 1)
+        t2.prune(["l1", "l%d" %(depth - 1), "last"])
+        self.assertEqual(t2.write(format=9), "(l1,(l%d,last));" %(depth - 1))
+
     def test_rooting(self):
         # Test set_outgroup and get_midpoint_outgroup
         t = Tree(nw2_full)
@@ -635,6 +974,19 @@ class Test_Coretype_Tree(unittest.TestCase):
         self.assertEqual(t.children[0].dist, 5.0)
         self.assertEqual(t.children[1].dist, 5.0)
 
+        # The midpoint of the longest path falls within the branches of
+        # the new root, whatever the node the outgroup is requested from
+        for i in range(20):
+            t = Tree()
+            t.populate(random.randint(3, 50), random_branches=True)
+            leaf = t.get_leaves()[-1]
+            outgroup = leaf.get_midpoint_outgroup()
+            self.assertTrue(outgroup is t.get_midpoint_outgroup())
+            t.set_outgroup(outgroup)
+            d1 = t.children[0].dist + t.children[0].get_farthest_leaf()[1]
+            d2 = t.children[1].dist + t.children[1].get_farthest_leaf()[1]
+            self.assertTrue(abs(d1 - d2) <= t.children[0].dist + t.children[1].dist + 1e-9)
+
 
     def test_tree_navigation(self):
         t = Tree("(((A, B)H, C)I, (D, F)J)root;", format=1)
@@ -1220,6 +1572,26 @@ class Test_Coretype_Tree(unittest.TestCase):
         mono_nodes = t.get_monophyletic(values=["green", "yellow"], target_attr="color")
         self.assertEqual(set(mono_nodes), green_yellow_nodes)
 
+        #print 'Testing bulk monophyly checks'
+        t = Tree()
+        t.populate(100)
+        for i, leaf in enumerate(t):
+            leaf.add_features(group=i % 7)
+        for leaf in t.children[0]:
+            leaf.group = 7
+        groups = dict([(name, random.sample(range(7), random.randint(1, 3)))
+                       for name in range(50)])
+        groups["missing"] = [0, 10]
+        groups["clade"] = [7]
+        results = t.check_monophyly_groups(groups, "group", ignore_missing=True)
+        self.assertEqual(results["clade"], (True, "monophyletic", set()))
+        for name, values in six.iteritems(groups):
+            self.assertEqual(results[name],
+                             t.check_monophyly(values, "group", ignore_missing=True))
+        self.assertEqual(t.check_monophyly_groups([[1, 2]], "group"),
+                         [t.check_monophyly([1, 2], "group")])
+        self.assertRaises(ValueError, t.check_monophyly_groups, [[0, 10]], "group")
+
 
     def test_copy(self):
         t = Tree("((A, B)Internal_1:0.7, (C, D)Internal_2:0.5)root:1.3;", format=1)
@@ -1240,6 +1612,150 @@ class Test_Coretype_Tree(unittest.TestCase):
         self.assertEqual((t_pkl & "A").complex[0], [0,1])
         self.assertEqual((t_deep & "A").testfn(), "YES")
 
+        # clones
+        t_clone = (t & "Internal_1").copy("clone")
+        t_deepclone = t.copy("deepclone")
+        self.assertEqual(t_clone.up, None)
+        self.assertEqual(t_clone.write(features=["label"], format_root_node=True),
+                         (t & "Internal_1").write(features=["label"], format_root_node=True))
+        self.assertEqual(t_deepclone.write(format=1, features=["label", "complex"]),
+                         t.write(format=1, features=["label", "complex"]))
+        self.assertEqual((t_clone & "A").testfn(), "YES")
+        self.assertEqual((t_deepclone & "A").testfn(), "YES")
+        # copy on write
+        (t_clone & "A").add_features(label="new value")
+        (t_clone & "B").dist = 0.3
+        t_clone.add_child(name="E")
+        self.assertEqual((t & "A").label, "custom Value")
+        self.assertEqual((t & "B").dist, 1.0)
+        self.assertEqual(len((t & "Internal_1").children), 2)
+        self.assertTrue((t_clone & "A").complex is (t & "A").complex)
+        self.assertTrue((t_deepclone & "A").complex is not (t & "A").complex)
+        self.assertEqual((t_deepclone & "A").complex, (t & "A").complex)
+        self.assertEqual((t_clone & "A").features, set(["name", "dist", "support",
+                                                        "label", "complex"]))
+
+    def test_random_models(self):
+        """ test generating random trees from tree models """
+        from ..coretype.treegen import random_tree
+        for model in ["yule", "coalescent", "uniform"]:
+            for size in [1, 2, 3, 50]:
+                compact = random_tree(size, model=model, random_branches=True)
+                self.assertEqual(len(compact), size)
+                t = compact.to_tree()
+                self.assertEqual(len(t), size)
+                self.assertEqual(t.get_leaf_names(), compact.get_leaf_names())
+                self.assertEqual(len(set(t.get_leaf_names())), size)
+
+                # All the ways of writing the same tree match
+                for format in [0, 1, 5, 9]:
+                    self.assertEqual(compact.write(format=format, format_root_node=True),
+                                     t.write(format=format, format_root_node=True))
+                t2 = Tree.load_binary(compact.dump_binary())
+                self.assertEqual(t2.write(format_root_node=True),
+                                 t.write(format_root_node=True))
+                for n in t.iter_descendants():
+                    self.assertTrue(0 <= n.support <= 1)
+
+                if model != "uniform" and size > 1:
+                    dists = set([round(l.get_distance(t), 8) for l in t])
+                    self.assertEqual(len(dists), 1)
+
+        # Same trees after seeding the random module
+        random.seed(10)
+        t1 = random_tree(100, model="uniform", random_branches=True).write()
+        random.seed(10)
+        t2 = random_tree(100, model="uniform", random_branches=True).write()
+        self.assertEqual(t1, t2)
+        self.assertEqual(random_tree(100, random_state=5).write(),
+                         random_tree(100, random_state=5).write())
+
+        names = ["sp%d" %i for i in range(20)]
+        self.assertEqual(set(random_tree(20, names_library=names).get_leaf_names()),
+                         set(names))
+        self.assertTrue(set(random_tree(50, names_library=names, reuse_names=True)
+                            .get_leaf_names()) <= set(names))
+        self.assertRaises(ValueError, random_tree, 30, names_library=names)
+        self.assertRaises(ValueError, random_tree, 10, model="unknown")
+
+        # Populating existing nodes
+        t = PhyloTree("(A,B);")
+        t.populate(10, model="coalescent")
+        self.assertEqual(len(t), 12)
+        self.assertTrue(all([type(n) == PhyloTree for n in t.traverse()]))
+        t = Tree()
+        t.populate(1, model="yule", names_library=["A"])
+        self.assertEqual(t.write(format=9), "A;")
+
+        # Legacy trees do not change
+        random.seed(3)
+        t = Tree()
+        t.populate(6, random_branches=True)
+        self.assertEqual(t.write(format=9), "(((aaaaaaaaac,aaaaaaaaad),(aaaaaaaaae,aaaaaaaaaf)),"
+                         "(aaaaaaaaaa,aaaaaaaaab));")
+
+    def test_profiling(self):
+        import json, os, pstats, tempfile
+        from .. import profiling
+
+        write_fn = TreeNode.write
+        profiling.reset()
+        profiling.enable()
+        try:
+            self.assertTrue(profiling.is_enabled())
+            self.assertTrue(TreeNode.write is not write_fn)
+            t1 = Tree()
+            t1.populate(50)
+            t2 = Tree(t1.write())
+            t2.get_cached_content()
+            list(t2.traverse("postorder"))
+            t1.robinson_foulds(t2)
+        finally:
+            profiling.disable()
+        self.assertTrue(TreeNode.write is write_fn)
+        self.assertFalse(profiling.is_enabled())
+
+        # nothing is recorded once disabled
+        t1.write()
+        stats = profiling.get_stats()
+        self.assertEqual(stats["newick.write"]["calls"], 1)
+        self.assertEqual(stats["newick.read"]["calls"], 1)
+        self.assertTrue(stats["traverse.postorder"]["calls"] >= 1)
+        # robinson_foulds computes the cached content of both trees
+        self.assertEqual(stats["get_cached_content"]["calls"], 3)
+        self.assertEqual(stats["robinson_foulds"]["calls"], 1)
+        rf = stats["robinson_foulds"]
+        self.assertTrue(rf["cumtime"] >= rf["tottime"] >= 0.0)
+        self.assertEqual(json.loads(profiling.dump_json()), stats)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            profiling.dump_stats(path)
+            pstats_data = pstats.Stats(path)
+        finally:
+            os.remove(path)
+        op2stats = dict((func[2], values) for func, values in six.iteritems(pstats_data.stats))
+        self.assertEqual(op2stats["robinson_foulds"][1], 1)
+        callers = op2stats["get_cached_content"][4]
+        self.assertEqual(sorted(c[2] for c in callers), ["robinson_foulds"])
+
+        profiling.reset()
+        self.assertEqual(profiling.get_stats(), {})
+
+        try:
+            profiling.enable(memory=True)
+        except ValueError:
+            # tracemalloc.reset_peak not available
+            pass
+        else:
+            try:
+                Tree(t1.write())
+            finally:
+                profiling.disable()
+            self.assertTrue(profiling.get_stats()["newick.read"]["peak_memory"] > 0)
+            profiling.reset()
+
 
 
 
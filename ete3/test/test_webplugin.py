@@ -0,0 +1,251 @@
+from __future__ import absolute_import
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import json
+
+from .. import Tree
+from ..webplugin.tiles import TileCache, get_tiles_in_region
+from ..webplugin.session import TreeSessionStore
+from ..webplugin.renderpool import RenderPool
+from ..webplugin.spatial import NodeSpatialIndex
+from ..webplugin.webapp import WebTreeApplication, _get_fingerprint
+
+class Test_Webplugin_Tiles(unittest.TestCase):
+    """ Tests the tile cache used by the web plugin """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_tile_cache(self):
+        cache = TileCache(self.tmpdir, max_mem_tiles=2)
+        k1 = ("t1", 0, "s", 0, 0, 0)
+        k2 = ("t1", 0, "s", 1, 0, 0)
+        k3 = ("t2", 0, "s", 1, 1, 0)
+        cache.put(k1, b"A")
+        cache.put(k2, b"B")
+        cache.put(k3, b"C")
+        # k1 was evicted from memory, but it is still on disk
+        self.assertEqual(len(cache._mem), 2)
+        self.assertTrue(k1 not in cache._mem)
+        self.assertEqual(cache.get(k1), b"A")
+
+        cache.discard(k2)
+        self.assertEqual(cache.get(k2), None)
+
+        cache.clear("t1")
+        self.assertEqual(cache.get(k1), None)
+        self.assertEqual(cache.get(k3), b"C")
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "t1")))
+
+        mem_cache = TileCache(None)
+        mem_cache.put(k1, b"A")
+        self.assertEqual(mem_cache.get(k1), b"A")
+        self.assertEqual(mem_cache.get(k2), None)
+
+    def test_tiles_in_region(self):
+        scene = (0, 0, 512, 256)
+        self.assertEqual(get_tiles_in_region(scene, (10, 10, 20, 20), 0), [(0, 0)])
+        self.assertEqual(get_tiles_in_region(scene, (10, 10, 300, 20), 1), [(0, 0), (1, 0)])
+        self.assertEqual(sorted(get_tiles_in_region(scene, (0, 0, 512, 256), 2)),
+                         [(x, y) for x in range(4) for y in range(3)])
+        # regions out of the scene are clipped
+        self.assertEqual(get_tiles_in_region(scene, (-50, -50, 1000, 1000), 0), [(0, 0)])
+
+    def test_tile_range(self):
+        stdout = sys.stdout
+        try:
+            app = WebTreeApplication()
+        finally:
+            sys.stdout = stdout
+        app.CONFIG["temp_dir"] = self.tmpdir
+        app.enable_tile_rendering(max_zoom=2)
+        status = []
+        start_response = lambda code, headers: status.append(code)
+        for z, x, y in [(1, 2, 0), (1, 0, -1), (0, 10**9, 0), (3, 0, 0)]:
+            app._serve_tile({}, start_response,
+                            {"z": [str(z)], "x": [str(x)], "y": [str(y)]}, "t1")
+        self.assertEqual(status, ['404 Not Found'] * 4)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_style_fingerprint(self):
+        class Style(object):
+            def __init__(self, scale):
+                self.scale = scale
+                self.layout_fn = [lambda n: n.name.split("_")[0]]
+
+        style = Style(10)
+        self.assertEqual(_get_fingerprint(style), _get_fingerprint(Style(10)))
+        self.assertNotEqual(_get_fingerprint(style), _get_fingerprint(Style(20)))
+        # keys must not depend on memory addresses
+        self.assertTrue("0x" not in _get_fingerprint(style))
+        self.assertNotEqual(_get_fingerprint(lambda n: n.name.split("_")[0]),
+                            _get_fingerprint(lambda n: n.name.split("_")[1]))
+
+class Test_Webplugin_NodeIndex(unittest.TestCase):
+    """ Tests the spatial index replacing HTML image maps """
+    def test_node_index(self):
+        img_map = {"nodes": [[0, 0, 10, 10, 0, None],
+                             [100, 100, 110, 110, 1, None]],
+                   "faces": [[5, 5, 200, 20, 0, "label A"],
+                             [120, 100, 180, 110, 1, "label A"]],
+                   "node_areas": {0: [0, 0, 300, 300], 1: [100, 100, 190, 120]}}
+        index = NodeSpatialIndex(img_map, cell_size=32)
+        self.assertEqual(index.labels, ["label A"])
+        # node regions are reported before faces
+        hits = index.query(7, 7)
+        self.assertEqual([h[4:6] for h in hits], [(0, 0), (0, 1)])
+        self.assertEqual(hits[1][6], "label A")
+        self.assertEqual([h[4:6] for h in index.query(150, 15)], [(0, 1)])
+        self.assertEqual([h[4:6] for h in index.query(150, 105)], [(1, 1)])
+        self.assertEqual(index.query(50, 50), [])
+
+        data = json.loads(index.to_json())
+        self.assertEqual(len(data["rects"]), 4)
+        self.assertEqual(data["rects"][2], [5, 5, 200, 20, 0, 1, 0])
+        self.assertEqual(data["node_areas"]["1"], [100, 100, 190, 120])
+
+class Test_Webplugin_Sessions(unittest.TestCase):
+    """ Tests the session store used by the web plugin """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lru_and_spill(self):
+        store = TreeSessionStore(self.tmpdir, max_trees=2)
+        evicted = []
+        store.eviction_callbacks.append(evicted.append)
+        for i in range(3):
+            store.put("t%d" %i, Tree("((A,B),C);"))
+        self.assertEqual(evicted, ["t0"])
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.stats["evictions"], 1)
+        self.assertEqual(store.stats["spilled_trees"], 1)
+
+        # evicted trees are recovered from disk
+        t0 = store.get("t0")
+        self.assertEqual(sorted(t0.get_leaf_names()), ["A", "B", "C"])
+        self.assertEqual(store.stats["disk_hits"], 1)
+        store.get("t0")
+        self.assertEqual(store.stats["hits"], 1)
+        self.assertEqual(store.get("unknown"), None)
+        self.assertEqual(store.stats["misses"], 1)
+
+        # spilled sessions survive restarts
+        store.flush()
+        store2 = TreeSessionStore(self.tmpdir, max_trees=2)
+        self.assertTrue("t1" in store2)
+        self.assertEqual(store2.get("t1").write(), Tree("((A,B),C);").write())
+
+        store2.discard("t1")
+        self.assertFalse("t1" in store2)
+        self.assertRaises(ValueError, store2.get, "../t1")
+
+    def test_spill_size_limit(self):
+        store = TreeSessionStore(self.tmpdir, max_trees=1, max_spill_bytes=1)
+        for i in range(4):
+            store.put("t%d" %i, Tree("((A,B),C);"))
+        # Only the most recent spill is kept
+        self.assertEqual(store.get("t0"), None)
+        self.assertTrue(store.get("t2") is not None)
+        self.assertTrue(store.stats["discarded_spills"] > 0)
+
+    def test_node_index(self):
+        store = TreeSessionStore()
+        t = Tree("((A,B),C);")
+        for nid, n in enumerate(t.traverse("preorder")):
+            n.add_feature("_nid", nid)
+        store.put("t", t)
+        self.assertEqual(store.get_node("t", "2").name, "A")
+        self.assertEqual(store.get_node("t", 4).name, "C")
+        self.assertEqual(store.stats["index_builds"], 1)
+
+        # Index is only rebuilt when it is out of date
+        (t&"C").add_child(name="D")._nid = 5
+        store.touch("t")
+        self.assertEqual(store.get_node("t", "2").name, "A")
+        self.assertEqual(store.stats["index_builds"], 1)
+        self.assertEqual(store.get_node("t", "5").name, "D")
+        self.assertEqual(store.stats["index_builds"], 2)
+        self.assertEqual(store.get_node("t", "99"), None)
+        self.assertEqual(store.stats["index_builds"], 2)
+
+        # Detached nodes are not returned
+        (t&"A").up.detach()
+        self.assertEqual(store.get_node("t", "2"), None)
+        self.assertEqual(store.get_node("t", "3"), None)
+        self.assertEqual(store.get_node("t", "4").name, "C")
+
+        # Numbering nodes keeps the index up to date
+        store.number_nodes("t")
+        self.assertEqual(store.get_node("t", "2").name, "D")
+        self.assertEqual(store.stats["index_builds"], 2)
+
+        # Node ids are not node features
+        store.put("u", Tree("((A,B),C);"))
+        u = store.number_nodes("u")
+        self.assertEqual(u._nid, 0)
+        self.assertFalse("_nid" in u.write(features=[]))
+
+    def test_write_through(self):
+        # Two processes sharing the same sessions
+        store1 = TreeSessionStore(self.tmpdir, write_through=True)
+        store2 = TreeSessionStore(self.tmpdir, write_through=True)
+        store1.put("t", Tree("((A,B),C);"))
+        t2 = store2.get("t")
+        self.assertEqual(sorted(t2.get_leaf_names()), ["A", "B", "C"])
+
+        t2.add_child(name="D")
+        store2.touch("t")
+        self.assertEqual(sorted(store1.get("t").get_leaf_names()), ["A", "B", "C", "D"])
+        self.assertEqual(store1.stats["disk_hits"], 1)
+        store1.get("t")
+        self.assertEqual(store1.stats["hits"], 1)
+
+class Test_Webplugin_RenderPool(unittest.TestCase):
+    """ Tests the asynchronous render pool used by the web plugin """
+    def test_coalescing(self):
+        tmpdir = tempfile.mkdtemp()
+        pool = RenderPool(processes=1)
+        try:
+            t = Tree("((A,B),C);")
+            img = os.path.join(tmpdir, "t.png")
+            job1 = pool.submit(("t", 0, "s"), t, img)
+            job2 = pool.submit(("t", 0, "s"), t, img)
+            self.assertEqual(job1, job2)
+            # coalesced requests are not serialized
+            job2 = pool.submit(("t", 0, "s"), t, img, layout=lambda node: None)
+            self.assertEqual(job1, job2)
+            self.assertEqual(pool.stats["submitted"], 1)
+            self.assertEqual(pool.stats["coalesced"], 2)
+
+            job = pool.get_job(job1)
+            self.assertTrue(job.wait(60))
+            # Rendering may fail if Qt is not available, but jobs
+            # always finish
+            self.assertTrue(job.status in set(["done", "error"]))
+            self.assertEqual(job.requests, 3)
+
+            job3 = pool.submit(("t", 1, "s"), t, img)
+            self.assertNotEqual(job1, job3)
+            self.assertEqual(pool.get_job("unknown"), None)
+
+            # Arguments that cannot be sent to workers do not leave
+            # pending jobs behind
+            self.assertRaises(Exception, pool.submit, ("t", 2, "s"), t, img,
+                              layout=lambda node: None)
+            job4 = pool.submit(("t", 2, "s"), t, img)
+            self.assertEqual(pool.stats["coalesced"], 2)
+            self.assertTrue(pool.get_job(job4).wait(60))
+        finally:
+            pool.close()
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -50,7 +50,7 @@ TOOLSPATH = os.path.realpath(os.path.split(os.path.realpath(__file__))[0])
 #print sys.path
 
 import argparse
-from . import ete_split, ete_expand, ete_annotate, ete_ncbiquery, ete_view, ete_generate, ete_mod, ete_extract, ete_compare
+from . import ete_split, ete_expand, ete_annotate, ete_ncbiquery, ete_view, ete_generate, ete_mod, ete_extract, ete_compare, ete_bench
 from . import common
 from .common import log
 
@@ -178,6 +178,13 @@ def main():
     generate_args_p.set_defaults(func=ete_generate.run)
     ete_generate.populate_args(generate_args_p)
 
+    # - BENCH -
+    bench_args_p = subparser.add_parser("bench", parents=[main_args_p],
+                                        description=ete_bench.DESC,
+                                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    bench_args_p.set_defaults(func=ete_bench.run)
+    ete_bench.populate_args(bench_args_p)
+
     # - build -
     generate_args_p = subparser.add_parser("build")
 
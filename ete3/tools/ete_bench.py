@@ -0,0 +1,122 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+
+from .common import log
+from ..utils import print_table
+
+DESC = """
+ - ete bench -
+
+'bench' runs performance benchmarks of the most common ETE operations
+(newick parsing and writing, traversals, copies, pruning, rooting,
+comparisons, taxonomy annotation, alignments, clustering and rendering)
+on synthetic data of several sizes.
+
+Results can be saved as JSON (-o) and compared with those obtained in a
+previous run (--compare), i.e. in a different commit:
+
+  ete3 bench -o before.json
+  ete3 bench --compare before.json -o after.json
+"""
+
+def populate_args(bench_args_p):
+    bench_args = bench_args_p.add_argument_group("BENCHMARK OPTIONS")
+
+    bench_args.add_argument("--sizes", dest="sizes", type=int, nargs="+",
+                            help="tree sizes (number of leaves) used by benchmarks")
+
+    bench_args.add_argument("--repeat", dest="repeat", type=int, default=3,
+                            help="number of repetitions of each benchmark. Best time is reported.")
+
+    bench_args.add_argument("--only", dest="patterns", type=str, nargs="+",
+                            help="run only benchmarks whose group or name matches"
+                            " any of the given patterns, i.e. 'tree' or 'tree.traverse.*'")
+
+    bench_args.add_argument("--stress", dest="stress", action="store_true",
+                            help="run also stress benchmarks (large and deep trees,"
+                            " 1GB alignments). They take several minutes and a lot of memory.")
+
+    bench_args.add_argument("--memory", dest="memory", action="store_true",
+                            help="measure peak memory usage of each benchmark")
+
+    bench_args.add_argument("--compare", dest="compare", type=str,
+                            help="JSON file with results of a previous run")
+
+    bench_args.add_argument("--list", dest="list", action="store_true",
+                            help="list available benchmarks and exit")
+
+def run(args):
+    from ..test import bench
+
+    if args.list:
+        for b in bench.iter_benchmarks(args.patterns, stress=True):
+            if b.stress:
+                print(b.fullname, "(stress, size: %s)" %' '.join(map(str, b.sizes)))
+            else:
+                print(b.fullname)
+        return
+
+    def report(b, size, result):
+        if "skipped" in result:
+            log.warn("%s (%d): skipped, %s" %(b.fullname, size, result["skipped"]))
+        else:
+            memory = result.get("peak_memory")
+            print("%-40s % 8d % 12.6f%s" %(b.fullname, size, result["best"],
+                                          " % 12d" %memory if memory is not None else ""))
+            sys.stdout.flush()
+
+    reference = bench.load_results(args.compare) if args.compare else None
+
+    results = bench.run_benchmarks(sizes=args.sizes, repeat=args.repeat,
+                                   patterns=args.patterns, stress=args.stress,
+                                   memory=args.memory, callback=report)
+    if args.output:
+        bench.save_results(results, args.output)
+
+    if reference is not None:
+        rows = [[name, size, "%0.6f" %old, "%0.6f" %new, "%0.2f" %ratio]
+                for name, size, old, new, ratio in bench.compare_results(reference, results)]
+        if rows:
+            print()
+            print_table(rows, header=["benchmark", "size", "reference", "time", "ratio"],
+                        max_col_width=40)
@@ -37,21 +37,86 @@
 #
 # #END_LICENSE#############################################################
 from __future__ import absolute_import
-from .common import dump
+import argparse
+import multiprocessing
+import random
+import sys
+
 from six.moves import range
 
-DESC = ""
+DESC = """Generates random trees and writes them in newick format, one per
+line. Trees sampled from a model (--model) are built and written without
+creating tree nodes, which is much faster for large trees."""
 
 def populate_args(generate_args_p):
     generate_args_p.add_argument('--number', dest='number', type=int, default=1)
     generate_args_p.add_argument('--size', dest='size', type=int, default=10)
     generate_args_p.add_argument('--random_branches', dest='random_branches', action="store_true")
+    generate_args_p.add_argument('--model', dest='model', type=str, default=None,
+                                 choices=["yule", "coalescent", "uniform"],
+                                 help=("Model used to sample topologies and branch lengths."
+                                       " By default, trees are generated by TreeNode.populate()"))
+    generate_args_p.add_argument('--seed', dest='seed', type=int, default=None,
+                                 help=("Random seed. The same trees are generated regardless"
+                                       " of the number of processes"))
+    generate_args_p.add_argument("--processes", dest="processes", type=int, default=1,
+                                 help=("Number of processes used to generate the trees. Trees"
+                                       " are dumped in the same order in which they are generated."))
 
-def run(args):
-    import random
+# Options used by generate_tree(), sent once to every worker process
+GENERATE_OPTIONS = ["size", "random_branches", "model", "seed", "newick_format"]
+
+_WORKER_ARGS = None
+
+def _init_worker(generate_args):
+    global _WORKER_ARGS
+    _WORKER_ARGS = generate_args
+
+def _generate_newick(index):
+    return generate_tree(index, _WORKER_ARGS).write(format=_WORKER_ARGS.newick_format)
+
+def generate_tree(index, args):
+    """ Returns the tree number index. Trees sampled from a model are
+    returned as CompactTree instances."""
     from .. import Tree
+    from ..coretype.treegen import random_tree
+
+    # Every tree has its own seed, so results do not depend on the
+    # order in which trees are generated
+    random.seed(args.seed * 2**32 + index)
+    if args.model:
+        return random_tree(args.size, model=args.model,
+                           random_branches=args.random_branches)
+    t = Tree()
+    t.populate(args.size, random_branches=args.random_branches)
+    return t
+
+def run(args):
+    if args.seed is None:
+        args.seed = random.getrandbits(32)
+
+    if args.output:
+        OUT = open(args.output, "w")
+    else:
+        OUT = sys.stdout
 
-    for n in range(args.number):
-        t = Tree()
-        t.populate(args.size, random_branches=args.random_branches)
-        dump(t)
+    try:
+        if args.processes > 1:
+            generate_args = argparse.Namespace(**dict((k, getattr(args, k))
+                                                      for k in GENERATE_OPTIONS))
+            pool = multiprocessing.Pool(args.processes, _init_worker, (generate_args,))
+            try:
+                for nw in pool.imap(_generate_newick, range(args.number), chunksize=16):
+                    OUT.write(nw)
+                    OUT.write("\n")
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for index in range(args.number):
+                # Newick text is written in chunks, as it is generated
+                generate_tree(index, args).write(outfile=OUT, format=args.newick_format)
+                OUT.write("\n")
+    finally:
+        if OUT is not sys.stdout:
+            OUT.close()
@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+from __future__ import print_function
 # #START_LICENSE###########################################################
 #
 #
@@ -37,6 +38,9 @@ from __future__ import absolute_import
 #
 #
 # #END_LICENSE#############################################################
+import argparse
+import multiprocessing
+
 from .common import dump
 
 DESC = ""
@@ -66,6 +70,10 @@ def populate_args(mod_args_p):
                                  "thus preserving original tree length."))
 
 
+    mod_args.add_argument("--root_midpoint", "--root-midpoint", dest="root_midpoint",
+                          action = "store_true",
+                           help="Root the tree at the midpoint of its longest path.")
+
     mod_args.add_argument("--unroot", dest="unroot",
                           action = "store_true",
                            help="Unroots the tree.")
@@ -87,11 +95,44 @@ def populate_args(mod_args_p):
                           action = "store_true",
                            help="Standardize tree topology by expanding polytomies and single child nodes.")
 
+    mod_args.add_argument("--processes", dest="processes",
+                          type=int, default=1,
+                           help=("Number of processes used to modify the trees. Trees are"
+                                 " streamed through the pool and dumped in their original order."))
+
+
 
+# Options used by mod_tree(), sent once to every worker process
+MOD_OPTIONS = ["outgroup", "ultrametric", "prune", "prune_preserve_lengths",
+               "root_midpoint", "unroot", "sort", "ladderize",
+               "resolve_polytomies", "standardize"]
+
+_WORKER_ARGS = None
+
+def _init_worker(mod_args):
+    global _WORKER_ARGS
+    _WORKER_ARGS = mod_args
+
+def _mod_newick(nw):
+    from .. import Tree
+    t = Tree(nw)
+    mod_tree(t, _WORKER_ARGS)
+    return t.write(format=0)
 
 def run(args):
     from .. import Tree
 
+    if args.processes > 1:
+        mod_args = argparse.Namespace(**dict((k, getattr(args, k)) for k in MOD_OPTIONS))
+        pool = multiprocessing.Pool(args.processes, _init_worker, (mod_args,))
+        try:
+            for nw in pool.imap(_mod_newick, args.src_tree_iterator, chunksize=64):
+                print(nw)
+        finally:
+            pool.terminate()
+            pool.join()
+        return
+
     for nw in args.src_tree_iterator:
         t = Tree(nw)
         mod_tree(t, args)
@@ -104,14 +145,18 @@ def mod_tree(t, args):
     if args.prune:
         t.prune(args.prune, preserve_branch_length=args.prune_preserve_lengths)
 
-    if args.outgroup and args.unroot:
-        raise ValueError("--ourgroup and --unroot options are mutually exclusive")
+    if sum(map(bool, [args.outgroup, args.root_midpoint, args.unroot])) > 1:
+        raise ValueError("--ourgroup, --root_midpoint and --unroot options are mutually exclusive")
     elif args.outgroup:
         if len(args.outgroup) > 1:
             outgroup = t.get_common_ancestor(args.outgroup)
         else:
             outgroup = t & args.outgroup[0]
         t.set_outgroup(outgroup)
+    elif args.root_midpoint:
+        outgroup = t.get_midpoint_outgroup()
+        if outgroup is not None and outgroup is not t:
+            t.set_outgroup(outgroup)
     elif args.unroot:
         t.unroot()
 
@@ -271,14 +271,15 @@ def merge_arg_dicts(source, target, parent=""):
     return target
 
 def load_node_size(n):
-    if n.is_leaf():
-        size = 1
-    else:
-        size = 0
-        for ch in n.children:
-            size += load_node_size(ch)
-    n.add_feature("_size", size)
-    return size
+    for node in n.traverse("postorder"):
+        if node.is_leaf():
+            size = 1
+        else:
+            size = 0
+            for ch in node.children:
+                size += ch._size
+        node.add_feature("_size", size)
+    return n._size
 
 def render_tree(tree, fname):
     # Generates tree snapshot
@@ -476,16 +477,14 @@ def print_as_table(rows, header=None, fields=None, print_header=True, stdout=sys
 
 def get_node2content(node, store=None):
     if not store: store = {}
-    for ch in node.children:
-        get_node2content(ch, store=store)
-
-    if node.children:
-        val = []
-        for ch in node.children:
-            val.extend(store[ch])
-        store[node] = val
-    else:
-        store[node] = [node.name]
+    for n in node.traverse("postorder"):
+        if n.children:
+            val = []
+            for ch in n.children:
+                val.extend(store[ch])
+            store[n] = val
+        else:
+            store[n] = [n.name]
     return store
 
 def iter_prepostorder(tree, is_leaf_fn=None):
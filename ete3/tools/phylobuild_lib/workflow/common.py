@@ -49,7 +49,6 @@ from .. import db
 from ..errors import ConfigError, DataError, TaskError
 from ..master_task import register_task_recursively, isjob
 import six
-from six.moves import range
 
 log = logging.getLogger("main")
 
@@ -140,33 +139,18 @@ def get_iternumber(threadid):
 
 def get_identity(fname):
     s = SeqGroup(fname)
-    seqlen = len(six.itervalues(s.id2seq))
-    ident = list()
-    for i in range(seqlen):
-        states = defaultdict(int)
-        for seq in six.itervalues(s.id2seq):
-            if seq[i] != "-":
-                states[seq[i]] += 1
-        values = list(states.values())
-        if values:
-            ident.append(float(max(values))/sum(values))
-    return (_max(ident), _min(ident),
-            _mean(ident), _std(ident))
+    return _get_conservation_stats(s.to_matrix())
 
 
 def get_seqs_identity(alg, seqs):
     ''' Returns alg statistics regarding a set of sequences'''
-    seqlen = len(alg.get_seq(seqs[0]))
-    ident = list()
-    for i in range(seqlen):
-        states = defaultdict(int)
-        for seq_id in seqs:
-            seq = alg.get_seq(seq_id)
-            if seq[i] != "-":
-                states[seq[i]] += 1
-        values = list(states.values())
-        if values:
-            ident.append(float(max(values))/sum(values))
+    return _get_conservation_stats(alg.to_matrix(names=seqs))
+
+
+def _get_conservation_stats(matrix):
+    # Columns with gaps only are not considered
+    ident = matrix.get_conservation()
+    ident = ident[ident == ident]
     return (_max(ident), _min(ident),
             _mean(ident), _std(ident))
 
@@ -569,27 +553,43 @@ def select_outgroups(target, n2content, splitterconf):
     return set(seqs), set(outs)
 
 def distance_matrix_new(target, leaf_only=False, topology_only=False):
+    """ Returns the distances from target to all the nodes in its tree,
+    as if the tree were rooted at target's branch: a bifurcated root is
+    not reported (its two branches are merged) and, when topology_only
+    is used, target's branch counts as two for nodes outside it. """
     t = target.get_tree_root()
-    real_outgroup = t.children[0]
-    t.set_outgroup(target)
+    unrooted = len(t.children) == 2
 
     n2dist = {target:0}
     for n in target.get_descendants("preorder"):
         n2dist[n] = n2dist[n.up] + (topology_only or n.dist)
 
-    sister = target.get_sisters()[0]
-    n2dist[sister] = (topology_only or sister.dist)+ (topology_only or target.dist)
-    for n in sister.get_descendants("preorder"):
-        n2dist[n] = n2dist[n.up] + (topology_only or n.dist)
-
-    t.set_outgroup(real_outgroup)
+    # Walk towards the root, visiting the sister branches of each
+    # ancestor.
+    prev_dist = 0
+    if topology_only:
+        # target's branch is split by the root
+        prev_dist += 1
+    prev, current = target, target.up
+    while current:
+        branch = (topology_only or prev.dist)
+        if current is t and unrooted:
+            sister = [ch for ch in current.children if ch is not prev][0]
+            if not topology_only:
+                branch += sister.dist
+            n2dist[sister] = prev_dist + branch
+            sisters = [sister]
+        else:
+            n2dist[current] = prev_dist + branch
+            sisters = [ch for ch in current.children if ch is not prev]
+            for ch in sisters:
+                n2dist[ch] = n2dist[current] + (topology_only or ch.dist)
+        for sister in sisters:
+            for n in sister.get_descendants("preorder"):
+                n2dist[n] = n2dist[n.up] + (topology_only or n.dist)
+        prev_dist = n2dist.get(current)
+        prev, current = current, current.up
 
-    ## Slow Test.
-    # for n in t.get_descendants():
-    #     if float(str(target.get_distance(n))) != float(str(n2dist[n])):
-    #         print n
-    #         print target.get_distance(n), n2dist[n]
-    #         raw_input("ERROR")
     return n2dist
 
 
@@ -39,16 +39,17 @@ from __future__ import absolute_import
 # #END_LICENSE#############################################################
 import types
 import signal
+import six
 
 from PyQt4  import QtGui
 from PyQt4  import QtCore
 from .qt4_gui import _GUI, _PropertiesDialog, _BasicNodeActions
 
 from . import layouts
-from .main import save
+from .main import save, save_tile
 from .qt4_render import _TreeScene, render, get_tree_img_map, init_tree_style
 
-__all__ = ["show_tree", "render_tree"]
+__all__ = ["show_tree", "render_tree", "get_scene", "render_tile"]
 
 _QApp = None
 GUI_TIMEOUT = None
@@ -99,7 +100,7 @@ def render_tree(t, imgName, w=None, h=None, layout=None,
     """ Render tree image into a file."""
     global _QApp
     for nid, n in enumerate(t.traverse("preorder")):
-        n.add_feature("_nid", nid)
+        n._nid = nid
     scene, img = init_scene(t, layout, tree_style)
     tree_item, n2i, n2f = render(t, img)
 
@@ -115,6 +116,40 @@ def render_tree(t, imgName, w=None, h=None, layout=None,
     return imgmap
 
 
+def get_scene(t, layout=None, tree_style=None):
+    """ Builds the drawing scene of a tree, so it can be rasterized
+    several times (i.e. tile by tile) without being recomputed."""
+    for nid, n in enumerate(t.traverse("preorder")):
+        n._nid = nid
+    scene, img = init_scene(t, layout, tree_style)
+    tree_item, n2i, n2f = render(t, img)
+    scene.init_values(t, img, n2i, n2f)
+    tree_item.setParentItem(scene.master_item)
+    scene.master_item.setPos(0,0)
+    scene.addItem(scene.master_item)
+    return scene
+
+def get_scene_node_regions(scene):
+    """ Returns a dictionary with the scene region (x1, y1, x2, y2)
+    occupied by every node, including its descendants and faces."""
+    node2region = {}
+    for n, item in six.iteritems(scene.n2i):
+        rect = item.mapToScene(item.fullRegion).boundingRect()
+        node2region[n] = (rect.x(), rect.y(),
+                          rect.x() + rect.width(),
+                          rect.y() + rect.height())
+    return node2region
+
+def get_scene_img_map(scene):
+    """ Returns the image map of a precomputed scene, in scene
+    coordinates. """
+    return get_tree_img_map(scene.n2i)
+
+def render_tile(scene, zoom, x, y, tile_size=256):
+    """ Returns the PNG data of a given tile of a precomputed
+    scene. See :func:`get_scene`."""
+    return save_tile(scene, zoom, x, y, tile_size=tile_size)
+
 def get_img(t, w=None, h=None, layout=None, tree_style = None,
             header=None, units="px", dpi=90):
     global _QApp
@@ -47,14 +47,16 @@ from PyQt4.QtGui import (QGraphicsRectItem, QGraphicsLineItem,
 from PyQt4.QtCore import Qt,  QPointF, QRect, QRectF
 
 import math
-from .main import add_face_to_node, _Background, _Border, COLOR_SCHEMES
+from .main import add_face_to_node, _Background, _Border, _leaf, COLOR_SCHEMES
+from . import heatmap
 import six
 from six.moves import map
 from six.moves import range
 from six.moves import zip
 
 try:
-    from numpy import isfinite as _isfinite, ceil
+    import numpy
+    from numpy import isfinite as _isfinite
 except ImportError:
     pass
 else:
@@ -163,6 +165,10 @@ class Face(object):
     :param inner_background.color: background color of the face excluding margins
     :param border: Border around face margins.
     :param inner_border: Border around face excluding margins.
+    :param False span_leaves: Only for aligned faces of internal nodes
+      in rectangular mode. If True, the face is drawn next to the
+      leaves under the node and stretched to cover all their rows
+      (otherwise, aligned faces of internal nodes are not drawn).
 
     **border and inner_border sub-parameters:**
 
@@ -197,6 +203,7 @@ class Face(object):
         self.inner_border = _Border()
         self.inner_background = _Background()
         self.rotation = 0
+        self.span_leaves = False
 
     def _size(self):
         if self.pixmap:
@@ -420,6 +427,14 @@ class ProfileFace(Face):
       min values to max values. 0=green & blue; 1=green & red; 2=red &
       blue. In all three cases, missing values are rendered in black
       and transition color (values=center) is white.
+
+    Heatmaps are computed as a single image buffer for all the leaves
+    under the node the face is attached to. Adding a "heatmap" face to
+    a collapsed internal node renders the whole block of rows as one
+    pixmap, while adding it to each leaf renders one row per face. If
+    the face is aligned to an internal node and `span_leaves` is set,
+    one row is drawn per visible leaf and the pixmap is stretched to
+    the rows of the tree (this is what the "heatmap" layout does).
     """
 
     def __init__(self,max_v,min_v,center_v,width=200,height=40,style="lines", colorscheme=2):
@@ -444,59 +459,12 @@ class ProfileFace(Face):
             self.draw_centered_bar_profile()
 
     def get_color_gradient(self):
-        colors = []
-        if self.colorscheme == 0:
-            # Blue and Green
-            for a in range(100,0,-1):
-                color=QColor()
-                color.setRgb( 200-2*a,255,200-2*a )
-                colors.append(color)
-
-            colors.append(QColor("white"))
-
-            for a in range(0,100):
-                color=QColor()
-                color.setRgb( 200-2*a,200-2*a,255 )
-                colors.append(color)
-#            color=QColor()
-#            color.setRgb( 0,255,255 )
-#            colors.append(color)
-
-        elif self.colorscheme == 1:
-            for a in range(100,0,-1):
-                color=QColor()
-                color.setRgb( 200-2*a,255,200-2*a )
-                colors.append(color)
-
-            colors.append(QColor("white"))
-
-            for a in range(0,100):
-                color=QColor()
-                color.setRgb( 255,200-2*a,200-2*a )
-                colors.append(color)
-#            color=QColor()
-#            color.setRgb(255,255,0 )
-#            colors.append(color)
-
-        else:
-            # Blue and Red
-            for a in range(100,0,-1):
-                color=QColor()
-                color.setRgb( 200-2*a,200-2*a,255 )
-                colors.append(color)
-
-            colors.append(QColor("white"))
-
-            for a in range(0,100):
-                color=QColor()
-                color.setRgb( 255,200-2*a,200-2*a )
-                colors.append(color)
+        return [QColor.fromRgba(int(c)) for c in heatmap.get_color_lut(self.colorscheme)[:heatmap.NAN_INDEX]]
 
-#            color=QColor()
-#            color.setRgb( 255,0,255 )
-#            colors.append(color)
-
-        return colors
+    def get_color_indexes(self, vector):
+        """ Returns the position of each value of the vector in the
+        color gradient (missing values are mapped to black)."""
+        return heatmap.get_color_indexes(vector, self.min_value, self.max_value, self.center_v)
 
     def draw_bar_profile(self):
         # Calculate vector
@@ -506,7 +474,12 @@ class ProfileFace(Face):
         if mean_vector is None:
             return
 
-        colors = self.get_color_gradient()
+        colors = heatmap.get_color_lut(self.colorscheme)
+        # Colors and scaled values are computed at once for the whole
+        # vector
+        color_indexes = self.get_color_indexes(mean_vector)
+        mean_values = self.fit_to_scale_vector(mean_vector)
+        dev_values = self.fit_to_scale_vector(deviation_vector)
 
         vlength = len(mean_vector)
         # pixels per array position
@@ -552,22 +525,15 @@ class ProfileFace(Face):
             x1 = x2
             x2 = x1 + x_alpha
 
-            dev1 =  self.fit_to_scale(deviation_vector[pos])
-            mean1 = self.fit_to_scale(mean_vector[pos])
+            dev1 = dev_values[pos]
+            mean1 = mean_values[pos]
 
             # If nan value, skip
-            if not isfinite(mean1):
+            if color_indexes[pos] == heatmap.NAN_INDEX:
                 continue
 
             # Set heatmap color
-            if mean1 > self.center_v:
-                color_index = abs(int(ceil(((self.center_v - mean1) * 100) / (self.max_value - self.center_v))))
-                customColor = colors[100 + color_index]
-            elif mean1 < self.center_v:
-                color_index = abs(int(ceil(((self.center_v - mean1) * 100) / (self.min_value - self.center_v))))
-                customColor = colors[100 - color_index]
-            else:
-                customColor = colors[100]
+            customColor = QColor.fromRgba(int(colors[color_indexes[pos]]))
 
             # mean bar high
             mean_y1     = int ( (mean1 - self.min_value) * y_alpha)
@@ -594,7 +560,12 @@ class ProfileFace(Face):
         if mean_vector is None:
             return
 
-        colors = self.get_color_gradient()
+        colors = heatmap.get_color_lut(self.colorscheme)
+        # Colors and scaled values are computed at once for the whole
+        # vector
+        color_indexes = self.get_color_indexes(mean_vector)
+        mean_values = self.fit_to_scale_vector(mean_vector)
+        dev_values = self.fit_to_scale_vector(deviation_vector)
 
         vlength = len(mean_vector)
         # pixels per array position
@@ -642,27 +613,15 @@ class ProfileFace(Face):
             x1 = x2
             x2 = x1 + x_alpha
 
-            dev1 =  self.fit_to_scale( deviation_vector[pos]   )
-            mean1 = self.fit_to_scale( mean_vector[pos]        )
+            dev1 = dev_values[pos]
+            mean1 = mean_values[pos]
 
             # If nan value, skip
-            if not isfinite(mean1):
+            if color_indexes[pos] == heatmap.NAN_INDEX:
                 continue
 
             # Set heatmap color
-            if mean1>self.center_v:
-                color_index = abs(int(ceil(((self.center_v-mean1)*100)/(self.max_value-self.center_v))))
-                customColor = colors[100 + color_index]
-
-                #print mean1, color_index, len(colors), "%x" %colors[100 + color_index].rgb()
-                #print abs(((self.center_v-mean1)*100)/(self.max_value-self.center_v))
-                #print round(((self.center_v-mean1)*100)/(self.max_value-self.center_v))
-
-            elif mean1<self.center_v:
-                color_index = abs(int(ceil(((self.center_v-mean1)*100)/(self.min_value-self.center_v))))
-                customColor = colors[100 - color_index]
-            else:
-                customColor = colors[100]
+            customColor = QColor.fromRgba(int(colors[color_indexes[pos]]))
 
             # mean bar high
             if mean1 < self.center_v:
@@ -740,97 +699,76 @@ class ProfileFace(Face):
         p.drawLine(x2+1, line2_y, profile_width-2, line2_y )
         p.drawLine(x2+1, line3_y, profile_width-2, line3_y )
 
-        # Draw lines
-        for pos in range(0,vlength-1):
-            dev1 =  self.fit_to_scale(mean_vector[pos] + deviation_vector[pos])
-            dev2 =  self.fit_to_scale(mean_vector[pos+1] + deviation_vector[pos+1])
-            mean1 = self.fit_to_scale(mean_vector[pos])
-            mean2 = self.fit_to_scale(mean_vector[pos+1])
-            # first and second X pixel positions
-            x1 = x2
-            x2 = x1 + x_alpha
-
-            # Draw vt grid
-            if x2 < profile_width:
-                p.setPen(dashedPen)
-                p.drawLine(x2, y+1, x2, profile_height-2)
-
-            # If nan values, continue
-            if not isfinite(mean1) or not isfinite(mean2):
-                continue
-
-            # First Y postions for mean
-            mean_y1 = (mean1 - self.min_value) * y_alpha
-            # Second Y postions for mean
-            mean_y2 = (mean2 - self.min_value) * y_alpha
-            if dev1!= 0 and dev2!=0:
-                # First Y postions for deviations
-                dev_y1   = (dev1 - self.min_value) * y_alpha
-                # Second Y postions for deviations
-                dev_y2   = (dev2 - self.min_value) * y_alpha
-                # Draw red deviation lines
-                p.setPen(QColor("red"))
-                p.drawLine(x1, profile_height-dev_y1, x2, profile_height-dev_y2)
-                p.drawLine(x1, profile_height+dev_y1, x2, profile_height+dev_y2)
-            # Draw blue mean line
-            p.setPen(QColor("blue"))
-            p.drawLine(x1, profile_height-mean_y1, x2, profile_height-mean_y2)
-
+        # Draw vt grid
+        p.setPen(dashedPen)
+        for pos in range(1, vlength):
+            x = pos * x_alpha
+            if x < profile_width:
+                p.drawLine(x, y+1, x, profile_height-2)
+
+        # Y positions of all means and deviations are computed at once
+        means = self.fit_to_scale_vector(mean_vector)
+        devs = self.fit_to_scale_vector(numpy.asarray(mean_vector, dtype=float) +
+                                        numpy.asarray(deviation_vector, dtype=float))
+        mean_y = (means - self.min_value) * y_alpha
+        dev_y = (devs - self.min_value) * y_alpha
+        x_pos = numpy.arange(vlength) * x_alpha
+
+        # Segments are skipped when any of their ends is missing
+        valid = numpy.isfinite(means[:-1]) & numpy.isfinite(means[1:])
+        with_dev = valid & (devs[:-1] != 0) & (devs[1:] != 0)
+
+        # Draw red deviation lines
+        p.setPen(QColor("red"))
+        for pos in numpy.nonzero(with_dev)[0]:
+            x1, x2 = x_pos[pos], x_pos[pos+1]
+            p.drawLine(x1, profile_height-dev_y[pos], x2, profile_height-dev_y[pos+1])
+            p.drawLine(x1, profile_height+dev_y[pos], x2, profile_height+dev_y[pos+1])
+
+        # Draw blue mean line, as a single polyline per run of valid
+        # segments
+        p.setPen(QColor("blue"))
+        line = QPolygonF()
+        for pos in range(vlength-1):
+            if valid[pos]:
+                if line.isEmpty():
+                    line.append(QPointF(x_pos[pos], profile_height-mean_y[pos]))
+                line.append(QPointF(x_pos[pos+1], profile_height-mean_y[pos+1]))
+            elif not line.isEmpty():
+                p.drawPolyline(line)
+                line = QPolygonF()
+        if not line.isEmpty():
+            p.drawPolyline(line)
 
     def draw_heatmap_profile(self):
         # Calculate vector
         vector = self.node.profile
-        deviation = self.node.deviation
         # If no vector, skip
         if vector is None:
             return
 
-        colors = self.get_color_gradient()
-
-        leaves = self.node.get_leaves()
-
-        vlength = len(vector)
-        # pixels per array position
-        img_height = self.height * len(leaves)
-        profile_width = self.width
-        profile_height= img_height
-
-        x_alpha = float( profile_width / (len(vector)) )
-
-        # Creates a pixmap
-        self.pixmap = QPixmap(self.width,img_height)
-        self.pixmap.fill(QColor("white"))
-        p = QPainter(self.pixmap)
-
-        x2 = 0
-        y  = 0
-        y_step = self.height
-        for leaf in leaves:
-            mean_vector = leaf.profile
-            deviation_vector = leaf.deviation
-            # Draw heatmap
-            for pos in range(vlength):
-                # first and second X pixel positions
-                x1 = x2
-                x2 = x1 + x_alpha
-                dev1 =  self.fit_to_scale( deviation_vector[pos]   )
-                mean1 = self.fit_to_scale( mean_vector[pos]        )
-                # Set heatmap color
-                if not isfinite(mean1):
-                    customColor = QColor("black")
-                elif mean1>self.center_v:
-                    color_index = abs(int(ceil(((self.center_v-mean1)*100)/(self.max_value-self.center_v))))
-                    customColor = colors[100 + color_index]
-                elif mean1<self.center_v:
-                    color_index = abs(int(ceil(((self.center_v-mean1)*100)/(self.min_value-self.center_v))))
-                    customColor = colors[100 - color_index]
-                else:
-                    customColor = colors[100]
-
-                # Fill bar with custom color
-                p.fillRect(x1, y, x_alpha, y_step, QBrush(customColor))
-            y+= y_step
-            x2 = 0
+        if self.span_leaves and not _leaf(self.node):
+            # One pixel per row. The renderer stretches the pixmap to
+            # the position of the leaves
+            leaves = self.node.get_leaves(is_leaf_fn=_leaf)
+            cell_height = 1
+        else:
+            leaves = self.node.get_leaves()
+            cell_height = self.height
+        matrix = self.get_leaf_matrix(leaves)
+
+        # The whole heatmap (all leaves under the node) is computed as a
+        # single RGBA buffer and blitted as one pixmap
+        buf = heatmap.get_heatmap_buffer(matrix, self.min_value,
+                                         self.max_value, self.center_v,
+                                         colorscheme=self.colorscheme,
+                                         width=self.width,
+                                         cell_height=cell_height)
+        self.pixmap = QPixmap.fromImage(heatmap.get_heatmap_qimage(buf))
+
+    def get_leaf_matrix(self, leaves):
+        """ Returns the matrix of profiles of the given leaves. """
+        return numpy.array([leaf.profile for leaf in leaves], dtype=float)
 
     def fit_to_scale(self,v):
         if v<self.min_value:
@@ -840,6 +778,10 @@ class ProfileFace(Face):
         else:
             return float(v)
 
+    def fit_to_scale_vector(self, vector):
+        return numpy.clip(numpy.asarray(vector, dtype=float),
+                          self.min_value, self.max_value)
+
 
 class OLD_SequenceFace(Face):
     """ Creates a new molecular sequence face object.
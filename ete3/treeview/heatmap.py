@@ -0,0 +1,176 @@
+from __future__ import absolute_import
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+
+"""
+NumPy helpers used to render expression matrices (heatmaps and profile
+plots) without painting every cell with an individual QPainter call.
+
+Colors are encoded as 32 bit ARGB integers (QRgb values), so the buffers
+produced here can be wrapped into a QImage in a single step.
+"""
+
+from .. import numpy
+
+__all__ = ["get_color_lut", "get_color_indexes", "get_heatmap_buffer",
+           "get_heatmap_qimage"]
+
+# Position of the transition color (center value) and the missing value
+# color within the lookup tables
+CENTER_INDEX = 100
+NAN_INDEX = 201
+
+_LUT_CACHE = {}
+
+def _rgb(r, g, b):
+    return (0xff << 24) | (r << 16) | (g << 8) | b
+
+def get_color_lut(colorscheme=2):
+    """
+    Returns the color lookup table used by ProfileFace as a numpy array
+    of ARGB values. Positions 0-99 contain the gradient for values below
+    the center, position 100 is the center color (white), positions
+    101-200 the gradient for values above the center and position 201
+    the color used for missing values (black).
+
+    Tables are computed only once per color scheme.
+
+    :argument 2 colorscheme: 0=green & blue; 1=green & red; 2=red & blue.
+    """
+    if colorscheme not in (0, 1):
+        colorscheme = 2
+
+    lut = _LUT_CACHE.get(colorscheme, None)
+    if lut is not None:
+        return lut
+
+    # a goes from 100 to 1 for the lower half and from 0 to 99 for the
+    # upper one
+    low = 200 - 2 * numpy.arange(100, 0, -1)
+    high = 200 - 2 * numpy.arange(0, 100)
+    full = numpy.empty(100, dtype=int)
+    full.fill(255)
+
+    if colorscheme == 0:
+        lower = (low, full, low)
+        upper = (high, high, full)
+    elif colorscheme == 1:
+        lower = (low, full, low)
+        upper = (full, high, high)
+    else:
+        lower = (low, low, full)
+        upper = (full, high, high)
+
+    lut = numpy.empty(202, dtype=numpy.uint32)
+    lut[:CENTER_INDEX] = [_rgb(int(r), int(g), int(b)) for r, g, b in zip(*lower)]
+    lut[CENTER_INDEX] = _rgb(255, 255, 255)
+    lut[CENTER_INDEX+1:NAN_INDEX] = [_rgb(int(r), int(g), int(b)) for r, g, b in zip(*upper)]
+    lut[NAN_INDEX] = _rgb(0, 0, 0)
+    lut.flags.writeable = False
+    _LUT_CACHE[colorscheme] = lut
+    return lut
+
+def get_color_indexes(values, min_v, max_v, center_v):
+    """
+    Maps an array of values to positions in the color lookup tables
+    returned by :func:`get_color_lut`. Values are first fitted to the
+    [min_v, max_v] range. Non finite values are mapped to the missing
+    value color.
+    """
+    values = numpy.asarray(values, dtype=float)
+    fitted = numpy.clip(values, min_v, max_v)
+    finite = numpy.isfinite(fitted)
+
+    indexes = numpy.empty(values.shape, dtype=numpy.intp)
+    indexes.fill(CENTER_INDEX)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        up = finite & (fitted > center_v)
+        if max_v != center_v:
+            steps = numpy.floor((fitted[up] - center_v) * 100.0 / (max_v - center_v))
+            indexes[up] = CENTER_INDEX + steps.astype(numpy.intp)
+        down = finite & (fitted < center_v)
+        if min_v != center_v:
+            steps = numpy.floor((center_v - fitted[down]) * 100.0 / (center_v - min_v))
+            indexes[down] = CENTER_INDEX - steps.astype(numpy.intp)
+    numpy.clip(indexes, 0, NAN_INDEX - 1, out=indexes)
+    indexes[~finite] = NAN_INDEX
+    return indexes
+
+def _scale_positions(cells, pixels):
+    # Maps every pixel to the cell it belongs to
+    return (numpy.arange(pixels) * cells) // pixels
+
+def get_heatmap_buffer(matrix, min_v, max_v, center_v, colorscheme=2,
+                       width=None, cell_height=1):
+    """
+    Returns a 2D numpy array of ARGB values representing the heatmap of
+    the given matrix (one row per leaf, one column per condition).
+
+    :argument matrix: a 2D array-like object. Missing values should be
+      encoded as nan.
+    :argument None width: width of the image in pixels. Matrix columns
+      are stretched to fill it. If None, one pixel is used per column.
+    :argument 1 cell_height: height in pixels of each matrix row.
+    """
+    matrix = numpy.asarray(matrix, dtype=float)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    nrows, ncols = matrix.shape
+    if width is None:
+        width = ncols
+
+    colors = get_color_lut(colorscheme)[get_color_indexes(matrix, min_v, max_v, center_v)]
+    if width != ncols and ncols:
+        colors = colors[:, _scale_positions(ncols, int(width))]
+    if cell_height != 1:
+        colors = numpy.repeat(colors, int(cell_height), axis=0)
+    return numpy.ascontiguousarray(colors)
+
+def get_heatmap_qimage(buf):
+    """
+    Converts an ARGB buffer, as returned by :func:`get_heatmap_buffer`,
+    into a QImage that owns a copy of the data.
+    """
+    from PyQt4.QtGui import QImage
+    buf = numpy.ascontiguousarray(buf, dtype=numpy.uint32)
+    height, width = buf.shape
+    data = buf.tobytes()
+    img = QImage(data, width, height, width * 4, QImage.Format_ARGB32)
+    # QImage does not keep a reference to the python buffer
+    return img.copy()
@@ -80,7 +80,12 @@ def phylogeny(node):
     else:
         node.img_style["size"] = 6
 
-def heatmap(node):
+def heatmap(node, per_leaf=False):
+    """ Draws the profiles of all leaves as a heatmap. By default, the
+    whole heatmap is a single pixmap aligned to the root node, which
+    is only drawn in rectangular mode. Use per_leaf=True (i.e.
+    functools.partial(heatmap, per_leaf=True)) to add one face to
+    every leaf instead."""
     square_size = 10
     # Extras node info
     node.collapsed = False
@@ -89,22 +94,27 @@ def heatmap(node):
     node.img_style["fgcolor"] = "#3333FF"
     node.img_style["size"] =  0
 
-    ncols = node.arraytable.matrix.shape[1]
+    if per_leaf:
+        add_profile = node.is_leaf()
+    else:
+        # A single face spanning all leaves
+        add_profile = node.up is None
 
-    matrix_max = numpy.max(node.arraytable._matrix_max)
-    matrix_min = numpy.min(node.arraytable._matrix_min)
-    print(matrix_max)
-    matrix_avg = matrix_min+((matrix_max-matrix_min)/2)
+    if add_profile:
+        ncols = node.arraytable.matrix.shape[1]
+        matrix_max = numpy.max(node.arraytable._matrix_max)
+        matrix_min = numpy.min(node.arraytable._matrix_min)
+        matrix_avg = matrix_min+((matrix_max-matrix_min)/2)
 
-    ProfileFace = faces.ProfileFace(\
-      matrix_max,\
-        matrix_min,\
-        matrix_avg,\
-        square_size*ncols,\
-        square_size,\
-        "heatmap")
-    ProfileFace.ymargin=0
-    if node.is_leaf():
+        ProfileFace = faces.ProfileFace(\
+          matrix_max,\
+            matrix_min,\
+            matrix_avg,\
+            square_size*ncols,\
+            square_size,\
+            "heatmap")
+        ProfileFace.ymargin=0
+        ProfileFace.span_leaves = not per_leaf
         # Set colors
         faces.add_face_to_node(ProfileFace, node, 0, aligned=True)
 
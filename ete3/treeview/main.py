@@ -773,3 +773,34 @@ def save(scene, imgName, w=None, h=None, dpi=90,\
             ii.save(imgName)
 
     return w/main_rect.width(), h/main_rect.height()
+
+def get_tile_rect(scene, zoom, x, y, tile_size=256):
+    """ Returns the scene region covered by tile (zoom, x, y). At zoom
+    level 0, the whole scene fits in a single tile. Every new zoom
+    level doubles the number of tiles per axis. """
+    main_rect = scene.sceneRect()
+    side = max(main_rect.width(), main_rect.height()) / float(2 ** zoom)
+    return QtCore.QRectF(main_rect.x() + (x * side),
+                         main_rect.y() + (y * side), side, side)
+
+def save_tile(scene, zoom, x, y, tile_size=256, dpi=90):
+    """ Renders a single square tile of the scene and returns it as
+    PNG data."""
+    source_rect = get_tile_rect(scene, zoom, x, y, tile_size)
+    targetRect = QtCore.QRectF(0, 0, tile_size, tile_size)
+    ii= QImage(tile_size, tile_size, QImage.Format_ARGB32)
+    ii.fill(QColor(QtCore.Qt.white).rgb())
+    ii.setDotsPerMeterX(dpi / 0.0254)
+    ii.setDotsPerMeterY(dpi / 0.0254)
+    pp = QPainter(ii)
+    pp.setRenderHint(QPainter.Antialiasing)
+    pp.setRenderHint(QPainter.TextAntialiasing)
+    pp.setRenderHint(QPainter.SmoothPixmapTransform)
+    scene.render(pp, targetRect, source_rect, QtCore.Qt.IgnoreAspectRatio)
+    pp.end()
+
+    ba = QtCore.QByteArray()
+    buf = QtCore.QBuffer(ba)
+    buf.open(QtCore.QIODevice.WriteOnly)
+    ii.save(buf, "PNG")
+    return ba.data()
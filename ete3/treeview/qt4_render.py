@@ -813,8 +813,17 @@ def render_aligned_faces(img, mainRect, parent, n2i, n2f):
     aligned_faces = [ [node, fb["aligned"]] for node, fb in six.iteritems(n2f)\
                           if fb["aligned"].column2faces and _leaf(node)]
 
+    # Aligned faces of internal nodes spanning the rows of their leaves
+    # (i.e. a heatmap of the whole tree drawn as a single pixmap)
+    if img.mode == "r":
+        block_faces = [ [node, fb["aligned"]] for node, fb in six.iteritems(n2f)\
+                            if fb["aligned"].column2faces and not _leaf(node) and\
+                            _spans_leaves(fb["aligned"])]
+    else:
+        block_faces = []
+
     # If no aligned faces, just return an offset of 0 pixels
-    if not aligned_faces:
+    if not aligned_faces and not block_faces:
         return 0
 
     # Load header and footer
@@ -836,7 +845,7 @@ def render_aligned_faces(img, mainRect, parent, n2i, n2f):
     c2max_w = {}
     maxh = 0
     maxh_node = None
-    for node, fb in aligned_faces + surroundings:
+    for node, fb in aligned_faces + block_faces + surroundings:
         if fb.h > maxh:
             maxh = fb.h
             maxh_node = node
@@ -901,12 +910,40 @@ def render_aligned_faces(img, mainRect, parent, n2i, n2f):
             guide_line.setPen(pen)
             guide_line.setParentItem(item.content)
 
+    for node, fb in block_faces:
+        item = n2i[node]
+        item.mapped_items.append(fb)
+        if img.draw_aligned_faces_as_table:
+            fb.setup_grid(c2max_w, as_grid=img.aligned_table_style == 0)
+        fb.render()
+        fb.setParentItem(item.content)
+        x = item.mapFromScene(tree_end_x, 0).x()
+
+        # Rows are stretched from the center of the first leaf to the
+        # center of the last one
+        leaves = node.get_leaves(is_leaf_fn=_leaf)
+        first, last = n2i[leaves[0]], n2i[leaves[-1]]
+        top = item.content.mapFromItem(first.content, 0, first.center).y()
+        bottom = item.content.mapFromItem(last.content, 0, last.center).y()
+        if len(leaves) > 1:
+            row_h = (bottom - top) / (len(leaves) - 1)
+        else:
+            row_h = float(fb.h)
+        if fb.h:
+            fb.setTransform(QtGui.QTransform().scale(1, row_h * len(leaves) / fb.h))
+        fb.setPos(x, top - row_h / 2.0)
+
     if img.mode == "c":
         mainRect.adjust(-extra_width, -extra_width, extra_width, extra_width)
     else:
         mainRect.adjust(0, 0, extra_width, 0)
     return extra_width
 
+def _spans_leaves(faceblock):
+    return any(getattr(f, "span_leaves", False)
+               for col_faces in six.itervalues(faceblock.column2faces)
+               for f in col_faces)
+
 def get_tree_img_map(n2i, x_scale=1, y_scale=1):
     MOTIF_ITEMS = set([faces.QGraphicsTriangleItem,
                        faces.QGraphicsEllipseItem,
@@ -40,6 +40,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 import re
 import time
+import gc
 
 import os
 import six
@@ -224,3 +225,19 @@ def timeit(f):
         return r
     return a_wrapper_accepting_arguments
 
+def without_gc(f):
+    """ Disables the cyclic garbage collector while f runs. Creating
+    many linked objects (i.e. tree nodes) would otherwise trigger lots
+    of useless collections."""
+    def wrapper(*args, **kargs):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return f(*args, **kargs)
+        finally:
+            if enabled:
+                gc.enable()
+    wrapper.__name__ = f.__name__
+    wrapper.__doc__ = f.__doc__
+    return wrapper
+
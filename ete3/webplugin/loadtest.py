@@ -0,0 +1,199 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+"""
+Load test harness for the ETE web plugin.
+
+Serves a :class:`WebTreeApplication` through a local multithreaded WSGI
+server and simulates concurrent clients asking for tree images. A
+working PyQt4 installation and X display (or xvfb) are required.
+
+Usage::
+
+  python -m ete3.webplugin.loadtest --clients 16 --requests 20 --trees 4 --size 2000 --processes 4
+  python -m ete3.webplugin.loadtest --sync [...]   # renders in the request thread
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import re
+import time
+import random
+import shutil
+import tempfile
+import threading
+import argparse
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+from six.moves import socketserver
+from six.moves.urllib.parse import urlencode
+from six.moves.urllib.request import urlopen
+
+from .. import Tree
+from .webapp import WebTreeApplication
+
+JOB_MATCH = re.compile(r'wait_render_job\("([^"]+)", "([^"]+)"\)')
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def _post(url, **params):
+    return urlopen(url, urlencode(params).encode("utf-8")).read().decode("utf-8")
+
+def _get_tree_img(url, treeid, newick=None, poll_interval=0.05):
+    """ Requests a tree image and waits until it is available. Returns
+    the number of polling requests needed. """
+    if newick:
+        html = _post(url+"/draw", treeid=treeid, tree=newick)
+    else:
+        html = _post(url+"/action", treeid=treeid)
+    polls = 0
+    match = JOB_MATCH.search(html)
+    while match:
+        time.sleep(poll_interval)
+        html = _post(url+"/job", treeid=treeid, jobid=match.groups()[1])
+        match = JOB_MATCH.search(html)
+        polls += 1
+    if "ete_tree_img" not in html:
+        raise ValueError(html)
+    return polls
+
+def _client(url, newicks, nrequests, modify_rate, latencies, errors):
+    for i in range(nrequests):
+        tree_index = random.randint(0, len(newicks)-1)
+        newick = newicks[tree_index] if random.random() < modify_rate else None
+        t1 = time.time()
+        try:
+            _get_tree_img(url, "tree%d" %tree_index, newick)
+        except Exception as e:
+            errors.append(str(e))
+        else:
+            latencies.append(time.time() - t1)
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values)-1, int(len(values) * p))]
+
+def run(clients=8, requests=10, ntrees=4, size=1000, processes=2,
+        modify_rate=0.1, sync=False, port=0, display=None):
+    """ Runs a load test and returns a dictionary with the results. """
+    temp_dir = tempfile.mkdtemp()
+    app = WebTreeApplication()
+    app.CONFIG["temp_dir"] = temp_dir
+    app.CONFIG["temp_url"] = "/tmp"
+    app.CONFIG["DISPLAY"] = display or os.environ.get("DISPLAY", ":0")
+    app.set_tree_loader(Tree)
+    if not sync:
+        app.enable_async_rendering(processes=processes)
+
+    server = make_server("127.0.0.1", port, app, server_class=_ThreadingWSGIServer,
+                         handler_class=_QuietHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    url = "http://127.0.0.1:%d" %server.server_port
+
+    newicks = []
+    for i in range(ntrees):
+        t = Tree()
+        t.populate(size, random_branches=True)
+        newicks.append(t.write())
+
+    try:
+        # Load trees
+        for i, nw in enumerate(newicks):
+            _get_tree_img(url, "tree%d" %i, nw)
+
+        latencies, errors = [], []
+        threads = [threading.Thread(target=_client,
+                                    args=(url, newicks, requests, modify_rate, latencies, errors))
+                   for i in range(clients)]
+        t1 = time.time()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.time() - t1
+    finally:
+        server.shutdown()
+        if app._render_pool:
+            app._render_pool.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    results = {
+        "mode": "sync" if sync else "async",
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_p50": _percentile(latencies, 0.50) if latencies else None,
+        "latency_p95": _percentile(latencies, 0.95) if latencies else None,
+        "latency_max": max(latencies) if latencies else None,
+        }
+    if app._render_pool:
+        results.update(("pool_%s" %k, v) for k, v in app._render_pool.stats.items())
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--trees", type=int, default=4, help="number of distinct trees")
+    parser.add_argument("--size", type=int, default=1000, help="leaves per tree")
+    parser.add_argument("--processes", type=int, default=2, help="renderer processes")
+    parser.add_argument("--modify_rate", type=float, default=0.1,
+                        help="fraction of requests uploading a new tree version")
+    parser.add_argument("--sync", action="store_true",
+                        help="render in the request thread (no worker pool)")
+    parser.add_argument("--display", help="X display used for rendering")
+    args = parser.parse_args(argv)
+
+    results = run(clients=args.clients, requests=args.requests, ntrees=args.trees,
+                  size=args.size, processes=args.processes, modify_rate=args.modify_rate,
+                  sync=args.sync, display=args.display)
+    for key in sorted(results):
+        print("%s\t%s" %(key, results[key]))
+
+if __name__ == "__main__":
+    main()
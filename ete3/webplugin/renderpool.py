@@ -0,0 +1,215 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+from __future__ import absolute_import
+import os
+import time
+import threading
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from hashlib import md5
+
+import six
+from six.moves import cPickle
+
+__all__ = ["RenderPool", "RenderJob"]
+
+def _init_worker(display):
+    if display:
+        os.environ["DISPLAY"] = display
+
+def _render_in_worker(tree_data, img_path, render_data):
+    """ Renders a pickled tree in a worker process and returns its
+    image map. Qt is only initialized once per worker. """
+    try:
+        t = cPickle.loads(tree_data)
+        render_args = cPickle.loads(render_data)
+        return True, t.render(img_path, **render_args)
+    except Exception:
+        return False, traceback.format_exc()
+
+class RenderJob(object):
+    """ A tree image requested to a :class:`RenderPool`. """
+    def __init__(self, jobid, key, img_path):
+        self.jobid = jobid
+        self.key = key
+        self.img_path = img_path
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self.requests = 1
+        self.submitted = time.time()
+        self.finished = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """ Blocks until the job is finished. Returns True if so. """
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+class RenderPool(object):
+    """ Renders tree images in a pool of long-lived worker processes,
+    so web requests are never blocked by slow renders.
+
+    Jobs are identified by a key (i.e. tree id, tree version and style).
+    If a job with the same key is already pending or done, no new
+    render is launched and the existing job is returned instead
+    (request coalescing).
+
+    :argument 2 processes: number of renderer processes.
+
+    :argument None display: X DISPLAY used by workers.
+
+    :argument 1000 max_finished_jobs: number of finished jobs kept, so
+      their results can be retrieved.
+    """
+    def __init__(self, processes=2, display=None, max_finished_jobs=1000):
+        self.processes = processes
+        self.display = display
+        self.max_finished_jobs = max_finished_jobs
+        self.stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "completed": 0,
+            "failed": 0,
+            "render_time": 0.0,
+            }
+        self._pool = None
+        self._jobs = OrderedDict()
+        self._key2jobid = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes, _init_worker, (self.display,))
+        return self._pool
+
+    def submit(self, key, tree, img_path, **render_args):
+        """ Queues the rendering of a tree into `img_path` and returns
+        the job id immediately. Extra arguments are passed to
+        :func:`TreeNode.render`.
+
+        The tree is serialized before returning, so it can be safely
+        modified while the job is running. Trees or arguments that
+        cannot be pickled (i.e. lambda layout functions) raise an
+        error, and no job is created. Requests for a `key` that is
+        already being rendered share its job without serializing the
+        tree again.
+        """
+        with self._lock:
+            jobid = self._get_live_job(key)
+        if jobid:
+            return jobid
+
+        # Serialized out of the lock and only for new jobs, so pickling
+        # errors are raised here instead of leaving a job that never
+        # finishes
+        tree_data = cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL)
+        render_data = cPickle.dumps(render_args, cPickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            # the same job may have been submitted while serializing
+            jobid = self._get_live_job(key)
+            if jobid:
+                return jobid
+
+            jobid = md5(("%s-%s" %(key, time.time())).encode("utf-8")).hexdigest()
+            job = RenderJob(jobid, key, img_path)
+            self._jobs[jobid] = job
+            self._key2jobid[key] = jobid
+            self.stats["submitted"] += 1
+
+        callbacks = {"callback": lambda r: self._finish(jobid, *r)}
+        if not six.PY2:
+            callbacks["error_callback"] = lambda e: self._finish(jobid, False, repr(e))
+        try:
+            self._get_pool().apply_async(_render_in_worker,
+                                         (tree_data, img_path, render_data),
+                                         **callbacks)
+        except Exception as e:
+            self._finish(jobid, False, repr(e))
+            raise
+        return jobid
+
+    def _get_live_job(self, key):
+        # Returns the id of the job rendering key, if any, and counts
+        # the new request on it. Must be called holding the lock.
+        jobid = self._key2jobid.get(key)
+        job = self._jobs.get(jobid) if jobid else None
+        if job is not None and job.status != "error":
+            job.requests += 1
+            self.stats["coalesced"] += 1
+            return jobid
+        return None
+
+    def _finish(self, jobid, success, result):
+        with self._lock:
+            job = self._jobs.get(jobid)
+            if job is None:
+                return
+            job.finished = time.time()
+            if not success:
+                job.status = "error"
+                job.error = result
+                self.stats["failed"] += 1
+            else:
+                job.status = "done"
+                job.result = result
+                self.stats["completed"] += 1
+                self.stats["render_time"] += job.finished - job.submitted
+            job._done.set()
+
+            finished = [j for j in self._jobs if self._jobs[j].status != "pending"]
+            for old_jobid in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                old_job = self._jobs.pop(old_jobid)
+                if self._key2jobid.get(old_job.key) == old_jobid:
+                    del self._key2jobid[old_job.key]
+
+    def get_job(self, jobid):
+        """ Returns a :class:`RenderJob` instance, or None if the job is
+        unknown."""
+        with self._lock:
+            return self._jobs.get(jobid)
+
+    def close(self):
+        """ Stops all renderer processes. """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
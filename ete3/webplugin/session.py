@@ -0,0 +1,320 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+from __future__ import absolute_import
+import os
+import time
+import zlib
+import threading
+from collections import OrderedDict
+
+from six.moves import cPickle
+
+__all__ = ["TreeSessionStore"]
+
+class TreeSessionStore(object):
+    """ Keeps the trees served by a :class:`WebTreeApplication`.
+
+    The most recently used trees are kept in memory. When more than
+    `max_trees` are loaded, the least recently used ones are evicted
+    and spilled to disk (if `spill_dir` is set) in a compressed
+    pickle format. The total size of spilled trees is bounded by
+    `max_spill_bytes`, discarding the oldest sessions first.
+
+    A node index (``_nid`` -> node) is kept for every tree in
+    memory. It is filled when nodes are numbered (see
+    :func:`number_nodes`), and only rebuilt when an unknown node is
+    requested after the tree has been modified (see :func:`touch`).
+    Nodes removed from their tree are dropped from the index when
+    found.
+
+    Usage statistics are available through :attr:`stats`.
+
+    :argument None spill_dir: directory where evicted trees are
+      stored. If None, evicted trees are lost.
+
+    :argument 64 max_trees: maximum number of trees kept in memory.
+
+    :argument 1073741824 max_spill_bytes: maximum disk space used by
+      spilled trees.
+
+    :argument False write_through: If True, trees are also written to
+      disk every time they are modified (see :func:`touch`), and trees
+      in memory are reloaded if a newer version is found on disk. This
+      is necessary when several processes serve the same sessions.
+    """
+    SPILL_EXT = ".tree.z"
+
+    def __init__(self, spill_dir=None, max_trees=64,
+                 max_spill_bytes=1024**3, write_through=False):
+        self.spill_dir = spill_dir
+        self.max_trees = max_trees
+        self.max_spill_bytes = max_spill_bytes
+        self.write_through = write_through
+        self.eviction_callbacks = []
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "spilled_trees": 0,
+            "discarded_spills": 0,
+            "index_builds": 0,
+            "serialization_time": 0.0,
+            "deserialization_time": 0.0,
+            }
+        self._trees = OrderedDict()
+        self._indexes = {}
+        self._stale_indexes = set()
+        self._versions = {}
+        self._spilled = OrderedDict()
+        self._spilled_bytes = 0
+        self._lock = threading.RLock()
+        if spill_dir:
+            self._scan_spill_dir()
+
+    def __contains__(self, treeid):
+        return treeid in self._trees or treeid in self._spilled
+
+    def __len__(self):
+        return len(self._trees)
+
+    def _scan_spill_dir(self):
+        """ Registers trees spilled by previous sessions, from the
+        oldest to the newest. """
+        if not os.path.exists(self.spill_dir):
+            os.makedirs(self.spill_dir)
+        spilled = []
+        for fname in os.listdir(self.spill_dir):
+            if fname.endswith(self.SPILL_EXT):
+                fpath = os.path.join(self.spill_dir, fname)
+                spilled.append((os.path.getmtime(fpath), fname, os.path.getsize(fpath)))
+        for mtime, fname, size in sorted(spilled):
+            treeid = fname[:-len(self.SPILL_EXT)]
+            self._spilled[treeid] = size
+            self._spilled_bytes += size
+
+    def _get_spill_path(self, treeid):
+        if os.sep in treeid or treeid.startswith("."):
+            raise ValueError("Invalid tree id: %s" %treeid)
+        return os.path.join(self.spill_dir, "%s%s" %(treeid, self.SPILL_EXT))
+
+    def dumps(self, tree):
+        """ Serializes a tree. Override to use a custom format. """
+        return zlib.compress(cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL), 1)
+
+    def loads(self, data):
+        """ Restores a tree serialized with :func:`dumps`. """
+        return cPickle.loads(zlib.decompress(data))
+
+    def get(self, treeid):
+        """ Returns the tree associated to a session id, or None if it
+        is not available. """
+        with self._lock:
+            tree = self._trees.pop(treeid, None)
+            if tree is not None and self.write_through and self.spill_dir:
+                version = self._get_version(treeid)
+                if version is not None and version != self._versions.get(treeid):
+                    # Modified by another process
+                    self._indexes.pop(treeid, None)
+                    tree = None
+            if tree is not None:
+                self._trees[treeid] = tree
+                self.stats["hits"] += 1
+                return tree
+
+            tree = self._load_spilled(treeid)
+            if tree is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(treeid, tree)
+            return tree
+
+    def put(self, treeid, tree):
+        """ Registers a tree, replacing any previous version. """
+        with self._lock:
+            self._indexes.pop(treeid, None)
+            self._remember(treeid, tree)
+            if self.write_through:
+                self._spill(treeid, tree)
+
+    def touch(self, treeid):
+        """ Notifies that a tree has been modified. """
+        with self._lock:
+            self._stale_indexes.add(treeid)
+            if self.write_through and treeid in self._trees:
+                self._spill(treeid, self._trees[treeid])
+
+    def discard(self, treeid):
+        """ Removes a tree from memory and disk. """
+        with self._lock:
+            self._trees.pop(treeid, None)
+            self._indexes.pop(treeid, None)
+            self._discard_spilled(treeid)
+
+    def flush(self):
+        """ Writes all trees in memory to disk (i.e. before shutting
+        down the application). """
+        with self._lock:
+            for treeid, tree in list(self._trees.items()):
+                self._spill(treeid, tree)
+
+    def number_nodes(self, treeid):
+        """ Sets the ``_nid`` attribute of all nodes in a tree, in
+        preorder, and indexes them. Returns the tree, or None if it is
+        not available. """
+        with self._lock:
+            tree = self.get(treeid)
+            if tree is None:
+                return None
+            index = self._indexes[treeid] = {}
+            for nid, n in enumerate(tree.traverse("preorder")):
+                n._nid = nid
+                index[str(nid)] = n
+            self._stale_indexes.discard(treeid)
+            return tree
+
+    def get_node(self, treeid, nid):
+        """ Returns the node with a given ``_nid`` attribute within a
+        tree, or None if not found."""
+        with self._lock:
+            tree = self.get(treeid)
+            if tree is None:
+                return None
+            nid = str(nid)
+            index = self._indexes.get(treeid)
+            if index is None or (nid not in index and treeid in self._stale_indexes):
+                index = self._build_index(treeid, tree)
+            node = index.get(nid)
+            if node is not None and (str(getattr(node, "_nid", None)) != nid or
+                                     not _is_attached(node, tree)):
+                # Renumbered or removed from the tree
+                del index[nid]
+                node = None
+            return node
+
+    def _build_index(self, treeid, tree):
+        index = self._indexes[treeid] = {}
+        for n in tree.traverse():
+            if hasattr(n, "_nid"):
+                index[str(n._nid)] = n
+        self._stale_indexes.discard(treeid)
+        self.stats["index_builds"] += 1
+        return index
+
+    def _remember(self, treeid, tree):
+        self._trees.pop(treeid, None)
+        self._trees[treeid] = tree
+        while len(self._trees) > self.max_trees:
+            old_treeid, old_tree = self._trees.popitem(last=False)
+            self._indexes.pop(old_treeid, None)
+            self.stats["evictions"] += 1
+            # Written through trees are already on disk, maybe in a
+            # newer version saved by another process
+            if self.spill_dir and not self.write_through:
+                self._spill(old_treeid, old_tree)
+            for callback in self.eviction_callbacks:
+                callback(old_treeid)
+
+    def _spill(self, treeid, tree):
+        if not self.spill_dir:
+            return
+        t1 = time.time()
+        data = self.dumps(tree)
+        self.stats["serialization_time"] += time.time() - t1
+
+        self._discard_spilled(treeid)
+        spill_path = self._get_spill_path(treeid)
+        tmp_path = "%s.%s.tmp" %(spill_path, os.getpid())
+        with open(tmp_path, "wb") as SPILL:
+            SPILL.write(data)
+        os.rename(tmp_path, spill_path)
+        self._versions[treeid] = self._get_version(treeid)
+        self._spilled[treeid] = len(data)
+        self._spilled_bytes += len(data)
+        self.stats["spilled_trees"] += 1
+
+        while self._spilled_bytes > self.max_spill_bytes and len(self._spilled) > 1:
+            old_treeid = next(iter(self._spilled))
+            self._discard_spilled(old_treeid)
+            self.stats["discarded_spills"] += 1
+
+    def _load_spilled(self, treeid):
+        if not self.spill_dir:
+            return None
+        spill_path = self._get_spill_path(treeid)
+        if not os.path.exists(spill_path):
+            return None
+        t1 = time.time()
+        version = self._get_version(treeid)
+        with open(spill_path, "rb") as SPILL:
+            data = SPILL.read()
+        tree = self.loads(data)
+        self.stats["deserialization_time"] += time.time() - t1
+        self._versions[treeid] = version
+        if treeid not in self._spilled:
+            # Spilled by another process
+            self._spilled[treeid] = len(data)
+            self._spilled_bytes += len(data)
+        return tree
+
+    def _get_version(self, treeid):
+        """ Returns a value identifying the current spill file of a
+        tree, which is replaced every time the tree is written. """
+        try:
+            st = os.stat(self._get_spill_path(treeid))
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime, st.st_size)
+
+    def _discard_spilled(self, treeid):
+        self._versions.pop(treeid, None)
+        size = self._spilled.pop(treeid, None)
+        if size is not None:
+            self._spilled_bytes -= size
+        if self.spill_dir:
+            spill_path = self._get_spill_path(treeid)
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+
+def _is_attached(node, root):
+    """ Returns True if node belongs to the tree under root. """
+    while node.up is not None:
+        node = node.up
+    return node is root
@@ -0,0 +1,116 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+from __future__ import absolute_import
+import json
+
+import six
+from six.moves import range
+
+__all__ = ["NodeSpatialIndex"]
+
+NODE_AREA = 0
+FACE_AREA = 1
+
+class NodeSpatialIndex(object):
+    """ Uniform grid index over the clickable regions of a tree image,
+    as returned by :func:`TreeNode.render` (image maps).
+
+    It replaces the HTML ``<area>`` maps, which grow to megabytes for
+    large trees: the index is serialized once per tree version as a
+    compact JSON document (see :func:`to_json`), and point queries can
+    be resolved either in the browser or through :func:`query`.
+
+    :argument img_map: image map dictionary with "nodes", "faces" and
+      "node_areas" keys.
+
+    :argument 64 cell_size: side of the grid cells, in pixels.
+    """
+    def __init__(self, img_map, cell_size=64):
+        self.cell_size = cell_size
+        self.rects = []
+        self.labels = []
+        self.node_areas = {}
+        self._grid = {}
+        label2index = {}
+
+        for nid, area in six.iteritems(img_map.get("node_areas") or {}):
+            self.node_areas[int(nid)] = [int(v) for v in area]
+
+        for kind, key in ((NODE_AREA, "nodes"), (FACE_AREA, "faces")):
+            for x1, y1, x2, y2, nid, text in img_map.get(key) or []:
+                if text:
+                    label = label2index.get(text)
+                    if label is None:
+                        label = label2index[text] = len(self.labels)
+                        self.labels.append(text)
+                else:
+                    label = -1
+                rect = [int(x1), int(y1), int(x2), int(y2), int(nid), kind, label]
+                self._add_to_grid(len(self.rects), rect)
+                self.rects.append(rect)
+
+    def _add_to_grid(self, rect_index, rect):
+        cs = self.cell_size
+        for cx in range(rect[0] // cs, rect[2] // cs + 1):
+            for cy in range(rect[1] // cs, rect[3] // cs + 1):
+                self._grid.setdefault((cx, cy), []).append(rect_index)
+
+    def query(self, x, y):
+        """ Returns the list of regions containing point (x, y) as
+        (x1, y1, x2, y2, nid, kind, label) tuples. Node regions are
+        reported before face regions, as in HTML image maps. """
+        cell = (int(x) // self.cell_size, int(y) // self.cell_size)
+        matches = []
+        for i in self._grid.get(cell, []):
+            x1, y1, x2, y2, nid, kind, label = self.rects[i]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                matches.append((x1, y1, x2, y2, nid, kind,
+                                self.labels[label] if label >= 0 else None))
+        return matches
+
+    def to_json(self):
+        """ Returns the JSON representation of the index. Rectangles
+        are encoded as [x1, y1, x2, y2, nid, kind, label_index], where
+        kind is 0 for nodes and 1 for faces, and label_index points to
+        the `labels` list (-1 if no label). """
+        return json.dumps({"cell_size": self.cell_size,
+                           "rects": self.rects,
+                           "labels": self.labels,
+                           "node_areas": self.node_areas},
+                          separators=(",", ":"))
@@ -0,0 +1,155 @@
+# #START_LICENSE###########################################################
+#
+#
+# This file is part of the Environment for Tree Exploration program
+# (ETE).  http://etetoolkit.org
+#
+# ETE is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ETE is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ETE.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#                     ABOUT THE ETE PACKAGE
+#                     =====================
+#
+# ETE is distributed under the GPL copyleft license (2008-2015).
+#
+# If you make use of ETE in published work, please cite:
+#
+# Jaime Huerta-Cepas, Joaquin Dopazo and Toni Gabaldon.
+# ETE: a python Environment for Tree Exploration. Jaime BMC
+# Bioinformatics 2010,:24doi:10.1186/1471-2105-11-24
+#
+# Note that extra references to the specific methods implemented in
+# the toolkit may be available in the documentation.
+#
+# More info at http://etetoolkit.org. Contact: huerta@embl.de
+#
+#
+# #END_LICENSE#############################################################
+from __future__ import absolute_import
+import os
+import math
+import shutil
+import threading
+from collections import OrderedDict
+
+__all__ = ["TileCache", "get_tiles_in_region"]
+
+class TileCache(object):
+    """ Two-level (memory and disk) cache of rendered tree tiles.
+
+    Tiles are identified by a key tuple ``(treeid, version, style,
+    zoom, x, y)``. The most recently used tiles are kept in memory,
+    while all of them are also stored under `cache_dir` (if provided),
+    so they survive memory evictions and application restarts.
+
+    :argument None cache_dir: directory used to store tiles on disk.
+      If None, tiles are only kept in memory.
+
+    :argument 1024 max_mem_tiles: maximum number of tiles kept in
+      memory.
+    """
+    def __init__(self, cache_dir=None, max_mem_tiles=1024):
+        self.cache_dir = cache_dir
+        self.max_mem_tiles = max_mem_tiles
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_tile_path(self, key):
+        treeid, version, style, zoom, x, y = key
+        return os.path.join(self.cache_dir, str(treeid),
+                            "%s_%s" %(version, style), str(zoom),
+                            "%d_%d.png" %(x, y))
+
+    def get(self, key):
+        """ Returns the PNG data of a tile, or None if not cached. """
+        with self._lock:
+            data = self._mem.pop(key, None)
+            if data is not None:
+                self._mem[key] = data
+                return data
+
+        if self.cache_dir:
+            tile_path = self._get_tile_path(key)
+            if os.path.exists(tile_path):
+                data = open(tile_path, "rb").read()
+                self._remember(key, data)
+                return data
+        return None
+
+    def put(self, key, data):
+        """ Stores the PNG data of a tile. """
+        self._remember(key, data)
+        if self.cache_dir:
+            tile_path = self._get_tile_path(key)
+            tile_dir = os.path.dirname(tile_path)
+            if not os.path.exists(tile_dir):
+                try:
+                    os.makedirs(tile_dir)
+                except OSError:
+                    # Created by a concurrent request
+                    pass
+            # Write and rename, so other processes never read partial tiles
+            tmp_path = "%s.%s.tmp" %(tile_path, threading.current_thread().ident)
+            with open(tmp_path, "wb") as TILE:
+                TILE.write(data)
+            os.rename(tmp_path, tile_path)
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._mem.pop(key, None)
+            self._mem[key] = data
+            while len(self._mem) > self.max_mem_tiles:
+                self._mem.popitem(last=False)
+
+    def discard(self, key):
+        """ Removes a single tile from the cache. """
+        with self._lock:
+            self._mem.pop(key, None)
+        if self.cache_dir:
+            tile_path = self._get_tile_path(key)
+            if os.path.exists(tile_path):
+                os.remove(tile_path)
+
+    def clear(self, treeid):
+        """ Removes all tiles of a given tree, no matter their version
+        or style. """
+        with self._lock:
+            for key in [k for k in self._mem if k[0] == treeid]:
+                del self._mem[key]
+        if self.cache_dir:
+            tree_dir = os.path.join(self.cache_dir, str(treeid))
+            if os.path.exists(tree_dir):
+                shutil.rmtree(tree_dir, ignore_errors=True)
+
+def get_tiles_in_region(scene_rect, region, zoom):
+    """ Returns the list of tile coordinates (x, y) that overlap a given
+    region of the scene at a given zoom level.
+
+    :argument scene_rect: (x, y, width, height) of the whole scene.
+
+    :argument region: (x1, y1, x2, y2) scene coordinates of the
+      region.
+    """
+    sx, sy, sw, sh = scene_rect
+    side = max(sw, sh) / float(2 ** zoom)
+    if side <= 0:
+        return []
+    max_tile = (2 ** zoom) - 1
+    x1, y1, x2, y2 = region
+    first_x = max(0, int(math.floor((x1 - sx) / side)))
+    first_y = max(0, int(math.floor((y1 - sy) / side)))
+    last_x = min(max_tile, int(math.floor((x2 - sx) / side)))
+    last_y = min(max_tile, int(math.floor((y2 - sy) / side)))
+    return [(x, y) for x in range(first_x, last_x + 1)
+            for y in range(first_y, last_y + 1)]
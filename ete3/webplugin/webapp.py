@@ -41,10 +41,17 @@ from __future__ import print_function
 import sys
 import os
 import time
-import cgi
+import json
 from hashlib import md5
+import six
 import six.moves.cPickle
 from six.moves import map
+from six.moves.urllib.parse import parse_qs
+
+from .tiles import TileCache, get_tiles_in_region
+from .session import TreeSessionStore
+from .renderpool import RenderPool
+from .spatial import NodeSpatialIndex, FACE_AREA
 
 ALL = ["WebTreeApplication"]
 
@@ -71,9 +78,16 @@ class WebTreeApplication(object):
         self._custom_tree_renderer = None
         self._treeid2layout = {}
         self._external_app_handler = None
-        self._treeid2tree = {}
-        self._treeid2cache = {}
-        self._treeid2index = {}
+        self._session_store = None
+        self._tile_cache = None
+        self._tile_size = 256
+        self._max_zoom = 8
+        self._treeid2scene = {}
+        self._treeid2version = {}
+        self._render_pool = None
+        self._treeid2revision = {}
+        self._node_index_cell_size = None
+        self._treeid2nodeindex = {}
         self.queries = {}
         self.CONFIG = {
             "temp_dir":"/var/www/webplugin/",
@@ -115,6 +129,217 @@ class WebTreeApplication(object):
         """ Fix a :class:`TreeStyle` instance to render tree images. """
         self._tree_style = handler
 
+    def set_session_store(self, store):
+        """ Sets the :class:`TreeSessionStore` instance (or any object
+        providing the same interface) used to keep loaded trees. By
+        default, a store writing trees through to CONFIG["temp_dir"]
+        is created. """
+        self._session_store = store
+        store.eviction_callbacks.append(self._on_tree_evicted)
+
+    def get_session_store(self):
+        """ Returns the store keeping loaded trees. """
+        if self._session_store is None:
+            spill_dir = os.path.join(self.CONFIG["temp_dir"], "sessions")
+            # Several worker processes may serve the same sessions
+            self.set_session_store(TreeSessionStore(spill_dir, write_through=True))
+        return self._session_store
+
+    def _on_tree_evicted(self, treeid):
+        # Drawing scenes point to the evicted tree instance
+        self._treeid2scene.pop(treeid, None)
+        self._treeid2nodeindex.pop(treeid, None)
+
+    def enable_node_index(self, cell_size=64):
+        """ Replaces the HTML image maps of tree images by a spatial
+        index of node regions, which is built once per tree version
+        and served as JSON (``node_index`` method). Clicks are resolved
+        through the ``node_at`` method, so node actions are only
+        checked for the clicked node. Tiled images always use it. """
+        self._node_index_cell_size = cell_size
+
+    def _set_node_index(self, treeid, key, img_map):
+        """ Builds the spatial index of an image map, unless it is
+        already built for the same tree version (key). """
+        current = self._treeid2nodeindex.get(treeid)
+        if current and current[0] == key:
+            return current[1]
+        index = NodeSpatialIndex(img_map, cell_size=self._node_index_cell_size or 64)
+        self._treeid2nodeindex[treeid] = [key, index, None]
+        return index
+
+    def _get_node_index_json(self, treeid):
+        entry = self._treeid2nodeindex.get(treeid)
+        if entry is None:
+            return json.dumps(None)
+        if entry[2] is None:
+            entry[2] = entry[1].to_json()
+        return entry[2]
+
+    def _get_node_at(self, treeid, x, y):
+        """ Returns the node (and its available actions) found at a given
+        image position, as JSON."""
+        entry = self._treeid2nodeindex.get(treeid)
+        hits = entry[1].query(x, y) if entry else []
+        if not hits:
+            return json.dumps({"nid": None})
+
+        x1, y1, x2, y2, nid, kind, text = hits[0]
+        node = self.get_session_store().get_node(treeid, nid)
+        targets = set(["node", "face"]) if kind == FACE_AREA else set(["node"])
+        actions = []
+        for aindex, (action, target, handler, checker, html_generator) in enumerate(self.actions):
+            if target in targets and node is not None and (not checker or checker(node)):
+                actions.append(aindex)
+
+        return json.dumps({"nid": nid,
+                           "kind": "face" if kind == FACE_AREA else "node",
+                           "text": text or "",
+                           "area": entry[1].node_areas.get(nid, [0, 0, 0, 0]),
+                           "actions": actions})
+
+    def enable_tile_rendering(self, tile_size=256, max_zoom=8,
+                              max_mem_tiles=1024, disk_cache=True):
+        """ Serves tree images as square tiles (``tile`` method)
+        instead of a single image, so large trees can be panned and
+        zoomed without full re-renders. Rendered tiles are cached in
+        memory and, if `disk_cache` is True, under
+        CONFIG["temp_dir"]. Actions only invalidate the tiles
+        overlapping the regions that changed. """
+        self._tile_size = tile_size
+        self._max_zoom = max_zoom
+        cache_dir = os.path.join(self.CONFIG["temp_dir"], "tiles") if disk_cache else None
+        self._tile_cache = TileCache(cache_dir, max_mem_tiles=max_mem_tiles)
+
+    def enable_async_rendering(self, processes=2, max_finished_jobs=1000):
+        """ Renders tree images in a pool of background processes
+        instead of the request thread. Drawing requests return
+        immediately with a render job placeholder that is replaced by
+        the tree image once ready (``job`` method). Concurrent requests
+        for the same tree version share the same render job. """
+        self._render_pool = RenderPool(processes, display=self.CONFIG["DISPLAY"],
+                                       max_finished_jobs=max_finished_jobs)
+
+    def invalidate_tiles(self, treeid):
+        """ Discards all cached tiles of a tree. Custom handlers
+        modifying nodes out of the target node's partition should call
+        this method. """
+        self._treeid2version[treeid] = self._treeid2version.get(treeid, 0) + 1
+        self._treeid2scene.pop(treeid, None)
+        if self._tile_cache:
+            self._tile_cache.clear(treeid)
+
+    def _get_style_key(self, treeid):
+        # Derived from the content of the layout and style, so tiles
+        # cached on disk are reused after restarts
+        layout_fn = self._treeid2layout.get(treeid, self._layout)
+        fingerprint = _get_fingerprint((layout_fn, self._tree_style))
+        return md5(fingerprint.encode("utf-8")).hexdigest()[:8]
+
+    def _get_tree_scene(self, treeid):
+        """ Returns the (cached) drawing scene of a tree, together with
+        its bounding box and the region occupied by every node. """
+        version = self._treeid2version.setdefault(treeid, 0)
+        cached = self._treeid2scene.get(treeid)
+        if cached and cached[0] == version:
+            return cached[1:]
+
+        from ..treeview import drawer
+        os.environ["DISPLAY"] = self.CONFIG["DISPLAY"]
+        t = self.get_session_store().number_nodes(treeid)
+        layout_fn = self._treeid2layout.get(treeid, self._layout)
+        scene = drawer.get_scene(t, layout=layout_fn, tree_style=self._tree_style)
+        rect = scene.sceneRect()
+        scene_rect = (rect.x(), rect.y(), rect.width(), rect.height())
+        node2region = drawer.get_scene_node_regions(scene)
+        self._set_node_index(treeid, ("tiles", version, id(scene)), drawer.get_scene_img_map(scene))
+        self._treeid2scene[treeid] = (version, scene, scene_rect, node2region)
+        return scene, scene_rect, node2region
+
+    def _get_tile(self, treeid, zoom, x, y):
+        key = (treeid, self._treeid2version.get(treeid, 0),
+               self._get_style_key(treeid), zoom, x, y)
+        data = self._tile_cache.get(key)
+        if data is None:
+            from ..treeview import drawer
+            scene, scene_rect, node2region = self._get_tree_scene(treeid)
+            data = drawer.render_tile(scene, zoom, x, y, tile_size=self._tile_size)
+            self._tile_cache.put(key, data)
+        return data
+
+    def _get_tiles_info(self, treeid, dirty_regions=None):
+        scene, scene_rect, node2region = self._get_tree_scene(treeid)
+        info = {
+            "treeid": treeid,
+            "version": self._treeid2version[treeid],
+            "tile_size": self._tile_size,
+            "max_zoom": self._max_zoom,
+            "scene": scene_rect,
+            "dirty": dirty_regions if dirty_regions is not None else [],
+            }
+        return json.dumps(info)
+
+    def _update_tiles(self, treeid, pre_drawing_action=None):
+        """ Applies an action to a tiled tree and invalidates only the
+        tiles overlapping the regions that have changed. """
+        old_scene, old_rect, old_regions = self._get_tree_scene(treeid)
+        target = self._run_pre_drawing_action(treeid, pre_drawing_action)
+
+        # Force the scene to be recomputed, but keep tile version
+        self._treeid2scene.pop(treeid, None)
+        new_scene, new_rect, new_regions = self._get_tree_scene(treeid)
+        self.get_session_store().touch(treeid)
+
+        if old_rect != new_rect or (pre_drawing_action and target is None):
+            # Image geometry changed or whole tree actions were
+            # performed: all tiles are dirty
+            self.invalidate_tiles(treeid)
+            return self._get_tiles_info(treeid, dirty_regions=[new_rect])
+
+        dirty_regions = []
+        for node in set(old_regions) | set(new_regions):
+            old_r, new_r = old_regions.get(node), new_regions.get(node)
+            if old_r != new_r or node is target:
+                dirty_regions.extend([r for r in (old_r, new_r) if r is not None])
+
+        style_key = self._get_style_key(treeid)
+        version = self._treeid2version[treeid]
+        for zoom in range(self._max_zoom + 1):
+            dirty_tiles = set()
+            for region in dirty_regions:
+                dirty_tiles.update(get_tiles_in_region(new_rect, region, zoom))
+            for x, y in dirty_tiles:
+                self._tile_cache.discard((treeid, version, style_key, zoom, x, y))
+        return self._get_tiles_info(treeid, dirty_regions=dirty_regions)
+
+    def _serve_tile(self, environ, start_response, queries, treeid):
+        try:
+            zoom = int(queries.get("z", [0])[0])
+            x = int(queries.get("x", [0])[0])
+            y = int(queries.get("y", [0])[0])
+        except ValueError:
+            start_response('400 Bad Request', [('content-type', 'text/plain')])
+            return [b"tile: invalid tile coordinates"]
+
+        if not 0 <= zoom <= self._max_zoom or not 0 <= x < 2 ** zoom \
+           or not 0 <= y < 2 ** zoom:
+            start_response('404 Not Found', [('content-type', 'text/plain')])
+            return [b"tile: tile out of range"]
+
+        if not self._tile_cache or not self._load_tree(treeid):
+            start_response('404 Not Found', [('content-type', 'text/plain')])
+            return [("tile: Cannot load the tree: %s" %treeid).encode("utf-8")]
+
+        data = self._get_tile(treeid, zoom, x, y)
+        etag = '"%s"' %md5(data).hexdigest()
+        if environ.get("HTTP_IF_NONE_MATCH") == etag:
+            start_response('304 Not Modified', [('ETag', etag)])
+            return []
+        start_response('200 OK', [('content-type', 'image/png'),
+                                  ('Cache-Control', 'no-cache'),
+                                  ('ETag', etag)])
+        return [data]
+
     def _get_html_map(self, img_map, treeid, mapid, tree):
         # Scans for node-enabled actions.
         nid2actions = {}
@@ -152,85 +377,123 @@ class WebTreeApplication(object):
         return html_map
 
     def _load_tree(self, treeid, tree=None, cache_file=None):
+        store = self.get_session_store()
         # if a tree is given, it overwrites previous versions
         if tree and isinstance(tree, str):
             tree = self._tree(tree)
-            self._treeid2tree[treeid] = tree
-            self._load_tree_index(treeid)
-        elif tree:
-            self._treeid2tree[treeid] = tree
-            self._load_tree_index(treeid)
-
-        self._treeid2cache[treeid] = cache_file if cache_file else "%s.pkl" %treeid
+        if tree:
+            store.put(treeid, tree)
+            self._treeid2revision[treeid] = self._treeid2revision.get(treeid, 0) + 1
+            self._treeid2scene.pop(treeid, None)
+            if self._tile_cache:
+                self.invalidate_tiles(treeid)
+            return True
 
         # if no tree is given, and not in memmory, it tries to loaded
         # from previous sessions
-        if treeid not in self._treeid2tree:
-            self._load_tree_from_path(self._treeid2cache[treeid])
-
-        # Returns True if tree and indexes are loaded
-        return (treeid in self._treeid2tree) and (treeid in self._treeid2index)
+        if store.get(treeid) is not None:
+            return True
+        return self._load_tree_from_path(treeid, cache_file if cache_file else "%s.pkl" %treeid)
 
-    def _load_tree_from_path(self, pkl_path):
+    def _load_tree_from_path(self, treeid, pkl_path):
+        """ Loads trees pickled by previous versions of the web
+        plugin. """
         tree_path = os.path.join(self.CONFIG["temp_dir"], pkl_path)
         if os.path.exists(tree_path):
-            print(six.moves.cPickle.load(open(tree_path)))
-            t = self._treeid2tree[treeid] = six.moves.cPickle.load(open(tree_path))
-            self._load_tree_index(treeid)
-            return True
-        else:
-            return False
-
-    def _load_tree_index(self, treeid):
-        if not self._treeid2index.get(treeid, {}):
-            tree_index = self._treeid2index[treeid] = {}
-            t = self._treeid2tree[treeid]
-            for n in t.traverse():
-                if hasattr(n, "_nid"):
-                    tree_index[str(n._nid)] = n
+            with open(tree_path, "rb") as PKL:
+                t = six.moves.cPickle.load(PKL)
+            self.get_session_store().put(treeid, t)
             return True
         else:
             return False
 
-    def _dump_tree_to_file(self, t, treeid):
-        tree_path = os.path.join(self.CONFIG["temp_dir"], treeid+".pkl")
-        six.moves.cPickle.dump(t, open(tree_path, "w"))
-        #open(tree_path, "w").write(t.write(features=[]))
+    def _run_pre_drawing_action(self, treeid, pre_drawing_action):
+        """ Runs an action handler and returns the target node, if
+        any. """
+        if not pre_drawing_action:
+            return None
+        store = self.get_session_store()
+        t = store.get(treeid)
+        atype, handler, arguments = pre_drawing_action
+        if atype in set(["node", "face"]) and len(arguments)==1 and handler:
+            nid = arguments[0]
+            node = store.get_node(treeid, nid)
+            handler(node)
+            return node
+        elif atype == "tree":
+            handler(t, arguments[0])
+        elif atype == "search":
+            handler(t, arguments[0])
+        elif atype == "layout":
+            self._treeid2layout[treeid] = handler
+        return None
 
     def _get_tree_img(self, treeid, pre_drawing_action=None):
         img_url = os.path.join(self.CONFIG["temp_url"], treeid+".png?"+str(time.time()))
         img_path = os.path.join(self.CONFIG["temp_dir"], treeid+".png")
 
-        t = self._treeid2tree[treeid]
-        tree_index = self._treeid2index[treeid]
-
+        store = self.get_session_store()
+        t = store.get(treeid)
+        self._run_pre_drawing_action(treeid, pre_drawing_action)
         if pre_drawing_action:
-            atype, handler, arguments = pre_drawing_action
-            if atype in set(["node", "face"]) and len(arguments)==1 and handler:
-                nid = arguments[0]
-                node = tree_index.get(str(nid), None)
-                handler(node)
-            elif atype == "tree":
-                handler(t, arguments[0])
-            elif atype == "search":
-                handler(t, arguments[0])
-            elif atype == "layout":
-                self._treeid2layout[treeid] = handler
+            self._treeid2revision[treeid] = self._treeid2revision.get(treeid, 0) + 1
+            store.touch(treeid)
+
+        if self._render_pool:
+            return self._submit_tree_img(treeid, t)
 
+        store.number_nodes(treeid)
         layout_fn = self._treeid2layout.get(treeid, self._layout)
-        mapid = "img_map_"+str(time.time())
         img_map = _render_tree(t, img_path, self.CONFIG["DISPLAY"], layout = layout_fn,
                                tree_style = self._tree_style,
                                w=self._width,
                                h=self._height,
                                units=self._size_units)
-        html_map = self._get_html_map(img_map, treeid, mapid, t)
-        for n in t.traverse():
-            self._treeid2index[treeid][str(n._nid)]=n
-            if hasattr(n, "_QtItem_"):
-                n._QtItem_ = None
-                delattr(n, "_QtItem_")
-
+        return self._get_img_html(treeid, t, img_map, img_url,
+                                  version_key=(treeid, self._treeid2revision.setdefault(treeid, 0),
+                                               self._get_style_key(treeid)))
+
+    def _submit_tree_img(self, treeid, t):
+        revision = self._treeid2revision.setdefault(treeid, 0)
+        style_key = self._get_style_key(treeid)
+        # Node ids must be known by this process to resolve actions
+        self.get_session_store().number_nodes(treeid)
+        img_path = os.path.join(self.CONFIG["temp_dir"],
+                                "%s.%s.%s.png" %(treeid, revision, style_key))
+        layout_fn = self._treeid2layout.get(treeid, self._layout)
+        jobid = self._render_pool.submit((treeid, revision, style_key), t, img_path,
+                                         layout=layout_fn,
+                                         tree_style=self._tree_style,
+                                         w=self._width,
+                                         h=self._height,
+                                         units=self._size_units)
+        return self._get_job_html(jobid)
+
+    def _get_job_html(self, jobid):
+        job = self._render_pool.get_job(jobid) if jobid else None
+        if job is None:
+            return "job: Unknown render job: %s" %jobid
+        treeid = job.key[0]
+        if job.status == "pending":
+            return """<div id="ETE_tree_%s" class="ete_render_job"><script type="text/javascript">wait_render_job("%s", "%s");</script></div>""" %\
+                (treeid, treeid, jobid)
+        elif job.status == "error":
+            print(job.error, file=sys.stderr)
+            return "job: Cannot render the tree: %s" %treeid
+
+        t = self.get_session_store().get(treeid)
+        img_url = os.path.join(self.CONFIG["temp_url"],
+                               os.path.basename(job.img_path)+"?"+str(job.finished))
+        return self._get_img_html(treeid, t, job.result, img_url, version_key=job.key)
+
+    def _get_job_status(self, jobid):
+        job = self._render_pool.get_job(jobid) if jobid else None
+        if job is None:
+            return json.dumps({"jobid": jobid, "status": "unknown"})
+        return json.dumps({"jobid": jobid, "treeid": job.key[0],
+                           "revision": job.key[1], "status": job.status})
+
+    def _get_img_html(self, treeid, t, img_map, img_url, version_key=None):
         tree_actions = []
         for aindex, (action, target, handler, checker, html_generator) in enumerate(self.actions):
             if target in self.TREE_TARGET_ACTIONS and (not checker or checker(t)):
@@ -241,12 +504,18 @@ class WebTreeApplication(object):
         except NameError:
             version_tag = "ete3"
 
-        self._dump_tree_to_file(t, treeid)
-
         ete_publi = '<div style="margin:0px;padding:0px;text-align:left;"><a href="http://etetoolkit.org" style="font-size:7pt;" target="_blank" >%s</a></div>' %\
             (version_tag)
-        img_html = """<img id="%s" class="ete_tree_img" src="%s" USEMAP="#%s" onLoad='javascript:bind_popup();' onclick='javascript:show_context_menu("%s", "", "%s");' >""" %\
-            (treeid, img_url, mapid, treeid, ','.join(map(str, tree_actions)))
+        if self._node_index_cell_size:
+            self._set_node_index(treeid, version_key, img_map)
+            html_map = ""
+            img_html = """<img id="%s" class="ete_tree_img" src="%s" onLoad='javascript:bind_popup();' onclick='javascript:node_index_click(event, this, "%s", "%s");' >""" %\
+                (treeid, img_url, treeid, ','.join(map(str, tree_actions)))
+        else:
+            mapid = "img_map_"+str(time.time())
+            html_map = self._get_html_map(img_map, treeid, mapid, t)
+            img_html = """<img id="%s" class="ete_tree_img" src="%s" USEMAP="#%s" onLoad='javascript:bind_popup();' onclick='javascript:show_context_menu("%s", "", "%s");' >""" %\
+                (treeid, img_url, mapid, treeid, ','.join(map(str, tree_actions)))
 
         tree_div_id = "ETE_tree_"+str(treeid)
         return html_map+ '<div id="%s" >'%tree_div_id + img_html + ete_publi + "</div>"
@@ -256,34 +525,83 @@ class WebTreeApplication(object):
         """ This function is executed when the application is called
         by the WSGI apache module. It is, therefore, in charge of
         answering web requests."""
+        result = self._dispatch(environ, start_response)
+        if isinstance(result, six.text_type):
+            # WSGI servers expect byte strings
+            return [result.encode("utf-8")]
+        return result
+
+    def _dispatch(self, environ, start_response):
         path = environ['PATH_INFO'].split("/")
-        start_response('202 OK', [('content-type', 'text/plain')])
         if environ['REQUEST_METHOD'].upper() == 'GET' and  environ['QUERY_STRING']:
-            self.queries = cgi.parse_qs(environ['QUERY_STRING'])
+            queries = parse_qs(environ['QUERY_STRING'])
         elif environ['REQUEST_METHOD'].upper() == 'POST' and environ['wsgi.input']:
-            self.queries = cgi.parse_qs(environ['wsgi.input'].read())
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or -1)
+            except ValueError:
+                length = -1
+            body = environ['wsgi.input'].read(length)
+            if isinstance(body, bytes) and not isinstance(body, str):
+                body = body.decode("utf-8")
+            queries = parse_qs(body)
         else:
-            self.queries = {}
+            queries = {}
+        # Kept for compatibility with external handlers. Concurrent
+        # requests should not rely on it.
+        self.queries = queries
 
         method = path[1]
-        treeid = self.queries.get("treeid", [None])[0]
-        nodeid = self.queries.get("nid", [None])[0]
-        textface = self.queries.get("textface", [None])[0]
-        actions = self.queries.get("show_actions", [None])[0]
-        tree = self.queries.get("tree", [None])[0]
-        search_term = self.queries.get("search_term", [None])[0]
-        aindex = self.queries.get("aindex", [None])[0]
-
-        if method == "draw":
+        treeid = queries.get("treeid", [None])[0]
+        nodeid = queries.get("nid", [None])[0]
+        textface = queries.get("textface", [None])[0]
+        actions = queries.get("show_actions", [None])[0]
+        tree = queries.get("tree", [None])[0]
+        search_term = queries.get("search_term", [None])[0]
+        aindex = queries.get("aindex", [None])[0]
+        jobid = queries.get("jobid", [None])[0]
+
+        if method == "tile":
+            return self._serve_tile(environ, start_response, queries, treeid)
+
+        start_response('202 OK', [('content-type', 'text/plain')])
+        if method == "job":
+            if not self._render_pool:
+                return "job: Asynchronous rendering is not enabled"
+            return self._get_job_html(jobid)
+
+        elif method == "job_status":
+            if not self._render_pool:
+                return "job_status: Asynchronous rendering is not enabled"
+            return self._get_job_status(jobid)
+
+        elif method == "node_index":
+            return self._get_node_index_json(treeid)
+
+        elif method == "node_at":
+            try:
+                x = float(queries.get("x", [None])[0])
+                y = float(queries.get("y", [None])[0])
+            except (TypeError, ValueError):
+                return "node_at: invalid coordinates"
+            if not self._load_tree(treeid):
+                return "node_at: Cannot load the tree: %s" %treeid
+            return self._get_node_at(treeid, x, y)
+
+        elif method == "tiles_info":
+            if not self._tile_cache or not self._load_tree(treeid, tree):
+                return "tiles_info: Cannot load the tree: %s" %treeid
+            return self._get_tiles_info(treeid)
+
+        elif method == "draw":
             # if not treeid is given, generate one
             if not treeid:
-                treeid = md5(str(time.time())).hexdigest()
+                treeid = md5(str(time.time()).encode("utf-8")).hexdigest()
 
             if not self._load_tree(treeid, tree):
                 return "draw: Cannot load the tree: %s" %treeid
 
+            t = self.get_session_store().get(treeid)
             if self._custom_tree_renderer:
-                t = self._treeid2tree[treeid]
                 return self._custom_tree_renderer(t, treeid, self)
             elif t and treeid:
                 return self._get_tree_img(treeid=treeid)
@@ -295,8 +613,7 @@ class WebTreeApplication(object):
                 return "get_menu: Cannot load the tree: %s" %treeid
 
             if nodeid:
-                tree_index = self._treeid2index[treeid]
-                node = tree_index[nodeid]
+                node = self.get_session_store().get_node(treeid, nodeid)
             else:
                 node = None
 
@@ -322,10 +639,20 @@ class WebTreeApplication(object):
 
             if aindex is None:
                 # just refresh tree
+                if self._tile_cache:
+                    return self._get_tiles_info(treeid)
                 return self._get_tree_img(treeid=treeid)
             else:
                 aname, target, handler, checker, html_generator = self.actions[int(aindex)]
 
+            if self._tile_cache:
+                if target in set(["node", "face", "layout"]):
+                    return self._update_tiles(treeid, pre_drawing_action=[target, handler, [nodeid]])
+                elif target in set(["search"]):
+                    return self._update_tiles(treeid, pre_drawing_action=[target, handler, [search_term]])
+                elif target in set(["refresh"]):
+                    return self._get_tiles_info(treeid)
+
             if target in set(["node", "face", "layout"]):
                 return self._get_tree_img(treeid=treeid, pre_drawing_action=[target, handler, [nodeid]])
             elif target in set(["search"]):
@@ -335,9 +662,35 @@ class WebTreeApplication(object):
             return "Bad guy"
 
         elif self._external_app_handler:
-            return self._external_app_handler(environ, start_response, self.queries)
+            return self._external_app_handler(environ, start_response, queries)
         else:
-            return  '\n'.join(map(str, list(environ.items()))) + str(self.queries) + '\t\n'.join(environ['wsgi.input'])
+            return  '\n'.join(map(str, list(environ.items()))) + str(queries)
+
+def _get_fingerprint(obj, depth=0):
+    """ Returns a text representation of a layout function or tree
+    style that does not depend on memory addresses. """
+    if isinstance(obj, (six.string_types, six.integer_types, float, bool, type(None))):
+        return repr(obj)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = [_get_fingerprint(v, depth + 1) for v in obj]
+        if isinstance(obj, (set, frozenset)):
+            items.sort()
+        return "%s(%s)" %(type(obj).__name__, ",".join(items))
+    elif isinstance(obj, dict):
+        items = sorted("%s:%s" %(_get_fingerprint(k, depth + 1), _get_fingerprint(v, depth + 1))
+                       for k, v in six.iteritems(obj))
+        return "{%s}" %",".join(items)
+
+    name = "%s.%s" %(getattr(obj, "__module__", ""),
+                     getattr(obj, "__name__", type(obj).__name__))
+    code = getattr(obj, "__code__", None)
+    if code is not None:
+        # Functions are identified by their code
+        return "%s:%s:%s" %(name, md5(code.co_code).hexdigest(),
+                            _get_fingerprint(code.co_consts, depth + 1))
+    elif hasattr(obj, "__dict__") and depth < 4:
+        return "%s%s" %(name, _get_fingerprint(vars(obj), depth + 1))
+    return name
 
 def _render_tree(t, img_path, display, layout=None, tree_style=None,
                  w=None, h=None, units="px"):
@@ -34,6 +34,31 @@ function run_action(treeid, nodeid, aindex, search_term){
       });
 }
 
+function wait_render_job(treeid, jobid){
+  // Used when the web application renders trees asynchronously. The
+  // placeholder is replaced by the tree image as soon as it is ready.
+  setTimeout(function() {
+      $.post(ete_webplugin_URL+'/job', {"treeid": treeid, "jobid": jobid}, function(html) {
+              $("div.ete_render_job[id='ETE_tree_"+treeid+"']").replaceWith(html);
+          });
+      }, 500);
+}
+
+function node_index_click(e, img, treeid, tree_actions){
+  // Used when the web application serves node indexes instead of HTML
+  // image maps. The clicked node is resolved by the server.
+  var offset = $(img).offset();
+  var params = {"treeid": treeid, "x": e.pageX - offset.left, "y": e.pageY - offset.top};
+  $.post(ete_webplugin_URL+'/node_at', params, function(data) {
+          var hit = $.parseJSON(data);
+          if ( hit.nid != null ){
+              show_context_menu(treeid, hit.nid, hit.actions.join(","), hit.text);
+          }else{
+              show_context_menu(treeid, "", tree_actions);
+          }
+      });
+}
+
 function random_tid(){
     return Math.ceil(Math.random()*10000000);
 }